@@ -1,10 +1,13 @@
 import logging
+import os
+import signal
 import sys
 from pathlib import Path
-from flask import Flask, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 from backend.config import Config
 from backend.routes import register_routes
+from backend.utils.http_compression import compress_json_response
 
 
 def setup_logging():
@@ -66,9 +69,40 @@ def create_app():
     # 注册所有 API 路由
     register_routes(app)
 
+    # 请求体超过 MAX_CONTENT_LENGTH 时返回 JSON 错误（Flask 在读取请求体之前即拒绝）
+    @app.errorhandler(413)
+    def payload_too_large(e):
+        return jsonify({
+            "success": False,
+            "error": f"请求数据过大，不能超过 {Config.MAX_CONTENT_LENGTH // 1024 // 1024}MB\n"
+                     "解决方案：减少参考图片数量或压缩图片后重试"
+        }), 413
+
+    # 较大的 JSON 响应按 Accept-Encoding 压缩
+    if Config.JSON_COMPRESS_MIN_BYTES > 0:
+        @app.after_request
+        def compress_json(response):
+            return compress_json_response(response, request.accept_encodings, Config.JSON_COMPRESS_MIN_BYTES)
+
     # 启动时验证配置
     _validate_config_on_startup(logger)
 
+    # 后台任务：多进程部署时只由持有锁的一个工作进程运行
+    if Config.HISTORY_SYNC_INTERVAL > 0 or Config.HISTORY_RETENTION_INTERVAL > 0:
+        from backend.services.history import get_history_service
+        from backend.utils.process_lock import try_acquire_process_lock
+        history_service = get_history_service()
+        if try_acquire_process_lock(os.path.join(history_service.history_dir, "background.lock")):
+            # 后台增量同步任务文件夹（启动时先同步一次）
+            if Config.HISTORY_SYNC_INTERVAL > 0:
+                history_service.start_sync_watcher(Config.HISTORY_SYNC_INTERVAL)
+
+            # 后台执行保留策略（归档、磁盘配额、孤立文件清理）
+            if Config.HISTORY_RETENTION_INTERVAL > 0:
+                history_service.start_retention(Config.HISTORY_RETENTION_INTERVAL)
+        else:
+            logger.info("后台任务由其他工作进程运行")
+
     # 根据是否有前端构建产物决定根路由行为
     if frontend_dist.exists():
         @app.route('/')
@@ -151,6 +185,9 @@ def _validate_config_on_startup(logger):
 
 
 if __name__ == '__main__':
+    # 开发服务器（单进程）；生产环境使用 gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+    # SIGTERM（如 docker stop）转为正常退出，使 atexit 中的延迟写入得以刷新
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
     app = create_app()
     app.run(
         host=Config.HOST,
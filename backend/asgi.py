@@ -0,0 +1,141 @@
+"""
+ASGI 入口（异步模式，适合大量客户端同时订阅生成进度）
+
+    uv run uvicorn backend.asgi:app --host 0.0.0.0 --port 12398 --workers 4
+
+- GET /api/task/<task_id>/stream 由事件循环直接处理：所有事件流连接共享一个事件循环，
+  空闲连接只占一个协程和一个队列，不占用线程；同一任务的订阅者共享事件日志的读取（TaskEventBus）
+- 其他请求（包括旧版 /api/generate、/api/retry-failed 事件流）交给 Flask，在 WEB_THREADS 个线程中执行
+- 生成任务通过 /api/jobs/generate、/api/jobs/retry-failed 提交，在后台线程中运行，与事件流连接解耦
+"""
+
+import asyncio
+import re
+import time
+from typing import Any, Callable, Dict
+from urllib.parse import parse_qs, unquote
+
+from backend.app import create_app
+from backend.config import Config
+from backend.routes.image_routes import HEARTBEAT_INTERVAL
+from backend.services.generation_jobs import (
+    STREAM_IDLE_TIMEOUT, format_sse_event, format_sse_heartbeat, get_generation_jobs, is_terminal_event
+)
+from backend.services.task_event_bus import TaskEventBus
+from backend.services.task_state import get_task_state_store
+from backend.utils.wsgi_bridge import WsgiBridge
+
+_STREAM_PATH = re.compile(r"^/api/task/([^/]+)/stream$")
+
+
+def _int_or_zero(value) -> int:
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class AsgiApp:
+    """事件流路径由事件循环处理，其余请求转发给 Flask"""
+
+    def __init__(self, flask_app):
+        self.flask = WsgiBridge(
+            flask_app, max_workers=Config.WEB_THREADS, max_body_size=Config.MAX_CONTENT_LENGTH
+        )
+        self.bus = TaskEventBus(get_task_state_store(), get_generation_jobs())
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            # 不支持 WebSocket
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close"})
+            return
+
+        match = _STREAM_PATH.match(scope["path"])
+        if match and scope["method"] == "GET":
+            await self._stream(scope, receive, send, unquote(match.group(1)))
+        else:
+            await self.flask(scope, receive, send)
+
+    @staticmethod
+    async def _lifespan(receive: Callable, send: Callable) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _stream(self, scope: Dict[str, Any], receive: Callable, send: Callable, task_id: str) -> None:
+        """推送任务事件，与 Flask 的 /task/<task_id>/stream 行为相同"""
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        headers = dict(scope["headers"])
+        after = max(
+            _int_or_zero(query.get("after", ["0"])[0]),
+            _int_or_zero(headers.get(b"last-event-id", b"0").decode("latin-1"))
+        )
+
+        response_headers = [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]
+        origin = headers.get(b"origin", b"").decode("latin-1")
+        if origin in Config.CORS_ORIGINS:
+            response_headers += [(b"access-control-allow-origin", origin.encode("latin-1")), (b"vary", b"Origin")]
+        await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+
+        queue = self.bus.subscribe(task_id, after)
+        disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+        last_seq = after
+        last_event_at = time.monotonic()
+        try:
+            while True:
+                getter = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait(
+                    {getter, disconnect}, timeout=HEARTBEAT_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnect in done:
+                    getter.cancel()
+                    return
+                if getter not in done:
+                    getter.cancel()
+                    if time.monotonic() - last_event_at >= STREAM_IDLE_TIMEOUT:
+                        break
+                    await self._send_text(send, format_sse_heartbeat())
+                    continue
+
+                event = getter.result()
+                last_event_at = time.monotonic()
+                if event.get("seq") is not None:
+                    if event["seq"] <= last_seq:
+                        continue
+                    last_seq = event["seq"]
+                await self._send_text(send, format_sse_event(event))
+                if is_terminal_event(event):
+                    break
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            # 发送时连接已断开
+            pass
+        finally:
+            self.bus.unsubscribe(task_id, queue)
+            disconnect.cancel()
+
+    @staticmethod
+    async def _send_text(send: Callable, text: str) -> None:
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    @staticmethod
+    async def _wait_disconnect(receive: Callable) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+
+app = AsgiApp(create_app())
@@ -1,4 +1,5 @@
 import logging
+import os
 import yaml
 from pathlib import Path
 
@@ -12,6 +13,66 @@ class Config:
     CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000']
     OUTPUT_DIR = 'output'
 
+    # 请求体中图片的大小限制（字节）
+    MAX_IMAGE_BYTES = 20 * 1024 * 1024          # 单张图片（解码后）
+    MAX_IMAGE_REQUEST_BYTES = 60 * 1024 * 1024  # 单个请求中所有图片合计（解码后）
+    # 请求体原始大小上限：base64 膨胀约 4/3，超过后 Flask 直接返回 413，不读取请求体
+    MAX_CONTENT_LENGTH = MAX_IMAGE_REQUEST_BYTES * 4 // 3 + 4 * 1024 * 1024
+
+    # 历史记录存储后端：sqlite（默认，首次启动自动导入 JSON 记录）或 json
+    HISTORY_BACKEND = os.environ.get('HISTORY_BACKEND', 'sqlite')
+    # 后台增量同步任务文件夹的间隔（秒），0 表示不启用
+    HISTORY_SYNC_INTERVAL = float(os.environ.get('HISTORY_SYNC_INTERVAL', '0'))
+
+    # 历史记录保留策略（均为 0 表示不启用）
+    # 任务文件夹占用空间上限（MB），超出时按最近访问时间从旧到新归档
+    HISTORY_DISK_QUOTA_MB = float(os.environ.get('HISTORY_DISK_QUOTA_MB', '0'))
+    # 超过这么多天未访问的任务文件夹归档为压缩文件（访问图片时自动恢复）
+    HISTORY_ARCHIVE_AFTER_DAYS = float(os.environ.get('HISTORY_ARCHIVE_AFTER_DAYS', '0'))
+    # 后台执行保留策略和孤立文件清理的间隔（秒）
+    HISTORY_RETENTION_INTERVAL = float(os.environ.get('HISTORY_RETENTION_INTERVAL', '0'))
+    # 没有关联记录的任务文件夹/归档超过这么多小时后被清理
+    HISTORY_ORPHAN_GRACE_HOURS = float(os.environ.get('HISTORY_ORPHAN_GRACE_HOURS', '24'))
+
+    # 图片和打包下载的文件交给前置代理发送（Flask 只做校验和路径解析）：
+    # - 空（默认）：Flask 直接发送文件
+    # - nginx：返回 X-Accel-Redirect: <FILE_OFFLOAD_PREFIX><相对 history 目录的路径>，
+    #   nginx 需配置对应的 internal location，例如
+    #       location /_history/ { internal; alias /app/history/; }
+    # - sendfile：返回 X-Sendfile: <绝对路径>（Apache mod_xsendfile、lighttpd 等）
+    FILE_OFFLOAD = os.environ.get('FILE_OFFLOAD', '').strip().lower()
+    FILE_OFFLOAD_PREFIX = os.environ.get('FILE_OFFLOAD_PREFIX', '/_history/')
+
+    # 按宽度/格式生成的图片变体缓存上限（MB），超出时淘汰最久未使用的变体。
+    # 上限按进程计算：各工作进程只统计和淘汰自己生成的变体（启动时已有的除外），
+    # 多进程部署时磁盘占用最多约为 工作进程数 × 该值
+    IMAGE_VARIANT_CACHE_MB = float(os.environ.get('IMAGE_VARIANT_CACHE_MB', '512'))
+    # 最近写入/发送的图片在进程内存中的缓存上限（MB），0 表示不启用
+    IMAGE_MEMORY_CACHE_MB = float(os.environ.get('IMAGE_MEMORY_CACHE_MB', '128'))
+    # 不小于该大小（字节）的 JSON 响应按 Accept-Encoding 压缩（br/gzip），0 表示不压缩
+    JSON_COMPRESS_MIN_BYTES = int(os.environ.get('JSON_COMPRESS_MIN_BYTES', '1024'))
+
+    # 跨请求共享状态（任务状态、登录 token 吊销列表等）的存储后端：
+    # sqlite（默认，同一台机器上的多个工作进程共享）、memory（仅单进程）
+    # 或 "包.模块:类名" 形式的自定义后端
+    SHARED_STATE_BACKEND = os.environ.get('SHARED_STATE_BACKEND', 'sqlite')
+    # sqlite 后端的数据库文件，默认 history/state.db
+    SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', '')
+    # 登录 token 有效期（小时）
+    AUTH_TOKEN_TTL_HOURS = float(os.environ.get('AUTH_TOKEN_TTL_HOURS', '168'))
+    # 登录 token 的签名密钥；为空时自动生成并保存在 history/auth_secret（多节点部署需配置相同的值）
+    AUTH_SECRET = os.environ.get('AUTH_SECRET', '')
+    # 各进程缓存登录 token 吊销列表的时间（秒）：在一个进程登出后，其他进程最多这么久后才拒绝该 token；
+    # 0 表示每次验证都读取共享状态
+    AUTH_REVOCATION_REFRESH = float(os.environ.get('AUTH_REVOCATION_REFRESH', '5'))
+
+    # 生产环境多进程服务器（gunicorn -c backend/gunicorn.conf.py backend.wsgi:app）
+    # 工作进程数，0 表示按 CPU 核数（最多 8 个）；注意内存缓存按进程计算
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', '0'))
+    # 每个工作进程的线程数（SSE 生成流在整个生成期间占用一个线程；
+    # 异步模式 uvicorn backend.asgi:app 下事件流不占线程，这里只限制同时处理的普通请求）
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', '16'))
+
     _image_providers_config = None
     _text_providers_config = None
 
@@ -1,4 +1,5 @@
 """图片生成器抽象基类"""
+import threading
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 
@@ -16,6 +17,8 @@ class ImageGeneratorBase(ABC):
         self.config = config
         self.api_key = config.get('api_key')
         self.base_url = config.get('base_url')
+        # 最近一次调用的 token 用量（按线程隔离，并发生成时互不干扰）
+        self._usage_local = threading.local()
 
     @abstractmethod
     def generate_image(
@@ -62,3 +65,58 @@ class ImageGeneratorBase(ABC):
             支持的宽高比列表
         """
         return self.config.get('supported_aspect_ratios', ['1:1', '3:4', '16:9'])
+
+    def _record_usage(
+        self,
+        prompt_tokens: Optional[int] = None,
+        cached_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None
+    ):
+        """
+        记录当前线程最近一次调用的 token 用量
+
+        服务商未返回的字段保留为 None（未知），不记为 0，避免汇总时低估用量。
+        服务商通常只在命中缓存时返回缓存 token 数，因此输入 token 数已知时缺失的缓存数记为 0。
+
+        Args:
+            prompt_tokens: 输入 token 数（含命中缓存的部分）
+            cached_tokens: 命中缓存的输入 token 数
+            output_tokens: 输出 token 数
+        """
+        if cached_tokens is None and prompt_tokens is not None:
+            cached_tokens = 0
+        self._usage_local.usage = {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+        }
+
+    def _record_openai_usage(self, result: Dict[str, Any]):
+        """
+        从 OpenAI 风格响应中记录 token 用量
+
+        兼容 Chat API（prompt_tokens / completion_tokens）
+        和 Images API（input_tokens / output_tokens）两种字段命名
+        """
+        usage = result.get("usage") if isinstance(result, dict) else None
+        if not isinstance(usage, dict):
+            return
+
+        details = usage.get("prompt_tokens_details") or usage.get("input_tokens_details") or {}
+        self._record_usage(
+            prompt_tokens=usage.get("prompt_tokens", usage.get("input_tokens")),
+            cached_tokens=details.get("cached_tokens") if isinstance(details, dict) else None,
+            output_tokens=usage.get("completion_tokens", usage.get("output_tokens")),
+        )
+
+    def pop_last_usage(self) -> Optional[Dict[str, Optional[int]]]:
+        """
+        取出当前线程最近一次调用的 token 用量（取出后清空）
+
+        Returns:
+            用量字典（prompt_tokens / cached_tokens / output_tokens，未知的字段为 None），
+            服务商未返回用量时为 None
+        """
+        usage = getattr(self._usage_local, "usage", None)
+        self._usage_local.usage = None
+        return usage
@@ -1,7 +1,10 @@
 """Google GenAI 图片生成器"""
+import hashlib
 import logging
 import base64
-from typing import Dict, Any, Optional
+import threading
+import time
+from typing import Callable, Dict, Any, Optional, Tuple
 from google import genai
 from google.genai import types
 from .base import ImageGeneratorBase
@@ -320,12 +323,71 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
             types.SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="OFF"),
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ]
+
+        # 任务共享上下文的显式缓存：key -> (cached_content 名称, 本地过期时间)
+        # 名称为 None 表示该上下文无法缓存（如 token 数低于模型下限），直接走前缀布局
+        self.context_cache_ttl = int(self.config.get('context_cache_ttl', 600))
+        self._context_caches: Dict[str, Tuple[Optional[str], float]] = {}
+        self._context_cache_lock = threading.Lock()
         logger.info("GoogleGenAIGenerator 初始化完成")
 
     def validate_config(self) -> bool:
         """验证配置"""
         return bool(self.api_key)
 
+    def _get_context_cache(self, model: str, shared_context: str) -> Optional[str]:
+        """
+        获取（或创建）任务共享上下文的 Gemini 缓存
+
+        同一任务的所有页面共享同一份上下文，只上传一次，之后每页通过缓存名引用。
+        创建在锁内完成，并发生成的页面会等待同一次创建，而不是各自创建。
+
+        Args:
+            model: 模型名称（缓存与模型绑定）
+            shared_context: 任务共享上下文文本
+
+        Returns:
+            缓存名称；服务商不支持或创建失败时返回 None
+        """
+        key = hashlib.sha256(f"{model}\n{shared_context}".encode("utf-8")).hexdigest()
+        now = time.time()
+
+        with self._context_cache_lock:
+            entry = self._context_caches.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+
+            # 清理已过期的条目
+            for expired_key in [k for k, (_, expires) in self._context_caches.items() if expires <= now]:
+                del self._context_caches[expired_key]
+
+            name = None
+            try:
+                cache = self.client.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        contents=[types.Content(role="user", parts=[types.Part(text=shared_context)])],
+                        ttl=f"{self.context_cache_ttl}s",
+                        display_name="redink-task-context",
+                    ),
+                )
+                name = cache.name
+                logger.info(f"创建上下文缓存: {name} (ttl={self.context_cache_ttl}s)")
+            except Exception as e:
+                # 上下文过短、模型不支持或代理不支持 caches 接口时，退回前缀布局
+                logger.warning(f"上下文缓存不可用，改用共享前缀: {str(e)[:200]}")
+
+            # 提前 60 秒视为过期，避免引用即将被服务端删除的缓存
+            self._context_caches[key] = (name, now + max(self.context_cache_ttl - 60, 0))
+            return name
+
+    def _invalidate_context_cache(self, cache_name: str):
+        """移除已失效的缓存条目（服务端已删除或过期）"""
+        with self._context_cache_lock:
+            for key, (name, _) in list(self._context_caches.items()):
+                if name == cache_name:
+                    del self._context_caches[key]
+
     def generate_image(
         self,
         prompt: str,
@@ -333,6 +395,8 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         temperature: float = 1.0,
         model: str = "gemini-3-pro-image-preview",
         reference_image: Optional[bytes] = None,
+        shared_context: Optional[str] = None,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None,
         **kwargs
     ) -> bytes:
         """
@@ -344,6 +408,9 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
             temperature: 温度
             model: 模型名称
             reference_image: 参考图片二进制数据（用于保持风格一致）
+            shared_context: 任务共享上下文（同一任务各页相同）。
+                启用 context_cache 时上传为 Gemini 缓存，否则作为固定前缀放在最前面
+            on_progress: 流式进度回调 (stage, info)，stage 为 first_byte / thought / image_received
             **kwargs: 其他参数
 
         Returns:
@@ -352,9 +419,17 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         logger.info(f"Google GenAI 生成图片: model={model}, aspect_ratio={aspect_ratio}")
         logger.debug(f"  prompt 长度: {len(prompt)} 字符, 有参考图: {reference_image is not None}")
 
+        cache_name = None
+        if shared_context and self.config.get('context_cache', False):
+            cache_name = self._get_context_cache(model, shared_context)
+
         # 构建 parts 列表
         parts = []
 
+        # 共享上下文未走缓存时放在最前面，保持各页请求前缀一致
+        if shared_context and not cache_name:
+            parts.append(types.Part(text=shared_context))
+
         # 如果有参考图，先添加参考图和说明
         if reference_image:
             logger.debug(f"  添加参考图片 ({len(reference_image)} bytes)")
@@ -399,29 +474,28 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         if self.is_vertexai:
             image_config_kwargs["output_mime_type"] = "image/png"
 
-        generate_content_config = types.GenerateContentConfig(
-            temperature=temperature,
-            top_p=0.95,
-            max_output_tokens=32768,
-            response_modalities=["TEXT", "IMAGE"],
-            safety_settings=self.safety_settings,
-            image_config=types.ImageConfig(**image_config_kwargs),
-        )
-
-        image_data = None
-        logger.debug(f"  开始调用 API: model={model}")
-        for chunk in self.client.models.generate_content_stream(
-            model=model,
-            contents=contents,
-            config=generate_content_config,
-        ):
-            if chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts:
-                for part in chunk.candidates[0].content.parts:
-                    # 检查是否有图片数据
-                    if hasattr(part, 'inline_data') and part.inline_data:
-                        image_data = part.inline_data.data
-                        logger.debug(f"  收到图片数据: {len(image_data)} bytes")
-                        break
+        config_kwargs = {
+            "temperature": temperature,
+            "top_p": 0.95,
+            "max_output_tokens": 32768,
+            "response_modalities": ["TEXT", "IMAGE"],
+            "safety_settings": self.safety_settings,
+            "image_config": types.ImageConfig(**image_config_kwargs),
+        }
+        if cache_name:
+            config_kwargs["cached_content"] = cache_name
+
+        try:
+            image_data = self._stream_image(model, contents, types.GenerateContentConfig(**config_kwargs), on_progress)
+        except Exception as e:
+            if not cache_name or "cache" not in str(e).lower():
+                raise
+            # 缓存已被服务端删除或过期：作废后改用共享前缀重试一次
+            logger.warning(f"上下文缓存失效，改用共享前缀重试: {str(e)[:200]}")
+            self._invalidate_context_cache(cache_name)
+            del config_kwargs["cached_content"]
+            contents[0].parts.insert(0, types.Part(text=shared_context))
+            image_data = self._stream_image(model, contents, types.GenerateContentConfig(**config_kwargs), on_progress)
 
         if not image_data:
             logger.error("API 返回为空，未生成图片")
@@ -443,6 +517,105 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         logger.info(f"✅ Google GenAI 图片生成成功: {len(image_data)} bytes")
         return image_data
 
+    def _stream_image(
+        self,
+        model: str,
+        contents: list,
+        config: types.GenerateContentConfig,
+        on_progress: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    ) -> Optional[bytes]:
+        """
+        调用流式接口并取出图片数据，同时记录 token 用量
+
+        收到最终图片后立即关闭流返回，不再等待后续的收尾分片。
+        思考过程中产生的草稿图（thought=True）会被跳过。
+
+        用量取自图片分片及之前各分片的 usage_metadata，每个字段取最后一次出现的值。
+        完整用量通常在收尾分片中才返回，提前退出时缺失的字段记为未知（None），而不是 0。
+
+        Args:
+            model: 模型名称
+            contents: 请求内容
+            config: 生成配置
+            on_progress: 流式进度回调 (stage, info)
+
+        Returns:
+            图片二进制数据，未收到图片时返回 None
+        """
+        def emit(stage: str, **info):
+            if on_progress:
+                info["elapsed_ms"] = int((time.time() - start_time) * 1000)
+                try:
+                    on_progress(stage, info)
+                except Exception as e:
+                    logger.debug(f"  进度回调异常（忽略）: {e}")
+
+        image_data = None
+        usage: Dict[str, Optional[int]] = {}
+        start_time = time.time()
+        first_chunk = True
+        logger.debug(f"  开始调用 API: model={model}")
+
+        stream = self.client.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        )
+        try:
+            for chunk in stream:
+                if first_chunk:
+                    first_chunk = False
+                    emit("first_byte")
+
+                self._merge_usage(usage, getattr(chunk, 'usage_metadata', None))
+                if not (chunk.candidates and chunk.candidates[0].content and chunk.candidates[0].content.parts):
+                    continue
+
+                for part in chunk.candidates[0].content.parts:
+                    is_thought = bool(getattr(part, 'thought', False))
+                    # 检查是否有图片数据（跳过思考阶段的草稿图）
+                    if getattr(part, 'inline_data', None) and part.inline_data.data and not is_thought:
+                        image_data = part.inline_data.data
+                        logger.debug(f"  收到图片数据: {len(image_data)} bytes")
+                        break
+                    if getattr(part, 'text', None):
+                        emit("thought" if is_thought else "text", text=part.text[:200])
+
+                if image_data:
+                    emit("image_received", bytes=len(image_data))
+                    break
+        finally:
+            # 提前退出时主动关闭流，释放底层连接
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+
+        self._record_usage(
+            prompt_tokens=usage.get("prompt_tokens"),
+            cached_tokens=usage.get("cached_tokens"),
+            output_tokens=usage.get("output_tokens"),
+        )
+        logger.debug(
+            f"  token 用量: prompt={usage.get('prompt_tokens', '未知')}, "
+            f"cached={usage.get('cached_tokens', '未知')}, output={usage.get('output_tokens', '未知')}"
+        )
+
+        return image_data
+
+    @staticmethod
+    def _merge_usage(usage: Dict[str, Optional[int]], metadata) -> None:
+        """把分片的 usage_metadata 合并进 usage，忽略未返回的字段"""
+        if not metadata:
+            return
+        for key, attr in (
+            ("prompt_tokens", "prompt_token_count"),
+            ("cached_tokens", "cached_content_token_count"),
+            ("output_tokens", "candidates_token_count"),
+        ):
+            value = getattr(metadata, attr, None)
+            if value is not None:
+                usage[key] = value
+
     def get_supported_aspect_ratios(self) -> list:
         """获取支持的宽高比"""
         return ["1:1", "3:4", "4:3", "16:9", "9:16"]
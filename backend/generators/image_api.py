@@ -168,6 +168,7 @@ class ImageApiGenerator(ImageGeneratorBase):
             )
 
         result = response.json()
+        self._record_openai_usage(result)
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
         if "data" in result and len(result["data"]) > 0:
@@ -277,6 +278,7 @@ class ImageApiGenerator(ImageGeneratorBase):
                 )
 
         result = response.json()
+        self._record_openai_usage(result)
         logger.debug(f"Chat API 响应: {str(result)[:500]}")
 
         # 解析响应
@@ -135,6 +135,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             )
 
         result = response.json()
+        self._record_openai_usage(result)
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
         if "data" not in result or len(result["data"]) == 0:
@@ -247,6 +248,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                 )
 
         result = response.json()
+        self._record_openai_usage(result)
         logger.debug(f"Chat API 响应: {str(result)[:500]}")
 
         # 解析响应
@@ -0,0 +1,36 @@
+"""
+gunicorn 配置（生产环境多进程服务器）
+
+    uv run gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+
+- 多个工作进程，每个进程多个线程（gthread）：生成图片的 SSE 流在整个生成期间占用一个线程
+- 工作进程数、线程数由 WEB_WORKERS、WEB_THREADS 配置
+- 跨请求状态保存在共享状态（默认 history/state.db）中，任意工作进程都能处理重试、查询进度等请求
+- 后台任务（增量同步、保留策略）只在持有 history/background.lock 的一个工作进程中运行
+- 大量客户端同时订阅生成进度时改用异步入口 backend/asgi.py（uvicorn），事件流不占用线程
+"""
+
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.config import Config  # noqa: E402
+
+bind = f"{Config.HOST}:{Config.PORT}"
+workers = Config.WEB_WORKERS or min(multiprocessing.cpu_count(), 8)
+worker_class = "gthread"
+threads = Config.WEB_THREADS
+
+# gthread 工作进程的 timeout 只用于检测进程是否卡死，处理中的长请求（SSE 流、重新生成）不受影响
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# 工作进程心跳文件放在内存文件系统中（Docker 默认的 /tmp 可能是较慢的 overlay）
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = "-"
+errorlog = "-"
@@ -8,11 +8,16 @@ API 路由模块
 - config_routes: 配置管理 API
 - content_routes: 内容生成相关 API（标题、文案、标签）
 - auth_routes: 登录认证相关 API
+- upload_routes: 参考图片上传 API
 
 所有路由都注册到统一的 /api 前缀下
 """
 
-from flask import Blueprint
+import logging
+from flask import Blueprint, jsonify, request
+from backend.services.upload import UploadNotFoundError
+
+logger = logging.getLogger(__name__)
 
 
 def create_api_blueprint():
@@ -30,6 +35,7 @@ def create_api_blueprint():
     from .config_routes import create_config_blueprint
     from .content_routes import create_content_blueprint
     from .auth_routes import create_auth_blueprint
+    from .upload_routes import create_upload_blueprint
 
     # 创建主 API 蓝图
     api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -41,6 +47,20 @@ def create_api_blueprint():
     api_bp.register_blueprint(create_history_blueprint())
     api_bp.register_blueprint(create_config_blueprint())
     api_bp.register_blueprint(create_content_blueprint())
+    api_bp.register_blueprint(create_upload_blueprint())
+
+    @api_bp.errorhandler(UploadNotFoundError)
+    def upload_not_found(e):
+        """
+        引用的参考图片不存在（客户端错误）
+
+        各接口的兜底 except Exception 会先重新抛出 UploadNotFoundError，统一在这里返回 400
+        """
+        logger.warning(f"{request.path} 参考图片不可用: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
 
     return api_bp
 
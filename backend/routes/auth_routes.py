@@ -9,10 +9,10 @@
 
 import logging
 import os
-import secrets
 from pathlib import Path
 from flask import Blueprint, request, jsonify
 from dotenv import load_dotenv
+from backend.services.auth_tokens import get_auth_token_service
 from .utils import log_request, log_error
 
 logger = logging.getLogger(__name__)
@@ -24,18 +24,10 @@ load_dotenv(ENV_PATH)
 AUTH_USERNAME = os.getenv('AUTH_USERNAME', 'root')
 AUTH_PASSWORD = os.getenv('AUTH_PASSWORD', 'ai@2025toor')
 
-# 简单的 token 存储（生产环境建议使用 Redis 或持久化会话存储）
-valid_tokens = set()
-
-
-def _generate_token() -> str:
-    """生成随机 token"""
-    return secrets.token_hex(32)
-
 
 def _verify_token(token: str) -> bool:
-    """验证 token 是否有效"""
-    return token in valid_tokens
+    """验证 token 是否有效（签名、有效期、是否已登出）"""
+    return get_auth_token_service().verify(token)
 
 
 def _get_bearer_token() -> str:
@@ -58,8 +50,7 @@ def create_auth_blueprint():
             log_request('/login', {'username': username})
 
             if username == AUTH_USERNAME and password == AUTH_PASSWORD:
-                token = _generate_token()
-                valid_tokens.add(token)
+                token = get_auth_token_service().issue(username)
                 logger.info(f"✅ 用户 {username} 登录成功")
                 return jsonify({
                     "success": True,
@@ -85,8 +76,7 @@ def create_auth_blueprint():
         """用户登出"""
         try:
             token = _get_bearer_token()
-            if token and token in valid_tokens:
-                valid_tokens.discard(token)
+            if get_auth_token_service().revoke(token):
                 logger.info("✅ 用户登出成功")
 
             return jsonify({
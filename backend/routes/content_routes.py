@@ -3,11 +3,13 @@
 
 包含功能：
 - 生成标题、文案、标签
+- 流式生成标题、文案、标签（SSE）
 """
 
+import json
 import time
 import logging
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from backend.services.content import get_content_service
 from .utils import log_request, log_error
 
@@ -79,4 +81,60 @@ def create_content_blueprint():
                 "error": f"内容生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
             }), 500
 
+    @content_bp.route('/content/stream', methods=['POST'])
+    def generate_content_stream():
+        """
+        流式生成标题、文案、标签（SSE 流式返回）
+
+        请求格式（application/json）：
+        - topic: 主题文本
+        - outline: 大纲内容
+
+        返回：
+        SSE 事件流，包含以下事件类型：
+        - title: 单个标题生成完成 { index, title }
+        - field: 某个字段生成完成 { field, value }
+        - finish: 全部完成 { success, titles, copywriting, tags, partial }
+        - error: 生成失败 { success, error }
+        """
+        try:
+            data = request.get_json() or {}
+            topic = data.get('topic', '')
+            outline = data.get('outline', '')
+
+            log_request('/content/stream', {'topic': topic[:50] if topic else '', 'outline_length': len(outline)})
+
+            if not topic or not outline:
+                logger.warning("流式内容生成请求缺少 topic 或 outline 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 和 outline 不能为空。\n请先生成大纲。"
+                }), 400
+
+            logger.info(f"🔄 开始流式生成内容，主题: {topic[:50]}...")
+            content_service = get_content_service()
+
+            def generate():
+                """SSE 事件生成器"""
+                for event in content_service.generate_content_stream(topic, outline):
+                    yield f"event: {event['event']}\n"
+                    yield f"data: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+            return Response(
+                generate(),
+                mimetype='text/event-stream',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no',
+                }
+            )
+
+        except Exception as e:
+            log_error('/content/stream', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"内容生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
+            }), 500
+
     return content_bp
@@ -10,14 +10,26 @@
 """
 
 import os
-import io
-import zipfile
 import logging
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from backend.config import Config
 from backend.services.history import get_history_service
+from backend.services.history_export import archive_signature, archive_size, plan_archive
+from backend.utils.http_cache import content_version
+from .utils import attachment_header, conditional_json, parse_fields, project_fields, send_history_file
 
 logger = logging.getLogger(__name__)
 
+# ?fields= 可选的顶层字段：列表条目（索引摘要）和记录详情
+LIST_FIELDS = (
+    "id", "title", "created_at", "updated_at", "status", "thumbnail",
+    "page_count", "task_id", "image_count", "disk_bytes"
+)
+RECORD_FIELDS = (
+    "id", "title", "created_at", "updated_at", "status", "thumbnail",
+    "outline", "images", "disk_bytes", "archived_at"
+)
+
 
 def create_history_blueprint():
     """创建历史记录路由蓝图（工厂函数，支持多次调用）"""
@@ -90,24 +102,120 @@ def create_history_blueprint():
         """
         获取历史记录列表（分页）
 
+        支持两种分页方式：传 cursor 或 limit 时使用游标分页，否则使用页码分页。
+
         查询参数：
         - page: 页码（默认 1）
         - page_size: 每页数量（默认 20）
+        - cursor: 游标分页，上一页返回的 next_cursor（第一页不传）
+        - limit: 游标分页每页数量（默认 20）
         - status: 状态过滤（可选：all/completed/draft）
+        - sort: 排序字段（created_at / updated_at，默认 created_at，倒序）
+        - since: 排序字段的时间下限（包含，ISO 格式，可选）
+        - until: 排序字段的时间上限（不包含，ISO 格式，可选）
+        - fields: 每条记录只返回这些字段（逗号分隔，id 总是返回，可选；不支持的字段返回 400）
 
         返回：
         - success: 是否成功
         - records: 记录列表
         - total: 总数
-        - total_pages: 总页数
+        - total_pages: 总页数（页码分页）
+        - next_cursor: 下一页的游标，没有下一页时为 null（游标分页）
+        - has_more: 是否还有下一页（游标分页）
+
+        响应带 ETag，列表内容未变化时 If-None-Match 请求返回 304
         """
         try:
-            page = int(request.args.get('page', 1))
-            page_size = int(request.args.get('page_size', 20))
             status = request.args.get('status')
+            if status == 'all':
+                status = None
+            sort = request.args.get('sort', 'created_at')
+            since = request.args.get('since') or None
+            until = request.args.get('until') or None
+
+            if sort not in ('created_at', 'updated_at'):
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：sort 只支持 created_at 或 updated_at。"
+                }), 400
+
+            try:
+                fields = parse_fields(request.args.get('fields'), LIST_FIELDS)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": f"参数错误：{str(e)}"
+                }), 400
 
             history_service = get_history_service()
-            result = history_service.list_records(page, page_size, status)
+            if 'cursor' in request.args or 'limit' in request.args:
+                limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+                try:
+                    result = history_service.list_records_by_cursor(
+                        request.args.get('cursor') or None, limit, status, sort, since, until
+                    )
+                except ValueError as e:
+                    return jsonify({
+                        "success": False,
+                        "error": f"参数错误：{str(e)}"
+                    }), 400
+            else:
+                page = int(request.args.get('page', 1))
+                page_size = int(request.args.get('page_size', 20))
+                result = history_service.list_records(page, page_size, status, sort, since, until)
+
+            result["records"] = [project_fields(record, fields) for record in result["records"]]
+            return conditional_json({
+                "success": True,
+                **result
+            })
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"获取历史记录列表失败。\n错误详情: {error_msg}"
+            }), 500
+
+    @history_bp.route('/history/contact-sheet', methods=['GET'])
+    def get_history_contact_sheet():
+        """
+        分页获取历史记录列表，并返回当前页封面拼图的坐标表
+
+        前端用一张拼图（CSS 背景定位）显示整页卡片封面，替代逐个请求缩略图。
+
+        查询参数：
+        - page: 页码（默认 1）
+        - page_size: 每页数量（默认 20，最大 100）
+        - status: 状态过滤（可选）
+        - sort: 排序字段 created_at（默认）/ updated_at
+
+        返回：
+        - success: 是否成功
+        - records/total/page/page_size/total_pages: 同 GET /history
+        - sheet: 拼图信息，当前页没有可用封面时为 null
+          - url: 拼图地址
+          - width/height: 拼图尺寸
+          - tile_width/tile_height: 单个封面尺寸
+          - tiles: 记录 ID -> {x, y}（封面左上角在拼图中的坐标）
+        """
+        try:
+            page = max(request.args.get('page', 1, type=int), 1)
+            page_size = min(max(request.args.get('page_size', 20, type=int), 1), 100)
+            status = request.args.get('status') or None
+            if status == 'all':
+                status = None
+            sort = request.args.get('sort', 'created_at')
+            if sort not in ('created_at', 'updated_at'):
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：sort 只支持 created_at 或 updated_at。"
+                }), 400
+
+            history_service = get_history_service()
+            result = history_service.get_contact_sheet(page, page_size, status, sort)
+            if result["sheet"] is not None:
+                result["sheet"]["url"] = f"/api/history/contact-sheet/{result['sheet']['key']}.jpg"
 
             return jsonify({
                 "success": True,
@@ -118,9 +226,37 @@ def create_history_blueprint():
             error_msg = str(e)
             return jsonify({
                 "success": False,
-                "error": f"获取历史记录列表失败。\n错误详情: {error_msg}"
+                "error": f"获取封面拼图失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/contact-sheet/<key>.jpg', methods=['GET'])
+    def get_history_contact_sheet_image(key):
+        """
+        获取封面拼图图片
+
+        拼图内容由 key 唯一确定，可以永久缓存。
+
+        路径参数：
+        - key: GET /history/contact-sheet 返回的拼图标识
+        """
+        history_service = get_history_service()
+        try:
+            path = history_service.sheets.image_path(key)
+        except ValueError:
+            path = None
+        if path is None or not os.path.exists(path):
+            return jsonify({
+                "success": False,
+                "error": f"拼图不存在：{key}"
+            }), 404
+
+        response = send_history_file(path, history_service.history_dir, mimetype='image/jpeg', etag=key)
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        return response
+
     @history_bp.route('/history/<record_id>', methods=['GET'])
     def get_history(record_id):
         """
@@ -129,13 +265,38 @@ def create_history_blueprint():
         路径参数：
         - record_id: 记录 ID
 
+        查询参数：
+        - fields: 只返回这些字段（逗号分隔，嵌套字段用点号，如 status,images.generated；id 总是返回；
+          不支持的顶层字段返回 400）
+
         返回：
         - success: 是否成功
-        - record: 完整的记录数据
+        - record: 记录数据（未指定 fields 时为完整记录）
+
+        响应带 ETag（由记录版本和 fields 决定），记录未变化时 If-None-Match 请求返回 304，
+        不读取完整记录
         """
         try:
+            try:
+                fields = parse_fields(request.args.get('fields'), RECORD_FIELDS)
+            except ValueError as e:
+                return jsonify({
+                    "success": False,
+                    "error": f"参数错误：{str(e)}"
+                }), 400
+
             history_service = get_history_service()
-            record = history_service.get_record(record_id)
+            version = history_service.record_version(record_id)
+            record = None
+
+            if version is not None:
+                etag = content_version(f"{record_id}|{version}|{','.join(fields or ['*'])}".encode('utf-8'))
+                if request.if_none_match.contains_weak(etag):
+                    response = Response(status=304)
+                    response.set_etag(etag)
+                    response.cache_control.no_cache = True
+                    return response
+                record = history_service.get_record(record_id)
 
             if not record:
                 return jsonify({
@@ -143,10 +304,10 @@ def create_history_blueprint():
                     "error": f"历史记录不存在：{record_id}\n可能原因：记录已被删除或ID错误"
                 }), 404
 
-            return jsonify({
+            return conditional_json({
                 "success": True,
-                "record": record
-            }), 200
+                "record": project_fields(record, fields)
+            }, etag)
 
         except Exception as e:
             error_msg = str(e)
@@ -296,17 +457,23 @@ def create_history_blueprint():
     @history_bp.route('/history/search', methods=['GET'])
     def search_history():
         """
-        搜索历史记录
+        全文检索历史记录（标题和大纲内容）
 
         查询参数：
         - keyword: 搜索关键词（必填）
+        - page: 页码（默认 1）
+        - page_size: 每页数量（默认 20）
 
         返回：
         - success: 是否成功
-        - records: 匹配的记录列表
+        - records: 匹配的记录列表（按相关度排序）
+        - total: 命中总数
+        - total_pages: 总页数
         """
         try:
             keyword = request.args.get('keyword', '')
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', 20))
 
             if not keyword:
                 return jsonify({
@@ -315,11 +482,11 @@ def create_history_blueprint():
                 }), 400
 
             history_service = get_history_service()
-            results = history_service.search_records(keyword)
+            result = history_service.search_records(keyword, page, page_size)
 
             return jsonify({
                 "success": True,
-                "records": results
+                **result
             }), 200
 
         except Exception as e:
@@ -337,7 +504,10 @@ def create_history_blueprint():
         返回：
         - success: 是否成功
         - total: 总记录数
-        - by_status: 按状态分组的统计
+        - total_images: 已生成图片总数
+        - total_disk_bytes: 占用空间总计（字节）
+        - by_status: 按状态分组的记录数
+        - details: 按状态分组的 {records, images, disk_bytes}
         """
         try:
             history_service = get_history_service()
@@ -355,6 +525,65 @@ def create_history_blueprint():
                 "error": f"获取历史记录统计失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/stats/reconcile', methods=['POST'])
+    def reconcile_history_stats():
+        """
+        对账：重新计算各记录的占用空间和全部统计
+
+        返回：
+        - success: 是否成功
+        - corrected: 占用空间被校正的记录数
+        - 其余字段同 GET /history/stats
+        """
+        try:
+            history_service = get_history_service()
+            stats = history_service.reconcile_statistics()
+
+            return jsonify({
+                "success": True,
+                **stats
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"统计对账失败。\n错误详情: {error_msg}"
+            }), 500
+
+    @history_bp.route('/history/retention/run', methods=['POST'])
+    def run_history_retention():
+        """
+        立即执行一轮保留策略：归档长时间未访问或超出磁盘配额的任务文件夹，清理孤立文件
+
+        查询参数：
+        - dry_run: 为 true 时只返回将要归档和删除的任务，不实际执行
+
+        返回：
+        - success: 是否成功
+        - archived: 归档的任务 ID 列表
+        - freed_bytes: 归档释放的空间（字节）
+        - live_bytes: 未归档任务文件夹的总大小（字节）
+        - removed_orphans: 删除的孤立任务 ID 列表
+        - failed: 失败的任务及原因
+        """
+        try:
+            history_service = get_history_service()
+            dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+            result = history_service.run_retention(dry_run=dry_run)
+
+            return jsonify({
+                "success": True,
+                **result
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"执行保留策略失败。\n错误详情: {error_msg}"
+            }), 500
+
     # ==================== 扫描和同步 ====================
 
     @history_bp.route('/history/scan/<task_id>', methods=['GET'])
@@ -388,18 +617,30 @@ def create_history_blueprint():
     @history_bp.route('/history/scan-all', methods=['POST'])
     def scan_all_tasks():
         """
-        扫描所有任务并同步图片列表
+        分批扫描任务并同步图片列表
+
+        查询参数：
+        - limit: 本批最多扫描的任务数（默认 200，最大 1000）
+        - cursor: 上一批返回的 next_cursor，不传则从头开始
+        - incremental: 为 true 时只扫描自上次同步后发生变化的任务
 
         返回：
         - success: 是否成功
-        - total_tasks: 扫描的任务总数
+        - total_tasks: 本批扫描的任务数
+        - skipped: 增量模式下跳过的未变化任务数
         - synced: 成功同步的任务数
+        - updated: 其中记录实际发生变化的任务数
         - failed: 失败的任务数
         - orphan_tasks: 孤立任务列表（有图片但无记录）
+        - next_cursor: 下一批的游标，为 null 表示已扫描完
+        - has_more: 是否还有未扫描的任务
         """
         try:
             history_service = get_history_service()
-            result = history_service.scan_all_tasks()
+            limit = request.args.get('limit', history_service.SCAN_BATCH_SIZE, type=int)
+            cursor = request.args.get('cursor') or None
+            incremental = request.args.get('incremental', 'false').lower() == 'true'
+            result = history_service.scan_all_tasks(limit=limit, cursor=cursor, incremental=incremental)
 
             if not result.get("success"):
                 return jsonify(result), 500
@@ -420,11 +661,14 @@ def create_history_blueprint():
         """
         下载历史记录的所有图片为 ZIP 文件
 
+        归档不压缩（图片本身已压缩），首次下载边生成边发送并写入磁盘缓存；
+        缓存生成后支持 Range 断点续传，图片重新生成后缓存自动失效。
+
         路径参数：
         - record_id: 记录 ID
 
         返回：
-        - 成功：ZIP 文件下载
+        - 成功：ZIP 文件下载（带 Content-Length、ETag）
         - 失败：JSON 错误信息
         """
         try:
@@ -444,28 +688,47 @@ def create_history_blueprint():
                     "error": "该记录没有关联的任务图片"
                 }), 404
 
-            # 获取任务目录
-            task_dir = os.path.join(history_service.history_dir, task_id)
+            # 获取任务目录（已归档时先恢复）
+            task_dir = history_service.ensure_task_restored(task_id)
             if not os.path.exists(task_dir):
                 return jsonify({
                     "success": False,
                     "error": f"任务目录不存在：{task_id}"
                 }), 404
 
-            # 创建内存中的 ZIP 文件
-            zip_buffer = _create_images_zip(task_dir)
-
             # 生成安全的下载文件名
             title = record.get('title', 'images')
             safe_title = _sanitize_filename(title)
             filename = f"{safe_title}.zip"
 
-            return send_file(
-                zip_buffer,
-                mimetype='application/zip',
-                as_attachment=True,
-                download_name=filename
+            entries = plan_archive(task_dir)
+            signature = archive_signature(entries)
+            exports = history_service.exports
+
+            # 有缓存时直接发送文件（支持 Range 和 If-None-Match）；
+            # 没有缓存但请求了 Range，或文件交给前置代理发送时，先生成缓存再发送
+            cached_path = exports.cached(task_id, signature)
+            if cached_path is None and (request.range is not None or Config.FILE_OFFLOAD):
+                cached_path = exports.build(task_id, signature, entries)
+            if cached_path is not None:
+                return send_history_file(
+                    cached_path,
+                    history_service.history_dir,
+                    mimetype='application/zip',
+                    etag=signature,
+                    download_name=filename
+                )
+
+            # 首次下载：边生成边发送，同时写入缓存
+            response = Response(
+                stream_with_context(exports.stream(task_id, signature, entries)),
+                mimetype='application/zip'
             )
+            response.content_length = archive_size(entries)
+            response.headers['Content-Disposition'] = attachment_header(filename)
+            response.headers['Accept-Ranges'] = 'bytes'
+            response.set_etag(signature)
+            return response
 
         except Exception as e:
             error_msg = str(e)
@@ -477,42 +740,6 @@ def create_history_blueprint():
     return history_bp
 
 
-def _create_images_zip(task_dir: str) -> io.BytesIO:
-    """
-    创建包含所有图片的 ZIP 文件
-
-    Args:
-        task_dir: 任务目录路径
-
-    Returns:
-        io.BytesIO: 内存中的 ZIP 文件
-    """
-    memory_file = io.BytesIO()
-
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        # 遍历任务目录中的所有图片（排除缩略图）
-        for filename in os.listdir(task_dir):
-            # 跳过缩略图文件
-            if filename.startswith('thumb_'):
-                continue
-
-            if filename.endswith(('.png', '.jpg', '.jpeg')):
-                file_path = os.path.join(task_dir, filename)
-
-                # 生成归档文件名（page_N.png 格式）
-                try:
-                    index = int(filename.split('.')[0])
-                    archive_name = f"page_{index + 1}.png"
-                except ValueError:
-                    archive_name = filename
-
-                zf.write(file_path, archive_name)
-
-    # 将指针移到开始位置
-    memory_file.seek(0)
-    return memory_file
-
-
 def _sanitize_filename(title: str) -> str:
     """
     清理文件名中的非法字符
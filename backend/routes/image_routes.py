@@ -6,23 +6,37 @@
 - 获取图片
 - 重试/重新生成单张图片
 - 批量重试失败图片
-- 获取任务状态
+- 后台生成任务（提交后通过事件流订阅进度）
+- 获取任务状态和事件
 """
 
 import os
 import json
-import base64
 import logging
 import queue
 import threading
-from flask import Blueprint, request, jsonify, Response, send_file
+import time
+from flask import Blueprint, request, jsonify, Response
+from backend.config import Config
+from backend.services.generation_jobs import (
+    STREAM_IDLE_TIMEOUT, format_sse_event, format_sse_heartbeat, get_generation_jobs, is_terminal_event
+)
+from backend.services.history import get_history_service
+from backend.services.hot_image_cache import get_hot_image_cache
 from backend.services.image import get_image_service
-from .utils import log_request, log_error
+from backend.services.image_variants import VARIANT_FORMATS, negotiate_format, snap_width, supported_formats
+from backend.services.task_state import get_task_state_store
+from backend.services.upload import UploadNotFoundError, get_upload_service
+from backend.utils.http_cache import describe_file
+from backend.utils.request_body import PayloadTooLargeError
+from .utils import log_request, log_error, read_image_json_body, send_history_file
 
 logger = logging.getLogger(__name__)
 
 # 心跳间隔（秒）- 用于保持 SSE 连接活跃，防止 Cloudflare/Nginx 代理超时
 HEARTBEAT_INTERVAL = 30
+# WSGI 模式下事件流轮询事件日志的间隔（秒）
+STREAM_POLL_INTERVAL = 0.5
 
 
 def create_image_blueprint():
@@ -41,7 +55,9 @@ def create_image_blueprint():
         - task_id: 任务 ID
         - full_outline: 完整大纲文本
         - user_topic: 用户原始输入主题
-        - user_images: base64 编码的用户参考图片列表
+        - user_image_ids: /uploads 返回的用户参考图片 ID 列表（推荐）
+        - user_images: base64 编码的用户参考图片列表（兼容旧版）
+        - record_id: 关联的历史记录 ID（可选，生成过程中同步写入已完成的图片）
 
         返回：
         SSE 事件流，包含以下事件类型：
@@ -50,14 +66,15 @@ def create_image_blueprint():
         - complete: 全部完成
         """
         try:
-            data = request.get_json()
+            data, body_images = read_image_json_body(('user_images',))
             pages = data.get('pages')
             task_id = data.get('task_id')
             full_outline = data.get('full_outline', '')
             user_topic = data.get('user_topic', '')
+            record_id = data.get('record_id')
 
-            # 解析 base64 格式的用户参考图片
-            user_images = _parse_base64_images(data.get('user_images', []))
+            # 解析用户参考图片（上传 ID 或 base64）
+            user_images = _resolve_user_images(data, body_images['user_images'])
 
             log_request('/generate', {
                 'pages_count': len(pages) if pages else 0,
@@ -87,7 +104,8 @@ def create_image_blueprint():
                         for event in image_service.generate_images(
                             pages, task_id, full_outline,
                             user_images=user_images if user_images else None,
-                            user_topic=user_topic
+                            user_topic=user_topic,
+                            record_id=record_id
                         ):
                             if stop_flag.is_set():
                                 break
@@ -156,6 +174,16 @@ def create_image_blueprint():
                 }
             )
 
+        except PayloadTooLargeError as e:
+            logger.warning(f"/generate 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
         except Exception as e:
             log_error('/generate', e)
             error_msg = str(e)
@@ -177,9 +205,13 @@ def create_image_blueprint():
 
         查询参数：
         - thumbnail: 是否返回缩略图（默认 true）
+        - v: 图片内容版本号（生成接口返回的 image_url 中自带）
+        - w: 目标宽度（像素），向上取整到固定档位；指定后从原图生成变体，忽略 thumbnail
+        - format: 变体格式 avif/webp/jpeg/png，auto 或只指定 w 时按 Accept 头协商
 
         返回：
-        - 成功：图片文件
+        - 成功：图片文件，带内容哈希 ETag，If-None-Match 命中时返回 304；
+          v 与当前内容一致时长期缓存（immutable），否则每次使用前重新验证
         - 失败：JSON 错误信息
         """
         try:
@@ -188,30 +220,66 @@ def create_image_blueprint():
             # 检查是否请求缩略图
             thumbnail = request.args.get('thumbnail', 'true').lower() == 'true'
 
-            # 构建 history 目录路径
-            history_root = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-                "history"
-            )
-
-            if thumbnail:
-                # 尝试返回缩略图
-                thumb_filename = f"thumb_{filename}"
-                thumb_filepath = os.path.join(history_root, task_id, thumb_filename)
-
-                if os.path.exists(thumb_filepath):
-                    return send_file(thumb_filepath, mimetype='image/png')
-
-            # 返回原图
-            filepath = os.path.join(history_root, task_id, filename)
+            # 通过目录布局解析任务文件夹（分片位置或旧版平铺位置），已归档时先恢复
+            history_service = get_history_service()
+            try:
+                task_dir = history_service.ensure_task_restored(task_id)
+            except ValueError:
+                return jsonify({
+                    "success": False,
+                    "error": f"图片不存在：{task_id}/{filename}"
+                }), 404
 
-            if not os.path.exists(filepath):
+            # 原图的内容版本号（缩略图随原图一起生成，共用同一个版本号）
+            filepath = os.path.join(task_dir, filename)
+            try:
+                version, mimetype, _ = describe_file(filepath)
+            except OSError:
                 return jsonify({
                     "success": False,
                     "error": f"图片不存在：{task_id}/{filename}"
                 }), 404
 
-            return send_file(filepath, mimetype='image/png')
+            # 响应式变体：按宽度和格式从原图生成，缓存在磁盘上
+            width = request.args.get('w', type=int)
+            fmt = (request.args.get('format') or '').lower()
+            if width or fmt:
+                negotiated = fmt in ('', 'auto')
+                if negotiated:
+                    fmt = negotiate_format(request.accept_mimetypes)
+                elif fmt == 'jpg':
+                    fmt = 'jpeg'
+                if fmt not in supported_formats():
+                    return jsonify({
+                        "success": False,
+                        "error": f"不支持的图片格式：{fmt}，可选 {', '.join(supported_formats())}"
+                    }), 400
+
+                target_width = snap_width(width) if width and width > 0 else None
+                variant_path = history_service.variants.get(
+                    task_id, filename, filepath, version, target_width, fmt
+                )
+                response = _send_cached_image(
+                    variant_path, history_service.history_dir, VARIANT_FORMATS[fmt][1],
+                    f"{version}-{target_width or 'full'}-{fmt}", version
+                )
+                if negotiated:
+                    response.vary.add('Accept')
+                return response
+
+            if thumbnail:
+                # 尝试返回缩略图（按文件头识别类型，缩略图是 JPEG 数据）
+                thumb_filepath = os.path.join(task_dir, f"thumb_{filename}")
+                try:
+                    thumb_version, thumb_mimetype, _ = describe_file(thumb_filepath)
+                    return _send_cached_image(
+                        thumb_filepath, history_service.history_dir, thumb_mimetype, thumb_version, version
+                    )
+                except OSError:
+                    pass
+
+            # 返回原图
+            return _send_cached_image(filepath, history_service.history_dir, mimetype, version, version)
 
         except Exception as e:
             log_error('/images', e)
@@ -232,16 +300,18 @@ def create_image_blueprint():
         - task_id: 任务 ID（必填）
         - page: 页面信息（必填）
         - use_reference: 是否使用参考图（默认 true）
+        - user_image_ids: 用户参考图片 ID 列表（可选）
 
         返回：
         - success: 是否成功
         - image_url: 新图片 URL
         """
         try:
-            data = request.get_json()
+            data, body_images = read_image_json_body(('user_images',))
             task_id = data.get('task_id')
             page = data.get('page')
             use_reference = data.get('use_reference', True)
+            user_images = _resolve_user_images(data, body_images['user_images'])
 
             log_request('/retry', {
                 'task_id': task_id,
@@ -257,7 +327,10 @@ def create_image_blueprint():
 
             logger.info(f"🔄 重试生成图片: task={task_id}, page={page.get('index')}")
             image_service = get_image_service()
-            result = image_service.retry_single_image(task_id, page, use_reference)
+            result = image_service.retry_single_image(
+                task_id, page, use_reference,
+                user_images=user_images if user_images else None
+            )
 
             if result["success"]:
                 logger.info(f"✅ 图片重试成功: {result.get('image_url')}")
@@ -266,6 +339,16 @@ def create_image_blueprint():
 
             return jsonify(result), 200 if result["success"] else 500
 
+        except PayloadTooLargeError as e:
+            logger.warning(f"/retry 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
         except Exception as e:
             log_error('/retry', e)
             error_msg = str(e)
@@ -282,14 +365,16 @@ def create_image_blueprint():
         请求体：
         - task_id: 任务 ID（必填）
         - pages: 要重试的页面列表（必填）
+        - user_image_ids: 用户参考图片 ID 列表（可选）
 
         返回：
         SSE 事件流
         """
         try:
-            data = request.get_json()
+            data, body_images = read_image_json_body(('user_images',))
             task_id = data.get('task_id')
             pages = data.get('pages')
+            user_images = _resolve_user_images(data, body_images['user_images'])
 
             log_request('/retry-failed', {
                 'task_id': task_id,
@@ -308,7 +393,10 @@ def create_image_blueprint():
 
             def generate():
                 """SSE 事件生成器"""
-                for event in image_service.retry_failed_images(task_id, pages):
+                for event in image_service.retry_failed_images(
+                    task_id, pages,
+                    user_images=user_images if user_images else None
+                ):
                     event_type = event["event"]
                     event_data = event["data"]
 
@@ -324,6 +412,16 @@ def create_image_blueprint():
                 }
             )
 
+        except PayloadTooLargeError as e:
+            logger.warning(f"/retry-failed 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
         except Exception as e:
             log_error('/retry-failed', e)
             error_msg = str(e)
@@ -343,18 +441,20 @@ def create_image_blueprint():
         - use_reference: 是否使用参考图（默认 true）
         - full_outline: 完整大纲文本（用于上下文）
         - user_topic: 用户原始输入主题
+        - user_image_ids: 用户参考图片 ID 列表（可选）
 
         返回：
         - success: 是否成功
         - image_url: 新图片 URL
         """
         try:
-            data = request.get_json()
+            data, body_images = read_image_json_body(('user_images',))
             task_id = data.get('task_id')
             page = data.get('page')
             use_reference = data.get('use_reference', True)
             full_outline = data.get('full_outline', '')
             user_topic = data.get('user_topic', '')
+            user_images = _resolve_user_images(data, body_images['user_images'])
 
             log_request('/regenerate', {
                 'task_id': task_id,
@@ -373,7 +473,8 @@ def create_image_blueprint():
             result = image_service.regenerate_image(
                 task_id, page, use_reference,
                 full_outline=full_outline,
-                user_topic=user_topic
+                user_topic=user_topic,
+                user_images=user_images if user_images else None
             )
 
             if result["success"]:
@@ -383,6 +484,16 @@ def create_image_blueprint():
 
             return jsonify(result), 200 if result["success"] else 500
 
+        except PayloadTooLargeError as e:
+            logger.warning(f"/regenerate 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
         except Exception as e:
             log_error('/regenerate', e)
             error_msg = str(e)
@@ -391,6 +502,117 @@ def create_image_blueprint():
                 "error": f"重新生成图片失败。\n错误详情: {error_msg}"
             }), 500
 
+    # ==================== 后台生成任务 ====================
+
+    @image_bp.route('/jobs/generate', methods=['POST'])
+    def start_generate_job():
+        """
+        提交批量生成任务（后台运行，不占用请求连接）
+
+        请求体：与 /generate 相同
+
+        返回：
+        - success: 是否成功
+        - task_id: 任务 ID（请求未指定时自动生成）
+        - stream_url: 事件流地址（相对 /api），已包含 after 参数，只推送本次生成的事件
+        """
+        try:
+            data, body_images = read_image_json_body(('user_images',))
+            pages = data.get('pages')
+            user_images = _resolve_user_images(data, body_images['user_images'])
+
+            if not pages:
+                logger.warning("生成任务请求缺少 pages 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：pages 不能为空。\n请提供要生成的页面列表数据。"
+                }), 400
+
+            image_service = get_image_service()
+            task_id = data.get('task_id') or image_service.new_task_id()
+            log_request('/jobs/generate', {
+                'pages_count': len(pages),
+                'task_id': task_id,
+                'user_images': user_images
+            })
+
+            return _submit_job(task_id, lambda: image_service.generate_images(
+                pages, task_id, data.get('full_outline', ''),
+                user_images=user_images if user_images else None,
+                user_topic=data.get('user_topic', ''),
+                record_id=data.get('record_id')
+            ))
+
+        except PayloadTooLargeError as e:
+            logger.warning(f"/jobs/generate 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
+        except Exception as e:
+            log_error('/jobs/generate', e)
+            return jsonify({
+                "success": False,
+                "error": f"提交生成任务失败。\n错误详情: {str(e)}"
+            }), 500
+
+    @image_bp.route('/jobs/retry-failed', methods=['POST'])
+    def start_retry_failed_job():
+        """
+        提交批量重试任务（后台运行，不占用请求连接）
+
+        请求体：与 /retry-failed 相同
+
+        返回：
+        - success: 是否成功
+        - task_id: 任务 ID
+        - stream_url: 事件流地址（相对 /api），已包含 after 参数，只推送本次重试的事件
+        """
+        try:
+            data, body_images = read_image_json_body(('user_images',))
+            task_id = data.get('task_id')
+            pages = data.get('pages')
+            user_images = _resolve_user_images(data, body_images['user_images'])
+
+            log_request('/jobs/retry-failed', {
+                'task_id': task_id,
+                'pages_count': len(pages) if pages else 0
+            })
+
+            if not task_id or not pages:
+                logger.warning("批量重试任务请求缺少必要参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：task_id 和 pages 不能为空。\n请提供任务ID和要重试的页面列表。"
+                }), 400
+
+            image_service = get_image_service()
+            return _submit_job(task_id, lambda: image_service.retry_failed_images(
+                task_id, pages,
+                user_images=user_images if user_images else None
+            ))
+
+        except PayloadTooLargeError as e:
+            logger.warning(f"/jobs/retry-failed 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
+        except Exception as e:
+            log_error('/jobs/retry-failed', e)
+            return jsonify({
+                "success": False,
+                "error": f"提交重试任务失败。\n错误详情: {str(e)}"
+            }), 500
+
     # ==================== 任务状态 ====================
 
     @image_bp.route('/task/<task_id>', methods=['GET'])
@@ -409,8 +631,7 @@ def create_image_blueprint():
           - has_cover: 是否有封面图
         """
         try:
-            image_service = get_image_service()
-            state = image_service.get_task_state(task_id)
+            state = get_task_state_store().get(task_id)
 
             if state is None:
                 return jsonify({
@@ -422,7 +643,7 @@ def create_image_blueprint():
             safe_state = {
                 "generated": state.get("generated", {}),
                 "failed": state.get("failed", {}),
-                "has_cover": state.get("cover_image") is not None
+                "has_cover": state.get("has_cover", False)
             }
 
             return jsonify({
@@ -437,6 +658,89 @@ def create_image_blueprint():
                 "error": f"获取任务状态失败。\n错误详情: {error_msg}"
             }), 500
 
+    @image_bp.route('/task/<task_id>/events', methods=['GET'])
+    def get_task_events(task_id):
+        """
+        获取任务的生成事件（SSE 连接断开后补取，任意工作进程都可以处理）
+
+        路径参数：
+        - task_id: 任务 ID
+
+        查询参数：
+        - after: 只返回序号大于该值的事件（默认 0，即全部）
+
+        返回：
+        - success: 是否成功
+        - events: 事件列表，每项包含 seq、event、data（与 SSE 推送的事件相同，不含模型流式阶段进度）
+        - last_seq: 最后一个事件的序号，下次请求作为 after 传入
+        """
+        try:
+            after = request.args.get('after', 0, type=int)
+            events = get_task_state_store().events(task_id, after)
+            return jsonify({
+                "success": True,
+                "events": events,
+                "last_seq": events[-1]["seq"] if events else after
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"获取任务事件失败。\n错误详情: {error_msg}"
+            }), 500
+
+    @image_bp.route('/task/<task_id>/stream', methods=['GET'])
+    def stream_task_events(task_id):
+        """
+        订阅任务事件（SSE），推送到任务结束（finish/retry_finish 或任务级错误）为止
+
+        WSGI 模式下每个连接占用一个线程轮询事件日志；
+        ASGI 模式（backend.asgi）由事件循环直接处理该路径，不会进入这里。
+
+        路径参数：
+        - task_id: 任务 ID
+
+        查询参数：
+        - after: 只推送序号大于该值的事件（默认 0）；请求头 Last-Event-ID 更大时以其为准
+
+        返回：
+        SSE 事件流，事件与 /generate、/retry-failed 相同，另带 id（事件序号）
+        """
+        after = max(
+            request.args.get('after', 0, type=int),
+            request.headers.get('Last-Event-ID', 0, type=int)
+        )
+        store = get_task_state_store()
+
+        def generate():
+            last_seq = after
+            last_event_at = last_sent_at = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if store.last_seq(task_id) > last_seq:
+                    for event in store.events(task_id, last_seq):
+                        last_seq = event["seq"]
+                        yield format_sse_event(event)
+                        if is_terminal_event(event):
+                            return
+                    last_event_at = last_sent_at = now
+                elif now - last_event_at >= STREAM_IDLE_TIMEOUT:
+                    return
+                elif now - last_sent_at >= HEARTBEAT_INTERVAL:
+                    yield format_sse_heartbeat()
+                    last_sent_at = now
+                time.sleep(STREAM_POLL_INTERVAL)
+
+        return Response(
+            generate(),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+            }
+        )
+
     # ==================== 健康检查 ====================
 
     @image_bp.route('/health', methods=['GET'])
@@ -453,29 +757,87 @@ def create_image_blueprint():
             "message": "服务正常运行"
         }), 200
 
+    @image_bp.route('/image-cache/stats', methods=['GET'])
+    def image_cache_stats():
+        """
+        热点图片内存缓存指标
+
+        返回：
+        - success: 是否成功
+        - enabled: 是否启用（IMAGE_MEMORY_CACHE_MB > 0）
+        - entries/bytes/max_bytes: 当前条目数、占用字节数、预算
+        - hits/misses/hit_ratio: 命中次数、未命中次数、命中率
+        - evictions/invalidations: 因超出预算淘汰、因文件变化失效的条目数
+        """
+        return jsonify({
+            "success": True,
+            **get_hot_image_cache().stats()
+        }), 200
+
     return image_bp
 
 
 # ==================== 辅助函数 ====================
 
-def _parse_base64_images(images_base64: list) -> list:
+def _send_cached_image(filepath: str, root: str, mimetype: str, etag: str, version: str):
     """
-    解析 base64 编码的图片列表
+    发送图片并设置缓存头
+
+    图片内容优先从热点图片内存缓存发送；配置了 FILE_OFFLOAD 时由前置代理发送文件内容。
+    请求的 v 与当前版本一致时，URL 唯一对应这份内容，可以永久缓存；
+    不带 v 或版本已过期（图片被重新生成）时，要求浏览器每次用 ETag 重新验证。
+    """
+    data = None if Config.FILE_OFFLOAD else get_hot_image_cache().load(filepath)
+    if data is not None:
+        response = Response(data, mimetype=mimetype)
+        response.set_etag(etag)
+        response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    else:
+        response = send_history_file(filepath, root, mimetype=mimetype, etag=etag)
+    if request.args.get('v') == version:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = None
+    return response
+
+
+def _submit_job(task_id: str, run):
+    """提交后台任务，返回任务 ID 和从当前序号开始的事件流地址"""
+    after = get_task_state_store().last_seq(task_id)
+    if not get_generation_jobs().submit(task_id, run):
+        return jsonify({
+            "success": False,
+            "error": f"任务正在运行：{task_id}\n请订阅其事件流，或等待结束后再提交。"
+        }), 409
+
+    logger.info(f"🖼️  已提交后台任务: {task_id}")
+    return jsonify({
+        "success": True,
+        "task_id": task_id,
+        "stream_url": f"/task/{task_id}/stream?after={after}"
+    }), 202
+
+
+def _resolve_user_images(data: dict, body_images: list) -> list:
+    """
+    解析请求中的用户参考图片
+
+    优先使用 user_image_ids（已上传图片的 ID），否则使用请求体中
+    base64 格式的 user_images（已在流式读取时解码并压缩）
 
     Args:
-        images_base64: base64 编码的图片字符串列表
+        data: 请求体（不含图片字段）
+        body_images: 请求体中解码后的图片列表
 
     Returns:
-        list: 解码后的图片二进制数据列表
+        list: 图片二进制数据列表
     """
-    if not images_base64:
-        return []
-
-    images = []
-    for img_b64 in images_base64:
-        # 移除可能的 data URL 前缀（如 data:image/png;base64,）
-        if ',' in img_b64:
-            img_b64 = img_b64.split(',')[1]
-        images.append(base64.b64decode(img_b64))
+    image_ids = data.get('user_image_ids') or []
+    if image_ids:
+        return get_upload_service().load_many(image_ids)
 
-    return images
+    return body_images
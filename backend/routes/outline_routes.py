@@ -6,11 +6,13 @@
 """
 
 import time
-import base64
 import logging
 from flask import Blueprint, request, jsonify
 from backend.services.outline import get_outline_service
-from .utils import log_request, log_error
+from backend.services.upload import UploadNotFoundError, get_upload_service
+from backend.config import Config
+from backend.utils.request_body import PayloadTooLargeError
+from .utils import log_request, log_error, read_image_json_body
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +30,12 @@ def create_outline_blueprint():
         1. multipart/form-data（带图片文件）
            - topic: 主题文本
            - images: 图片文件列表
+           - image_ids: 已上传图片的 ID（可选，可重复）
 
-        2. application/json（无图片或 base64 图片）
+        2. application/json（无图片、上传 ID 或 base64 图片）
            - topic: 主题文本
-           - images: base64 编码的图片数组（可选）
+           - image_ids: /uploads 返回的图片 ID 列表（推荐）
+           - images: base64 编码的图片数组（可选，兼容旧版）
 
         返回：
         - success: 是否成功
@@ -68,6 +72,16 @@ def create_outline_blueprint():
                 logger.error(f"❌ 大纲生成失败: {result.get('error', '未知错误')}")
                 return jsonify(result), 500
 
+        except PayloadTooLargeError as e:
+            logger.warning(f"/outline 请求体过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except UploadNotFoundError:
+            raise
+
         except Exception as e:
             log_error('/outline', e)
             error_msg = str(e)
@@ -85,7 +99,7 @@ def _parse_outline_request():
 
     支持两种格式：
     1. multipart/form-data - 用于文件上传
-    2. application/json - 用于 base64 图片
+    2. application/json - 用于上传 ID 或 base64 图片
 
     返回：
         tuple: (topic, images) - 主题和图片列表
@@ -95,28 +109,37 @@ def _parse_outline_request():
         topic = request.form.get('topic')
         images = []
 
-        # 获取上传的图片文件
+        # 获取上传的图片文件（超过单张大小限制的直接拒绝）
         if 'images' in request.files:
             files = request.files.getlist('images')
             for file in files:
                 if file and file.filename:
-                    image_data = file.read()
+                    image_data = file.read(Config.MAX_IMAGE_BYTES + 1)
+                    if len(image_data) > Config.MAX_IMAGE_BYTES:
+                        raise PayloadTooLargeError(
+                            f"图片 {file.filename} 过大：超过 {Config.MAX_IMAGE_BYTES // 1024 // 1024}MB 限制"
+                        )
                     images.append(image_data)
 
+        # 已上传图片的 ID
+        image_ids = request.form.getlist('image_ids')
+        if image_ids:
+            images.extend(get_upload_service().load_many(image_ids))
+
         return topic, images
 
-    # JSON 请求（无图片或 base64 图片）
-    data = request.get_json()
+    # JSON 请求（无图片、上传 ID 或 base64 图片）
+    # base64 图片在流式读取时边解码边压缩，不会整体载入内存
+    data, body_images = read_image_json_body(('images',))
     topic = data.get('topic')
     images = []
 
-    # 支持 base64 格式的图片
-    images_base64 = data.get('images', [])
-    if images_base64:
-        for img_b64 in images_base64:
-            # 移除可能的 data URL 前缀
-            if ',' in img_b64:
-                img_b64 = img_b64.split(',')[1]
-            images.append(base64.b64decode(img_b64))
+    # 优先使用已上传图片的 ID
+    image_ids = data.get('image_ids', [])
+    if image_ids:
+        images.extend(get_upload_service().load_many(image_ids))
+
+    # 兼容 base64 格式的图片
+    images.extend(body_images['images'])
 
     return topic, images
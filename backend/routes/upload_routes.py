@@ -0,0 +1,123 @@
+"""
+参考图片上传相关 API 路由
+
+包含功能：
+- 上传参考图片（multipart 或原始二进制），返回可复用的上传 ID
+"""
+
+import logging
+from flask import Blueprint, request, jsonify
+from backend.config import Config
+from backend.services.upload import get_upload_service
+from backend.utils.request_body import PayloadTooLargeError, read_limited
+from .utils import log_request, log_error
+
+logger = logging.getLogger(__name__)
+
+
+def create_upload_blueprint():
+    """创建上传路由蓝图（工厂函数，支持多次调用）"""
+    upload_bp = Blueprint('upload', __name__)
+
+    @upload_bp.route('/uploads', methods=['POST'])
+    def upload_images():
+        """
+        上传参考图片
+
+        同一张图片（内容相同）只会存储一次，返回的 ID 可在
+        /outline、/generate、/retry、/retry-failed、/regenerate 中复用。
+
+        请求格式：
+        1. multipart/form-data
+           - images: 图片文件列表
+        2. 原始二进制（image/* 或 application/octet-stream）
+           - 请求体即为单张图片
+
+        返回：
+        - success: 是否成功
+        - ids: 上传 ID 列表（与上传顺序一致）
+        - uploads: 每张图片的详情 { id, size, original_size, reused }
+        """
+        try:
+            images = _read_upload_images()
+
+            log_request('/uploads', {'images': images})
+
+            if not images:
+                logger.warning("上传请求中没有图片")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：没有找到图片。\n请使用 multipart 的 images 字段或直接上传图片二进制。"
+                }), 400
+
+            upload_service = get_upload_service()
+            uploads = [upload_service.save(image) for image in images]
+
+            logger.info(f"✅ 上传参考图片 {len(uploads)} 张")
+            return jsonify({
+                "success": True,
+                "ids": [u["id"] for u in uploads],
+                "uploads": uploads
+            }), 200
+
+        except PayloadTooLargeError as e:
+            logger.warning(f"上传参考图片过大: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 413
+
+        except ValueError as e:
+            logger.warning(f"上传参考图片被拒绝: {e}")
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+
+        except Exception as e:
+            log_error('/uploads', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"上传图片失败。\n错误详情: {error_msg}"
+            }), 500
+
+    return upload_bp
+
+
+def _read_upload_images() -> list:
+    """
+    从请求中读取图片数据
+
+    单张图片超过 Config.MAX_IMAGE_BYTES 时立即中断读取
+
+    Returns:
+        list: 图片二进制数据列表
+
+    Raises:
+        PayloadTooLargeError: 图片超过大小限制
+    """
+    content_type = request.content_type or ''
+    max_bytes = Config.MAX_IMAGE_BYTES
+
+    if 'multipart/form-data' in content_type:
+        images = []
+        for file in request.files.getlist('images'):
+            if file and file.filename:
+                data = file.read(max_bytes + 1)
+                if len(data) > max_bytes:
+                    raise PayloadTooLargeError(
+                        f"图片 {file.filename} 过大：超过 {max_bytes // 1024 // 1024}MB 限制"
+                    )
+                images.append(data)
+        return images
+
+    if content_type.startswith('image/') or 'application/octet-stream' in content_type:
+        if request.content_length and request.content_length > max_bytes:
+            raise PayloadTooLargeError(
+                f"图片过大：超过 {max_bytes // 1024 // 1024}MB 限制"
+            )
+        data = read_limited(request.stream, max_bytes)
+        return [data] if data else []
+
+    return []
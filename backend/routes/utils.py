@@ -1,11 +1,19 @@
 """
 API 路由工具函数
 
-包含通用的日志记录、错误处理等辅助函数
+包含通用的日志记录、错误处理、请求体解析、字段投影和条件响应等辅助函数
 """
 
 import logging
+import os
 import traceback
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+from flask import Response, jsonify, request, send_file
+from backend.config import Config
+from backend.utils.http_cache import content_version
+from backend.utils.image_compressor import compress_image
+from backend.utils.request_body import PayloadTooLargeError, parse_json_with_images
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +58,145 @@ def log_error(endpoint: str, error: Exception):
     logger.debug(f"  堆栈跟踪:\n{traceback.format_exc()}")
 
 
+def send_history_file(
+    path: str,
+    root: str,
+    mimetype: str,
+    etag: Optional[str] = None,
+    download_name: Optional[str] = None
+) -> Response:
+    """
+    发送 history 目录下的文件
+
+    Config.FILE_OFFLOAD 为 nginx/sendfile 时只返回 X-Accel-Redirect/X-Sendfile 头，
+    文件内容由前置代理发送（零拷贝 sendfile，并由代理处理 Range）；
+    If-None-Match 命中时仍由这里直接返回 304。未配置时使用 send_file。
+
+    Args:
+        path: 文件路径
+        root: history 目录（nginx 模式下据此计算相对路径）
+        mimetype: Content-Type
+        etag: ETag（不含引号），None 表示不设置
+        download_name: 作为附件下载时的文件名，None 表示直接显示
+
+    Returns:
+        Response: 响应对象，调用方可以继续设置缓存头
+    """
+    mode = Config.FILE_OFFLOAD
+    rel_path = os.path.relpath(os.path.realpath(path), os.path.realpath(root))
+    if mode not in ('nginx', 'sendfile') or rel_path.startswith(os.pardir):
+        return send_file(
+            path,
+            mimetype=mimetype,
+            as_attachment=download_name is not None,
+            download_name=download_name,
+            etag=etag if etag is not None else False,
+            conditional=True
+        )
+
+    # 由前置代理发送：Flask 只负责协商缓存，不读取文件内容
+    response = Response(mimetype=mimetype)
+    if download_name is not None:
+        response.headers['Content-Disposition'] = attachment_header(download_name)
+    if etag is not None:
+        response.set_etag(etag)
+        if etag in request.if_none_match:
+            response.status_code = 304
+            return response
+
+    if mode == 'nginx':
+        prefix = Config.FILE_OFFLOAD_PREFIX.rstrip('/') + '/'
+        response.headers['X-Accel-Redirect'] = prefix + quote(rel_path.replace(os.sep, '/'))
+    else:
+        response.headers['X-Sendfile'] = os.path.abspath(path)
+    return response
+
+
+def attachment_header(filename: str) -> str:
+    """Content-Disposition 头（非 ASCII 文件名按 RFC 5987 编码，并提供 ASCII 回退）"""
+    ascii_name = filename.encode('ascii', 'ignore').decode('ascii').strip()
+    if not ascii_name or ascii_name.startswith('.'):
+        ascii_name = 'images.zip'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def parse_fields(raw: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """
+    解析 ?fields= 参数
+
+    Args:
+        raw: 逗号分隔的字段列表，嵌套字段用点号（如 id,title,images.generated）
+        allowed: 可选的顶层字段名（嵌套字段只校验第一段）
+
+    Returns:
+        Optional[List[str]]: 去重排序后的字段路径，未指定时返回 None（返回全部字段）
+
+    Raises:
+        ValueError: 包含不支持的字段（拼写错误时直接报错，而不是静默返回空结果）
+    """
+    if not raw:
+        return None
+    fields = sorted({field.strip() for field in raw.split(',') if field.strip()})
+    allowed = set(allowed)
+    unknown = [field for field in fields if field.split('.', 1)[0] not in allowed or '' in field.split('.')]
+    if unknown:
+        raise ValueError(
+            f"不支持的字段：{', '.join(unknown)}\n"
+            f"可选字段：{', '.join(sorted(allowed))}"
+        )
+    return fields or None
+
+
+def project_fields(data: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    只保留指定字段（id 总是保留，不存在的字段忽略）
+
+    Args:
+        data: 记录或列表条目
+        fields: parse_fields 的结果，None 表示不投影
+
+    Returns:
+        Dict: 投影后的新字典（不修改原数据）
+    """
+    if fields is None:
+        return data
+    result = {"id": data["id"]} if "id" in data else {}
+    for field in fields:
+        # 已请求整个父字段时忽略其子字段
+        if any(field.startswith(f"{other}.") for other in fields):
+            continue
+        source, target = data, result
+        *parents, leaf = field.split('.')
+        for name in parents:
+            source = source.get(name) if isinstance(source, dict) else None
+            if not isinstance(source, dict):
+                break
+            target = target.setdefault(name, {})
+        else:
+            if leaf in source:
+                target[leaf] = source[leaf]
+    return result
+
+
+def conditional_json(payload: Dict[str, Any], etag: Optional[str] = None) -> Response:
+    """
+    返回带 ETag 的 JSON 响应，If-None-Match 命中时返回 304
+
+    浏览器每次使用前重新验证（no-cache），内容未变化时只传输响应头。
+
+    Args:
+        payload: 响应数据
+        etag: ETag（不含引号），None 表示按响应内容计算
+
+    Returns:
+        Response: 200 或 304 响应（较大的响应在 after_request 中压缩）
+    """
+    response = jsonify(payload)
+    response.set_etag(etag or content_version(response.get_data()))
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
 def mask_api_key(key: str) -> str:
     """
     遮盖 API Key，只显示前4位和后4位
@@ -95,3 +242,36 @@ def prepare_providers_for_response(providers: dict) -> dict:
         result[name] = provider_copy
 
     return result
+
+
+def read_image_json_body(image_fields: Iterable[str]) -> Tuple[Dict, Dict[str, List[bytes]]]:
+    """
+    流式读取携带 base64 图片的 JSON 请求体
+
+    图片边读边解码，每张读完立即压缩到 200KB 以内；
+    单张图片或请求总量超过 Config 中的限制时立即中断读取。
+
+    Args:
+        image_fields: 存放 base64 图片数组的顶层字段名
+
+    Returns:
+        (data, images): 其他字段组成的字典，以及各图片字段的图片列表
+
+    Raises:
+        PayloadTooLargeError: 超过大小限制
+        ValueError: JSON 格式错误
+    """
+    max_content_length = Config.MAX_CONTENT_LENGTH
+    if request.content_length and request.content_length > max_content_length:
+        raise PayloadTooLargeError(
+            f"请求数据过大：{request.content_length / 1024 / 1024:.1f}MB，"
+            f"不能超过 {max_content_length // 1024 // 1024}MB"
+        )
+
+    return parse_json_with_images(
+        request.stream,
+        image_fields,
+        max_image_bytes=Config.MAX_IMAGE_BYTES,
+        max_total_bytes=Config.MAX_IMAGE_REQUEST_BYTES,
+        normalize=lambda data: compress_image(data, max_size_kb=200)
+    )
@@ -0,0 +1,188 @@
+"""
+登录 token（HMAC 签名，无状态）
+
+token 格式：<载荷 base64url>.<签名 base64url>，载荷为 {"sub", "exp", "jti"}。
+任意工作进程、任意节点只要持有相同的密钥即可本地验证签名和有效期，不需要查询共享存储。
+
+登出的 token 登记到吊销列表（共享状态中的一个键，jti -> 过期时间），过期的条目随之清除，
+列表只包含尚未过期且已登出的 token。各进程在内存中缓存吊销列表，
+最多每隔 revocation_refresh 秒（Config.AUTH_REVOCATION_REFRESH，默认 5 秒）重新读取一次。
+因此登出立即在本进程生效，但在其他工作进程中，已登出的 token 最多还能继续使用这么久；
+需要立即生效时把它设为 0，每次验证都读取共享状态（sqlite 后端每次多一次本地查询）。
+
+签名密钥取 Config.AUTH_SECRET；未配置时在 history/auth_secret 生成一个随机密钥，
+同一台机器上的所有进程共享，重启后已签发的 token 仍然有效。多节点部署需配置相同的 AUTH_SECRET。
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+from backend.config import Config
+from backend.services.shared_state import SharedState, get_shared_state
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def load_or_create_secret(path: str) -> bytes:
+    """读取密钥文件，不存在时生成（多个进程同时启动时只有一个能创建成功）"""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    for _ in range(50):
+        with open(path, "r", encoding="utf-8") as f:
+            secret = f.read().strip()
+        if secret:
+            return secret.encode("utf-8")
+        # 其他进程刚创建文件、尚未写入
+        time.sleep(0.01)
+    raise RuntimeError(f"密钥文件为空: {path}")
+
+
+class AuthTokenService:
+    """签发、验证和吊销登录 token"""
+
+    # 吊销列表在各进程内缓存的默认时间（秒）
+    REVOCATION_REFRESH = 5.0
+    # 共享状态中吊销列表的位置
+    REVOCATION_NAMESPACE = "auth"
+    REVOCATION_KEY = "revoked"
+
+    def __init__(
+        self,
+        secret: bytes,
+        shared: SharedState,
+        ttl_seconds: float,
+        revocation_refresh: float = REVOCATION_REFRESH
+    ):
+        self._secret = secret
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        # 其他进程的登出最多延迟这么久才在本进程生效，0 表示每次验证都读取共享状态
+        self.revocation_refresh = revocation_refresh
+        self._lock = threading.Lock()
+        self._revoked: Dict[str, float] = {}
+        self._revoked_loaded_at = 0.0
+
+    def _sign(self, payload: bytes) -> str:
+        return _b64encode(hmac.new(self._secret, payload, hashlib.sha256).digest())
+
+    def issue(self, subject: str) -> str:
+        """签发 token"""
+        payload = json.dumps({
+            "sub": subject,
+            "exp": int(time.time() + self.ttl_seconds),
+            "jti": secrets.token_hex(8)
+        }, separators=(",", ":")).encode("utf-8")
+        return f"{_b64encode(payload)}.{self._sign(payload)}"
+
+    def decode(self, token: str) -> Optional[Dict]:
+        """
+        验证签名和有效期
+
+        Returns:
+            Optional[Dict]: 载荷，token 无效或已过期时返回 None（不检查吊销列表）
+        """
+        if not token or token.count(".") != 1:
+            return None
+        payload_text, signature = token.split(".")
+        try:
+            payload = _b64decode(payload_text)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(signature.encode("utf-8"), self._sign(payload).encode("ascii")):
+            return None
+        try:
+            claims = json.loads(payload)
+            if claims["exp"] <= time.time() or not isinstance(claims["jti"], str):
+                return None
+        except (ValueError, TypeError, KeyError):
+            return None
+        return claims
+
+    def verify(self, token: str) -> bool:
+        """
+        token 是否有效（签名正确、未过期、未登出）
+
+        在其他进程登出的 token，最多 revocation_refresh 秒后才会在这里判定为无效
+        """
+        claims = self.decode(token)
+        return claims is not None and not self._is_revoked(claims["jti"])
+
+    def revoke(self, token: str) -> bool:
+        """
+        登出：把 token 加入吊销列表
+
+        Returns:
+            bool: token 是否有效（无效的 token 不需要登记）
+        """
+        claims = self.decode(token)
+        if claims is None:
+            return False
+
+        def apply(revoked):
+            now = time.time()
+            revoked = {jti: exp for jti, exp in (revoked or {}).items() if exp > now}
+            revoked[claims["jti"]] = claims["exp"]
+            return revoked
+
+        revoked = self.shared.update(self.REVOCATION_NAMESPACE, self.REVOCATION_KEY, apply)
+        with self._lock:
+            self._revoked = revoked
+            self._revoked_loaded_at = time.time()
+        return True
+
+    def _is_revoked(self, jti: str) -> bool:
+        now = time.time()
+        with self._lock:
+            if now - self._revoked_loaded_at >= self.revocation_refresh:
+                self._revoked = self.shared.get(self.REVOCATION_NAMESPACE, self.REVOCATION_KEY) or {}
+                self._revoked_loaded_at = now
+            return jti in self._revoked
+
+
+_service_instance = None
+_service_lock = threading.Lock()
+
+
+def get_auth_token_service() -> AuthTokenService:
+    """
+    获取登录 token 服务实例（单例模式）
+
+    Returns:
+        AuthTokenService: 使用 Config.AUTH_SECRET（或自动生成的本机密钥）签名的 token 服务
+    """
+    global _service_instance
+    if _service_instance is None:
+        with _service_lock:
+            if _service_instance is None:
+                if Config.AUTH_SECRET:
+                    secret = Config.AUTH_SECRET.encode("utf-8")
+                else:
+                    history_dir = os.path.join(
+                        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                        "history"
+                    )
+                    os.makedirs(history_dir, exist_ok=True)
+                    secret = load_or_create_secret(os.path.join(history_dir, "auth_secret"))
+                _service_instance = AuthTokenService(
+                    secret, get_shared_state(), Config.AUTH_TOKEN_TTL_HOURS * 3600,
+                    revocation_refresh=Config.AUTH_REVOCATION_REFRESH
+                )
+    return _service_instance
@@ -10,7 +10,8 @@ import os
 import re
 import yaml
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Generator, List, Any, Optional
+from backend.utils.json_stream import IncrementalJSONParser
 from backend.utils.text_client import get_text_chat_client
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,9 @@ logger = logging.getLogger(__name__)
 class ContentService:
     """内容生成服务：生成标题、文案、标签"""
 
+    # 需要推送给前端的字段
+    CONTENT_FIELDS = ("titles", "copywriting", "tags")
+
     def __init__(self):
         logger.debug("初始化 ContentService...")
         self.text_config = self._load_text_config()
@@ -128,9 +132,48 @@ class ContentService:
             except json.JSONDecodeError:
                 pass
 
+        # 最后尝试容错解析（兼容被截断的 JSON）
+        parser = IncrementalJSONParser()
+        parser.feed(response_text)
+        try:
+            result = parser.finish()
+            if parser.truncated:
+                logger.warning("JSON 响应不完整，已恢复部分字段: %s", list(result.keys()))
+            return result
+        except ValueError:
+            pass
+
         logger.error(f"无法解析 JSON 响应: {response_text[:200]}...")
         raise ValueError("AI 返回的内容格式不正确，无法解析")
 
+    def _build_request(self, topic: str, outline: str) -> Dict[str, Any]:
+        """构建文本生成请求参数（提示词 + 模型参数）"""
+        prompt = self.prompt_template.format(
+            topic=topic,
+            outline=outline
+        )
+
+        # 从配置中获取模型参数
+        active_provider = self.text_config.get('active_provider', 'google_gemini')
+        providers = self.text_config.get('providers', {})
+        provider_config = providers.get(active_provider, {})
+
+        return {
+            "prompt": prompt,
+            "model": provider_config.get('model', 'gemini-2.0-flash-exp'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "max_output_tokens": provider_config.get('max_output_tokens', 4000)
+        }
+
+    @staticmethod
+    def _normalize_field(field: str, value: Any) -> Any:
+        """规范化字段类型：titles/tags 为列表，copywriting 为字符串"""
+        if field == 'titles' and isinstance(value, str):
+            return [value]
+        if field == 'tags' and isinstance(value, str):
+            return [t.strip() for t in value.split(',')]
+        return value
+
     def generate_content(
         self,
         topic: str,
@@ -149,46 +192,23 @@ class ContentService:
         try:
             logger.info(f"开始生成内容: topic={topic[:50]}...")
 
-            # 构建提示词
-            prompt = self.prompt_template.format(
-                topic=topic,
-                outline=outline
-            )
+            request_kwargs = self._build_request(topic, outline)
 
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 4000)
-
-            logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
-            response_text = self.client.generate_text(
-                prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens
+            logger.info(
+                f"调用文本生成 API: model={request_kwargs['model']}, "
+                f"temperature={request_kwargs['temperature']}"
             )
+            response_text = self.client.generate_text(**request_kwargs)
 
             logger.debug(f"API 返回文本长度: {len(response_text)} 字符")
 
             # 解析 JSON 响应
             content_data = self._parse_json_response(response_text)
 
-            # 验证必要字段
-            titles = content_data.get('titles', [])
+            # 验证必要字段（确保 titles/tags 是列表）
+            titles = self._normalize_field('titles', content_data.get('titles', []))
             copywriting = content_data.get('copywriting', '')
-            tags = content_data.get('tags', [])
-
-            # 确保 titles 是列表
-            if isinstance(titles, str):
-                titles = [titles]
-
-            # 确保 tags 是列表
-            if isinstance(tags, str):
-                tags = [t.strip() for t in tags.split(',')]
+            tags = self._normalize_field('tags', content_data.get('tags', []))
 
             logger.info(f"内容生成完成: {len(titles)} 个标题, {len(tags)} 个标签")
 
@@ -203,44 +223,136 @@ class ContentService:
             error_msg = str(e)
             logger.error(f"内容生成失败: {error_msg}")
 
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：API Key 无效或已过期\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
-            else:
-                detailed_error = (
-                    f"内容生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "建议：检查配置文件 text_providers.yaml"
-                )
-
             return {
                 "success": False,
-                "error": detailed_error
+                "error": self._format_error(error_msg)
             }
 
+    def generate_content_stream(
+        self,
+        topic: str,
+        outline: str
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        流式生成标题、文案和标签（生成器，支持 SSE 流式返回）
+
+        边接收模型输出边做增量 JSON 解析，每个字段一完成就推送给前端；
+        流被截断时尽量恢复已生成的部分内容。
+
+        参数：
+            topic: 用户输入的主题
+            outline: 大纲内容
+
+        Yields:
+            进度事件字典：
+            - title: 单个标题生成完成
+            - field: titles/copywriting/tags 某个字段完成
+            - finish: 全部完成（包含完整结果）
+            - error: 生成失败
+        """
+        try:
+            logger.info(f"开始流式生成内容: topic={topic[:50]}...")
+            request_kwargs = self._build_request(topic, outline)
+
+            logger.info(
+                f"调用流式文本生成 API: model={request_kwargs['model']}, "
+                f"temperature={request_kwargs['temperature']}"
+            )
+
+            parser = IncrementalJSONParser()
+            received = 0
+            title_count = 0
+
+            for chunk in self.client.generate_text_stream(**request_kwargs):
+                received += len(chunk)
+                for kind, field, value in parser.feed(chunk):
+                    if kind == "item" and field == "titles":
+                        yield {
+                            "event": "title",
+                            "data": {"index": title_count, "title": value}
+                        }
+                        title_count += 1
+                    elif kind == "field" and field in self.CONTENT_FIELDS:
+                        yield {
+                            "event": "field",
+                            "data": {"field": field, "value": self._normalize_field(field, value)}
+                        }
+                if parser.done:
+                    break
+
+            logger.debug(f"流式 API 返回文本长度: {received} 字符")
+
+            content_data = parser.finish()
+            partial = parser.truncated or any(f not in content_data for f in self.CONTENT_FIELDS)
+            if partial:
+                logger.warning(f"内容生成结果不完整，已恢复字段: {list(content_data.keys())}")
+
+            titles = self._normalize_field('titles', content_data.get('titles', []))
+            copywriting = content_data.get('copywriting', '')
+            tags = self._normalize_field('tags', content_data.get('tags', []))
+
+            logger.info(f"流式内容生成完成: {len(titles)} 个标题, {len(tags)} 个标签")
+
+            yield {
+                "event": "finish",
+                "data": {
+                    "success": True,
+                    "titles": titles,
+                    "copywriting": copywriting,
+                    "tags": tags,
+                    "partial": partial
+                }
+            }
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"流式内容生成失败: {error_msg}")
+
+            yield {
+                "event": "error",
+                "data": {
+                    "success": False,
+                    "error": self._format_error(error_msg)
+                }
+            }
+
+    @staticmethod
+    def _format_error(error_msg: str) -> str:
+        """根据错误类型提供更详细的错误信息"""
+        if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
+            detailed_error = (
+                f"API 认证失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：API Key 无效或已过期\n"
+                "解决方案：在系统设置页面检查并更新 API Key"
+            )
+        elif "model" in error_msg.lower() or "404" in error_msg:
+            detailed_error = (
+                f"模型访问失败。\n"
+                f"错误详情: {error_msg}\n"
+                "解决方案：在系统设置页面检查模型名称配置"
+            )
+        elif "timeout" in error_msg.lower() or "连接" in error_msg:
+            detailed_error = (
+                f"网络连接失败。\n"
+                f"错误详情: {error_msg}\n"
+                "解决方案：检查网络连接，稍后重试"
+            )
+        elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
+            detailed_error = (
+                f"API 配额限制。\n"
+                f"错误详情: {error_msg}\n"
+                "解决方案：等待配额重置，或升级 API 套餐"
+            )
+        else:
+            detailed_error = (
+                f"内容生成失败。\n"
+                f"错误详情: {error_msg}\n"
+                "建议：检查配置文件 text_providers.yaml"
+            )
+
+        return detailed_error
+
 
 def get_content_service() -> ContentService:
     """
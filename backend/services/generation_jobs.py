@@ -0,0 +1,142 @@
+"""
+后台生成任务
+
+生成/批量重试作为后台任务运行到结束，事件写入任务事件日志（TaskStateStore），
+与推送给客户端的 SSE 连接解耦：
+- 提交任务的请求立即返回，客户端再订阅 /api/task/<task_id>/stream
+- 客户端断开不会中断生成，重连后按事件序号补取
+- 同一任务的多个订阅者读取同一份事件日志，任意工作进程都可以推送
+
+本进程内产生的事件会通知已注册的监听器：ASGI 模式下的事件总线据此立即推送，不必等到下一次轮询；
+不写入日志的模型流式阶段进度也只能通过监听器送达（订阅者与任务在同一进程时才能收到）。
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from backend.services.task_state import TaskStateStore, get_task_state_store
+
+logger = logging.getLogger(__name__)
+
+# 结束事件：收到后事件流关闭
+TERMINAL_EVENTS = ("finish", "retry_finish")
+# 超过这么久（秒）没有新事件时关闭事件流（任务所在进程异常退出等情况），客户端可按序号重连
+STREAM_IDLE_TIMEOUT = 15 * 60
+
+
+def is_terminal_event(event: Dict[str, Any]) -> bool:
+    """是否为任务的最后一个事件（正常结束，或 index 为 -1 的任务级错误）"""
+    if event["event"] in TERMINAL_EVENTS:
+        return True
+    return event["event"] == "error" and event["data"].get("index") == -1
+
+
+def format_sse_event(event: Dict[str, Any]) -> str:
+    """事件 -> SSE 文本（id 为事件序号，断线重连时作为 Last-Event-ID 发回；不在日志中的事件没有 id）"""
+    text = f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n"
+    if event.get("seq") is not None:
+        text += f"id: {event['seq']}\n"
+    return text + "\n"
+
+
+def format_sse_heartbeat() -> str:
+    heartbeat_data = {
+        "status": "heartbeat",
+        "message": "保持连接..."
+    }
+    return f"event: heartbeat\ndata: {json.dumps(heartbeat_data, ensure_ascii=False)}\n\n"
+
+
+class GenerationJobs:
+    """后台生成任务执行器"""
+
+    # 同时运行的任务数上限，超出的任务排队（每个任务内部另有并发生成线程）
+    MAX_RUNNING = 16
+
+    def __init__(self, task_states: TaskStateStore):
+        self.task_states = task_states
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.MAX_RUNNING, thread_name_prefix="generation-job"
+        )
+        self._lock = threading.Lock()
+        self._running: Set[str] = set()
+        self._listeners: List[Callable[[str, Optional[Dict[str, Any]]], None]] = []
+
+    def submit(self, task_id: str, run: Callable[[], Iterable[Dict[str, Any]]]) -> bool:
+        """
+        提交任务
+
+        Args:
+            task_id: 任务 ID
+            run: 返回事件生成器的函数（ImageService.generate_images 等，事件由其写入日志）
+
+        Returns:
+            bool: 是否已提交（同一任务正在本进程中运行时返回 False）
+        """
+        with self._lock:
+            if task_id in self._running:
+                return False
+            self._running.add(task_id)
+        self._executor.submit(self._run, task_id, run)
+        return True
+
+    def is_running(self, task_id: str) -> bool:
+        with self._lock:
+            return task_id in self._running
+
+    def add_listener(self, listener: Callable[[str, Optional[Dict[str, Any]]], None]) -> None:
+        """
+        注册监听器（在任务线程中调用，不能阻塞）
+
+        调用参数为 (task_id, live_event)：任务写入新的日志事件后 live_event 为 None；
+        不写入日志的阶段进度以 live_event 传递事件本身。
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, task_id: str, live_event: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(task_id, live_event)
+            except Exception as e:
+                logger.warning(f"生成任务事件监听器异常: {e}")
+
+    def _run(self, task_id: str, run: Callable[[], Iterable[Dict[str, Any]]]) -> None:
+        try:
+            for event in run():
+                # 模型流式阶段进度不写入日志（见 ImageService._log_events），直接传给监听器
+                self._notify(task_id, event if "stage" in event["data"] else None)
+        except Exception as e:
+            logger.error(f"❌ 生成任务异常: {task_id}: {e}", exc_info=True)
+            self.task_states.append_event(task_id, {
+                "event": "error",
+                "data": {
+                    "index": -1,
+                    "status": "error",
+                    "message": f"服务器内部错误: {e}",
+                    "retryable": False
+                }
+            })
+            self._notify(task_id)
+        finally:
+            with self._lock:
+                self._running.discard(task_id)
+
+
+_jobs_instance = None
+_jobs_lock = threading.Lock()
+
+
+def get_generation_jobs() -> GenerationJobs:
+    """获取后台生成任务执行器（单例模式）"""
+    global _jobs_instance
+    if _jobs_instance is None:
+        with _jobs_lock:
+            if _jobs_instance is None:
+                _jobs_instance = GenerationJobs(get_task_state_store())
+    return _jobs_instance
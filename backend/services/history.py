@@ -5,13 +5,31 @@
 支持草稿、生成中、完成等多种状态流转。
 """
 
-import os
+import atexit
+import base64
 import json
+import logging
+import os
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Optional, Any
-from pathlib import Path
-from enum import Enum
+from backend.config import Config
+from backend.services.history_export import HistoryExportCache
+from backend.services.history_index import HistoryIndex, IndexEntry, RecordCache
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_retention import HistoryRetention
+from backend.services.history_search import query_terms
+from backend.services.history_sheets import ContactSheetCache, sheet_key
+from backend.services.history_store import build_index_entry, create_history_store
+from backend.services.history_sync import HistorySyncWatcher, TaskSyncState
+from backend.services.hot_image_cache import get_hot_image_cache
+from backend.services.image_variants import ImageVariantCache
+from backend.services.shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
 
 
 class RecordStatus:
@@ -24,11 +42,25 @@ class RecordStatus:
 
 
 class HistoryService:
+    # 检查存储是否被外部修改的最小间隔（秒）；本进程的写入会直接更新内存索引
+    INDEX_CHECK_INTERVAL = 1.0
+    # 完整记录 LRU 缓存条数
+    RECORD_CACHE_SIZE = 128
+    # 延迟写入窗口（秒）：窗口内对同一记录的多次 queue_update 合并为一次写入
+    WRITE_BEHIND_DELAY = 0.5
+    # 批量扫描任务文件夹时的并发线程数
+    SCAN_WORKERS = 8
+    # 批量扫描默认每批处理的任务文件夹数，以及单批上限
+    SCAN_BATCH_SIZE = 200
+    MAX_SCAN_BATCH = 1000
+    # 共享状态中登记变更任务的命名空间
+    CHANGED_NAMESPACE = "history_changed"
+
     def __init__(self):
         """
         初始化历史记录服务
 
-        创建历史记录存储目录和索引文件
+        创建历史记录存储目录，并按 Config.HISTORY_BACKEND 打开存储后端
         """
         # 历史记录存储目录（项目根目录/history）
         self.history_dir = os.path.join(
@@ -37,54 +69,120 @@ class HistoryService:
         )
         os.makedirs(self.history_dir, exist_ok=True)
 
-        # 索引文件路径
-        self.index_file = os.path.join(self.history_dir, "index.json")
-        self._init_index()
+        # 目录布局：任务文件夹和 JSON 记录按哈希前缀分片存放
+        self.layout = HistoryLayout(self.history_dir)
+
+        # 存储后端（SQLite 或 JSON 文件）
+        self.store = create_history_store(self.history_dir, Config.HISTORY_BACKEND, self.layout)
+
+        # 内存索引和完整记录缓存
+        self._lock = threading.RLock()
+        self._index = HistoryIndex()
+        self._records = RecordCache(self.RECORD_CACHE_SIZE)
+        self._index_token = None
+        self._index_checked_at = 0.0
+
+        # 统计缓存（存储后端增量维护，变更标记变化后重新读取）
+        self._stats: Optional[Dict[str, Dict[str, int]]] = None
+        self._stats_token = None
+
+        # 跨进程共享状态：变更登记、最近访问时间（后台任务只在一个工作进程中运行，需要看到所有进程的写入）
+        self.shared = get_shared_state()
+
+        # 任务文件夹增量同步：持久化的目录状态 + 各进程保存图片时登记的变更任务（共享状态）
+        self._sync_state = TaskSyncState(self.history_dir)
+        self._watcher: Optional[HistorySyncWatcher] = None
+
+        # 打包下载、图片变体、列表封面拼图的磁盘缓存
+        self.exports = HistoryExportCache(self.layout)
+        self.variants = ImageVariantCache(self.layout, int(Config.IMAGE_VARIANT_CACHE_MB * 1024 * 1024))
+        self.sheets = ContactSheetCache(self.layout)
+
+        # 保留策略：磁盘配额、按最近访问时间归档、孤立文件清理
+        self.retention = HistoryRetention(
+            self,
+            self.shared,
+            quota_bytes=int(Config.HISTORY_DISK_QUOTA_MB * 1024 * 1024),
+            archive_after_seconds=Config.HISTORY_ARCHIVE_AFTER_DAYS * 86400,
+            orphan_grace_seconds=Config.HISTORY_ORPHAN_GRACE_HOURS * 3600
+        )
 
-    def _init_index(self) -> None:
-        """
-        初始化索引文件
+        # 延迟写入缓冲：record_id -> 待写入的字段，由定时器或读取/同步更新时刷新
+        self._pending_updates: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        atexit.register(self.flush_pending_updates)
 
-        如果索引文件不存在，则创建一个空索引
+    def _ensure_index(self, force: bool = False) -> None:
         """
-        if not os.path.exists(self.index_file):
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump({"records": []}, f, ensure_ascii=False, indent=2)
+        确保内存索引是最新的
 
-    def _load_index(self) -> Dict:
-        """
-        加载索引文件
+        距上次检查不足 INDEX_CHECK_INTERVAL 时直接使用内存索引；
+        否则比较存储后端的变更标记，发现外部修改时整体重载并清空记录缓存。
 
-        Returns:
-            Dict: 索引数据，包含 records 列表
+        Args:
+            force: 忽略检查间隔，立即检查
         """
-        try:
-            with open(self.index_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return {"records": []}
-
-    def _save_index(self, index: Dict) -> None:
+        now = time.monotonic()
+        if (not force and self._index_token is not None
+                and now - self._index_checked_at < self.INDEX_CHECK_INTERVAL):
+            return
+
+        with self._lock:
+            self._index_checked_at = now
+            token = self.store.change_token()
+            if token == self._index_token and self._index_token is not None:
+                return
+            # 先取标记再读数据：期间若有写入，下次检查会再次重载
+            self._index.load(self.store.load_entries())
+            self._records.clear()
+            self._index_token = token
+
+    def _lookup(self, record_id: str) -> Optional[IndexEntry]:
         """
-        保存索引文件
+        在内存索引中查找记录
 
-        Args:
-            index: 索引数据
+        未命中时立即检查一次存储后端的变更再查找：其他工作进程刚创建的记录
+        不必等到下一次定时检查，创建后马上读取也不会返回"不存在"。
         """
-        with open(self.index_file, "w", encoding="utf-8") as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+        self._ensure_index()
+        entry = self._index.get(record_id)
+        if entry is None:
+            self._ensure_index(force=True)
+            entry = self._index.get(record_id)
+        return entry
+
+    def _lookup_task(self, task_id: str) -> Optional[str]:
+        """根据 task_id 查找关联的记录 ID（未命中时的处理同 _lookup）"""
+        self._ensure_index()
+        record_id = self._index.find_by_task(task_id)
+        if record_id is None:
+            self._ensure_index(force=True)
+            record_id = self._index.find_by_task(task_id)
+        return record_id
 
-    def _get_record_path(self, record_id: str) -> str:
+    def _after_write(self, token_before, record: Optional[Dict] = None, removed_id: Optional[str] = None) -> None:
         """
-        获取历史记录文件路径
+        本进程写入后同步内存索引和记录缓存
 
         Args:
-            record_id: 记录 ID
-
-        Returns:
-            str: 记录文件的完整路径
+            token_before: 写入前的变更标记
+            record: 新增或修改后的完整记录
+            removed_id: 被删除的记录 ID
         """
-        return os.path.join(self.history_dir, f"{record_id}.json")
+        if record is not None:
+            self._index.upsert(build_index_entry(record))
+            self._records.put(record)
+        if removed_id is not None:
+            self._index.remove(removed_id)
+            self._records.discard(removed_id)
+
+        token_after = self.store.last_write_token
+        if isinstance(token_before, int) and token_after != token_before + 1:
+            # 写入代数跳变：期间有其他进程写入，下次读取时重载
+            self._index_token = None
+        else:
+            self._index_token = token_after
 
     def create_record(
         self,
@@ -127,24 +225,12 @@ class HistoryService:
             "thumbnail": None  # 初始无缩略图
         }
 
-        # 保存完整记录到独立文件
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
-
-        # 更新索引（用于快速列表查询）
-        index = self._load_index()
-        index["records"].insert(0, {
-            "id": record_id,
-            "title": topic,
-            "created_at": now,
-            "updated_at": now,
-            "status": RecordStatus.DRAFT,  # 索引中也记录状态
-            "thumbnail": None,
-            "page_count": len(outline.get("pages", [])),  # 预期页数
-            "task_id": task_id
-        })
-        self._save_index(index)
+        # 保存记录（索引摘要由存储后端从记录中生成）
+        with self._lock:
+            self._ensure_index(force=True)
+            token_before = self._index_token
+            self.store.insert(record)
+            self._after_write(token_before, record=record)
 
         return record_id
 
@@ -168,16 +254,40 @@ class HistoryService:
             - status: 当前状态
             - thumbnail: 缩略图文件名
         """
-        record_path = self._get_record_path(record_id)
+        # 有尚未写入的更新时先写入，保证读到最新内容
+        if record_id in self._pending_updates:
+            self.flush_pending_updates(record_id)
 
-        if not os.path.exists(record_path):
+        if self._lookup(record_id) is None:
             return None
 
-        try:
-            with open(record_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
+        record = self._records.get(record_id)
+        if record is not None:
+            return record
+
+        with self._lock:
+            record = self.store.get(record_id)
+            if record is not None:
+                self._records.put(record)
+        return record
+
+    def record_version(self, record_id: str) -> Optional[str]:
+        """
+        记录的版本标识（用于 ETag，只读内存索引，不读取完整记录）
+
+        由 updated_at 和占用空间组成：内容修改都会刷新 updated_at；
+        扫描、归档只更新占用空间等存储字段，不刷新 updated_at，但占用空间随之变化。
+
+        Returns:
+            Optional[str]: 版本标识，记录不存在时返回 None
+        """
+        if record_id in self._pending_updates:
+            self.flush_pending_updates(record_id)
+
+        entry = self._lookup(record_id)
+        if entry is None:
             return None
+        return f"{entry.updated_at}:{entry.disk_bytes}"
 
     def record_exists(self, record_id: str) -> bool:
         """
@@ -189,8 +299,7 @@ class HistoryService:
         Returns:
             bool: 记录是否存在
         """
-        record_path = self._get_record_path(record_id)
-        return os.path.exists(record_path)
+        return self._lookup(record_id) is not None
 
     def update_record(
         self,
@@ -198,7 +307,8 @@ class HistoryService:
         outline: Optional[Dict] = None,
         images: Optional[Dict] = None,
         status: Optional[str] = None,
-        thumbnail: Optional[str] = None
+        thumbnail: Optional[str] = None,
+        disk_bytes: Optional[int] = None
     ) -> bool:
         """
         更新历史记录
@@ -212,6 +322,7 @@ class HistoryService:
             images: 图片信息（可选，包含 task_id 和 generated 列表）
             status: 状态（可选）
             thumbnail: 缩略图文件名（可选）
+            disk_bytes: 任务文件夹占用空间（可选，保存图片和扫描任务文件夹时更新）
 
         Returns:
             bool: 更新是否成功，记录不存在时返回 False
@@ -224,71 +335,92 @@ class HistoryService:
             partial -> generating: 继续生成剩余图片
             partial -> completed: 剩余图片生成完成
         """
-        # 获取现有记录
-        record = self.get_record(record_id)
-        if not record:
-            return False
-
-        # 更新时间戳
-        now = datetime.now().isoformat()
-        record["updated_at"] = now
-
-        # 更新大纲内容（支持修改大纲）
-        if outline is not None:
-            record["outline"] = outline
-
-        # 更新图片信息
-        if images is not None:
-            record["images"] = images
-
-        # 更新状态（状态流转）
-        if status is not None:
-            record["status"] = status
-
-        # 更新缩略图
-        if thumbnail is not None:
-            record["thumbnail"] = thumbnail
-
-        # 保存完整记录
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
-
-        # 同步更新索引
-        index = self._load_index()
-        for idx_record in index["records"]:
-            if idx_record["id"] == record_id:
-                idx_record["updated_at"] = now
-
-                # 更新状态
-                if status:
-                    idx_record["status"] = status
+        fields = {
+            key: value for key, value in (
+                ("outline", outline), ("images", images), ("status", status),
+                ("thumbnail", thumbnail), ("disk_bytes", disk_bytes)
+            ) if value is not None
+        }
 
-                # 更新缩略图
-                if thumbnail:
-                    idx_record["thumbnail"] = thumbnail
+        # 与尚未写入的延迟更新合并为一次写入（本次的字段优先）
+        with self._pending_lock:
+            pending = self._pending_updates.pop(record_id, None)
+        if pending:
+            fields = {**pending, **fields}
+        return self._write_update(record_id, fields)
+
+    def _write_update(self, record_id: str, fields: Dict[str, Any]) -> bool:
+        """把字段更新写入存储后端（一次写入），并刷新 updated_at"""
+        def apply(record: Dict) -> None:
+            # 更新时间戳
+            record["updated_at"] = datetime.now().isoformat()
+            # 更新大纲、图片信息、状态（状态流转）、缩略图
+            record.update(fields)
+
+        # 读取-修改-写回在存储后端内原子完成，索引摘要同步更新
+        with self._lock:
+            self._ensure_index(force=True)
+            token_before = self._index_token
+            record = self.store.update(record_id, apply)
+            if record is None:
+                return False
+            self._after_write(token_before, record=record)
+        return True
 
-                # 更新页数（如果大纲被修改）
-                if outline:
-                    idx_record["page_count"] = len(outline.get("pages", []))
+    def queue_update(self, record_id: str, **fields: Any) -> None:
+        """
+        延迟更新历史记录（write-behind）
 
-                # 更新任务 ID
-                if images is not None and images.get("task_id"):
-                    idx_record["task_id"] = images.get("task_id")
+        字段先写入内存缓冲，WRITE_BEHIND_DELAY 秒内对同一记录的多次更新合并后只写入一次。
+        生成过程中每完成一页都会调用，避免每页都重写整条记录。
+        get_record、update_record 会先写入该记录的缓冲；进程退出时写入全部缓冲。
 
-                break
+        Args:
+            record_id: 记录 ID
+            **fields: 与 update_record 相同的字段（outline/images/status/thumbnail/disk_bytes），None 表示不修改
+        """
+        fields = {key: value for key, value in fields.items() if value is not None}
+        if not fields:
+            return
+        with self._pending_lock:
+            self._pending_updates.setdefault(record_id, {}).update(fields)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.WRITE_BEHIND_DELAY, self._on_flush_timer)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _on_flush_timer(self) -> None:
+        with self._pending_lock:
+            self._flush_timer = None
+        self.flush_pending_updates()
+
+    def flush_pending_updates(self, record_id: Optional[str] = None) -> None:
+        """
+        立即写入延迟更新缓冲
 
-        self._save_index(index)
-        return True
+        Args:
+            record_id: 只写入该记录的缓冲，None 表示全部
+        """
+        with self._pending_lock:
+            if record_id is None:
+                pending, self._pending_updates = self._pending_updates, {}
+            else:
+                fields = self._pending_updates.pop(record_id, None)
+                pending = {record_id: fields} if fields else {}
+
+        for pending_id, fields in pending.items():
+            try:
+                self._write_update(pending_id, fields)
+            except Exception as e:
+                logger.error(f"写入延迟更新失败: record_id={pending_id}, {e}")
 
     def delete_record(self, record_id: str) -> bool:
         """
         删除历史记录
 
         会同时删除：
-        1. 记录 JSON 文件
-        2. 关联的任务图片目录
-        3. 索引中的记录
+        1. 存储后端中的记录（含索引）
+        2. 关联的任务图片目录（及其归档文件、打包下载和图片变体缓存）
 
         Args:
             record_id: 记录 ID
@@ -296,14 +428,22 @@ class HistoryService:
         Returns:
             bool: 删除是否成功，记录不存在时返回 False
         """
-        record = self.get_record(record_id)
-        if not record:
-            return False
+        with self._pending_lock:
+            self._pending_updates.pop(record_id, None)
+
+        with self._lock:
+            self._ensure_index(force=True)
+            token_before = self._index_token
+            record = self.store.delete(record_id)
+            if not record:
+                return False
+            self._after_write(token_before, removed_id=record_id)
 
         # 删除关联的任务图片目录
         if record.get("images") and record["images"].get("task_id"):
             task_id = record["images"]["task_id"]
-            task_dir = os.path.join(self.history_dir, task_id)
+            task_dir = self.layout.task_dir(task_id)
+            get_hot_image_cache().invalidate_dir(task_dir)
             if os.path.exists(task_dir) and os.path.isdir(task_dir):
                 try:
                     import shutil
@@ -311,18 +451,14 @@ class HistoryService:
                     print(f"已删除任务目录: {task_dir}")
                 except Exception as e:
                     print(f"删除任务目录失败: {task_dir}, {e}")
-
-        # 删除记录 JSON 文件
-        record_path = self._get_record_path(record_id)
-        try:
-            os.remove(record_path)
-        except Exception:
-            return False
-
-        # 从索引中移除
-        index = self._load_index()
-        index["records"] = [r for r in index["records"] if r["id"] != record_id]
-        self._save_index(index)
+            archive_path = self.layout.archive_path(task_id)
+            with self.retention.archiver.lock(task_id):
+                if os.path.exists(archive_path):
+                    try:
+                        os.remove(archive_path)
+                    except OSError as e:
+                        logger.warning(f"删除任务归档失败: {archive_path}, {e}")
+            self.invalidate_task_caches(task_id)
 
         return True
 
@@ -330,7 +466,10 @@ class HistoryService:
         self,
         page: int = 1,
         page_size: int = 20,
-        status: Optional[str] = None
+        status: Optional[str] = None,
+        sort: str = "created_at",
+        since: Optional[str] = None,
+        until: Optional[str] = None
     ) -> Dict:
         """
         分页获取历史记录列表
@@ -339,6 +478,9 @@ class HistoryService:
             page: 页码，从 1 开始
             page_size: 每页记录数
             status: 状态过滤（可选），支持：draft/generating/partial/completed/error
+            sort: 排序字段（created_at / updated_at），倒序
+            since: 排序字段的时间下限（包含，可选）
+            until: 排序字段的时间上限（不包含，可选）
 
         Returns:
             Dict: 分页结果
@@ -348,18 +490,12 @@ class HistoryService:
                 - page_size: 每页大小
                 - total_pages: 总页数
         """
-        index = self._load_index()
-        records = index.get("records", [])
+        self._ensure_index()
 
-        # 按状态过滤
-        if status:
-            records = [r for r in records if r.get("status") == status]
-
-        # 分页计算
-        total = len(records)
-        start = (page - 1) * page_size
-        end = start + page_size
-        page_records = records[start:end]
+        # 状态过滤和时间范围直接在对应的有序索引上定位
+        selected = self._index.select(sort, status, since, until)
+        total = len(selected)
+        page_records = [e.to_dict() for e in selected.page((page - 1) * page_size, page_size)]
 
         return {
             "records": page_records,
@@ -369,58 +505,325 @@ class HistoryService:
             "total_pages": (total + page_size - 1) // page_size
         }
 
-    def search_records(self, keyword: str) -> List[Dict]:
+    def get_contact_sheet(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        status: Optional[str] = None,
+        sort: str = "created_at"
+    ) -> Dict:
         """
-        根据关键词搜索历史记录
+        分页获取历史记录列表，并把当前页的封面拼成一张图
+
+        拼图按索引版本和分页参数缓存，记录没有变化时直接复用。
+        已归档任务的封面不会为此恢复，这些记录不在拼图中。
+
+        Args:
+            page/page_size/status/sort: 同 list_records
+
+        Returns:
+            Dict: list_records 的分页结果，另含 sheet（拼图坐标表，见 ContactSheetCache.get_or_build，
+                  当前页没有可用封面时为 None）
+        """
+        # 在锁内读取索引版本和当前页，保证拼图内容与缓存键一致
+        with self._lock:
+            self._ensure_index()
+            key = sheet_key(self._index_token, page, page_size, status, sort)
+            result = self.list_records(page, page_size, status, sort)
+
+        tiles = []
+        for record in result["records"]:
+            if not record.get("task_id") or not record.get("thumbnail"):
+                continue
+            try:
+                task_dir = self.layout.task_dir(record["task_id"])
+            except ValueError:
+                continue
+            thumb_path = os.path.join(task_dir, f"thumb_{record['thumbnail']}")
+            if not os.path.exists(thumb_path):
+                thumb_path = os.path.join(task_dir, record["thumbnail"])
+            tiles.append((record["id"], thumb_path))
+
+        result["sheet"] = self.sheets.get_or_build(key, tiles)
+        return result
+
+    def list_records_by_cursor(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 20,
+        status: Optional[str] = None,
+        sort: str = "created_at",
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> Dict:
+        """
+        游标分页获取历史记录列表
+
+        按排序字段倒序返回，下一页从上一页最后一条之后开始，
+        翻页期间新建的记录不会导致结果错位或重复。
+
+        Args:
+            cursor: 上一页返回的 next_cursor，不传则从第一页开始
+            limit: 每页记录数
+            status: 状态过滤（可选）
+            sort: 排序字段（created_at / updated_at），倒序
+            since: 排序字段的时间下限（包含，可选）
+            until: 排序字段的时间上限（不包含，可选）
+
+        Returns:
+            Dict: 分页结果
+                - records: 当前页的记录列表
+                - total: 符合条件的记录总数
+                - next_cursor: 下一页的游标（没有下一页时为 None）
+                - has_more: 是否还有下一页
+
+        Raises:
+            ValueError: 排序字段或游标无效
+        """
+        self._ensure_index()
+
+        key = self._decode_cursor(cursor) if cursor else None
+        selected = self._index.select(sort, status, since, until)
+        entries, has_more = selected.page_before(key, limit)
+
+        return {
+            "records": [e.to_dict() for e in entries],
+            "total": len(selected),
+            "next_cursor": self._encode_cursor(entries[-1].key_for(sort)) if has_more else None,
+            "has_more": has_more
+        }
+
+    @staticmethod
+    def _encode_cursor(key) -> str:
+        """把排序键编码为不透明的游标字符串"""
+        raw = json.dumps(list(key), ensure_ascii=False).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_cursor(cursor: str):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            value, record_id = json.loads(raw.decode("utf-8"))
+            return (str(value), str(record_id))
+        except Exception:
+            raise ValueError("无效的分页游标")
+
+    def search_records(self, keyword: str, page: int = 1, page_size: int = 20) -> Dict:
+        """
+        根据关键词全文检索历史记录（标题和大纲内容）
+
+        关键词按 history_search 的规则切分（中文二元组、英文单词），
+        所有词都命中的记录按相关度排序返回。
 
         Args:
             keyword: 搜索关键词（不区分大小写）
+            page: 页码，从 1 开始
+            page_size: 每页记录数
 
         Returns:
-            List[Dict]: 匹配的记录列表（按创建时间倒序）
+            Dict: 分页结果
+                - records: 当前页的记录列表（按相关度排序）
+                - total: 命中总数
+                - page: 当前页码
+                - page_size: 每页大小
+                - total_pages: 总页数
         """
-        index = self._load_index()
-        records = index.get("records", [])
+        self._ensure_index()
+        page = max(page, 1)
+        start = (page - 1) * page_size
 
-        # 不区分大小写的标题搜索
-        keyword_lower = keyword.lower()
-        results = [
-            r for r in records
-            if keyword_lower in r.get("title", "").lower()
-        ]
+        terms = query_terms(keyword)
+        if terms:
+            record_ids, total = self.store.search(terms, page_size, start)
+            # 只查一次索引：检查与读取之间记录可能被其他线程删除
+            entries = [self._index.get(record_id) for record_id in record_ids]
+            page_records = [entry.to_dict() for entry in entries if entry is not None]
+        else:
+            # 关键词中没有可检索的字词（如只有标点）时，退回标题子串匹配
+            keyword_lower = keyword.lower()
+            entries = [e for e in self._index.iter_newest() if keyword_lower in e.title.lower()]
+            total = len(entries)
+            page_records = [e.to_dict() for e in entries[start:start + page_size]]
 
-        return results
+        return {
+            "records": page_records,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size
+        }
 
     def get_statistics(self) -> Dict:
         """
         获取历史记录统计信息
 
+        统计由存储后端随每次写入增量维护，这里只在存储发生变化后读取一次，
+        不遍历记录。
+
         Returns:
             Dict: 统计数据
                 - total: 总记录数
+                - total_images: 已生成图片总数
+                - total_disk_bytes: 任务文件夹占用空间总计（字节）
                 - by_status: 各状态的记录数
                     - draft: 草稿数
                     - generating: 生成中数
                     - partial: 部分完成数
                     - completed: 已完成数
                     - error: 错误数
+                - details: 各状态的 {records, images, disk_bytes}
         """
-        index = self._load_index()
-        records = index.get("records", [])
-
-        total = len(records)
-        status_count = {}
+        self._ensure_index()
 
-        # 统计各状态的记录数
-        for record in records:
-            status = record.get("status", RecordStatus.DRAFT)
-            status_count[status] = status_count.get(status, 0) + 1
+        with self._lock:
+            if self._stats is None or self._stats_token != self._index_token:
+                self._stats = self.store.get_stats()
+                self._stats_token = self._index_token
+            details = self._stats
 
         return {
-            "total": total,
-            "by_status": status_count
+            "total": sum(d["records"] for d in details.values()),
+            "total_images": sum(d["images"] for d in details.values()),
+            "total_disk_bytes": sum(d["disk_bytes"] for d in details.values()),
+            "by_status": {status: d["records"] for status, d in details.items()},
+            "details": details
         }
 
+    def reconcile_statistics(self) -> Dict:
+        """
+        对账：重新计算各记录的占用空间和全部统计
+
+        增量维护的统计因进程崩溃、手动修改文件等原因出现偏差时使用。
+        会遍历所有任务文件夹，代价与数据量成正比。
+
+        Returns:
+            Dict: 对账后的统计（格式同 get_statistics），另含 corrected（占用空间被校正的记录数）
+        """
+        self.flush_pending_updates()
+        self._ensure_index(force=True)
+
+        corrected = 0
+        for entry in list(self._index.iter_newest()):
+            if not entry.task_id:
+                continue
+            try:
+                disk_bytes = self.task_disk_bytes(self.layout.task_dir(entry.task_id))
+                archive_path = self.layout.archive_path(entry.task_id)
+                if not disk_bytes and os.path.exists(archive_path):
+                    # 已归档的任务按归档文件大小计算
+                    disk_bytes = os.path.getsize(archive_path)
+            except (OSError, ValueError):
+                disk_bytes = 0
+            if disk_bytes != entry.disk_bytes:
+                self.set_disk_bytes(entry.id, disk_bytes)
+                corrected += 1
+
+        with self._lock:
+            self.store.rebuild_stats()
+            self._index_token = None
+            self._stats = None
+
+        return {**self.get_statistics(), "corrected": corrected}
+
+    def task_entries(self) -> Dict[str, IndexEntry]:
+        """
+        task_id -> 关联记录的索引摘要（先检查存储后端的变更，保留策略等后台任务使用）
+
+        Returns:
+            Dict[str, IndexEntry]: 同一任务关联多条记录时取最新的一条
+        """
+        self._ensure_index(force=True)
+        index = self._index
+        entries = {}
+        for task_id, record_id in index.task_items():
+            entry = index.get(record_id)
+            if entry is not None:
+                entries[task_id] = entry
+        return entries
+
+    @staticmethod
+    def task_disk_bytes(task_dir: str) -> int:
+        """任务文件夹中所有文件的大小之和（文件夹不存在时为 0）"""
+        if not os.path.isdir(task_dir):
+            return 0
+        total = 0
+        with os.scandir(task_dir) as it:
+            for entry in it:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+
+    def set_disk_bytes(self, record_id: str, disk_bytes: int, **fields: Any) -> None:
+        """
+        更新记录的占用空间及其他存储相关字段
+
+        占用空间不属于记录内容，不刷新 updated_at（不改变按更新时间的排序和保留策略的最近使用时间）。
+
+        Args:
+            record_id: 记录 ID
+            disk_bytes: 任务文件夹占用空间（字节）
+            **fields: 同时写入的其他存储字段（如 archived_at）
+        """
+        def apply(record: Dict) -> None:
+            record["disk_bytes"] = disk_bytes
+            record.update(fields)
+
+        with self._lock:
+            self._ensure_index(force=True)
+            token_before = self._index_token
+            record = self.store.update(record_id, apply)
+            if record is not None:
+                self._after_write(token_before, record=record)
+
+    # ==================== 保留策略 ====================
+
+    def mark_archived(self, record_id: str, archive_bytes: int) -> None:
+        """记录任务文件夹已归档：占用空间改为归档文件大小，并记录归档时间"""
+        self.set_disk_bytes(record_id, archive_bytes, archived_at=datetime.now().isoformat())
+
+    def ensure_task_restored(self, task_id: str) -> str:
+        """
+        确保任务文件夹可用：已归档时解压恢复，并登记最近访问
+
+        读取图片、下载和重新生成前调用；文件夹存在时只有一次 stat 的开销。
+
+        Args:
+            task_id: 任务 ID
+
+        Returns:
+            str: 任务文件夹路径（可能不存在）
+
+        Raises:
+            ValueError: task_id 非法
+        """
+        self.retention.touch(task_id)
+        task_dir = self.layout.task_dir(task_id)
+        if os.path.isdir(task_dir) or not self.retention.archiver.is_archived(task_id):
+            return task_dir
+
+        if self.retention.archiver.restore(task_id):
+            task_dir = self.layout.task_dir(task_id)
+            record_id = self._lookup_task(task_id)
+            if record_id:
+                self.set_disk_bytes(record_id, self.task_disk_bytes(task_dir), archived_at=None)
+            logger.info(f"已恢复归档的任务: {task_id}")
+        return self.layout.task_dir(task_id)
+
+    def run_retention(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        立即执行一轮保留策略（归档和孤立文件清理），参数和返回值见 HistoryRetention.run
+        """
+        return self.retention.run(dry_run=dry_run)
+
+    def start_retention(self, interval: float) -> None:
+        """
+        启动后台保留策略线程
+
+        Args:
+            interval: 执行间隔（秒）
+        """
+        self.retention.start(interval)
+
     def scan_and_sync_task_images(self, task_id: str) -> Dict[str, Any]:
         """
         扫描任务文件夹，同步图片列表
@@ -443,7 +846,13 @@ class HistoryService:
                 - status: 更新后的状态
                 - error: 错误信息（失败时）
         """
-        task_dir = os.path.join(self.history_dir, task_id)
+        try:
+            task_dir = self.layout.task_dir(task_id)
+        except ValueError as e:
+            return {
+                "success": False,
+                "error": str(e)
+            }
 
         if not os.path.exists(task_dir) or not os.path.isdir(task_dir):
             return {
@@ -452,14 +861,20 @@ class HistoryService:
             }
 
         try:
-            # 扫描目录下所有图片文件（排除缩略图）
+            # 扫描目录下所有图片文件（排除缩略图），同时统计占用空间
             image_files = []
-            for filename in os.listdir(task_dir):
-                # 跳过缩略图文件（以 thumb_ 开头）
-                if filename.startswith('thumb_'):
-                    continue
-                if filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                    image_files.append(filename)
+            disk_bytes = 0
+            with os.scandir(task_dir) as it:
+                for file_entry in it:
+                    if not file_entry.is_file():
+                        continue
+                    disk_bytes += file_entry.stat().st_size
+                    filename = file_entry.name
+                    # 跳过缩略图文件（以 thumb_ 开头）
+                    if filename.startswith('thumb_'):
+                        continue
+                    if filename.endswith('.png') or filename.endswith('.jpg') or filename.endswith('.jpeg'):
+                        image_files.append(filename)
 
             # 按文件名排序（数字排序）
             def get_index(filename):
@@ -470,32 +885,37 @@ class HistoryService:
 
             image_files.sort(key=get_index)
 
-            # 查找关联的历史记录
-            index = self._load_index()
-            record_id = None
-            for rec in index.get("records", []):
-                # 通过遍历所有记录，找到 task_id 匹配的记录
-                record_detail = self.get_record(rec["id"])
-                if record_detail and record_detail.get("images", {}).get("task_id") == task_id:
-                    record_id = rec["id"]
-                    break
+            # 通过 task_id 反向索引查找关联的历史记录
+            record_id = self._lookup_task(task_id)
+            record = self.get_record(record_id) if record_id else None
 
-            if record_id:
-                # 更新历史记录
-                record = self.get_record(record_id)
-                if record:
-                    # 根据生成图片数量判断状态
-                    expected_count = len(record.get("outline", {}).get("pages", []))
-                    actual_count = len(image_files)
-
-                    if actual_count == 0:
-                        status = RecordStatus.DRAFT  # 无图片：草稿
-                    elif actual_count >= expected_count:
-                        status = RecordStatus.COMPLETED  # 全部完成
-                    else:
-                        status = RecordStatus.PARTIAL  # 部分完成
+            if record:
+                # 根据生成图片数量判断状态
+                expected_count = len(record.get("outline", {}).get("pages", []))
+                actual_count = len(image_files)
 
-                    # 更新图片列表和状态
+                if actual_count == 0:
+                    status = RecordStatus.DRAFT  # 无图片：草稿
+                elif actual_count >= expected_count:
+                    status = RecordStatus.COMPLETED  # 全部完成
+                else:
+                    status = RecordStatus.PARTIAL  # 部分完成
+
+                thumbnail = image_files[0] if image_files else None
+                images = record.get("images") or {}
+                unchanged = (
+                    images.get("task_id") == task_id
+                    and images.get("generated") == image_files
+                    and record.get("status") == status
+                    and (thumbnail is None or record.get("thumbnail") == thumbnail)
+                )
+
+                # 图片列表和状态都没有变化时不写回，避免无意义地刷新 updated_at；
+                # 只有占用空间变化（如缩略图重建）时按存储字段更新，不影响排序和保留策略
+                if unchanged:
+                    if record.get("disk_bytes") != disk_bytes:
+                        self.set_disk_bytes(record_id, disk_bytes)
+                else:
                     self.update_record(
                         record_id,
                         images={
@@ -503,17 +923,19 @@ class HistoryService:
                             "generated": image_files
                         },
                         status=status,
-                        thumbnail=image_files[0] if image_files else None
+                        thumbnail=thumbnail,
+                        disk_bytes=disk_bytes
                     )
 
-                    return {
-                        "success": True,
-                        "record_id": record_id,
-                        "task_id": task_id,
-                        "images_count": len(image_files),
-                        "images": image_files,
-                        "status": status
-                    }
+                return {
+                    "success": True,
+                    "record_id": record_id,
+                    "task_id": task_id,
+                    "images_count": len(image_files),
+                    "images": image_files,
+                    "status": status,
+                    "unchanged": unchanged
+                }
 
             # 没有关联的记录，返回扫描结果
             return {
@@ -530,21 +952,63 @@ class HistoryService:
                 "error": f"扫描任务失败: {str(e)}"
             }
 
-    def scan_all_tasks(self) -> Dict[str, Any]:
+    def mark_task_changed(self, task_id: str) -> None:
+        """
+        登记任务文件夹发生了变化（变更日志）
+
+        ImageService 保存图片后调用，下次增量扫描时该任务一定会被重新扫描，
+        不依赖目录 mtime（覆盖已有文件时目录 mtime 不会变化）。
+        同时删除该任务的打包下载和图片变体缓存。
+
+        Args:
+            task_id: 任务 ID
+        """
+        self.shared.set(self.CHANGED_NAMESPACE, task_id, True)
+        self.invalidate_task_caches(task_id)
+
+    def invalidate_task_caches(self, task_id: str) -> None:
+        """删除由任务图片派生的缓存（打包下载、图片变体）"""
+        self.exports.invalidate(task_id)
+        self.variants.invalidate(task_id)
+
+    def _sync_signature(self, task_id: str, mtime_ns: int):
+        """当前任务文件夹的同步状态：目录 mtime + 关联记录 ID 和更新时间"""
+        record_id = self._index.find_by_task(task_id)
+        entry = self._index.get(record_id) if record_id else None
+        return (mtime_ns, record_id, entry.updated_at if entry else None)
+
+    def scan_all_tasks(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        incremental: bool = False
+    ) -> Dict[str, Any]:
         """
-        扫描所有任务文件夹，同步图片列表
+        扫描任务文件夹，同步图片列表
 
-        批量扫描 history 目录下的所有任务文件夹，
-        同步图片列表并更新记录状态。
+        任务文件夹按名称排序后分批扫描：每批从 cursor 之后开始，最多处理 limit 个，
+        批内并发扫描。返回的 next_cursor 传入下一次调用即可继续，为 None 表示已扫描完。
+
+        增量模式下跳过自上次同步后没有变化的文件夹（目录 mtime、关联记录均未变化，
+        且没有通过 mark_task_changed 登记），limit 只计算需要扫描的文件夹。
+
+        Args:
+            limit: 本批最多扫描的任务数（不超过 MAX_SCAN_BATCH），为 None 时扫描全部
+            cursor: 上一批返回的 next_cursor
+            incremental: 是否只扫描发生变化的文件夹
 
         Returns:
             Dict[str, Any]: 扫描结果统计
                 - success: 是否成功
-                - total_tasks: 扫描的任务总数
+                - total_tasks: 本批扫描的任务数
+                - skipped: 增量模式下跳过的未变化任务数
                 - synced: 成功同步的任务数
+                - updated: 其中记录实际发生变化的任务数
                 - failed: 失败的任务数
                 - orphan_tasks: 孤立任务列表（有图片但无记录）
                 - results: 详细结果列表
+                - next_cursor: 下一批的游标（已扫描完时为 None）
+                - has_more: 是否还有未扫描的任务
                 - error: 错误信息（失败时）
         """
         if not os.path.exists(self.history_dir):
@@ -554,41 +1018,80 @@ class HistoryService:
             }
 
         try:
+            # 遍历所有任务文件夹（文件夹名就是 task_id），同时取目录 mtime
+            dir_mtimes = {
+                task_id: entry.stat().st_mtime_ns
+                for task_id, entry in self.layout.iter_task_dirs()
+                if cursor is None or task_id > cursor
+            }
+            task_ids = sorted(dir_mtimes)
+
+            # 先加载索引，避免各线程同时触发重载
+            self._ensure_index()
+
+            skipped = 0
+            if incremental:
+                changed_tasks = set(self.shared.keys(self.CHANGED_NAMESPACE))
+                candidates = [
+                    task_id for task_id in task_ids
+                    if task_id in changed_tasks
+                    or not self._sync_state.is_current(
+                        task_id, self._sync_signature(task_id, dir_mtimes[task_id])
+                    )
+                ]
+                skipped = len(task_ids) - len(candidates)
+                task_ids = candidates
+
+            has_more = False
+            if limit is not None:
+                limit = max(1, min(limit, self.MAX_SCAN_BATCH))
+                has_more = len(task_ids) > limit
+                task_ids = task_ids[:limit]
+
+            # 扫描前清除变更登记：扫描期间新保存的图片会重新登记，下次再扫描
+            for task_id in task_ids:
+                self.shared.delete(self.CHANGED_NAMESPACE, task_id)
+
+            if len(task_ids) > 1:
+                with ThreadPoolExecutor(max_workers=min(self.SCAN_WORKERS, len(task_ids))) as executor:
+                    results = list(executor.map(self.scan_and_sync_task_images, task_ids))
+            else:
+                results = [self.scan_and_sync_task_images(task_id) for task_id in task_ids]
+
             synced_count = 0
+            updated_count = 0
             failed_count = 0
             orphan_tasks = []  # 没有关联记录的任务
-            results = []
-
-            # 遍历 history 目录
-            for item in os.listdir(self.history_dir):
-                item_path = os.path.join(self.history_dir, item)
-
-                # 只处理目录（任务文件夹）
-                if not os.path.isdir(item_path):
-                    continue
-
-                # 假设任务文件夹名就是 task_id
-                task_id = item
-
-                # 扫描并同步
-                result = self.scan_and_sync_task_images(task_id)
-                results.append(result)
-
+            for task_id, result in zip(task_ids, results):
                 if result.get("success"):
                     if result.get("no_record"):
                         orphan_tasks.append(task_id)
                     else:
                         synced_count += 1
+                        if not result.get("unchanged"):
+                            updated_count += 1
+                    # 使用扫描前取得的 mtime：扫描期间目录若有变化，下次仍会重新扫描
+                    self._sync_state.set(task_id, self._sync_signature(task_id, dir_mtimes[task_id]))
                 else:
                     failed_count += 1
+                    self._sync_state.discard(task_id)
+
+            # 从头扫描到底时，清理已不存在的文件夹的同步状态
+            if cursor is None and not has_more:
+                self._sync_state.retain(dir_mtimes)
+            self._sync_state.save()
 
             return {
                 "success": True,
                 "total_tasks": len(results),
+                "skipped": skipped,
                 "synced": synced_count,
+                "updated": updated_count,
                 "failed": failed_count,
                 "orphan_tasks": orphan_tasks,
-                "results": results
+                "results": results,
+                "next_cursor": task_ids[-1] if has_more else None,
+                "has_more": has_more
             }
 
         except Exception as e:
@@ -597,6 +1100,24 @@ class HistoryService:
                 "error": f"扫描所有任务失败: {str(e)}"
             }
 
+    def start_sync_watcher(self, interval: float) -> None:
+        """
+        启动后台同步线程，定期增量扫描任务文件夹
+
+        Args:
+            interval: 扫描间隔（秒）
+        """
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = HistorySyncWatcher(self, interval)
+            self._watcher.start()
+
+    def stop_sync_watcher(self) -> None:
+        """停止后台同步线程"""
+        with self._lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            watcher.stop()
 
 _service_instance = None
 
@@ -612,3 +1133,17 @@ def get_history_service() -> HistoryService:
     if _service_instance is None:
         _service_instance = HistoryService()
     return _service_instance
+
+
+if __name__ == "__main__":
+    # 统计对账：python -m backend.services.history reconcile-stats
+    import argparse
+
+    parser = argparse.ArgumentParser(description="历史记录维护命令")
+    parser.add_argument("command", choices=["reconcile-stats"], help="reconcile-stats: 重新计算占用空间和统计")
+    args = parser.parse_args()
+
+    if args.command == "reconcile-stats":
+        result = get_history_service().reconcile_statistics()
+        print(f"记录总数: {result['total']}，图片总数: {result['total_images']}，"
+              f"占用空间: {result['total_disk_bytes']} 字节，校正记录: {result['corrected']}")
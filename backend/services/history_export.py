@@ -0,0 +1,224 @@
+"""
+历史记录图片打包下载
+
+生成 STORED（不压缩）的 ZIP：PNG/JPEG 本身已经压缩，再 deflate 只浪费 CPU。
+不压缩时归档大小可以在写出之前算出，因此：
+- 首次下载边生成边发送，带准确的 Content-Length，不在内存中缓存整个归档
+- 同时写入磁盘缓存 history/exports/<分片>/<task_id>.<签名>.zip，之后的下载
+  （包括 Range 断点续传）直接发送缓存文件
+
+签名由图片文件名、大小和修改时间计算，重新生成某一页后签名变化，旧缓存自然失效；
+ImageService 保存图片时也会主动删除该任务的旧缓存。
+
+CRC 在发送文件数据的同时计算，写在数据之后的数据描述符（通用标志位 3）和中央目录中，
+因此每个文件只读取一遍，不需要在发送前预读全部图片。
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import time
+import uuid
+import zlib
+from typing import Iterator, List, NamedTuple, Optional
+
+from backend.services.history_layout import HistoryLayout
+
+logger = logging.getLogger(__name__)
+
+# 读取图片文件的块大小
+CHUNK_SIZE = 256 * 1024
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_RECORD = struct.Struct("<IHHHHIIH")
+# ZIP 2.0，不支持 ZIP64：单个归档不超过 4GB
+_ZIP_VERSION = 20
+_ZIP_MAX_SIZE = 0xFFFFFFFF
+# 通用标志位 3：CRC 和大小写在文件数据之后的数据描述符中
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+
+class ZipEntry(NamedTuple):
+    """归档中的一个文件"""
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+def _dos_datetime(mtime_ns: int):
+    """ZIP 使用的 DOS 日期和时间"""
+    t = time.localtime(mtime_ns / 1e9)
+    year = max(t.tm_year, 1980)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def plan_archive(task_dir: str) -> List[ZipEntry]:
+    """
+    列出任务文件夹中要打包的图片（排除缩略图），按页码排序
+
+    归档内文件名为 page_N.png（N 从 1 开始）。只读取目录信息，不读取文件内容。
+    """
+    files = []
+    with os.scandir(task_dir) as it:
+        for entry in it:
+            filename = entry.name
+            # 跳过缩略图文件
+            if not entry.is_file() or filename.startswith("thumb_"):
+                continue
+            if not filename.endswith((".png", ".jpg", ".jpeg")):
+                continue
+            try:
+                index = int(filename.split(".")[0])
+                archive_name = f"page_{index + 1}.png"
+            except ValueError:
+                index = None
+                archive_name = filename
+            st = entry.stat()
+            files.append((index is None, index or 0, archive_name, entry.path, st))
+
+    files.sort(key=lambda item: item[:3])
+    return [ZipEntry(name, path, st.st_size, st.st_mtime_ns) for _, _, name, path, st in files]
+
+
+def archive_signature(entries: List[ZipEntry]) -> str:
+    """归档内容签名（文件名、大小、修改时间），用作缓存文件名和 ETag"""
+    digest = hashlib.sha1()
+    for entry in entries:
+        digest.update(f"{entry.name}\0{entry.size}\0{entry.mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def archive_size(entries: List[ZipEntry]) -> int:
+    """STORED 归档的总字节数"""
+    size = _END_RECORD.size
+    for entry in entries:
+        name_len = len(entry.name.encode("utf-8"))
+        size += _LOCAL_HEADER.size + _DATA_DESCRIPTOR.size + _CENTRAL_HEADER.size + 2 * name_len + entry.size
+    return size
+
+
+def iter_zip(entries: List[ZipEntry]) -> Iterator[bytes]:
+    """
+    逐块生成 STORED 归档
+
+    Raises:
+        ValueError: 归档超过 4GB，或文件在打包前后被修改（大小或修改时间与 entries 不一致）
+    """
+    if archive_size(entries) > _ZIP_MAX_SIZE:
+        raise ValueError("归档超过 4GB，不支持打包下载")
+
+    central = []
+    offset = 0
+    for entry in entries:
+        name = entry.name.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(entry.mtime_ns)
+        header = _LOCAL_HEADER.pack(
+            0x04034B50, _ZIP_VERSION, _FLAG_DATA_DESCRIPTOR, 0, dos_time, dos_date,
+            0, 0, 0, len(name), 0
+        )
+        yield header + name
+
+        written = 0
+        crc = 0
+        with open(entry.path, "rb") as f:
+            while written < entry.size:
+                chunk = f.read(min(CHUNK_SIZE, entry.size - written))
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                written += len(chunk)
+                yield chunk
+            # 文件被覆盖写入时修改时间会变化；原子替换（os.replace）不影响已打开的旧文件
+            st = os.fstat(f.fileno())
+        if written != entry.size or st.st_size != entry.size or st.st_mtime_ns != entry.mtime_ns:
+            raise ValueError(f"打包期间图片被修改: {entry.name}")
+
+        descriptor = _DATA_DESCRIPTOR.pack(0x08074B50, crc, entry.size, entry.size)
+        yield descriptor
+
+        central.append(_CENTRAL_HEADER.pack(
+            0x02014B50, _ZIP_VERSION, _ZIP_VERSION, _FLAG_DATA_DESCRIPTOR, 0, dos_time, dos_date,
+            crc, entry.size, entry.size, len(name), 0, 0, 0, 0, 0o644 << 16, offset
+        ) + name)
+        offset += len(header) + len(name) + entry.size + len(descriptor)
+
+    central_dir = b"".join(central)
+    yield central_dir
+    yield _END_RECORD.pack(0x06054B50, 0, 0, len(entries), len(entries), len(central_dir), offset, 0)
+
+
+class HistoryExportCache:
+    """打包下载的磁盘缓存"""
+
+    def __init__(self, layout: HistoryLayout):
+        self.layout = layout
+
+    def _task_cache_dir(self, task_id: str) -> str:
+        self.layout._check_name(task_id)
+        return os.path.join(self.layout.exports_root, self.layout.task_shard(task_id))
+
+    def cache_path(self, task_id: str, signature: str) -> str:
+        return os.path.join(self._task_cache_dir(task_id), f"{task_id}.{signature}.zip")
+
+    def cached(self, task_id: str, signature: str) -> Optional[str]:
+        """已缓存的归档路径，没有时返回 None"""
+        path = self.cache_path(task_id, signature)
+        return path if os.path.exists(path) else None
+
+    def stream(self, task_id: str, signature: str, entries: List[ZipEntry]) -> Iterator[bytes]:
+        """
+        生成归档并同时写入缓存
+
+        完整发送后缓存才生效；客户端中途断开或出错时丢弃未完成的缓存文件。
+        """
+        path = self.cache_path(task_id, signature)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        completed = False
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter_zip(entries):
+                    f.write(chunk)
+                    yield chunk
+            os.replace(tmp_path, path)
+            completed = True
+            self._remove_stale(task_id, keep=path)
+        finally:
+            if not completed:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def build(self, task_id: str, signature: str, entries: List[ZipEntry]) -> str:
+        """生成归档写入缓存（不发送），返回缓存路径"""
+        for _ in self.stream(task_id, signature, entries):
+            pass
+        return self.cache_path(task_id, signature)
+
+    def invalidate(self, task_id: str) -> None:
+        """删除任务的全部缓存（重新生成图片、删除记录、归档任务时调用）"""
+        self._remove_stale(task_id, keep=None)
+
+    def _remove_stale(self, task_id: str, keep: Optional[str]) -> None:
+        cache_dir = self._task_cache_dir(task_id)
+        if not os.path.isdir(cache_dir):
+            return
+        prefix = f"{task_id}."
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if not name.startswith(prefix) or path == keep or name.endswith(".tmp"):
+                continue
+            # 签名部分不含 "."，避免误删 task_id 以本任务 ID 为前缀的其他任务的缓存
+            if "." in name[len(prefix):-len(".zip")]:
+                continue
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"删除打包缓存失败: {path}, {e}")
@@ -0,0 +1,274 @@
+"""
+历史记录内存索引
+
+HistoryService 在内存中保存一份解析好的索引，列表、搜索、统计直接从内存返回，
+不再每次读取和解析整个索引。写操作在更新存储后端的同时同步更新内存索引；
+其他进程的修改通过存储后端的变更标记（文件 mtime/size 或写入代数）发现后整体重载。
+"""
+
+import bisect
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class IndexEntry:
+    """索引条目（使用 __slots__，每条记录只占少量内存）"""
+
+    __slots__ = (
+        "id", "title", "created_at", "updated_at", "status",
+        "thumbnail", "page_count", "task_id", "image_count", "disk_bytes"
+    )
+
+    def __init__(self, data: Dict[str, Any]):
+        self.id = data["id"]
+        self.title = data.get("title") or ""
+        self.created_at = data.get("created_at") or ""
+        self.updated_at = data.get("updated_at") or ""
+        self.status = data.get("status") or "draft"
+        self.thumbnail = data.get("thumbnail")
+        self.page_count = data.get("page_count") or 0
+        self.task_id = data.get("task_id")
+        self.image_count = data.get("image_count") or 0
+        self.disk_bytes = data.get("disk_bytes") or 0
+
+    @property
+    def sort_key(self) -> Tuple[str, str]:
+        """排序键：创建时间，相同时按 ID"""
+        return (self.created_at, self.id)
+
+    def key_for(self, sort: str) -> Tuple[str, str]:
+        """按指定字段排序的键（字段值，相同时按 ID）"""
+        return (getattr(self, sort), self.id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为 API 返回的字典格式"""
+        return {
+            "id": self.id,
+            "title": self.title,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "status": self.status,
+            "thumbnail": self.thumbnail,
+            "page_count": self.page_count,
+            "task_id": self.task_id,
+            "image_count": self.image_count,
+            "disk_bytes": self.disk_bytes
+        }
+
+
+class HistoryIndex:
+    """
+    内存索引
+
+    为每个排序字段（创建时间、更新时间）各维护一份全部条目的有序列表，
+    以及按状态划分的有序列表，均为升序（倒序遍历即为最新在前），插入和删除通过二分查找定位。
+    分页、状态过滤和时间范围都在有序列表上二分定位，代价只与页大小有关。
+    另维护 task_id -> record_id 的反向索引。
+
+    读取不加锁（写入由 HistoryService 的锁串行化）：重建时在局部变量中构造后整体替换；
+    有序列表写时复制，新增、修改、删除都生成新列表再替换，正在分页的 IndexSlice
+    始终读取一份不会再变化的列表。
+    """
+
+    SORT_FIELDS = ("created_at", "updated_at")
+
+    def __init__(self):
+        self._entries: Dict[str, IndexEntry] = {}
+        # (排序字段, 状态) -> 有序条目列表；状态为 None 表示全部记录
+        self._sorted: Dict[Tuple[str, Optional[str]], List[IndexEntry]] = {}
+        self._by_task: Dict[str, str] = {}
+
+    @staticmethod
+    def _sort_key_func(sort: str):
+        return lambda e: e.key_for(sort)
+
+    def _list_keys(self, entry: IndexEntry) -> List[Tuple[str, Optional[str]]]:
+        return [(sort, status) for sort in self.SORT_FIELDS for status in (None, entry.status)]
+
+    def load(self, entries: List[Dict[str, Any]]) -> None:
+        """用存储后端的全部条目重建索引"""
+        by_id: Dict[str, IndexEntry] = {}
+        by_task: Dict[str, str] = {}
+        # 倒序处理：同一 task_id 对应多条记录时保留最新的一条（与逐条查找时的结果一致）
+        for data in reversed(entries):
+            entry = IndexEntry(data)
+            by_id[entry.id] = entry
+            if entry.task_id:
+                by_task[entry.task_id] = entry.id
+
+        sorted_lists: Dict[Tuple[str, Optional[str]], List[IndexEntry]] = {}
+        for entry in by_id.values():
+            for list_key in self._list_keys(entry):
+                sorted_lists.setdefault(list_key, []).append(entry)
+        for (sort, _), ordered in sorted_lists.items():
+            ordered.sort(key=self._sort_key_func(sort))
+
+        # 构造完成后再替换，并发读取看到的总是完整的索引
+        self._entries, self._sorted, self._by_task = by_id, sorted_lists, by_task
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._entries
+
+    def get(self, record_id: str) -> Optional[IndexEntry]:
+        return self._entries.get(record_id)
+
+    def find_by_task(self, task_id: str) -> Optional[str]:
+        """根据 task_id 查找关联的记录 ID"""
+        return self._by_task.get(task_id)
+
+    def task_items(self) -> List[Tuple[str, str]]:
+        """全部 (task_id, record_id) 对"""
+        return list(self._by_task.items())
+
+    def _without(self, list_key: Tuple[str, Optional[str]], entry: IndexEntry) -> List[IndexEntry]:
+        """去掉某个条目后的列表副本"""
+        ordered = self._sorted[list_key]
+        sort = list_key[0]
+        pos = bisect.bisect_left(ordered, entry.key_for(sort), key=self._sort_key_func(sort))
+        while ordered[pos] is not entry:
+            pos += 1
+        return ordered[:pos] + ordered[pos + 1:]
+
+    def upsert(self, data: Dict[str, Any]) -> IndexEntry:
+        """新增或替换一个条目（条目始终可见，不会出现先删后加的间隙）"""
+        old = self._entries.get(data["id"])
+        entry = IndexEntry(data)
+
+        updated: Dict[Tuple[str, Optional[str]], List[IndexEntry]] = {}
+        if old is not None:
+            for list_key in self._list_keys(old):
+                updated[list_key] = self._without(list_key, old)
+        for list_key in self._list_keys(entry):
+            if list_key not in updated:
+                updated[list_key] = list(self._sorted.get(list_key, ()))
+            bisect.insort(updated[list_key], entry, key=self._sort_key_func(list_key[0]))
+
+        self._entries[entry.id] = entry
+        self._sorted.update(updated)
+        if old is not None and old.task_id and self._by_task.get(old.task_id) == old.id:
+            del self._by_task[old.task_id]
+        if entry.task_id:
+            self._by_task[entry.task_id] = entry.id
+        return entry
+
+    def remove(self, record_id: str) -> Optional[IndexEntry]:
+        """移除一个条目"""
+        entry = self._entries.get(record_id)
+        if entry is not None:
+            self._sorted.update({
+                list_key: self._without(list_key, entry) for list_key in self._list_keys(entry)
+            })
+            self._entries.pop(record_id, None)
+            if entry.task_id and self._by_task.get(entry.task_id) == record_id:
+                del self._by_task[entry.task_id]
+        return entry
+
+    def iter_newest(self) -> Iterator[IndexEntry]:
+        """按创建时间倒序遍历"""
+        return reversed(self._sorted.get(("created_at", None), []))
+
+    def select(
+        self,
+        sort: str = "created_at",
+        status: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None
+    ) -> "IndexSlice":
+        """
+        按排序字段、状态和时间范围选出条目（二分定位，不复制列表）
+
+        Args:
+            sort: 排序字段（created_at / updated_at）
+            status: 状态过滤，None 表示全部
+            since: 时间下限（包含），ISO 格式字符串
+            until: 时间上限（不包含），ISO 格式字符串
+
+        Returns:
+            IndexSlice: 选中的有序区间
+        """
+        if sort not in self.SORT_FIELDS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        ordered = self._sorted.get((sort, status), [])
+        key = self._sort_key_func(sort)
+        lo = bisect.bisect_left(ordered, (since, ""), key=key) if since else 0
+        hi = bisect.bisect_left(ordered, (until, ""), key=key) if until else len(ordered)
+        return IndexSlice(ordered, sort, lo, max(lo, hi))
+
+
+class IndexSlice:
+    """有序条目列表上的一段区间 [lo, hi)，按倒序（最新在前）读取"""
+
+    def __init__(self, ordered: List[IndexEntry], sort: str, lo: int, hi: int):
+        self._ordered = ordered
+        self._sort = sort
+        self.lo = lo
+        self.hi = hi
+
+    def __len__(self) -> int:
+        return self.hi - self.lo
+
+    def page(self, offset: int, limit: int) -> List[IndexEntry]:
+        """按偏移量取一页（最新在前）"""
+        end = max(self.hi - offset, self.lo)
+        start = max(end - limit, self.lo)
+        return self._ordered[start:end][::-1]
+
+    def page_before(self, key: Optional[Tuple[str, str]], limit: int) -> Tuple[List[IndexEntry], bool]:
+        """
+        取排序键小于 key 的一页（游标分页，最新在前）
+
+        Args:
+            key: 上一页最后一条的排序键，None 表示第一页
+            limit: 页大小
+
+        Returns:
+            Tuple[List[IndexEntry], bool]: (当前页条目, 是否还有下一页)
+        """
+        end = self.hi
+        if key is not None:
+            pos = bisect.bisect_left(self._ordered, tuple(key), key=lambda e: e.key_for(self._sort))
+            end = max(min(end, pos), self.lo)
+        start = max(end - limit, self.lo)
+        return self._ordered[start:end][::-1], start > self.lo
+
+
+class RecordCache:
+    """
+    完整记录的 LRU 缓存
+
+    存取时都做深拷贝，调用方修改返回值不会污染缓存。读取可能与写入并发，内部加锁。
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._records: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, record_id: str) -> Optional[Dict]:
+        with self._lock:
+            record = self._records.get(record_id)
+            if record is None:
+                return None
+            self._records.move_to_end(record_id)
+        return copy.deepcopy(record)
+
+    def put(self, record: Dict) -> None:
+        record = copy.deepcopy(record)
+        with self._lock:
+            self._records[record["id"]] = record
+            self._records.move_to_end(record["id"])
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    def discard(self, record_id: str) -> None:
+        with self._lock:
+            self._records.pop(record_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
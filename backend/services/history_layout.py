@@ -0,0 +1,263 @@
+"""
+历史记录目录布局（路径解析层）
+
+任务文件夹和 JSON 记录文件按名称哈希前缀分片存放，避免 history 目录下条目过多：
+- 任务文件夹：history/tasks/<md5(task_id)[:2]>/<task_id>/
+- JSON 记录：history/records/<record_id[:2]>/<record_id>.json
+- 归档的任务文件夹：history/archive/<md5(task_id)[:2]>/<task_id>.zip（及同名 .lock 锁文件）
+- 打包下载缓存：history/exports/<md5(task_id)[:2]>/<task_id>.<签名>.zip
+- 图片变体缓存：history/variants/<md5(task_id)[:2]>/<task_id>/
+- 列表封面拼图：history/sheets/<缓存键>.jpg
+
+旧版本直接放在 history/ 下的文件夹和文件仍可读取（分片位置优先），
+新写入一律使用分片位置。migrate() 把旧位置的数据逐个移动到分片位置，
+服务运行期间也可以执行（最近仍在写入的任务文件夹会跳过，之后再迁移）。
+
+命令行迁移：
+    python -m backend.services.history_layout [--dry-run] [--grace 300]
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from typing import Any, Dict, Iterator, Tuple
+
+
+class HistoryLayout:
+    """历史记录目录的路径解析"""
+
+    TASKS_DIRNAME = "tasks"
+    RECORDS_DIRNAME = "records"
+    ARCHIVE_DIRNAME = "archive"
+    EXPORTS_DIRNAME = "exports"
+    VARIANTS_DIRNAME = "variants"
+    SHEETS_DIRNAME = "sheets"
+    # history 根目录下不是任务文件夹的子目录
+    RESERVED_DIRNAMES = (
+        TASKS_DIRNAME, RECORDS_DIRNAME, ARCHIVE_DIRNAME, EXPORTS_DIRNAME, VARIANTS_DIRNAME, SHEETS_DIRNAME
+    )
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tasks_root = os.path.join(root, self.TASKS_DIRNAME)
+        self.records_root = os.path.join(root, self.RECORDS_DIRNAME)
+        self.archive_root = os.path.join(root, self.ARCHIVE_DIRNAME)
+        self.exports_root = os.path.join(root, self.EXPORTS_DIRNAME)
+
+    @staticmethod
+    def _check_name(name: str) -> str:
+        """task_id / record_id 只能是单层名称，防止路径穿越"""
+        if not name or name in (".", "..") or "/" in name or "\\" in name or "\0" in name:
+            raise ValueError(f"非法的名称: {name!r}")
+        return name
+
+    @staticmethod
+    def task_shard(task_id: str) -> str:
+        """任务文件夹的分片名（task_id 前缀大多相同，使用哈希前缀）"""
+        return hashlib.md5(task_id.encode("utf-8")).hexdigest()[:2]
+
+    # ==================== 任务文件夹 ====================
+
+    def sharded_task_dir(self, task_id: str) -> str:
+        self._check_name(task_id)
+        return os.path.join(self.tasks_root, self.task_shard(task_id), task_id)
+
+    def legacy_task_dir(self, task_id: str) -> str:
+        self._check_name(task_id)
+        return os.path.join(self.root, task_id)
+
+    def task_dir(self, task_id: str) -> str:
+        """
+        任务文件夹路径
+
+        已存在的文件夹按分片位置、旧位置的顺序查找；都不存在时返回分片位置（用于新建）。
+        """
+        sharded = self.sharded_task_dir(task_id)
+        if os.path.isdir(sharded):
+            return sharded
+        legacy = self.legacy_task_dir(task_id)
+        if os.path.isdir(legacy):
+            return legacy
+        return sharded
+
+    def ensure_task_dir(self, task_id: str) -> str:
+        """获取任务文件夹路径，不存在时在分片位置创建"""
+        task_dir = self.task_dir(task_id)
+        os.makedirs(task_dir, exist_ok=True)
+        return task_dir
+
+    def iter_task_dirs(self) -> Iterator[Tuple[str, os.DirEntry]]:
+        """遍历所有任务文件夹（分片位置和旧位置），返回 (task_id, DirEntry)"""
+        if os.path.isdir(self.tasks_root):
+            with os.scandir(self.tasks_root) as shards:
+                shard_paths = [entry.path for entry in shards if entry.is_dir()]
+            for shard_path in shard_paths:
+                with os.scandir(shard_path) as it:
+                    for entry in it:
+                        if entry.is_dir():
+                            yield entry.name, entry
+
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_dir() and entry.name not in self.RESERVED_DIRNAMES:
+                    yield entry.name, entry
+
+    def archive_path(self, task_id: str) -> str:
+        """任务文件夹归档文件路径"""
+        self._check_name(task_id)
+        return os.path.join(self.archive_root, self.task_shard(task_id), f"{task_id}.zip")
+
+    def archive_lock_path(self, task_id: str) -> str:
+        """任务归档、恢复和清理共用的锁文件路径（与归档文件放在同一分片目录）"""
+        self._check_name(task_id)
+        return os.path.join(self.archive_root, self.task_shard(task_id), f"{task_id}.lock")
+
+    def iter_archives(self) -> Iterator[Tuple[str, str]]:
+        """遍历所有归档文件，返回 (task_id, 路径)"""
+        if not os.path.isdir(self.archive_root):
+            return
+        for shard in os.listdir(self.archive_root):
+            shard_path = os.path.join(self.archive_root, shard)
+            if not os.path.isdir(shard_path):
+                continue
+            for name in os.listdir(shard_path):
+                if name.endswith(".zip"):
+                    yield name[:-len(".zip")], os.path.join(shard_path, name)
+
+    # ==================== JSON 记录文件 ====================
+
+    def sharded_record_path(self, record_id: str) -> str:
+        self._check_name(record_id)
+        return os.path.join(self.records_root, record_id[:2], f"{record_id}.json")
+
+    def legacy_record_path(self, record_id: str) -> str:
+        self._check_name(record_id)
+        return os.path.join(self.root, f"{record_id}.json")
+
+    def record_path(self, record_id: str) -> str:
+        """JSON 记录文件路径（查找规则同 task_dir）"""
+        sharded = self.sharded_record_path(record_id)
+        if os.path.exists(sharded):
+            return sharded
+        legacy = self.legacy_record_path(record_id)
+        if os.path.exists(legacy):
+            return legacy
+        return sharded
+
+    def iter_record_paths(self) -> Iterator[str]:
+        """遍历所有 JSON 记录文件（分片位置和旧位置）"""
+        if os.path.isdir(self.records_root):
+            for shard in sorted(os.listdir(self.records_root)):
+                shard_path = os.path.join(self.records_root, shard)
+                if os.path.isdir(shard_path):
+                    for name in sorted(os.listdir(shard_path)):
+                        if name.endswith(".json"):
+                            yield os.path.join(shard_path, name)
+
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(".json") and name != "index.json" and not name.startswith("."):
+                yield os.path.join(self.root, name)
+
+    # ==================== 迁移 ====================
+
+    def migrate(self, grace_seconds: float = 300, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        把旧位置的任务文件夹和 JSON 记录移动到分片位置
+
+        每个文件夹/文件通过一次 rename 移动（同一文件系统内是原子操作），
+        读取方在任意时刻都能在两个位置之一找到数据。
+
+        Args:
+            grace_seconds: 最近这么多秒内有修改的任务文件夹视为仍在生成，本次跳过
+            dry_run: 只统计不移动
+
+        Returns:
+            Dict[str, Any]: 迁移统计
+                - moved_tasks: 移动的任务文件夹数
+                - skipped_tasks: 因最近有写入而跳过的任务文件夹
+                - moved_records: 移动的 JSON 记录数
+                - failed: 失败的条目及原因
+        """
+        result = {"moved_tasks": 0, "skipped_tasks": [], "moved_records": 0, "failed": []}
+        now = time.time()
+
+        with os.scandir(self.root) as it:
+            legacy_dirs = [
+                entry for entry in it
+                if entry.is_dir() and entry.name not in self.RESERVED_DIRNAMES
+            ]
+
+        for entry in legacy_dirs:
+            task_id = entry.name
+            try:
+                if now - self.latest_mtime(entry.path) < grace_seconds:
+                    result["skipped_tasks"].append(task_id)
+                    continue
+                target = self.sharded_task_dir(task_id)
+                if os.path.exists(target):
+                    result["failed"].append({"name": task_id, "error": "分片位置已存在同名文件夹"})
+                    continue
+                if not dry_run:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.rename(entry.path, target)
+                result["moved_tasks"] += 1
+            except Exception as e:
+                result["failed"].append({"name": task_id, "error": str(e)})
+
+        for name in os.listdir(self.root):
+            if not name.endswith(".json") or name == "index.json" or name.startswith("."):
+                continue
+            record_id = name[:-len(".json")]
+            try:
+                source = os.path.join(self.root, name)
+                target = self.sharded_record_path(record_id)
+                if not dry_run:
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.exists(target):
+                        # 分片位置已有（迁移期间被重新写入过），旧文件已过期
+                        os.remove(source)
+                    else:
+                        os.rename(source, target)
+                result["moved_records"] += 1
+            except Exception as e:
+                result["failed"].append({"name": name, "error": str(e)})
+
+        return result
+
+    @staticmethod
+    def latest_mtime(path: str) -> float:
+        """文件夹及其中文件的最近修改时间"""
+        latest = os.stat(path).st_mtime
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    latest = max(latest, entry.stat().st_mtime)
+                except OSError:
+                    continue
+        return latest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="把 history 目录迁移到分片布局（服务运行期间也可执行）")
+    parser.add_argument("--dry-run", action="store_true", help="只统计不移动")
+    parser.add_argument("--grace", type=float, default=300, help="跳过最近 N 秒内有写入的任务文件夹（默认 300）")
+    parser.add_argument("--history-dir", default=None, help="history 目录（默认项目根目录下的 history）")
+    args = parser.parse_args()
+
+    history_dir = args.history_dir or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "history"
+    )
+    result = HistoryLayout(history_dir).migrate(grace_seconds=args.grace, dry_run=args.dry_run)
+
+    print(f"移动任务文件夹: {result['moved_tasks']}")
+    print(f"移动 JSON 记录: {result['moved_records']}")
+    if result["skipped_tasks"]:
+        print(f"最近有写入而跳过: {len(result['skipped_tasks'])}（稍后重新执行即可）")
+    for item in result["failed"]:
+        print(f"失败: {item['name']} - {item['error']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+历史记录保留策略
+
+控制任务文件夹占用的磁盘空间：
+- 归档：长时间未访问的任务文件夹压缩为 history/archive/<分片>/<task_id>.zip 并删除原文件夹，
+  记录保留，访问图片、下载或重新生成时自动解压恢复
+- 配额：未归档任务文件夹的总大小超过配额时，按最近访问时间从旧到新归档，直到低于配额
+- 孤立文件清理：没有任何记录关联、且超过宽限期未修改的任务文件夹和归档直接删除
+
+生成中的记录、最近仍有写入的任务文件夹不会被归档。
+最近访问时间保存在共享状态中（各工作进程的访问都会计入），没有访问记录时以记录的 updated_at 为准。
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.shared_state import SharedState
+from backend.utils.process_lock import file_lock
+
+logger = logging.getLogger(__name__)
+
+# 恢复中的临时文件夹后缀（与任务文件夹在同一分片目录）
+RESTORING_SUFFIX = ".restoring"
+
+
+class _SizeCounter:
+    """只统计写入字节数的文件对象（估算归档大小，不落盘）"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.size += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self) -> None:
+        pass
+
+
+class TaskArchiver:
+    """
+    任务文件夹的归档和恢复
+
+    同一任务的归档、恢复和孤立文件清理通过锁文件互斥，多个工作进程同时访问同一个已归档任务时
+    只有一个执行恢复，其余等待后直接使用恢复好的文件夹。
+    """
+
+    def __init__(self, layout: HistoryLayout):
+        self.layout = layout
+
+    def lock(self, task_id: str):
+        """任务的跨进程互斥锁（上下文管理器）"""
+        return file_lock(self.layout.archive_lock_path(task_id))
+
+    def is_archived(self, task_id: str) -> bool:
+        return os.path.exists(self.layout.archive_path(task_id))
+
+    def archive(self, task_id: str) -> Optional[int]:
+        """
+        把任务文件夹压缩为归档文件并删除原文件夹
+
+        Returns:
+            Optional[int]: 归档文件大小（字节），任务文件夹不存在时返回 None
+        """
+        with self.lock(task_id):
+            task_dir = self.layout.task_dir(task_id)
+            if not os.path.isdir(task_dir):
+                return None
+
+            archive_path = self.layout.archive_path(task_id)
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            tmp_path = f"{archive_path}.tmp"
+            self._write_archive(task_dir, tmp_path)
+            os.replace(tmp_path, archive_path)
+            shutil.rmtree(task_dir)
+            return os.path.getsize(archive_path)
+
+    def estimate_size(self, task_id: str) -> Optional[int]:
+        """
+        按归档时相同的方式压缩任务文件夹，只统计大小（预演时使用）
+
+        Returns:
+            Optional[int]: 归档文件大小（字节），任务文件夹不存在时返回 None
+        """
+        task_dir = self.layout.task_dir(task_id)
+        if not os.path.isdir(task_dir):
+            return None
+        counter = _SizeCounter()
+        self._write_archive(task_dir, counter)
+        return counter.size
+
+    @staticmethod
+    def _write_archive(task_dir: str, target) -> None:
+        with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as zf:
+            with os.scandir(task_dir) as it:
+                for entry in it:
+                    if entry.is_file():
+                        zf.write(entry.path, entry.name)
+
+    def restore(self, task_id: str) -> bool:
+        """
+        把归档文件解压回任务文件夹（分片位置）并删除归档
+
+        先解压到唯一的临时文件夹再整体重命名，读取方不会看到只解压了一半的文件夹。
+
+        Returns:
+            bool: 是否执行了恢复（任务文件夹已存在或没有归档时返回 False）
+        """
+        with self.lock(task_id):
+            archive_path = self.layout.archive_path(task_id)
+            if os.path.isdir(self.layout.task_dir(task_id)) or not os.path.exists(archive_path):
+                return False
+
+            task_dir = self.layout.sharded_task_dir(task_id)
+            os.makedirs(os.path.dirname(task_dir), exist_ok=True)
+            tmp_dir = tempfile.mkdtemp(prefix=f"{task_id}.", suffix=RESTORING_SUFFIX, dir=os.path.dirname(task_dir))
+            try:
+                os.chmod(tmp_dir, 0o755)
+                with zipfile.ZipFile(archive_path) as zf:
+                    for name in zf.namelist():
+                        # 归档内只有平铺的文件，拒绝带路径的条目
+                        if name != os.path.basename(name) or name in ("", ".", ".."):
+                            raise ValueError(f"归档中包含非法的文件名: {name!r}")
+                        with zf.open(name) as src, open(os.path.join(tmp_dir, name), "wb") as dst:
+                            shutil.copyfileobj(src, dst)
+                try:
+                    os.rename(tmp_dir, task_dir)
+                except OSError:
+                    if not os.path.isdir(task_dir):
+                        raise
+                    # 目标文件夹已经存在（已被恢复），结果相同
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+            except Exception:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                raise
+            try:
+                os.remove(archive_path)
+            except FileNotFoundError:
+                pass
+            return True
+
+
+class HistoryRetention:
+    """
+    保留策略执行器
+
+    run() 执行一轮归档和孤立文件清理；start() 启动后台线程定期执行。
+    """
+
+    # 最近这么多秒内有写入的任务文件夹视为仍在使用，不归档
+    ACTIVE_GRACE_SECONDS = 600
+    # 同一任务的访问时间最多每隔这么多秒写入一次共享状态
+    TOUCH_INTERVAL = 60
+    # 共享状态中保存最近访问时间的命名空间
+    ACCESS_NAMESPACE = "task_access"
+
+    def __init__(
+        self,
+        history_service,
+        shared: SharedState,
+        quota_bytes: int = 0,
+        archive_after_seconds: float = 0,
+        orphan_grace_seconds: float = 24 * 3600
+    ):
+        self.history_service = history_service
+        self.layout: HistoryLayout = history_service.layout
+        self.archiver = TaskArchiver(self.layout)
+        self.shared = shared
+        self.quota_bytes = quota_bytes
+        self.archive_after_seconds = archive_after_seconds
+        self.orphan_grace_seconds = orphan_grace_seconds
+
+        # 本进程最近一次写入各任务访问时间的时刻
+        self._touched: Dict[str, float] = {}
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, task_id: str) -> None:
+        """登记任务最近被访问（读取图片、下载、重新生成）"""
+        now = time.time()
+        if now - self._touched.get(task_id, 0.0) < self.TOUCH_INTERVAL:
+            return
+        self._touched[task_id] = now
+        # 超过保留天数后访问记录已无意义，随之过期
+        self.shared.set(self.ACCESS_NAMESPACE, task_id, now, ttl=self.archive_after_seconds or None)
+
+    def _forget(self, task_id: str) -> None:
+        self._touched.pop(task_id, None)
+        self.shared.delete(self.ACCESS_NAMESPACE, task_id)
+
+    def _last_used(self, task_id: str, updated_at: str) -> float:
+        """任务最近一次使用的时间：各进程登记的访问时间和记录更新时间中较晚的一个"""
+        try:
+            updated = datetime.fromisoformat(updated_at).timestamp()
+        except (TypeError, ValueError):
+            updated = 0.0
+        return max(self.shared.get(self.ACCESS_NAMESPACE, task_id, 0.0), updated)
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        执行一轮保留策略
+
+        任务文件夹的占用空间在本轮中实际统计（记录中的值可能尚未更新），与记录不一致时写回。
+
+        Args:
+            dry_run: 只统计将要归档和删除的内容（释放空间按压缩后的大小估算），不实际执行
+
+        Returns:
+            Dict[str, Any]: 执行结果
+                - archived: 归档的任务 ID 列表
+                - freed_bytes: 归档释放的空间（原文件夹大小减去归档大小）
+                - live_bytes: 执行后未归档任务文件夹的总大小
+                - removed_orphans: 删除的孤立任务文件夹/归档的任务 ID 列表
+                - failed: 失败的任务及原因
+        """
+        with self._run_lock:
+            return self._run(dry_run)
+
+    def _run(self, dry_run: bool) -> Dict[str, Any]:
+        service = self.history_service
+        service.flush_pending_updates()
+        records = service.task_entries()
+
+        now = time.time()
+        result = {"archived": [], "freed_bytes": 0, "live_bytes": 0, "removed_orphans": [], "failed": []}
+
+        # 按是否有关联记录划分现有任务文件夹
+        candidates = []
+        for task_id, entry in list(self.layout.iter_task_dirs()):
+            if task_id.endswith(RESTORING_SUFFIX):
+                # 恢复中途进程退出留下的临时文件夹
+                if now - HistoryLayout.latest_mtime(entry.path) >= self.orphan_grace_seconds and not dry_run:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            record = records.get(task_id)
+            if record is None:
+                if now - HistoryLayout.latest_mtime(entry.path) >= self.orphan_grace_seconds:
+                    self._remove_orphan(task_id, entry.path, dry_run, result)
+                continue
+            disk_bytes = service.task_disk_bytes(entry.path)
+            result["live_bytes"] += disk_bytes
+            if record.status == "generating":
+                continue
+            if disk_bytes != record.disk_bytes and not dry_run:
+                service.set_disk_bytes(record.id, disk_bytes)
+            if now - HistoryLayout.latest_mtime(entry.path) < self.ACTIVE_GRACE_SECONDS:
+                continue
+            candidates.append((self._last_used(task_id, record.updated_at), task_id, record, disk_bytes))
+
+        for task_id, archive_path in list(self.layout.iter_archives()):
+            if task_id not in records:
+                if now - os.path.getmtime(archive_path) >= self.orphan_grace_seconds:
+                    self._remove_orphan(task_id, archive_path, dry_run, result)
+
+        # 从最久未使用的开始：超过保留天数的一律归档，之后继续归档直到低于配额
+        candidates.sort(key=lambda item: item[0])
+        for last_used, task_id, record, disk_bytes in candidates:
+            expired = self.archive_after_seconds > 0 and now - last_used >= self.archive_after_seconds
+            over_quota = self.quota_bytes > 0 and result["live_bytes"] > self.quota_bytes
+            if not expired and not over_quota:
+                continue
+            if self._last_used(task_id, record.updated_at) > last_used:
+                # 排序之后刚被访问过
+                continue
+
+            try:
+                if dry_run:
+                    archive_bytes = self.archiver.estimate_size(task_id)
+                else:
+                    archive_bytes = self.archiver.archive(task_id)
+                if archive_bytes is None:
+                    continue
+                if not dry_run:
+                    service.mark_archived(record.id, archive_bytes)
+                    service.invalidate_task_caches(task_id)
+            except Exception as e:
+                logger.warning(f"归档任务失败: task_id={task_id}, {e}")
+                result["failed"].append({"task_id": task_id, "error": str(e)})
+                continue
+
+            result["archived"].append(task_id)
+            result["live_bytes"] -= disk_bytes
+            result["freed_bytes"] += max(disk_bytes - archive_bytes, 0)
+            if not dry_run:
+                self._forget(task_id)
+
+        return result
+
+    def _remove_orphan(self, task_id: str, path: str, dry_run: bool, result: Dict[str, Any]) -> None:
+        """删除没有关联记录的任务文件夹或归档"""
+        try:
+            if not dry_run:
+                with self.archiver.lock(task_id):
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    elif os.path.exists(path):
+                        os.remove(path)
+            result["removed_orphans"].append(task_id)
+        except Exception as e:
+            logger.warning(f"清理孤立任务失败: task_id={task_id}, {e}")
+            result["failed"].append({"task_id": task_id, "error": str(e)})
+
+    # ==================== 后台线程 ====================
+
+    def start(self, interval: float) -> None:
+        """启动后台线程，每隔 interval 秒执行一轮（启动后先等待一个间隔）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval,), name="history-retention", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"历史记录保留策略已启动: 间隔 {interval}s")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _loop(self, interval: float) -> None:
+        while not self._stop_event.wait(interval):
+            try:
+                result = self.run()
+                if result["archived"] or result["removed_orphans"]:
+                    logger.info(
+                        f"保留策略: 归档 {len(result['archived'])} 个任务，"
+                        f"释放 {result['freed_bytes']} 字节，清理孤立任务 {len(result['removed_orphans'])} 个"
+                    )
+            except Exception as e:
+                logger.error(f"执行保留策略异常: {e}")
@@ -0,0 +1,138 @@
+"""
+历史记录全文检索
+
+对标题和大纲每页内容建立倒排索引：
+- 中文（CJK）连续字符切分为二元组（bigram），同时保留单字，支持单字查询
+- 英文、数字按单词切分，统一小写
+
+查询时所有查询词都必须命中（AND），按 TF-IDF 打分排序，标题中的词权重更高。
+SQLite 后端把倒排表保存在同一个数据库中并在写事务内同步更新；
+JSON 后端使用本模块的内存倒排索引（首次搜索时构建）。
+"""
+
+import math
+import re
+from typing import Dict, List, Tuple
+
+# 标题中的词相对正文的权重
+TITLE_WEIGHT = 3.0
+
+_CJK_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_TOKEN_RUN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    """
+    切分文本
+
+    Args:
+        text: 文本
+        for_query: 查询模式。中文长度不少于 2 时只使用二元组，单个汉字才使用单字
+
+    Returns:
+        List[str]: 词列表（可能有重复）
+    """
+    tokens = []
+    for run in _TOKEN_RUN.findall((text or "").lower()):
+        if not _CJK_RUN.fullmatch(run):
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if not for_query:
+            tokens.extend(run)
+    return tokens
+
+
+def query_terms(keyword: str) -> List[str]:
+    """把搜索关键词切分为去重后的查询词"""
+    return list(dict.fromkeys(tokenize(keyword, for_query=True)))
+
+
+def build_search_terms(record: Dict) -> Dict[str, float]:
+    """
+    计算一条记录的索引词及权重（词频，标题中的词乘以 TITLE_WEIGHT）
+
+    Args:
+        record: 完整记录
+
+    Returns:
+        Dict[str, float]: 词 -> 权重
+    """
+    terms: Dict[str, float] = {}
+    for token in tokenize(record.get("title", "")):
+        terms[token] = terms.get(token, 0.0) + TITLE_WEIGHT
+
+    outline = record.get("outline") or {}
+    for page in outline.get("pages", []) or []:
+        content = page.get("content", "") if isinstance(page, dict) else ""
+        for token in tokenize(content):
+            terms[token] = terms.get(token, 0.0) + 1.0
+    return terms
+
+
+def idf(total_docs: int, doc_freq: int) -> float:
+    """逆文档频率"""
+    return math.log(1.0 + total_docs / max(doc_freq, 1))
+
+
+class InvertedIndex:
+    """内存倒排索引（词 -> {记录 ID: 权重}）"""
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # 记录 ID -> (索引词, 创建时间)，创建时间用于同分时排序
+        self._docs: Dict[str, Tuple[Tuple[str, ...], str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, record: Dict) -> None:
+        """新增或替换一条记录"""
+        record_id = record["id"]
+        self.remove(record_id)
+        terms = build_search_terms(record)
+        for term, weight in terms.items():
+            self._postings.setdefault(term, {})[record_id] = weight
+        self._docs[record_id] = (tuple(terms), record.get("created_at", ""))
+
+    def remove(self, record_id: str) -> None:
+        """移除一条记录"""
+        terms, _ = self._docs.pop(record_id, ((), ""))
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(record_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, terms: List[str]) -> List[Tuple[str, float]]:
+        """
+        查询（所有词都必须命中）
+
+        Returns:
+            List[Tuple[str, float]]: (记录 ID, 得分)，按得分降序，同分时新记录在前
+        """
+        postings = [self._postings.get(term) for term in terms]
+        if not terms or not all(postings):
+            return []
+
+        # 从最短的倒排表开始求交集
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            candidates.intersection_update(p)
+            if not candidates:
+                return []
+
+        total = len(self._docs)
+        weights = [(p, idf(total, len(p))) for p in postings]
+        hits = [
+            (record_id, sum(p[record_id] * w for p, w in weights))
+            for record_id in candidates
+        ]
+        hits.sort(key=lambda hit: self._docs[hit[0]][1], reverse=True)
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits
@@ -0,0 +1,140 @@
+"""
+历史记录列表封面拼图（contact sheet）
+
+把一页记录的缩略图按网格拼成一张 JPEG，同时给出每条记录在拼图中的坐标，
+前端用 CSS 背景定位显示各卡片封面：一页网格只需一次图片请求。
+
+拼图按 (索引版本, 分页参数) 缓存在 history/sheets/ 下，记录有任何变化时索引版本随之变化，
+旧拼图不再被引用，超过 MAX_SHEETS 个后按修改时间删除最旧的。
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_store import write_json_atomic
+
+# 单个封面的尺寸（与前端卡片 3:4 的比例一致）
+TILE_WIDTH = 240
+TILE_HEIGHT = 320
+# 每行封面数
+COLUMNS = 6
+# 最多保留的拼图数
+MAX_SHEETS = 64
+JPEG_QUALITY = 80
+
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{20}$")
+
+
+def sheet_key(index_version, *params) -> str:
+    """拼图缓存键：索引版本 + 分页参数"""
+    raw = "|".join(str(p) for p in (index_version, *params))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+class ContactSheetCache:
+    """拼图的磁盘缓存"""
+
+    def __init__(self, layout: HistoryLayout):
+        self.root = os.path.join(layout.root, layout.SHEETS_DIRNAME)
+        self._lock = threading.Lock()
+
+    def image_path(self, key: str) -> str:
+        """拼图文件路径（key 非法时抛出 ValueError）"""
+        if not _KEY_PATTERN.match(key):
+            raise ValueError(f"非法的拼图标识: {key!r}")
+        return os.path.join(self.root, f"{key}.jpg")
+
+    def get_or_build(self, key: str, tiles: List[Tuple[str, str]]) -> Optional[Dict]:
+        """
+        获取拼图坐标表，没有缓存时生成拼图
+
+        Args:
+            key: sheet_key 计算的缓存键
+            tiles: (记录 ID, 缩略图路径) 列表，按显示顺序
+
+        Returns:
+            Optional[Dict]: 坐标表，没有可用的缩略图时返回 None
+                - key: 拼图标识
+                - width/height: 拼图尺寸
+                - tile_width/tile_height: 单个封面尺寸
+                - tiles: 记录 ID -> {x, y}
+        """
+        image_path = self.image_path(key)
+        map_path = image_path[:-len(".jpg")] + ".json"
+        if os.path.exists(image_path) and os.path.exists(map_path):
+            try:
+                with open(map_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+
+        sheet_map = self._build(key, tiles, image_path)
+        if sheet_map is not None:
+            write_json_atomic(map_path, sheet_map, indent=None)
+            self._prune()
+        return sheet_map
+
+    @staticmethod
+    def _build(key: str, tiles: List[Tuple[str, str]], image_path: str) -> Optional[Dict]:
+        images = []
+        for record_id, path in tiles:
+            try:
+                with Image.open(path) as img:
+                    img.draft("RGB", (TILE_WIDTH * 2, TILE_HEIGHT * 2))
+                    images.append((record_id, ImageOps.fit(img.convert("RGB"), (TILE_WIDTH, TILE_HEIGHT), Image.LANCZOS)))
+            except (OSError, ValueError):
+                # 缩略图缺失或损坏时该卡片回退为单独请求
+                continue
+        if not images:
+            return None
+
+        columns = min(COLUMNS, len(images))
+        rows = (len(images) + columns - 1) // columns
+        sheet = Image.new("RGB", (columns * TILE_WIDTH, rows * TILE_HEIGHT), (247, 247, 247))
+        positions = {}
+        for i, (record_id, tile) in enumerate(images):
+            x, y = (i % columns) * TILE_WIDTH, (i // columns) * TILE_HEIGHT
+            sheet.paste(tile, (x, y))
+            positions[record_id] = {"x": x, "y": y}
+
+        os.makedirs(os.path.dirname(image_path), exist_ok=True)
+        tmp_path = f"{image_path}.{uuid.uuid4().hex[:8]}.tmp"
+        sheet.save(tmp_path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        os.replace(tmp_path, image_path)
+
+        return {
+            "key": key,
+            "width": sheet.width,
+            "height": sheet.height,
+            "tile_width": TILE_WIDTH,
+            "tile_height": TILE_HEIGHT,
+            "tiles": positions
+        }
+
+    def _prune(self) -> None:
+        """只保留最近生成的 MAX_SHEETS 个拼图"""
+        with self._lock:
+            try:
+                names = [n for n in os.listdir(self.root) if n.endswith(".jpg")]
+            except OSError:
+                return
+            if len(names) <= MAX_SHEETS:
+                return
+            paths = sorted(
+                (os.path.join(self.root, n) for n in names),
+                key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0
+            )
+            for path in paths[:-MAX_SHEETS]:
+                for stale in (path, path[:-len(".jpg")] + ".json"):
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
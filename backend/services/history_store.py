@@ -0,0 +1,799 @@
+"""
+历史记录存储后端
+
+HistoryService 通过 HistoryStore 接口读写记录，具体存储方式可替换：
+- JsonHistoryStore：index.json + 每条记录一个 JSON 文件（原有格式）
+- SqliteHistoryStore：单个 SQLite 数据库（WAL 模式），状态、更新时间、
+  task_id、标题等列建有索引，更新在事务内完成；全文检索的倒排表保存在同一数据库中
+
+通过 Config.HISTORY_BACKEND 选择后端，默认 sqlite。
+首次使用 SQLite 后端时会一次性导入已有的 JSON 记录（原文件保留不动）。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_search import InvertedIndex, build_search_terms, idf
+
+logger = logging.getLogger(__name__)
+
+
+def build_index_entry(record: Dict) -> Dict:
+    """
+    从完整记录生成索引条目（列表展示用的摘要字段）
+
+    Args:
+        record: 完整记录
+
+    Returns:
+        Dict: 索引条目
+    """
+    outline = record.get("outline") or {}
+    images = record.get("images") or {}
+    return {
+        "id": record["id"],
+        "title": record.get("title", ""),
+        "created_at": record.get("created_at", ""),
+        "updated_at": record.get("updated_at", ""),
+        "status": record.get("status", "draft"),
+        "thumbnail": record.get("thumbnail"),
+        "page_count": len(outline.get("pages", [])),  # 预期页数
+        "task_id": images.get("task_id"),
+        "image_count": len(images.get("generated") or []),  # 已生成图片数
+        "disk_bytes": record.get("disk_bytes") or 0  # 任务文件夹占用空间（保存图片、扫描时更新）
+    }
+
+
+STAT_FIELDS = ("records", "images", "disk_bytes")
+
+
+def compute_stats(entries: List[Dict]) -> Dict[str, Dict[str, int]]:
+    """
+    从索引条目全量计算统计（对账和 JSON 后端使用）
+
+    Returns:
+        Dict[str, Dict[str, int]]: 状态 -> {records, images, disk_bytes}
+    """
+    stats: Dict[str, Dict[str, int]] = {}
+    for entry in entries:
+        bucket = stats.setdefault(entry.get("status") or "draft", dict.fromkeys(STAT_FIELDS, 0))
+        bucket["records"] += 1
+        bucket["images"] += entry.get("image_count") or 0
+        bucket["disk_bytes"] += entry.get("disk_bytes") or 0
+    return stats
+
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = 2) -> None:
+    """
+    原子写入 JSON 文件：先写同目录下的临时文件，再重命名覆盖
+
+    读取方不会看到写了一半的文件，写入中途崩溃也不会破坏原文件。
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class HistoryStore(ABC):
+    """历史记录存储后端接口"""
+
+    @abstractmethod
+    def load_entries(self) -> List[Dict]:
+        """
+        读取全部索引条目
+
+        Returns:
+            List[Dict]: 索引条目列表（按创建时间倒序）
+        """
+
+    @abstractmethod
+    def change_token(self) -> Any:
+        """
+        获取变更标记（代价很低的检查）
+
+        标记变化说明存储内容被修改过（可能来自其他进程），内存缓存需要重载。
+        """
+
+    @abstractmethod
+    def get(self, record_id: str) -> Optional[Dict]:
+        """读取完整记录，不存在时返回 None"""
+
+    @abstractmethod
+    def exists(self, record_id: str) -> bool:
+        """检查记录是否存在"""
+
+    @abstractmethod
+    def insert(self, record: Dict) -> None:
+        """写入新记录"""
+
+    @abstractmethod
+    def update(self, record_id: str, mutate: Callable[[Dict], None]) -> Optional[Dict]:
+        """
+        读取-修改-写回一条记录（原子操作，并发更新不会互相覆盖）
+
+        Args:
+            record_id: 记录 ID
+            mutate: 就地修改记录的函数
+
+        Returns:
+            Optional[Dict]: 修改后的记录，记录不存在时返回 None
+        """
+
+    @abstractmethod
+    def delete(self, record_id: str) -> Optional[Dict]:
+        """
+        删除记录
+
+        Returns:
+            Optional[Dict]: 被删除的记录，记录不存在时返回 None
+        """
+
+    @abstractmethod
+    def search(self, terms: List[str], limit: int, offset: int = 0) -> Tuple[List[str], int]:
+        """
+        全文检索（所有查询词都必须命中）
+
+        Args:
+            terms: 查询词（history_search.query_terms 的结果）
+            limit: 返回条数
+            offset: 跳过条数
+
+        Returns:
+            Tuple[List[str], int]: (按相关度排序的记录 ID, 命中总数)
+        """
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        读取按状态分组的统计（随写操作增量维护，读取代价与记录数无关）
+
+        Returns:
+            Dict[str, Dict[str, int]]: 状态 -> {records, images, disk_bytes}
+        """
+
+    @abstractmethod
+    def rebuild_stats(self) -> Dict[str, Dict[str, int]]:
+        """从全部记录重新计算统计并保存（对账），返回新的统计"""
+
+    @property
+    def last_write_token(self) -> Any:
+        """本进程最近一次写入后的变更标记（调用方据此判断之后是否有外部修改）"""
+        return self._last_write_token
+
+    def close(self) -> None:
+        """释放资源"""
+
+
+class JsonHistoryStore(HistoryStore):
+    """
+    JSON 文件存储（原有格式）
+
+    index.json 保存所有记录的摘要，每条记录的完整数据保存在 <record_id>.json
+    （按 HistoryLayout 分片存放，兼容读取旧版平铺的文件）。
+    进程内的写操作通过锁串行化，避免并发更新丢失；文件通过临时文件 + 重命名原子替换。
+    """
+
+    def __init__(self, history_dir: str, layout: Optional[HistoryLayout] = None):
+        self.history_dir = history_dir
+        self.layout = layout or HistoryLayout(history_dir)
+        self.index_file = os.path.join(history_dir, "index.json")
+        self._lock = threading.RLock()
+        self._init_index()
+        self._last_write_token = self.change_token()
+
+        # 全文检索的内存倒排索引：首次搜索时构建，之后随写操作增量更新
+        self._search_index: Optional[InvertedIndex] = None
+        self._search_token = None
+
+    def _init_index(self) -> None:
+        """如果索引文件不存在，则创建一个空索引"""
+        if not os.path.exists(self.index_file):
+            write_json_atomic(self.index_file, {"records": []})
+
+    def _load_index(self) -> Dict:
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {"records": []}
+
+    def _save_index(self, index: Dict) -> None:
+        # 统计随索引一起保存（JSON 后端每次写入本来就要重写整个索引）
+        index["stats"] = compute_stats(index.get("records", []))
+        write_json_atomic(self.index_file, index)
+        self._last_write_token = self.change_token()
+
+    def _get_record_path(self, record_id: str) -> str:
+        return self.layout.record_path(record_id)
+
+    def _write_record(self, record: Dict) -> None:
+        # 一律写入分片位置，旧位置的文件随之删除
+        path = self.layout.sharded_record_path(record["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_json_atomic(path, record)
+        legacy_path = self.layout.legacy_record_path(record["id"])
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+    def _update_search_index(self, token_before, record: Optional[Dict] = None,
+                             removed_id: Optional[str] = None) -> None:
+        """写入后增量更新倒排索引；写入前已有外部修改时丢弃索引，下次搜索重建"""
+        if self._search_index is None:
+            return
+        if self._search_token != token_before:
+            self._search_index = None
+            return
+        if record is not None:
+            self._search_index.add(record)
+        if removed_id is not None:
+            self._search_index.remove(removed_id)
+        self._search_token = self._last_write_token
+
+    def load_entries(self) -> List[Dict]:
+        return self._load_index().get("records", [])
+
+    def change_token(self):
+        # 索引文件的修改时间和大小
+        try:
+            stat = os.stat(self.index_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def get(self, record_id):
+        record_path = self._get_record_path(record_id)
+        if not os.path.exists(record_path):
+            return None
+        try:
+            with open(record_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def exists(self, record_id):
+        return os.path.exists(self._get_record_path(record_id))
+
+    def insert(self, record):
+        with self._lock:
+            token_before = self.change_token()
+            self._write_record(record)
+            index = self._load_index()
+            index["records"].insert(0, build_index_entry(record))
+            self._save_index(index)
+            self._update_search_index(token_before, record=record)
+
+    def update(self, record_id, mutate):
+        with self._lock:
+            record = self.get(record_id)
+            if not record:
+                return None
+            token_before = self.change_token()
+            mutate(record)
+            self._write_record(record)
+
+            entry = build_index_entry(record)
+            index = self._load_index()
+            for i, idx_record in enumerate(index["records"]):
+                if idx_record["id"] == record_id:
+                    index["records"][i] = entry
+                    break
+            self._save_index(index)
+            self._update_search_index(token_before, record=record)
+            return record
+
+    def delete(self, record_id):
+        with self._lock:
+            record = self.get(record_id)
+            if not record:
+                return None
+            token_before = self.change_token()
+            try:
+                os.remove(self._get_record_path(record_id))
+            except Exception:
+                return None
+
+            index = self._load_index()
+            index["records"] = [r for r in index["records"] if r["id"] != record_id]
+            self._save_index(index)
+            self._update_search_index(token_before, removed_id=record_id)
+            return record
+
+    def get_stats(self):
+        index = self._load_index()
+        if "stats" in index:
+            return index["stats"]
+        return compute_stats(index.get("records", []))
+
+    def rebuild_stats(self):
+        with self._lock:
+            index = self._load_index()
+            index["records"] = [
+                build_index_entry(record) if record else entry
+                for entry, record in ((e, self.get(e["id"])) for e in index.get("records", []))
+            ]
+            self._save_index(index)
+            return index["stats"]
+
+    def search(self, terms, limit, offset=0):
+        with self._lock:
+            token = self.change_token()
+            if self._search_index is None or self._search_token != token:
+                search_index = InvertedIndex()
+                for entry in self.load_entries():
+                    record = self.get(entry["id"])
+                    if record:
+                        search_index.add(record)
+                self._search_index = search_index
+                self._search_token = token
+            hits = self._search_index.search(terms)
+        return [record_id for record_id, _ in hits[offset:offset + limit]], len(hits)
+
+
+class SqliteHistoryStore(HistoryStore):
+    """
+    SQLite 存储（WAL 模式）
+
+    records 表中摘要字段为独立列并建有索引，完整记录以 JSON 保存在 data 列。
+    每个线程使用独立连接；写操作使用 BEGIN IMMEDIATE，多进程并发写入也不会丢失更新。
+    """
+
+    DB_FILENAME = "history.db"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL DEFAULT '',
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            thumbnail TEXT,
+            page_count INTEGER NOT NULL DEFAULT 0,
+            task_id TEXT,
+            data TEXT NOT NULL,
+            image_count INTEGER NOT NULL DEFAULT 0,
+            disk_bytes INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_created_at ON records(created_at);
+        CREATE INDEX IF NOT EXISTS idx_records_updated_at ON records(updated_at);
+        CREATE INDEX IF NOT EXISTS idx_records_status ON records(status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_records_task_id ON records(task_id);
+        CREATE INDEX IF NOT EXISTS idx_records_title ON records(title);
+        CREATE TABLE IF NOT EXISTS search_terms (
+            term TEXT NOT NULL,
+            record_id TEXT NOT NULL,
+            weight REAL NOT NULL,
+            PRIMARY KEY (term, record_id)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_search_terms_record ON search_terms(record_id);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', '0');
+    """
+
+    # 按状态分组的统计，由触发器在同一事务内随 records 的增删改维护
+    STATS_SCHEMA = """
+        CREATE TABLE IF NOT EXISTS stats (
+            status TEXT PRIMARY KEY,
+            records INTEGER NOT NULL DEFAULT 0,
+            images INTEGER NOT NULL DEFAULT 0,
+            disk_bytes INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TRIGGER IF NOT EXISTS trg_stats_insert AFTER INSERT ON records BEGIN
+            INSERT OR IGNORE INTO stats (status) VALUES (NEW.status);
+            UPDATE stats SET records = records + 1, images = images + NEW.image_count,
+                disk_bytes = disk_bytes + NEW.disk_bytes WHERE status = NEW.status;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_stats_delete AFTER DELETE ON records BEGIN
+            UPDATE stats SET records = records - 1, images = images - OLD.image_count,
+                disk_bytes = disk_bytes - OLD.disk_bytes WHERE status = OLD.status;
+        END;
+        CREATE TRIGGER IF NOT EXISTS trg_stats_update
+        AFTER UPDATE OF status, image_count, disk_bytes ON records BEGIN
+            UPDATE stats SET records = records - 1, images = images - OLD.image_count,
+                disk_bytes = disk_bytes - OLD.disk_bytes WHERE status = OLD.status;
+            INSERT OR IGNORE INTO stats (status) VALUES (NEW.status);
+            UPDATE stats SET records = records + 1, images = images + NEW.image_count,
+                disk_bytes = disk_bytes + NEW.disk_bytes WHERE status = NEW.status;
+        END;
+    """
+
+    ENTRY_COLUMNS = (
+        "id, title, created_at, updated_at, status, thumbnail, page_count, task_id, image_count, disk_bytes"
+    )
+    WRITE_COLUMNS = (
+        "title, created_at, updated_at, status, thumbnail, page_count, task_id, image_count, disk_bytes, data"
+    )
+
+    def __init__(self, history_dir: str, layout: Optional[HistoryLayout] = None):
+        self.history_dir = history_dir
+        self.layout = layout or HistoryLayout(history_dir)
+        self.db_path = os.path.join(history_dir, self.DB_FILENAME)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+        self._upgrade_columns()
+        conn.executescript(self.STATS_SCHEMA)
+        self._migrate_from_json()
+        self._build_search_terms()
+        self._build_stats()
+        self._last_write_token = self.change_token()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：由代码显式控制事务
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _bump_generation(self, conn: sqlite3.Connection) -> None:
+        """在当前写事务内递增写入代数，并记录为本进程最近一次写入的标记"""
+        conn.execute(
+            "UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'"
+        )
+        self._last_write_token = int(conn.execute(
+            "SELECT value FROM meta WHERE key = 'generation'"
+        ).fetchone()[0])
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict:
+        return {
+            "id": row["id"],
+            "title": row["title"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "status": row["status"],
+            "thumbnail": row["thumbnail"],
+            "page_count": row["page_count"],
+            "task_id": row["task_id"],
+            "image_count": row["image_count"],
+            "disk_bytes": row["disk_bytes"]
+        }
+
+    @staticmethod
+    def _entry_params(record: Dict) -> Tuple:
+        entry = build_index_entry(record)
+        return (
+            entry["title"], entry["created_at"], entry["updated_at"], entry["status"],
+            entry["thumbnail"], entry["page_count"], entry["task_id"],
+            entry["image_count"], entry["disk_bytes"],
+            json.dumps(record, ensure_ascii=False)
+        )
+
+    def _upgrade_columns(self) -> None:
+        """
+        升级旧版本创建的数据库：补充 image_count / disk_bytes 列并建立统计
+
+        新增列后从 data 中回填图片数，再全量计算一次统计表（之后由触发器维护）。
+        """
+        conn = self._conn()
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(records)")}
+        if {"image_count", "disk_bytes"} <= columns:
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if "image_count" not in columns:
+                conn.execute("ALTER TABLE records ADD COLUMN image_count INTEGER NOT NULL DEFAULT 0")
+            if "disk_bytes" not in columns:
+                conn.execute("ALTER TABLE records ADD COLUMN disk_bytes INTEGER NOT NULL DEFAULT 0")
+            for row in conn.execute("SELECT id, data FROM records").fetchall():
+                entry = build_index_entry(json.loads(row["data"]))
+                conn.execute(
+                    "UPDATE records SET image_count = ?, disk_bytes = ? WHERE id = ?",
+                    (entry["image_count"], entry["disk_bytes"], row["id"])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _build_stats(self) -> None:
+        """一次性为已有记录建立统计表（升级前创建的数据库）"""
+        conn = self._conn()
+        if conn.execute("SELECT value FROM meta WHERE key = 'stats_built'").fetchone():
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._rebuild_stats_table(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('stats_built', ?)",
+                (datetime.now().isoformat(),)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _rebuild_stats_table(self, conn: sqlite3.Connection) -> None:
+        """在当前写事务内从 records 全量重建统计表"""
+        conn.execute("DELETE FROM stats")
+        conn.execute(
+            "INSERT INTO stats (status, records, images, disk_bytes) "
+            "SELECT status, COUNT(*), SUM(image_count), SUM(disk_bytes) FROM records GROUP BY status"
+        )
+
+    @staticmethod
+    def _index_search_terms(conn: sqlite3.Connection, record: Dict) -> None:
+        """在当前写事务内重建一条记录的倒排表条目"""
+        conn.execute("DELETE FROM search_terms WHERE record_id = ?", (record["id"],))
+        conn.executemany(
+            "INSERT INTO search_terms (term, record_id, weight) VALUES (?, ?, ?)",
+            [(term, record["id"], weight) for term, weight in build_search_terms(record).items()]
+        )
+
+    def _build_search_terms(self) -> None:
+        """一次性为已有记录建立倒排表（升级前创建的数据库）"""
+        conn = self._conn()
+        if conn.execute("SELECT value FROM meta WHERE key = 'search_indexed'").fetchone():
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = 0
+            for row in conn.execute("SELECT data FROM records").fetchall():
+                self._index_search_terms(conn, json.loads(row["data"]))
+                count += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('search_indexed', ?)",
+                (datetime.now().isoformat(),)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if count:
+            logger.info(f"已为 {count} 条历史记录建立全文检索索引")
+
+    def _migrate_from_json(self) -> None:
+        """
+        一次性导入 JSON 格式的历史记录
+
+        以 index.json 中的顺序为准，同时导入未出现在索引中的记录文件。
+        原 JSON 文件保留不动，切回 JSON 后端时仍可使用（但不包含之后的修改）。
+        """
+        conn = self._conn()
+        if conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        record_paths = []
+        index_file = os.path.join(self.history_dir, "index.json")
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, "r", encoding="utf-8") as f:
+                    for entry in json.load(f).get("records", []):
+                        record_paths.append(self.layout.record_path(entry["id"]))
+            except Exception as e:
+                logger.warning(f"读取 index.json 失败，仅按记录文件导入: {e}")
+
+        known = set(record_paths)
+        for path in self.layout.iter_record_paths():
+            if path not in known:
+                record_paths.append(path)
+
+        imported = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for path in record_paths:
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        record = json.load(f)
+                except Exception:
+                    continue
+                if not isinstance(record, dict) or not record.get("id"):
+                    continue
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO records (id, {self.WRITE_COLUMNS}) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (record["id"], *self._entry_params(record))
+                )
+                if cursor.rowcount:
+                    self._index_search_terms(conn, record)
+                imported += cursor.rowcount
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)",
+                (datetime.now().isoformat(),)
+            )
+            self._bump_generation(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if imported:
+            logger.info(f"已从 JSON 文件导入 {imported} 条历史记录到 {self.db_path}")
+
+    def load_entries(self):
+        rows = self._conn().execute(
+            f"SELECT {self.ENTRY_COLUMNS} FROM records ORDER BY created_at DESC, id DESC"
+        ).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def change_token(self):
+        # 每次写事务都会递增的写入代数（其他进程的写入同样可见）
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def get(self, record_id):
+        row = self._conn().execute(
+            "SELECT data FROM records WHERE id = ?", (record_id,)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def exists(self, record_id):
+        return self._conn().execute(
+            "SELECT 1 FROM records WHERE id = ?", (record_id,)
+        ).fetchone() is not None
+
+    def insert(self, record):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                f"INSERT INTO records (id, {self.WRITE_COLUMNS}) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (record["id"], *self._entry_params(record))
+            )
+            self._index_search_terms(conn, record)
+            self._bump_generation(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def update(self, record_id, mutate):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM records WHERE id = ?", (record_id,)).fetchone()
+            if not row:
+                conn.execute("ROLLBACK")
+                return None
+            record = json.loads(row["data"])
+            mutate(record)
+            conn.execute(
+                "UPDATE records SET title = ?, created_at = ?, updated_at = ?, status = ?, "
+                "thumbnail = ?, page_count = ?, task_id = ?, image_count = ?, disk_bytes = ?, "
+                "data = ? WHERE id = ?",
+                (*self._entry_params(record), record_id)
+            )
+            self._index_search_terms(conn, record)
+            self._bump_generation(conn)
+            conn.execute("COMMIT")
+            return record
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, record_id):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM records WHERE id = ?", (record_id,)).fetchone()
+            if not row:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("DELETE FROM records WHERE id = ?", (record_id,))
+            conn.execute("DELETE FROM search_terms WHERE record_id = ?", (record_id,))
+            self._bump_generation(conn)
+            conn.execute("COMMIT")
+            return json.loads(row["data"])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_stats(self):
+        rows = self._conn().execute(
+            "SELECT status, records, images, disk_bytes FROM stats WHERE records > 0"
+        ).fetchall()
+        return {
+            row["status"]: {"records": row["records"], "images": row["images"], "disk_bytes": row["disk_bytes"]}
+            for row in rows
+        }
+
+    def rebuild_stats(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # 先按 data 校正摘要列（图片数、占用空间），再重算统计表
+            for row in conn.execute("SELECT id, data, image_count, disk_bytes FROM records").fetchall():
+                entry = build_index_entry(json.loads(row["data"]))
+                if (entry["image_count"], entry["disk_bytes"]) != (row["image_count"], row["disk_bytes"]):
+                    conn.execute(
+                        "UPDATE records SET image_count = ?, disk_bytes = ? WHERE id = ?",
+                        (entry["image_count"], entry["disk_bytes"], row["id"])
+                    )
+            self._rebuild_stats_table(conn)
+            self._bump_generation(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get_stats()
+
+    def search(self, terms, limit, offset=0):
+        if not terms:
+            return [], 0
+        conn = self._conn()
+        placeholders = ", ".join("?" * len(terms))
+
+        # 任一查询词没有命中时直接返回；否则按 TF-IDF 打分（每个词的 IDF 作为参数传入）
+        doc_freq = dict(conn.execute(
+            f"SELECT term, COUNT(*) FROM search_terms WHERE term IN ({placeholders}) GROUP BY term",
+            terms
+        ).fetchall())
+        if len(doc_freq) < len(terms):
+            return [], 0
+
+        total_docs = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        idf_case = " ".join("WHEN ? THEN ?" for _ in terms)
+        idf_params = [v for term in terms for v in (term, idf(total_docs, doc_freq[term]))]
+
+        matched = (
+            f"SELECT record_id, SUM(weight * CASE term {idf_case} END) AS score "
+            f"FROM search_terms WHERE term IN ({placeholders}) "
+            f"GROUP BY record_id HAVING COUNT(*) = ?"
+        )
+        params = [*idf_params, *terms, len(terms)]
+
+        total = conn.execute(f"SELECT COUNT(*) FROM ({matched})", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT m.record_id FROM ({matched}) m JOIN records r ON r.id = m.record_id "
+            f"ORDER BY m.score DESC, r.created_at DESC LIMIT ? OFFSET ?",
+            [*params, limit, offset]
+        ).fetchall()
+        return [row[0] for row in rows], total
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_history_store(
+    history_dir: str,
+    backend: str,
+    layout: Optional[HistoryLayout] = None
+) -> HistoryStore:
+    """
+    创建历史记录存储后端
+
+    Args:
+        history_dir: 历史记录目录
+        backend: 后端类型（sqlite / json）
+        layout: 目录布局（可选，默认按 history_dir 创建）
+
+    Returns:
+        HistoryStore: 存储后端实例
+    """
+    if backend == "json":
+        return JsonHistoryStore(history_dir, layout)
+    if backend == "sqlite":
+        return SqliteHistoryStore(history_dir, layout)
+    raise ValueError(
+        f"不支持的历史记录存储后端: {backend}\n"
+        "支持的后端: sqlite, json"
+    )
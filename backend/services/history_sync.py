@@ -0,0 +1,138 @@
+"""
+任务文件夹增量同步
+
+记录每个任务文件夹上次同步时的目录 mtime 以及关联记录的状态，
+增量扫描时只处理发生变化的文件夹：
+- 目录 mtime 变化（新增、删除、重命名图片文件）
+- 关联的记录变化（新建、删除或被修改）
+- 本进程 ImageService 保存图片时登记的任务（变更日志）
+
+HistorySyncWatcher 在后台定期执行增量扫描，保持记录与文件夹持续一致。
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from backend.services.history_store import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# 同步状态：(目录 mtime_ns, 关联记录 ID, 关联记录 updated_at)
+SyncSignature = Tuple[int, Optional[str], Optional[str]]
+
+
+class TaskSyncState:
+    """
+    任务文件夹同步状态（持久化到 history 目录下的 JSON 文件）
+
+    线程安全；只有发生变化时 save() 才会写盘，写入通过临时文件 + 重命名完成。
+    """
+
+    FILENAME = ".sync_state.json"
+
+    def __init__(self, history_dir: str):
+        self.path = os.path.join(history_dir, self.FILENAME)
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, SyncSignature] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._signatures = {
+                task_id: tuple(signature) for task_id, signature in data.get("tasks", {}).items()
+            }
+        except Exception as e:
+            # 状态文件损坏时当作首次同步，下次扫描会全部重新处理
+            logger.warning(f"读取同步状态失败，将重新全量同步: {e}")
+            self._signatures = {}
+
+    def is_current(self, task_id: str, signature: SyncSignature) -> bool:
+        """判断任务文件夹自上次同步后是否没有变化"""
+        with self._lock:
+            return self._signatures.get(task_id) == signature
+
+    def set(self, task_id: str, signature: SyncSignature) -> None:
+        with self._lock:
+            if self._signatures.get(task_id) != signature:
+                self._signatures[task_id] = signature
+                self._dirty = True
+
+    def discard(self, task_id: str) -> None:
+        with self._lock:
+            if self._signatures.pop(task_id, None) is not None:
+                self._dirty = True
+
+    def retain(self, task_ids: Iterable[str]) -> None:
+        """只保留仍然存在的任务文件夹"""
+        keep = set(task_ids)
+        with self._lock:
+            for task_id in [t for t in self._signatures if t not in keep]:
+                del self._signatures[task_id]
+                self._dirty = True
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"tasks": {task_id: list(sig) for task_id, sig in self._signatures.items()}}
+            self._dirty = False
+
+        try:
+            write_json_atomic(self.path, data, indent=None)
+        except Exception as e:
+            logger.warning(f"保存同步状态失败: {e}")
+            with self._lock:
+                self._dirty = True
+
+
+class HistorySyncWatcher:
+    """
+    后台同步线程
+
+    启动后立即执行一次增量扫描，之后每隔 interval 秒执行一次。
+    """
+
+    def __init__(self, history_service, interval: float):
+        self.history_service = history_service
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="history-sync", daemon=True)
+        self._thread.start()
+        logger.info(f"历史记录后台同步已启动: 间隔 {self.interval}s")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            try:
+                result = self.history_service.scan_all_tasks(incremental=True)
+                if result.get("success"):
+                    if result.get("updated"):
+                        logger.info(
+                            f"后台同步: 扫描 {result['total_tasks']} 个任务，更新 {result['updated']} 条记录"
+                        )
+                else:
+                    logger.warning(f"后台同步失败: {result.get('error')}")
+            except Exception as e:
+                logger.error(f"后台同步异常: {e}")
+
+            if self._stop_event.wait(self.interval):
+                return
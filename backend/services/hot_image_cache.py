@@ -0,0 +1,142 @@
+"""
+热点图片内存缓存
+
+生成完成后前端会立即（而且常常在多个标签页、多次渲染中重复）请求新图片和缩略图。
+这里在进程内按字节预算缓存最近写入和最近发送的图片：
+- ImageService 保存图片时直接把内存中的数据放入缓存，首次请求也不读磁盘
+- 图片接口未命中时读取文件并放入缓存（超过单个文件上限的不缓存）
+- 命中时仍会 stat 一次，文件被修改/删除（其他进程重新生成、删除记录、归档）后自动失效
+- 超出预算时淘汰最久未使用的条目（LRU），命中率等指标见 stats()
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from backend.config import Config
+
+# 单个文件最多占总预算的比例
+MAX_ITEM_FRACTION = 8
+
+
+class HotImageCache:
+    """按字节预算的图片 LRU 缓存（线程安全）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_bytes // MAX_ITEM_FRACTION
+        self._lock = threading.Lock()
+        # 路径 -> (mtime_ns, size, 数据)，按最近使用排序（最旧在前）
+        self._entries: "OrderedDict[str, Tuple[int, int, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def put(self, path: str, data: bytes, st: Optional[os.stat_result] = None) -> None:
+        """放入缓存（刚写入或刚读取的文件）"""
+        if not self.enabled or len(data) > self.max_item_bytes:
+            self.invalidate(path)
+            return
+        if st is None:
+            st = os.stat(path)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[path] = (st.st_mtime_ns, st.st_size, data)
+            self._bytes += st.st_size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self._bytes -= size
+                self._evictions += 1
+
+    def load(self, path: str) -> Optional[bytes]:
+        """
+        获取文件内容：命中时返回缓存的数据，未命中时读取文件并放入缓存
+
+        Returns:
+            Optional[bytes]: 文件内容，缓存未启用或文件超过单个上限时返回 None（由调用方直接发送文件）
+
+        Raises:
+            OSError: 文件不存在或无法读取
+        """
+        if not self.enabled:
+            return None
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                if entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                    self._entries.move_to_end(path)
+                    self._hits += 1
+                    return entry[2]
+                # 文件已被修改
+                del self._entries[path]
+                self._bytes -= entry[1]
+                self._invalidations += 1
+            self._misses += 1
+
+        if st.st_size > self.max_item_bytes:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) == st.st_size:
+            self.put(path, data, st)
+        return data
+
+    def invalidate(self, path: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+                self._invalidations += 1
+
+    def invalidate_dir(self, directory: str) -> None:
+        """删除某个目录（任务文件夹）下的全部条目"""
+        prefix = os.path.join(directory, "")
+        with self._lock:
+            for path in [p for p in self._entries if p.startswith(prefix)]:
+                self._bytes -= self._entries.pop(path)[1]
+                self._invalidations += 1
+
+    def stats(self) -> Dict:
+        """缓存指标"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations
+            }
+
+
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+
+def get_hot_image_cache() -> HotImageCache:
+    """
+    获取热点图片缓存实例（单例模式）
+
+    Returns:
+        HotImageCache: 按 Config.IMAGE_MEMORY_CACHE_MB 配置预算的缓存
+    """
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = HotImageCache(int(Config.IMAGE_MEMORY_CACHE_MB * 1024 * 1024))
+    return _cache_instance
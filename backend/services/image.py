@@ -1,13 +1,19 @@
 """图片生成服务"""
 import logging
 import os
+import queue
 import uuid
 import time
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, Any, Generator, List, Optional, Tuple
 from backend.config import Config
 from backend.generators.factory import ImageGeneratorFactory
+from backend.services.history import get_history_service
+from backend.services.hot_image_cache import get_hot_image_cache
+from backend.services.task_state import get_task_state_store
+from backend.utils.http_cache import file_version, remember_file
+from backend.services.history_layout import HistoryLayout
 from backend.utils.image_compressor import compress_image
 
 logger = logging.getLogger(__name__)
@@ -20,6 +26,14 @@ class ImageService:
     MAX_CONCURRENT = 15  # 最大并发数
     AUTO_RETRY_COUNT = 1  # 不自动重试，超时后让用户手动重试
 
+    # 流式生成阶段对应的提示文字
+    STAGE_MESSAGES = {
+        "first_byte": "已连接，正在生成...",
+        "thought": "模型思考中...",
+        "text": "模型思考中...",
+        "image_received": "图片已生成，正在保存...",
+    }
+
     def __init__(self, provider_name: str = None):
         """
         初始化图片生成服务
@@ -48,9 +62,14 @@ class ImageService:
         # 检查是否启用短 prompt 模式
         self.use_short_prompt = provider_config.get('short_prompt', False)
 
+        # 检查是否启用上下文缓存模式（大纲等任务共享上下文只上传一次）
+        self.use_context_cache = provider_config.get('context_cache', False)
+
         # 加载提示词模板
         self.prompt_template = self._load_prompt_template()
         self.prompt_template_short = self._load_prompt_template(short=True)
+        self.prompt_template_context = self._load_prompt_template("image_prompt_context.txt")
+        self.prompt_template_page = self._load_prompt_template("image_prompt_page.txt")
 
         # 历史记录根目录
         self.history_root_dir = os.path.join(
@@ -58,25 +77,28 @@ class ImageService:
             "history"
         )
         os.makedirs(self.history_root_dir, exist_ok=True)
+        # 任务文件夹按哈希前缀分片存放（兼容旧版平铺的文件夹）
+        self.layout = HistoryLayout(self.history_root_dir)
 
         # 当前任务的输出目录（每个任务一个子文件夹）
         self.current_task_dir = None
 
-        # 存储任务状态（用于重试）
-        self._task_states: Dict[str, Dict] = {}
+        # 任务状态、每页用量和事件日志（保存在共享状态中，重试等请求可由其他工作进程处理）
+        self.task_states = get_task_state_store()
 
         logger.info(f"ImageService 初始化完成: provider={provider_name}, type={provider_type}")
 
-    def _load_prompt_template(self, short: bool = False) -> str:
+    def _load_prompt_template(self, filename: str = None, short: bool = False) -> str:
         """加载 Prompt 模板"""
-        filename = "image_prompt_short.txt" if short else "image_prompt.txt"
+        if filename is None:
+            filename = "image_prompt_short.txt" if short else "image_prompt.txt"
         prompt_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)),
             "prompts",
             filename
         )
         if not os.path.exists(prompt_path):
-            # 如果短模板不存在，返回空字符串
+            # 如果可选模板不存在，返回空字符串
             return ""
         with open(prompt_path, "r", encoding="utf-8") as f:
             return f.read()
@@ -99,6 +121,11 @@ class ImageService:
         if task_dir is None:
             raise ValueError("任务目录未设置")
 
+        # 生成期间任务文件夹可能被迁移到分片位置，重新解析
+        task_id = os.path.basename(os.path.normpath(task_dir))
+        if not os.path.isdir(task_dir):
+            task_dir = self.layout.ensure_task_dir(task_id)
+
         # 保存原图
         filepath = os.path.join(task_dir, filename)
         with open(filepath, "wb") as f:
@@ -111,8 +138,54 @@ class ImageService:
         with open(thumbnail_path, "wb") as f:
             f.write(thumbnail_data)
 
+        # 登记内容哈希（ETag 和图片 URL 的版本号），图片接口无需再读取文件计算
+        remember_file(filepath, image_data)
+        remember_file(thumbnail_path, thumbnail_data)
+
+        # 放入热点图片缓存：生成完成后前端马上会请求，直接从内存发送（重新生成时覆盖旧数据）
+        hot_cache = get_hot_image_cache()
+        hot_cache.put(filepath, image_data)
+        hot_cache.put(thumbnail_path, thumbnail_data)
+
+        # 登记变更，下次增量同步时重新扫描该任务文件夹
+        get_history_service().mark_task_changed(task_id)
+
         return filepath
 
+    def _image_url(self, task_id: str, filename: str) -> str:
+        """
+        图片访问 URL，带内容版本号
+
+        重新生成后版本号随内容变化，URL 随之变化，浏览器和代理不会返回旧图片。
+        """
+        url = f"/api/images/{task_id}/{filename}"
+        version = file_version(os.path.join(self.layout.task_dir(task_id), filename))
+        return f"{url}?v={version}" if version else url
+
+    def _mark_generated(self, task_id: str, index: int, filename: str) -> None:
+        """登记某页生成成功，并把已生成的图片列表写入关联的历史记录"""
+        self._queue_history_update(task_id, self.task_states.mark_generated(task_id, index, filename))
+
+    def _queue_history_update(self, task_id: str, state: Optional[Dict]) -> None:
+        """
+        把已生成的图片列表写入关联的历史记录
+
+        使用 HistoryService 的延迟写入，短时间内完成的多页合并为一次写入。
+        同时更新任务文件夹的占用空间（列表、统计和保留策略的配额都依赖该字段）。
+        """
+        state = state or {}
+        record_id = state.get("record_id")
+        if not record_id:
+            return
+        generated = [state["generated"][index] for index in sorted(state["generated"])]
+        history = get_history_service()
+        history.queue_update(
+            record_id,
+            images={"task_id": task_id, "generated": generated},
+            thumbnail=generated[0] if generated else None,
+            disk_bytes=history.task_disk_bytes(self.layout.task_dir(task_id))
+        )
+
     def _generate_single_image(
         self,
         page: Dict,
@@ -121,7 +194,8 @@ class ImageService:
         retry_count: int = 0,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        user_topic: str = "",
+        progress_queue: Optional[queue.Queue] = None
     ) -> Tuple[int, bool, Optional[str], Optional[str]]:
         """
         生成单张图片（带自动重试）
@@ -134,6 +208,7 @@ class ImageService:
             full_outline: 完整的大纲文本
             user_images: 用户上传的参考图片列表
             user_topic: 用户原始输入
+            progress_queue: 流式进度事件队列（由 SSE 生成器转发给前端）
 
         Returns:
             (index, success, filename, error_message)
@@ -142,10 +217,26 @@ class ImageService:
         page_type = page["type"]
         page_content = page["content"]
 
+        def report_progress(stage: str, info: Dict[str, Any]):
+            if progress_queue is not None:
+                progress_queue.put({
+                    "event": "progress",
+                    "data": {
+                        "index": index,
+                        "status": "generating",
+                        "stage": stage,
+                        "message": self.STAGE_MESSAGES.get(stage, ""),
+                        **info
+                    }
+                })
+
         try:
             logger.debug(f"生成图片 [{index}]: type={page_type}")
 
-            # 根据配置选择模板（短 prompt 或完整 prompt）
+            # 任务共享上下文（仅上下文缓存模式下使用）
+            shared_context = None
+
+            # 根据配置选择模板（短 prompt、上下文缓存或完整 prompt）
             if self.use_short_prompt and self.prompt_template_short:
                 # 短 prompt 模式：只包含页面类型和内容
                 prompt = self.prompt_template_short.format(
@@ -153,6 +244,17 @@ class ImageService:
                     page_type=page_type
                 )
                 logger.debug(f"  使用短 prompt 模式 ({len(prompt)} 字符)")
+            elif self.use_context_cache and self.prompt_template_context and self.prompt_template_page:
+                # 上下文缓存模式：大纲和用户需求放进共享上下文，各页只发送自己的内容
+                shared_context = self.prompt_template_context.format(
+                    full_outline=full_outline,
+                    user_topic=user_topic if user_topic else "未提供"
+                )
+                prompt = self.prompt_template_page.format(
+                    page_content=page_content,
+                    page_type=page_type
+                )
+                logger.debug(f"  使用上下文缓存模式 (共享 {len(shared_context)} 字符, 页面 {len(prompt)} 字符)")
             else:
                 # 完整 prompt 模式：包含大纲和用户需求
                 prompt = self.prompt_template.format(
@@ -162,6 +264,13 @@ class ImageService:
                     user_topic=user_topic if user_topic else "未提供"
                 )
 
+            # 不支持显式缓存的服务商：共享上下文作为固定前缀拼在最前面，
+            # 各页请求前缀一致，便于服务端的前缀缓存命中
+            if shared_context and self.provider_config.get('type') != 'google_genai':
+                prompt = f"{shared_context}\n\n{prompt}"
+
+            start_time = time.time()
+
             # 调用生成器生成图片
             if self.provider_config.get('type') == 'google_genai':
                 logger.debug(f"  使用 Google GenAI 生成器")
@@ -171,6 +280,8 @@ class ImageService:
                     temperature=self.provider_config.get('temperature', 1.0),
                     model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
                     reference_image=reference_image,
+                    shared_context=shared_context,
+                    on_progress=report_progress,
                 )
             elif self.provider_config.get('type') == 'image_api':
                 logger.debug(f"  使用 Image API 生成器")
@@ -198,6 +309,8 @@ class ImageService:
                     quality=self.provider_config.get('quality', 'standard'),
                 )
 
+            self._record_page_metrics(task_id, index, start_time)
+
             # 保存图片（使用当前任务目录）
             filename = f"{index}.png"
             self._save_image(image_data, filename, self.current_task_dir)
@@ -206,17 +319,133 @@ class ImageService:
             return (index, True, filename, None)
 
         except Exception as e:
+            # 丢弃失败调用残留的用量，避免计入下一次
+            self.generator.pop_last_usage()
             error_msg = str(e)
             logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
             return (index, False, None, error_msg)
 
+    def _record_page_metrics(self, task_id: str, index: int, start_time: float):
+        """
+        记录单页生成耗时和 token 用量
+
+        Args:
+            task_id: 任务ID
+            index: 页面索引
+            start_time: 调用生成器前的时间戳
+        """
+        metrics = {"latency_ms": int((time.time() - start_time) * 1000)}
+        usage = self.generator.pop_last_usage()
+        if usage:
+            # 未知的用量字段不写入，汇总时据此区分“0”和“未知”
+            metrics.update({key: value for key, value in usage.items() if value is not None})
+
+        self.task_states.record_metrics(task_id, index, metrics)
+        logger.info(
+            f"图片 [{index}] 耗时 {metrics['latency_ms']}ms, "
+            f"prompt_tokens={metrics.get('prompt_tokens', '-')}, "
+            f"cached_tokens={metrics.get('cached_tokens', '-')}"
+        )
+
+    def get_usage_summary(self, task_id: str) -> Dict[str, int]:
+        """
+        汇总任务的 token 用量和耗时
+
+        Args:
+            task_id: 任务ID
+
+        Returns:
+            汇总字典：页数、总耗时、各类 token 合计（只计已知的值），
+            以及 token 用量不完整的页数 usage_unknown_pages
+        """
+        token_keys = ("prompt_tokens", "cached_tokens", "output_tokens")
+        pages = self.task_states.metrics(task_id).values()
+        summary = {
+            "pages": len(pages),
+            "latency_ms": 0,
+            "prompt_tokens": 0,
+            "cached_tokens": 0,
+            "output_tokens": 0,
+            "usage_unknown_pages": 0,
+        }
+        for metrics in pages:
+            summary["latency_ms"] += metrics.get("latency_ms", 0)
+            for key in token_keys:
+                summary[key] += metrics.get(key, 0)
+            if any(key not in metrics for key in token_keys):
+                summary["usage_unknown_pages"] += 1
+        return summary
+
+    def _iter_with_progress(
+        self,
+        futures,
+        progress_queue: queue.Queue
+    ) -> Generator[Any, None, None]:
+        """
+        等待一组 Future 完成，期间转发子线程上报的流式进度
+
+        Args:
+            futures: Future 集合（或以 Future 为键的字典）
+            progress_queue: 子线程写入进度事件的队列
+
+        Yields:
+            进度事件字典，或已完成的 Future（同一页的进度事件总在其 Future 之前）
+        """
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            while True:
+                try:
+                    yield progress_queue.get_nowait()
+                except queue.Empty:
+                    break
+            for future in done:
+                yield future
+
+    @staticmethod
+    def new_task_id() -> str:
+        """生成新的任务 ID"""
+        return f"task_{uuid.uuid4().hex[:8]}"
+
+    def _log_events(
+        self,
+        task_id: str,
+        events: Generator[Dict[str, Any], None, None]
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        转发事件，同时写入任务事件日志（客户端断线后可通过任意工作进程补取）
+
+        模型流式输出的阶段进度（带 stage 的 progress 事件）数量多且只在当时有意义，不写入日志。
+        """
+        for event in events:
+            if "stage" not in event["data"]:
+                self.task_states.append_event(task_id, event)
+            yield event
+
     def generate_images(
         self,
         pages: list,
         task_id: str = None,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        user_topic: str = "",
+        record_id: Optional[str] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """生成图片（生成器，支持 SSE 流式返回），参数见 _generate_images"""
+        if task_id is None:
+            task_id = self.new_task_id()
+        yield from self._log_events(task_id, self._generate_images(
+            pages, task_id, full_outline, user_images, user_topic, record_id
+        ))
+
+    def _generate_images(
+        self,
+        pages: list,
+        task_id: str = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = "",
+        record_id: Optional[str] = None
     ) -> Generator[Dict[str, Any], None, None]:
         """
         生成图片（生成器，支持 SSE 流式返回）
@@ -228,18 +457,19 @@ class ImageService:
             full_outline: 完整的大纲文本（用于保持风格一致）
             user_images: 用户上传的参考图片列表（可选）
             user_topic: 用户原始输入（用于保持意图一致）
+            record_id: 关联的历史记录 ID（可选，每完成一页延迟写入图片列表）
 
         Yields:
             进度事件字典
         """
         if task_id is None:
-            task_id = f"task_{uuid.uuid4().hex[:8]}"
+            task_id = self.new_task_id()
 
         logger.info(f"开始图片生成任务: task_id={task_id}, pages={len(pages)}")
 
-        # 创建任务专属目录
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
+        # 创建任务专属目录（继续已归档的任务时先恢复）
+        get_history_service().ensure_task_restored(task_id)
+        self.current_task_dir = self.layout.ensure_task_dir(task_id)
         logger.debug(f"任务目录: {self.current_task_dir}")
 
         total = len(pages)
@@ -247,21 +477,19 @@ class ImageService:
         failed_pages = []
         cover_image_data = None
 
+        # 各页生成线程上报的流式进度
+        progress_queue = queue.Queue()
+
         # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
         compressed_user_images = None
         if user_images:
             compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
 
         # 初始化任务状态
-        self._task_states[task_id] = {
-            "pages": pages,
-            "generated": {},
-            "failed": {},
-            "cover_image": None,
-            "full_outline": full_outline,
-            "user_images": compressed_user_images,
-            "user_topic": user_topic
-        }
+        self.task_states.create(
+            task_id, pages, full_outline, user_topic, record_id,
+            user_images=compressed_user_images
+        )
 
         # ==================== 第一阶段：生成封面 ====================
         cover_page = None
@@ -292,15 +520,22 @@ class ImageService:
                 }
             }
 
-            # 生成封面（使用用户上传的图片作为参考）
-            index, success, filename, error = self._generate_single_image(
-                cover_page, task_id, reference_image=None, full_outline=full_outline,
-                user_images=compressed_user_images, user_topic=user_topic
-            )
+            # 生成封面（使用用户上传的图片作为参考），在子线程中执行以便转发流式进度
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                cover_future = executor.submit(
+                    self._generate_single_image,
+                    cover_page, task_id, None, 0, full_outline,
+                    compressed_user_images, user_topic, progress_queue
+                )
+                for item in self._iter_with_progress([cover_future], progress_queue):
+                    if isinstance(item, dict):
+                        yield item
+
+            index, success, filename, error = cover_future.result()
 
             if success:
                 generated_images.append(filename)
-                self._task_states[task_id]["generated"][index] = filename
+                self._mark_generated(task_id, index, filename)
 
                 # 读取封面图片作为参考，并立即压缩到200KB以内
                 cover_path = os.path.join(self.current_task_dir, filename)
@@ -309,20 +544,21 @@ class ImageService:
 
                 # 压缩封面图（减少内存占用和后续传输开销）
                 cover_image_data = compress_image(cover_image_data, max_size_kb=200)
-                self._task_states[task_id]["cover_image"] = cover_image_data
+                self.task_states.set_cover(task_id, cover_image_data)
 
                 yield {
                     "event": "complete",
                     "data": {
                         "index": index,
                         "status": "done",
-                        "image_url": f"/api/images/{task_id}/{filename}",
-                        "phase": "cover"
+                        "image_url": self._image_url(task_id, filename),
+                        "phase": "cover",
+                        "metrics": self.task_states.metrics(task_id).get(index)
                     }
                 }
             else:
                 failed_pages.append(cover_page)
-                self._task_states[task_id]["failed"][index] = error
+                self.task_states.mark_failed(task_id, index, error)
 
                 yield {
                     "event": "error",
@@ -365,7 +601,8 @@ class ImageService:
                             0,  # retry_count
                             full_outline,  # 传入完整大纲
                             compressed_user_images,  # 用户上传的参考图片（已压缩）
-                            user_topic  # 用户原始输入
+                            user_topic,  # 用户原始输入
+                            progress_queue  # 流式进度
                         ): page
                         for page in other_pages
                     }
@@ -383,28 +620,33 @@ class ImageService:
                             }
                         }
 
-                    # 收集结果
-                    for future in as_completed(future_to_page):
+                    # 收集结果（同时转发各页的流式进度）
+                    for future in self._iter_with_progress(future_to_page, progress_queue):
+                        if isinstance(future, dict):
+                            yield future
+                            continue
+
                         page = future_to_page[future]
                         try:
                             index, success, filename, error = future.result()
 
                             if success:
                                 generated_images.append(filename)
-                                self._task_states[task_id]["generated"][index] = filename
+                                self._mark_generated(task_id, index, filename)
 
                                 yield {
                                     "event": "complete",
                                     "data": {
                                         "index": index,
                                         "status": "done",
-                                        "image_url": f"/api/images/{task_id}/{filename}",
-                                        "phase": "content"
+                                        "image_url": self._image_url(task_id, filename),
+                                        "phase": "content",
+                                        "metrics": self.task_states.metrics(task_id).get(index)
                                     }
                                 }
                             else:
                                 failed_pages.append(page)
-                                self._task_states[task_id]["failed"][index] = error
+                                self.task_states.mark_failed(task_id, index, error)
 
                                 yield {
                                     "event": "error",
@@ -420,7 +662,7 @@ class ImageService:
                         except Exception as e:
                             failed_pages.append(page)
                             error_msg = str(e)
-                            self._task_states[task_id]["failed"][page["index"]] = error_msg
+                            self.task_states.mark_failed(task_id, page["index"], error_msg)
 
                             yield {
                                 "event": "error",
@@ -459,32 +701,41 @@ class ImageService:
                     }
 
                     # 生成单张图片
-                    index, success, filename, error = self._generate_single_image(
-                        page,
-                        task_id,
-                        cover_image_data,
-                        0,
-                        full_outline,
-                        compressed_user_images,
-                        user_topic
-                    )
+                    with ThreadPoolExecutor(max_workers=1) as executor:
+                        page_future = executor.submit(
+                            self._generate_single_image,
+                            page,
+                            task_id,
+                            cover_image_data,
+                            0,
+                            full_outline,
+                            compressed_user_images,
+                            user_topic,
+                            progress_queue
+                        )
+                        for item in self._iter_with_progress([page_future], progress_queue):
+                            if isinstance(item, dict):
+                                yield item
+
+                    index, success, filename, error = page_future.result()
 
                     if success:
                         generated_images.append(filename)
-                        self._task_states[task_id]["generated"][index] = filename
+                        self._mark_generated(task_id, index, filename)
 
                         yield {
                             "event": "complete",
                             "data": {
                                 "index": index,
                                 "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}",
-                                "phase": "content"
+                                "image_url": self._image_url(task_id, filename),
+                                "phase": "content",
+                                "metrics": self.task_states.metrics(task_id).get(index)
                             }
                         }
                     else:
                         failed_pages.append(page)
-                        self._task_states[task_id]["failed"][index] = error
+                        self.task_states.mark_failed(task_id, index, error)
 
                         yield {
                             "event": "error",
@@ -507,7 +758,8 @@ class ImageService:
                 "total": total,
                 "completed": len(generated_images),
                 "failed": len(failed_pages),
-                "failed_indices": [p["index"] for p in failed_pages]
+                "failed_indices": [p["index"] for p in failed_pages],
+                "usage": self.get_usage_summary(task_id)
             }
         }
 
@@ -517,7 +769,8 @@ class ImageService:
         page: Dict,
         use_reference: bool = True,
         full_outline: str = "",
-        user_topic: str = ""
+        user_topic: str = "",
+        user_images: Optional[List[bytes]] = None
     ) -> Dict[str, Any]:
         """
         重试生成单张图片
@@ -528,27 +781,31 @@ class ImageService:
             use_reference: 是否使用封面作为参考
             full_outline: 完整大纲文本（从前端传入）
             user_topic: 用户原始输入（从前端传入）
+            user_images: 用户上传的参考图片（从前端传入，优先于任务状态）
 
         Returns:
             生成结果
         """
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
+        # 任务文件夹已归档时先恢复
+        get_history_service().ensure_task_restored(task_id)
+        self.current_task_dir = self.layout.ensure_task_dir(task_id)
 
         reference_image = None
-        user_images = None
+        if user_images:
+            user_images = [compress_image(img, max_size_kb=200) for img in user_images]
 
         # 首先尝试从任务状态中获取上下文
-        if task_id in self._task_states:
-            task_state = self._task_states[task_id]
-            if use_reference:
-                reference_image = task_state.get("cover_image")
+        task_state = self.task_states.get(task_id)
+        if task_state is not None:
+            if use_reference and task_state.get("has_cover"):
+                reference_image = self.task_states.cover_image(task_id)
             # 如果没有传入上下文，则使用任务状态中的
             if not full_outline:
                 full_outline = task_state.get("full_outline", "")
             if not user_topic:
                 user_topic = task_state.get("user_topic", "")
-            user_images = task_state.get("user_images")
+            if not user_images:
+                user_images = self.task_states.user_images(task_id)
 
         # 如果任务状态中没有封面图，尝试从文件系统加载
         if use_reference and reference_image is None:
@@ -570,15 +827,13 @@ class ImageService:
         )
 
         if success:
-            if task_id in self._task_states:
-                self._task_states[task_id]["generated"][index] = filename
-                if index in self._task_states[task_id]["failed"]:
-                    del self._task_states[task_id]["failed"][index]
+            self._mark_generated(task_id, index, filename)
 
             return {
                 "success": True,
                 "index": index,
-                "image_url": f"/api/images/{task_id}/{filename}"
+                "image_url": self._image_url(task_id, filename),
+                "metrics": self.task_states.metrics(task_id).get(index)
             }
         else:
             return {
@@ -591,7 +846,17 @@ class ImageService:
     def retry_failed_images(
         self,
         task_id: str,
-        pages: List[Dict]
+        pages: List[Dict],
+        user_images: Optional[List[bytes]] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """批量重试失败的图片，参数见 _retry_failed_images"""
+        yield from self._log_events(task_id, self._retry_failed_images(task_id, pages, user_images))
+
+    def _retry_failed_images(
+        self,
+        task_id: str,
+        pages: List[Dict],
+        user_images: Optional[List[bytes]] = None
     ) -> Generator[Dict[str, Any], None, None]:
         """
         批量重试失败的图片
@@ -599,18 +864,34 @@ class ImageService:
         Args:
             task_id: 任务ID
             pages: 需要重试的页面列表
+            user_images: 用户上传的参考图片（从前端传入，优先于任务状态）
 
         Yields:
             进度事件
         """
-        # 获取参考图
+        # 任务文件夹已归档时先恢复
+        get_history_service().ensure_task_restored(task_id)
+        self.current_task_dir = self.layout.ensure_task_dir(task_id)
+
+        # 获取参考图和上下文
         reference_image = None
-        if task_id in self._task_states:
-            reference_image = self._task_states[task_id].get("cover_image")
+        full_outline = ""
+        user_topic = ""
+        if user_images:
+            user_images = [compress_image(img, max_size_kb=200) for img in user_images]
+        task_state = self.task_states.get(task_id)
+        if task_state is not None:
+            if task_state.get("has_cover"):
+                reference_image = self.task_states.cover_image(task_id)
+            full_outline = task_state.get("full_outline", "")
+            user_topic = task_state.get("user_topic", "")
+            if not user_images:
+                user_images = self.task_states.user_images(task_id)
 
         total = len(pages)
         success_count = 0
         failed_count = 0
+        progress_queue = queue.Queue()
 
         yield {
             "event": "retry_start",
@@ -621,11 +902,6 @@ class ImageService:
         }
 
         # 并发重试
-        # 从任务状态中获取完整大纲
-        full_outline = ""
-        if task_id in self._task_states:
-            full_outline = self._task_states[task_id].get("full_outline", "")
-
         with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
             future_to_page = {
                 executor.submit(
@@ -634,29 +910,34 @@ class ImageService:
                     task_id,
                     reference_image,
                     0,  # retry_count
-                    full_outline  # 传入完整大纲
+                    full_outline,  # 传入完整大纲
+                    user_images,  # 用户上传的参考图片
+                    user_topic,  # 用户原始输入
+                    progress_queue  # 流式进度
                 ): page
                 for page in pages
             }
 
-            for future in as_completed(future_to_page):
+            for future in self._iter_with_progress(future_to_page, progress_queue):
+                if isinstance(future, dict):
+                    yield future
+                    continue
+
                 page = future_to_page[future]
                 try:
                     index, success, filename, error = future.result()
 
                     if success:
                         success_count += 1
-                        if task_id in self._task_states:
-                            self._task_states[task_id]["generated"][index] = filename
-                            if index in self._task_states[task_id]["failed"]:
-                                del self._task_states[task_id]["failed"][index]
+                        self._mark_generated(task_id, index, filename)
 
                         yield {
                             "event": "complete",
                             "data": {
                                 "index": index,
                                 "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}"
+                                "image_url": self._image_url(task_id, filename),
+                                "metrics": self.task_states.metrics(task_id).get(index)
                             }
                         }
                     else:
@@ -689,7 +970,8 @@ class ImageService:
                 "success": failed_count == 0,
                 "total": total,
                 "completed": success_count,
-                "failed": failed_count
+                "failed": failed_count,
+                "usage": self.get_usage_summary(task_id)
             }
         }
 
@@ -699,7 +981,8 @@ class ImageService:
         page: Dict,
         use_reference: bool = True,
         full_outline: str = "",
-        user_topic: str = ""
+        user_topic: str = "",
+        user_images: Optional[List[bytes]] = None
     ) -> Dict[str, Any]:
         """
         重新生成图片（用户手动触发，即使成功的也可以重新生成）
@@ -710,6 +993,7 @@ class ImageService:
             use_reference: 是否使用封面作为参考
             full_outline: 完整大纲文本
             user_topic: 用户原始输入
+            user_images: 用户上传的参考图片
 
         Returns:
             生成结果
@@ -717,7 +1001,8 @@ class ImageService:
         return self.retry_single_image(
             task_id, page, use_reference,
             full_outline=full_outline,
-            user_topic=user_topic
+            user_topic=user_topic,
+            user_images=user_images
         )
 
     def get_image_path(self, task_id: str, filename: str) -> str:
@@ -731,17 +1016,15 @@ class ImageService:
         Returns:
             完整路径
         """
-        task_dir = os.path.join(self.history_root_dir, task_id)
-        return os.path.join(task_dir, filename)
+        return os.path.join(self.layout.task_dir(task_id), filename)
 
     def get_task_state(self, task_id: str) -> Optional[Dict]:
-        """获取任务状态"""
-        return self._task_states.get(task_id)
+        """获取任务状态（不含参考图片，has_cover 表示是否已保存封面）"""
+        return self.task_states.get(task_id)
 
     def cleanup_task(self, task_id: str):
-        """清理任务状态（释放内存）"""
-        if task_id in self._task_states:
-            del self._task_states[task_id]
+        """清理任务状态"""
+        self.task_states.discard(task_id)
 
 
 # 全局服务实例
@@ -0,0 +1,194 @@
+"""
+图片响应式变体（按宽度和格式按需生成）
+
+/api/images/<task_id>/<filename>?w=720&format=webp 从原图生成缩放/转码后的变体，
+写入磁盘缓存 history/variants/<分片>/<task_id>/，之后直接发送缓存文件。
+
+- 宽度向上取整到 VARIANT_WIDTHS 中的档位，避免任意宽度产生大量变体
+- 缓存文件名包含原图的内容版本号，图片重新生成后自然不再命中；
+  任务变化时（保存图片、删除记录、归档）同时删除该任务的全部变体
+- 缓存总大小超过上限时按最近使用时间淘汰（LRU），进程启动后首次使用时
+  按文件修改时间恢复使用顺序
+- 使用记录保存在进程内存中，上限按进程计算：其他工作进程之后生成的变体
+  不计入本进程的总大小（多进程部署时磁盘占用最多约为 工作进程数 × 上限）
+"""
+
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image, features
+
+from backend.services.history_layout import HistoryLayout
+
+logger = logging.getLogger(__name__)
+
+# 可用的宽度档位（像素）
+VARIANT_WIDTHS = (240, 480, 720, 1080, 1440, 2160)
+
+# 格式 -> (Pillow 格式名, MIME 类型, 扩展名, 保存参数)
+VARIANT_FORMATS = {
+    "avif": ("AVIF", "image/avif", "avif", {"quality": 60}),
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("PNG", "image/png", "png", {"optimize": True}),
+}
+
+# 按 Accept 协商时的优先顺序（都不支持时使用 JPEG）
+NEGOTIATION_ORDER = ("avif", "webp")
+
+
+def supported_formats() -> Tuple[str, ...]:
+    """当前 Pillow 支持写出的变体格式"""
+    return tuple(
+        fmt for fmt in VARIANT_FORMATS
+        if fmt not in ("avif", "webp") or features.check(fmt)
+    )
+
+
+def snap_width(width: int) -> int:
+    """把请求的宽度向上取整到档位"""
+    for candidate in VARIANT_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+def negotiate_format(accept_mimetypes) -> str:
+    """
+    根据请求的 Accept 头选择格式
+
+    Args:
+        accept_mimetypes: flask.request.accept_mimetypes
+    """
+    available = supported_formats()
+    for fmt in NEGOTIATION_ORDER:
+        mimetype = VARIANT_FORMATS[fmt][1]
+        # 只在客户端明确列出时使用（image/* 通配不代表支持 AVIF/WebP）
+        if fmt in available and any(value == mimetype for value, _ in accept_mimetypes):
+            return fmt
+    return "jpeg"
+
+
+class ImageVariantCache:
+    """变体磁盘缓存（按总字节数限制，LRU 淘汰）"""
+
+    def __init__(self, layout: HistoryLayout, max_bytes: int):
+        self.layout = layout
+        self.root = os.path.join(layout.root, layout.VARIANTS_DIRNAME)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 路径 -> 文件大小，按最近使用排序（最旧在前）
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        self._total = 0
+
+    def _task_dir(self, task_id: str) -> str:
+        self.layout._check_name(task_id)
+        return os.path.join(self.root, self.layout.task_shard(task_id), task_id)
+
+    def _load(self) -> None:
+        """首次使用时扫描已有的变体文件，按修改时间恢复使用顺序"""
+        if self._entries is not None:
+            return
+        files = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, path, st.st_size))
+        files.sort()
+        self._entries = OrderedDict((path, size) for _, path, size in files)
+        self._total = sum(self._entries.values())
+
+    def get(
+        self,
+        task_id: str,
+        filename: str,
+        source_path: str,
+        version: str,
+        width: Optional[int],
+        fmt: str
+    ) -> str:
+        """
+        获取变体文件路径，不存在时从原图生成
+
+        Args:
+            task_id: 任务 ID
+            filename: 原图文件名
+            source_path: 原图路径
+            version: 原图内容版本号
+            width: 目标宽度档位，None 表示保持原尺寸
+            fmt: VARIANT_FORMATS 中的格式
+
+        Returns:
+            str: 变体文件路径
+        """
+        name = f"{filename}.{width or 'full'}.{version}.{VARIANT_FORMATS[fmt][2]}"
+        path = os.path.join(self._task_dir(task_id), name)
+
+        with self._lock:
+            self._load()
+            if path in self._entries and os.path.exists(path):
+                self._entries.move_to_end(path)
+                return path
+
+        size = self._render(source_path, path, width, fmt)
+
+        with self._lock:
+            self._total -= self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._total += size
+            self._evict()
+        return path
+
+    @staticmethod
+    def _render(source_path: str, path: str, width: Optional[int], fmt: str) -> int:
+        """生成变体文件（先写临时文件再重命名），返回文件大小"""
+        pil_format, _, _, save_params = VARIANT_FORMATS[fmt]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with Image.open(source_path) as img:
+                img.load()
+                if width and width < img.width:
+                    height = max(1, round(img.height * width / img.width))
+                    img = img.resize((width, height), Image.LANCZOS)
+                if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                img.save(tmp_path, pil_format, **save_params)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return os.path.getsize(path)
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的变体，直到总大小不超过上限（调用方持有锁）"""
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self, task_id: str) -> None:
+        """删除任务的全部变体"""
+        task_dir = self._task_dir(task_id)
+        with self._lock:
+            if self._entries is not None:
+                prefix = task_dir + os.sep
+                for path in [p for p in self._entries if p.startswith(prefix)]:
+                    self._total -= self._entries.pop(path)
+        if os.path.isdir(task_dir):
+            shutil.rmtree(task_dir, ignore_errors=True)
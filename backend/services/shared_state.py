@@ -0,0 +1,282 @@
+"""
+跨请求共享状态
+
+多个工作进程（gunicorn 等）之间需要共享的状态都通过这里读写，不再放在进程内的全局变量中：
+- 图片生成任务状态、页面用量、事件日志（任意进程都可以重试、查询进度）
+- 登录 token
+- 历史记录的变更登记和最近访问时间（只在一个进程中运行的后台任务需要看到所有进程的写入）
+
+状态按 (namespace, key) 存取，值为可 JSON 序列化的数据（bytes 会自动编码），可设置过期时间。
+后端由 Config.SHARED_STATE_BACKEND 选择：
+- sqlite（默认）：history/state.db，同一台机器上的所有进程共享
+- memory：进程内字典，只适用于单进程开发服务器
+- "包.模块:类名"：自定义后端（如 Redis），类需继承 SharedState 并支持无参构造
+"""
+
+import base64
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.config import Config
+
+# 值中 bytes 的 JSON 编码标记
+_BYTES_TAG = "$bytes"
+
+
+def _encode(value: Any) -> str:
+    def default(obj):
+        if isinstance(obj, (bytes, bytearray)):
+            return {_BYTES_TAG: base64.b64encode(obj).decode("ascii")}
+        raise TypeError(f"无法保存到共享状态的类型: {type(obj).__name__}")
+
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=default)
+
+
+def _decode(raw: str) -> Any:
+    def object_hook(obj):
+        if len(obj) == 1 and _BYTES_TAG in obj:
+            return base64.b64decode(obj[_BYTES_TAG])
+        return obj
+
+    return json.loads(raw, object_hook=object_hook)
+
+
+class SharedState:
+    """
+    共享状态接口
+
+    所有方法都必须是线程安全、进程安全的；update 需要保证读取-修改-写入的原子性。
+    """
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        """读取值，不存在或已过期时返回 default"""
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """写入值，ttl 为过期时间（秒），None 表示不过期"""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    def update(
+        self,
+        namespace: str,
+        key: str,
+        fn: Callable[[Any], Any],
+        ttl: Optional[float] = None
+    ) -> Any:
+        """
+        原子地修改值
+
+        Args:
+            fn: 接收当前值（不存在时为 None），返回新值；返回 None 表示删除
+            ttl: 新值的过期时间（秒）
+
+        Returns:
+            Any: 新值
+        """
+        raise NotImplementedError
+
+    def keys(self, namespace: str) -> List[str]:
+        """命名空间下未过期的全部键"""
+        raise NotImplementedError
+
+
+class MemorySharedState(SharedState):
+    """进程内实现（仅单进程）。值同样以 JSON 保存，读取方拿到的是副本，与其他后端行为一致"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[Tuple[str, str], Tuple[Optional[float], str]] = {}
+
+    def _get_raw(self, namespace: str, key: str) -> Optional[str]:
+        item = self._data.get((namespace, key))
+        if item is None:
+            return None
+        expires_at, raw = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[(namespace, key)]
+            return None
+        return raw
+
+    def _set_raw(self, namespace: str, key: str, value: Any, ttl: Optional[float]) -> None:
+        if value is None:
+            self._data.pop((namespace, key), None)
+            return
+        expires_at = time.time() + ttl if ttl else None
+        self._data[(namespace, key)] = (expires_at, _encode(value))
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            raw = self._get_raw(namespace, key)
+        return default if raw is None else _decode(raw)
+
+    def set(self, namespace, key, value, ttl=None):
+        with self._lock:
+            self._set_raw(namespace, key, value, ttl)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def update(self, namespace, key, fn, ttl=None):
+        with self._lock:
+            raw = self._get_raw(namespace, key)
+            value = fn(None if raw is None else _decode(raw))
+            self._set_raw(namespace, key, value, ttl)
+            return value
+
+    def keys(self, namespace):
+        with self._lock:
+            candidates = [key for ns, key in self._data if ns == namespace]
+            return [key for key in candidates if self._get_raw(namespace, key) is not None]
+
+
+class SqliteSharedState(SharedState):
+    """
+    SQLite 实现（WAL 模式）
+
+    同一台机器上的多个进程共享一个数据库文件；update 在 BEGIN IMMEDIATE 事务中执行。
+    过期的行读取时视为不存在，每 PURGE_EVERY 次写入顺带清理一次。
+    """
+
+    PURGE_EVERY = 256
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expires_at REAL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_state_expires_at ON state(expires_at);
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _select(conn: sqlite3.Connection, namespace: str, key: str) -> Optional[str]:
+        row = conn.execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ? "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _write(self, conn: sqlite3.Connection, namespace: str, key: str, value: Any, ttl: Optional[float]) -> None:
+        if value is None:
+            conn.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        else:
+            conn.execute(
+                "INSERT INTO state (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (namespace, key, _encode(value), time.time() + ttl if ttl else None)
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute("DELETE FROM state WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, namespace, key, default=None):
+        raw = self._select(self._conn(), namespace, key)
+        return default if raw is None else _decode(raw)
+
+    def set(self, namespace, key, value, ttl=None):
+        self._write(self._conn(), namespace, key, value, ttl)
+
+    def delete(self, namespace, key):
+        self._write(self._conn(), namespace, key, None, None)
+
+    def update(self, namespace, key, fn, ttl=None):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            raw = self._select(conn, namespace, key)
+            value = fn(None if raw is None else _decode(raw))
+            self._write(conn, namespace, key, value, ttl)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def keys(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key FROM state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+
+def create_shared_state(backend: str, db_path: str) -> SharedState:
+    """
+    创建共享状态后端
+
+    Args:
+        backend: sqlite / memory / "包.模块:类名"
+        db_path: sqlite 后端的数据库文件路径
+
+    Returns:
+        SharedState: 共享状态实例
+    """
+    if backend == "sqlite":
+        return SqliteSharedState(db_path)
+    if backend == "memory":
+        return MemorySharedState()
+    if ":" in backend:
+        module_name, _, class_name = backend.partition(":")
+        cls = getattr(importlib.import_module(module_name), class_name)
+        if not (isinstance(cls, type) and issubclass(cls, SharedState)):
+            raise ValueError(f"自定义共享状态后端必须继承 SharedState: {backend}")
+        return cls()
+    raise ValueError(
+        f"不支持的共享状态后端: {backend}\n"
+        "支持的后端: sqlite, memory, 或 \"包.模块:类名\" 形式的自定义后端"
+    )
+
+
+_state_instance = None
+_state_lock = threading.Lock()
+
+
+def get_shared_state() -> SharedState:
+    """
+    获取共享状态实例（单例模式）
+
+    Returns:
+        SharedState: 按 Config.SHARED_STATE_BACKEND 创建的共享状态
+    """
+    global _state_instance
+    if _state_instance is None:
+        with _state_lock:
+            if _state_instance is None:
+                db_path = Config.SHARED_STATE_PATH or os.path.join(
+                    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                    "history",
+                    "state.db"
+                )
+                _state_instance = create_shared_state(Config.SHARED_STATE_BACKEND, db_path)
+    return _state_instance
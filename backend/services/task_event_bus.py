@@ -0,0 +1,125 @@
+"""
+任务事件总线（asyncio，ASGI 模式使用）
+
+一个进程内所有 SSE 连接共享一个事件循环和一个轮询协程：
+- 每个被订阅的任务只读取一次事件日志，新事件分发到该任务所有订阅者的队列
+- 先读取很小的最新序号，有新事件才读取整个日志；读取在线程池中执行，不阻塞事件循环
+- 本进程的后台生成任务写入事件后立即唤醒轮询，其他进程产生的事件最迟 POLL_INTERVAL 秒后送达
+- 本进程任务的模型流式阶段进度（不写入日志、没有序号）直接分发给订阅者
+
+订阅者按自己的序号去重，新订阅的 after 小于总线读取位置时，总线回退读取位置补发历史事件。
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from backend.services.generation_jobs import GenerationJobs
+from backend.services.task_state import TaskStateStore
+
+logger = logging.getLogger(__name__)
+
+
+class TaskEventBus:
+    """按任务分发事件日志中的新事件"""
+
+    # 轮询事件日志的间隔（秒）
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, store: TaskStateStore, jobs: Optional[GenerationJobs] = None):
+        self.store = store
+        # task_id -> 订阅者队列
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        # task_id -> 已读取到的序号
+        self._cursors: Dict[str, int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._poller: Optional[asyncio.Task] = None
+        if jobs is not None:
+            jobs.add_listener(self._on_job_event)
+
+    def subscribe(self, task_id: str, after: int = 0) -> asyncio.Queue:
+        """
+        订阅任务事件（在事件循环中调用）
+
+        队列中的日志事件可能重复，由订阅者按 seq 去重；阶段进度没有 seq，收到即推送。
+        """
+        self._ensure_started()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        self._cursors[task_id] = min(self._cursors.get(task_id, after), after)
+        self._wake.set()
+        return queue
+
+    def unsubscribe(self, task_id: str, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(task_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[task_id]
+            self._cursors.pop(task_id, None)
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _ensure_started(self) -> None:
+        if self._poller is None or self._poller.done():
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self._poller = self._loop.create_task(self._poll())
+
+    def _on_job_event(self, task_id: str, live_event: Optional[Dict]) -> None:
+        """后台任务线程产生事件后调用"""
+        loop = self._loop
+        if loop is not None and task_id in self._subscribers:
+            try:
+                if live_event is None:
+                    loop.call_soon_threadsafe(self._wake.set)
+                else:
+                    loop.call_soon_threadsafe(self._dispatch, task_id, [live_event])
+            except RuntimeError:  # 事件循环已关闭
+                pass
+
+    def _dispatch(self, task_id: str, events: List[Dict]) -> None:
+        for queue in self._subscribers.get(task_id, ()):
+            for event in events:
+                queue.put_nowait(event)
+
+    async def _poll(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # 没有订阅者时只等待唤醒
+            timeout = self.POLL_INTERVAL if self._subscribers else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not self._subscribers:
+                continue
+
+            cursors = dict(self._cursors)
+            try:
+                updates = await loop.run_in_executor(None, self._read_new_events, cursors)
+            except Exception as e:
+                logger.warning(f"读取任务事件失败: {e}")
+                continue
+
+            for task_id, events in updates.items():
+                if task_id not in self._subscribers:
+                    continue
+                # 读取期间有新订阅者回退了读取位置时保留回退后的位置，下一轮补发
+                if self._cursors.get(task_id) == cursors[task_id]:
+                    self._cursors[task_id] = events[-1]["seq"]
+                self._dispatch(task_id, events)
+
+    def _read_new_events(self, cursors: Dict[str, int]) -> Dict[str, List[Dict]]:
+        """在线程池中执行：读取各任务序号大于读取位置的事件"""
+        updates: Dict[str, List[Dict]] = {}
+        for task_id, after in cursors.items():
+            if self.store.last_seq(task_id) > after:
+                events = self.store.events(task_id, after)
+                if events:
+                    updates[task_id] = events
+        return updates
@@ -0,0 +1,197 @@
+"""
+图片生成任务状态
+
+保存在共享状态中，生成、重试、重新生成和进度查询可以由不同的工作进程处理：
+- 任务状态：页面列表、已生成/失败的页、大纲和用户输入、关联的历史记录
+- 参考图片（封面压缩图、用户上传的参考图）单独保存，更新页面状态时不必反复读写
+- 每页的耗时和 token 用量
+- 事件日志：生成过程中推送的 SSE 事件按序号保存，断线后可从任意进程补取
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+from backend.services.shared_state import SharedState, get_shared_state
+
+_STATE = "task_state"
+_BLOBS = "task_blobs"
+_METRICS = "task_metrics"
+_EVENTS = "task_events"
+_EVENT_SEQ = "task_event_seq"
+
+
+def _int_keys(mapping: Optional[Dict]) -> Dict[int, Any]:
+    """JSON 对象的键都是字符串，还原为页码"""
+    return {int(k): v for k, v in (mapping or {}).items()}
+
+
+class TaskStateStore:
+    """任务状态存取"""
+
+    # 任务状态保留时间（秒），超过后重试/重新生成回退为从任务文件夹读取封面
+    STATE_TTL = 24 * 3600
+    # 每个任务最多保留的事件数
+    MAX_EVENTS = 500
+
+    def __init__(self, shared: SharedState):
+        self.shared = shared
+
+    def create(
+        self,
+        task_id: str,
+        pages: List[Dict],
+        full_outline: str,
+        user_topic: str,
+        record_id: Optional[str],
+        user_images: Optional[List[bytes]] = None
+    ) -> None:
+        """
+        开始生成时初始化任务状态（清空上一次生成的事件和用量）
+
+        事件序号不归零：重新生成同一任务时，之前订阅的 after 仍然有效，不会漏掉新事件。
+        """
+        self.shared.set(_STATE, task_id, {
+            "pages": pages,
+            "generated": {},
+            "failed": {},
+            "full_outline": full_outline,
+            "user_topic": user_topic,
+            "record_id": record_id,
+            "has_cover": False
+        }, ttl=self.STATE_TTL)
+        self.shared.set(_BLOBS, f"{task_id}:user_images", user_images, ttl=self.STATE_TTL)
+        self.shared.delete(_BLOBS, f"{task_id}:cover")
+        self.shared.delete(_METRICS, task_id)
+        self.shared.update(
+            _EVENTS, task_id, lambda log: log and {"seq": log["seq"], "events": []}, ttl=self.STATE_TTL
+        )
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """
+        获取任务状态（不含参考图片）
+
+        Returns:
+            Optional[Dict]: generated/failed 为 页码 -> 文件名/错误信息，任务不存在时返回 None
+        """
+        state = self.shared.get(_STATE, task_id)
+        if state is not None:
+            state["generated"] = _int_keys(state.get("generated"))
+            state["failed"] = _int_keys(state.get("failed"))
+        return state
+
+    def _update(self, task_id: str, fn) -> Optional[Dict]:
+        """修改已存在的任务状态（任务不存在时不创建）"""
+        def apply(state):
+            if state is not None:
+                fn(state)
+            return state
+
+        return self.shared.update(_STATE, task_id, apply, ttl=self.STATE_TTL)
+
+    def mark_generated(self, task_id: str, index: int, filename: str) -> Optional[Dict]:
+        """
+        登记某页生成成功（同时清除该页的失败记录）
+
+        Returns:
+            Optional[Dict]: 更新后的任务状态，任务不存在时返回 None
+        """
+        def apply(state):
+            state["generated"][str(index)] = filename
+            state["failed"].pop(str(index), None)
+
+        state = self._update(task_id, apply)
+        if state is not None:
+            state["generated"] = _int_keys(state["generated"])
+            state["failed"] = _int_keys(state["failed"])
+        return state
+
+    def mark_failed(self, task_id: str, index: int, error: str) -> None:
+        def apply(state):
+            state["failed"][str(index)] = error
+
+        self._update(task_id, apply)
+
+    def set_cover(self, task_id: str, cover_image: bytes) -> None:
+        """保存压缩后的封面（后续页面和重试的参考图）"""
+        def apply(state):
+            state["has_cover"] = True
+
+        self.shared.set(_BLOBS, f"{task_id}:cover", cover_image, ttl=self.STATE_TTL)
+        self._update(task_id, apply)
+
+    def cover_image(self, task_id: str) -> Optional[bytes]:
+        return self.shared.get(_BLOBS, f"{task_id}:cover")
+
+    def user_images(self, task_id: str) -> Optional[List[bytes]]:
+        return self.shared.get(_BLOBS, f"{task_id}:user_images")
+
+    # ==================== 用量 ====================
+
+    def record_metrics(self, task_id: str, index: int, metrics: Dict[str, int]) -> None:
+        def apply(pages):
+            pages = pages or {}
+            pages[str(index)] = metrics
+            return pages
+
+        self.shared.update(_METRICS, task_id, apply, ttl=self.STATE_TTL)
+
+    def metrics(self, task_id: str) -> Dict[int, Dict[str, int]]:
+        """各页的耗时和用量：页码 -> metrics"""
+        return _int_keys(self.shared.get(_METRICS, task_id))
+
+    # ==================== 事件日志 ====================
+
+    def append_event(self, task_id: str, event: Dict[str, Any]) -> int:
+        """
+        追加一个事件
+
+        Returns:
+            int: 事件序号（从 1 开始递增）
+        """
+        def apply(log):
+            log = log or {"seq": 0, "events": []}
+            log["seq"] += 1
+            log["events"].append({"seq": log["seq"], **event})
+            del log["events"][:-self.MAX_EVENTS]
+            return log
+
+        seq = self.shared.update(_EVENTS, task_id, apply, ttl=self.STATE_TTL)["seq"]
+        # 单独保存最新序号，订阅方轮询时只读这个小值，有新事件才读取整个日志
+        self.shared.set(_EVENT_SEQ, task_id, seq, ttl=self.STATE_TTL)
+        return seq
+
+    def last_seq(self, task_id: str) -> int:
+        """最新事件的序号（没有事件时为 0）"""
+        return self.shared.get(_EVENT_SEQ, task_id, 0)
+
+    def events(self, task_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """序号大于 after 的事件（每个事件包含 seq、event、data）"""
+        log = self.shared.get(_EVENTS, task_id) or {"events": []}
+        return [event for event in log["events"] if event["seq"] > after]
+
+    def discard(self, task_id: str) -> None:
+        """删除任务的全部状态"""
+        self.shared.delete(_STATE, task_id)
+        self.shared.delete(_BLOBS, f"{task_id}:cover")
+        self.shared.delete(_BLOBS, f"{task_id}:user_images")
+        self.shared.delete(_METRICS, task_id)
+        self.shared.delete(_EVENTS, task_id)
+        self.shared.delete(_EVENT_SEQ, task_id)
+
+
+_store_instance = None
+_store_lock = threading.Lock()
+
+
+def get_task_state_store() -> TaskStateStore:
+    """
+    获取任务状态存取实例（单例模式）
+
+    查询任务状态和事件不需要创建图片生成服务（不依赖服务商配置）。
+    """
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                _store_instance = TaskStateStore(get_shared_state())
+    return _store_instance
@@ -0,0 +1,184 @@
+"""
+上传文件服务
+
+负责存储用户上传的参考图片：
+- 按内容哈希寻址，同一张图片只存一份
+- 入库时统一压缩到 200KB 以内，后续请求直接复用压缩结果
+- 大纲、图片生成、重试、重新生成都通过上传 ID 引用图片，无需重复传输
+"""
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional
+from backend.config import Config
+from backend.utils.image_compressor import compress_image
+
+logger = logging.getLogger(__name__)
+
+
+class UploadNotFoundError(ValueError):
+    """引用的上传图片不存在或 ID 无效（客户端错误）"""
+
+
+class UploadService:
+    """参考图片上传存储服务"""
+
+    # 单张图片原始大小上限（字节）
+    MAX_IMAGE_BYTES = Config.MAX_IMAGE_BYTES
+    # 入库时压缩到的目标大小（KB），与生成链路中参考图的压缩标准一致
+    NORMALIZED_MAX_KB = 200
+    # 上传 ID 格式：sha256 前 32 位十六进制
+    ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+    def __init__(self):
+        # 上传文件存储目录（项目根目录/uploads）
+        self.upload_dir = os.path.join(
+            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+            "uploads"
+        )
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    def _get_upload_path(self, upload_id: str) -> str:
+        """
+        获取上传文件路径
+
+        Args:
+            upload_id: 上传 ID
+
+        Returns:
+            str: 文件完整路径
+
+        Raises:
+            ValueError: ID 格式不正确
+        """
+        if not upload_id or not self.ID_PATTERN.match(upload_id):
+            raise ValueError(f"无效的上传 ID: {upload_id}")
+        return os.path.join(self.upload_dir, upload_id[:2], f"{upload_id}.img")
+
+    def save(self, image_data: bytes) -> Dict:
+        """
+        保存一张图片（已存在则直接返回）
+
+        Args:
+            image_data: 原始图片二进制数据
+
+        Returns:
+            Dict: 上传结果
+                - id: 上传 ID
+                - size: 压缩后大小（字节）
+                - original_size: 原始大小（字节）
+                - reused: 是否命中已有文件
+
+        Raises:
+            ValueError: 图片为空或超过大小限制
+        """
+        if not image_data:
+            raise ValueError("上传的图片为空")
+        if len(image_data) > self.MAX_IMAGE_BYTES:
+            raise ValueError(
+                f"图片过大：{len(image_data) / 1024 / 1024:.1f}MB，"
+                f"单张图片不能超过 {self.MAX_IMAGE_BYTES // 1024 // 1024}MB"
+            )
+
+        upload_id = hashlib.sha256(image_data).hexdigest()[:32]
+        path = self._get_upload_path(upload_id)
+
+        if os.path.exists(path):
+            return {
+                "id": upload_id,
+                "size": os.path.getsize(path),
+                "original_size": len(image_data),
+                "reused": True
+            }
+
+        normalized = compress_image(image_data, max_size_kb=self.NORMALIZED_MAX_KB)
+
+        # 原子写入：先写临时文件再重命名，避免并发上传读到半个文件
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(normalized)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        logger.debug(f"保存上传图片: {upload_id} ({len(image_data)} -> {len(normalized)} bytes)")
+        return {
+            "id": upload_id,
+            "size": len(normalized),
+            "original_size": len(image_data),
+            "reused": False
+        }
+
+    def load(self, upload_id: str) -> Optional[bytes]:
+        """
+        读取上传的图片
+
+        Args:
+            upload_id: 上传 ID
+
+        Returns:
+            Optional[bytes]: 压缩后的图片数据，不存在时返回 None
+        """
+        try:
+            path = self._get_upload_path(upload_id)
+        except ValueError:
+            return None
+
+        if not os.path.exists(path):
+            return None
+
+        with open(path, "rb") as f:
+            return f.read()
+
+    def load_many(self, upload_ids: List[str]) -> List[bytes]:
+        """
+        批量读取上传的图片
+
+        Args:
+            upload_ids: 上传 ID 列表
+
+        Returns:
+            List[bytes]: 图片数据列表（顺序与 ID 一致）
+
+        Raises:
+            UploadNotFoundError: 有图片不存在或 ID 无效
+        """
+        images = []
+        missing = []
+        for upload_id in upload_ids or []:
+            data = self.load(upload_id)
+            if data is None:
+                missing.append(upload_id)
+            else:
+                images.append(data)
+
+        if missing:
+            raise UploadNotFoundError(
+                f"参考图片不存在：{', '.join(missing)}\n"
+                "解决方案：请重新上传参考图片"
+            )
+
+        return images
+
+
+_service_instance = None
+
+
+def get_upload_service() -> UploadService:
+    """
+    获取上传服务实例（单例模式）
+
+    Returns:
+        UploadService: 上传服务实例
+    """
+    global _service_instance
+    if _service_instance is None:
+        _service_instance = UploadService()
+    return _service_instance
@@ -2,6 +2,7 @@
 import time
 import random
 from functools import wraps
+from typing import Iterator
 from google import genai
 from google.genai import types
 
@@ -96,35 +97,16 @@ class GenAIClient:
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ]
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_text_request(
         self,
         prompt: str,
-        model: str = "gemini-3-pro-preview",
-        temperature: float = 1.0,
-        max_output_tokens: int = 8000,
+        temperature: float,
+        max_output_tokens: int,
         use_search: bool = False,
         use_thinking: bool = False,
-        images: list = None,
-        system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            use_search: 是否使用搜索
-            use_thinking: 是否启用思考模式
-            images: 图片列表（暂不支持）
-            system_prompt: 系统提示词（暂不支持）
-
-        Returns:
-            生成的文本
-        """
+        images: list = None
+    ):
+        """构建文本生成请求的 contents 和 config"""
         parts = [types.Part(text=prompt)]
 
         if images:
@@ -161,6 +143,41 @@ class GenAIClient:
 
         generate_content_config = types.GenerateContentConfig(**config_kwargs)
 
+        return contents, generate_content_config
+
+    @retry_on_429(max_retries=3, base_delay=2)
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            use_search: 是否使用搜索
+            use_thinking: 是否启用思考模式
+            images: 图片列表（暂不支持）
+            system_prompt: 系统提示词（暂不支持）
+
+        Returns:
+            生成的文本
+        """
+        contents, generate_content_config = self._build_text_request(
+            prompt, temperature, max_output_tokens, use_search, use_thinking, images
+        )
+
         result = ""
         for chunk in self.client.models.generate_content_stream(
             model=model,
@@ -173,6 +190,41 @@ class GenAIClient:
 
         return result
 
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（参数同 generate_text）
+
+        Yields:
+            依次到达的文本片段
+        """
+        contents, generate_content_config = self._build_text_request(
+            prompt, temperature, max_output_tokens, use_search, use_thinking, images
+        )
+
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=generate_content_config,
+            ):
+                if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
+                    continue
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise Exception(parse_genai_error(e))
+
     @retry_on_429(max_retries=5, base_delay=3)  # 图片生成重试更多次
     def generate_image(
         self,
@@ -0,0 +1,100 @@
+"""图片文件的 HTTP 缓存工具
+
+- 内容哈希：作为 ETag 和图片 URL 的版本号（?v=），按 (路径, mtime, 大小) 缓存，
+  文件未变化时不重复读取；保存图片时可以直接用内存中的数据登记，免去再次读取
+- 文件类型：按文件头识别（缩略图是 JPEG 数据但文件名是 .png）
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 版本号长度（十六进制字符数）
+VERSION_LENGTH = 16
+
+# 最多缓存的文件数
+MAX_ENTRIES = 4096
+
+_MAGIC_MIMETYPES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+# 路径 -> (mtime_ns, size, 版本号, MIME 类型)
+_cache: "OrderedDict[str, Tuple[int, int, str, str]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def content_version(data: bytes) -> str:
+    """计算内容版本号（SHA-256 前缀）"""
+    return hashlib.sha256(data).hexdigest()[:VERSION_LENGTH]
+
+
+def sniff_mimetype(head: bytes, default: str = "application/octet-stream") -> str:
+    """根据文件头识别图片类型"""
+    for magic, mimetype in _MAGIC_MIMETYPES:
+        if head.startswith(magic):
+            return mimetype
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+def _put(path: str, st: os.stat_result, version: str, mimetype: str) -> None:
+    with _lock:
+        _cache[path] = (st.st_mtime_ns, st.st_size, version, mimetype)
+        _cache.move_to_end(path)
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+def remember_file(path: str, data: bytes) -> str:
+    """
+    登记刚写入的文件内容（调用方已持有数据，无需再次读取）
+
+    Returns:
+        str: 内容版本号
+    """
+    version = content_version(data)
+    _put(path, os.stat(path), version, sniff_mimetype(data[:16]))
+    return version
+
+
+def describe_file(path: str) -> Tuple[str, str, os.stat_result]:
+    """
+    获取文件的内容版本号和 MIME 类型
+
+    Returns:
+        Tuple[str, str, os.stat_result]: (版本号, MIME 类型, stat 结果)
+
+    Raises:
+        OSError: 文件不存在或无法读取
+    """
+    st = os.stat(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            _cache.move_to_end(path)
+            return cached[2], cached[3], st
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024)
+        digest.update(head)
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    version = digest.hexdigest()[:VERSION_LENGTH]
+    mimetype = sniff_mimetype(head)
+    _put(path, st, version, mimetype)
+    return version, mimetype, st
+
+
+def file_version(path: str) -> Optional[str]:
+    """文件的内容版本号，文件不存在时返回 None"""
+    try:
+        return describe_file(path)[0]
+    except OSError:
+        return None
@@ -0,0 +1,79 @@
+"""JSON 响应压缩
+
+较大的 JSON 响应（历史记录详情中的完整大纲、列表、搜索结果）按 Accept-Encoding 压缩：
+- 安装了 brotli 模块时优先使用 br，否则使用 gzip
+- 压缩后 ETag 改为弱 ETag（同一内容的不同编码字节不同），条件请求按弱比较照常命中
+- 已有 Content-Encoding、流式响应和小响应不处理
+"""
+import gzip
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只使用 gzip
+    brotli = None
+
+# gzip 压缩级别（JSON 文本在 6 级已接近最大压缩率）
+GZIP_LEVEL = 6
+# brotli 压缩质量（0-11，5 级在速度和压缩率之间较均衡，适合动态响应）
+BROTLI_QUALITY = 5
+
+
+def supported_encodings() -> tuple:
+    """可用的压缩编码（按优先顺序）"""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """
+    按客户端的 Accept-Encoding 选择压缩编码
+
+    Args:
+        accept_encodings: werkzeug 的 request.accept_encodings
+
+    Returns:
+        Optional[str]: br / gzip，客户端不接受时返回 None
+    """
+    for encoding in supported_encodings():
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_json_response(response, accept_encodings, min_bytes: int):
+    """
+    压缩 JSON 响应（after_request 中调用）
+
+    Args:
+        response: Flask 响应
+        accept_encodings: request.accept_encodings
+        min_bytes: 小于该大小的响应不压缩
+
+    Returns:
+        原响应对象（可能已被原地修改）
+    """
+    if (response.mimetype != "application/json" or response.status_code != 200
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,271 @@
+"""增量 JSON 解析工具
+
+用于流式解析 AI 返回的 JSON 对象：
+- 逐块喂入文本，顶层字段一旦完整即可取出
+- 顶层数组的元素逐个完成时也会单独上报
+- 自动跳过 JSON 前后的说明文字和 markdown 代码块标记
+- 流被截断时尽量恢复已生成的部分内容
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    容错的增量 JSON 解析器（只关注顶层对象）
+
+    用法：
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for kind, key, value in parser.feed(chunk):
+                ...  # kind 为 "item"（数组元素）或 "field"（完整字段）
+        result = parser.finish()
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+
+        # 扫描状态
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+        # 顶层字段状态
+        self._expect_key = True
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._value_is_array = False
+
+        # 顶层数组元素状态
+        self._item_start: Optional[int] = None
+        self._items: List[Any] = []
+
+        self.result: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已完整闭合"""
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        """
+        喂入一段文本
+
+        Args:
+            chunk: 新到达的文本片段
+
+        Returns:
+            新完成的事件列表，每项为 (kind, key, value)
+        """
+        events: List[Tuple[str, str, Any]] = []
+        if not chunk or self._done:
+            return events
+
+        self._text += chunk
+        text = self._text
+
+        while self._pos < len(text) and not self._done:
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+
+            if not self._started:
+                if c == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string_end(i, events)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key_start = i
+                else:
+                    self._mark_value_start(i)
+                continue
+
+            if c in ' \t\r\n':
+                continue
+
+            if c in '{[':
+                self._mark_value_start(i)
+                self._depth += 1
+                if self._depth == 2 and c == '[':
+                    self._value_is_array = True
+                    self._item_start = None
+                continue
+
+            if c in '}]':
+                if self._depth == 2 and self._value_is_array:
+                    self._close_item(i, events)
+                self._depth -= 1
+                if self._depth == 1:
+                    self._close_value(i + 1, events)
+                elif self._depth == 0:
+                    self._close_value(i, events)
+                    self._done = True
+                continue
+
+            if c == ',':
+                if self._depth == 1:
+                    self._close_value(i, events)
+                elif self._depth == 2 and self._value_is_array:
+                    self._close_item(i, events)
+                continue
+
+            if c == ':' and self._depth == 1:
+                self._expect_key = False
+                continue
+
+            self._mark_value_start(i)
+
+        return events
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        结束解析，返回已解析的字段
+
+        如果流在某个字段中途被截断，会尽量恢复该字段：
+        - 字符串：补全引号后返回已生成的部分
+        - 数组：返回已完整的元素（以及可恢复的最后一个字符串元素）
+
+        Returns:
+            Dict: 解析结果
+
+        Raises:
+            ValueError: 文本中没有任何可用的 JSON 字段
+        """
+        if not self._done and self._key is not None and self._value_start is not None:
+            partial = self._recover_partial()
+            if partial is not None:
+                self.result[self._key] = partial
+
+        if not self.result:
+            raise ValueError("AI 返回的内容格式不正确，无法解析")
+
+        return self.result
+
+    @property
+    def truncated(self) -> bool:
+        """是否在顶层对象闭合前就结束了"""
+        return not self._done
+
+    # ==================== 内部方法 ====================
+
+    def _mark_value_start(self, i: int) -> None:
+        """记录值/数组元素的起始位置"""
+        if self._depth == 1 and not self._expect_key and self._value_start is None:
+            self._value_start = i
+        elif self._depth == 2 and self._value_is_array and self._item_start is None:
+            self._item_start = i
+
+    def _on_string_end(self, i: int, events: List) -> None:
+        """字符串结束：可能是键名，也可能是顶层字符串值"""
+        if self._depth != 1:
+            return
+
+        if self._expect_key and self._key_start is not None:
+            try:
+                self._key = json.loads(self._text[self._key_start:i + 1])
+            except json.JSONDecodeError:
+                self._key = self._text[self._key_start + 1:i]
+            self._key_start = None
+            return
+
+        # 顶层字符串值闭合后立即上报，不必等待后面的逗号
+        self._close_value(i + 1, events)
+
+    def _close_item(self, end: int, events: List) -> None:
+        """顶层数组中的一个元素完成"""
+        if self._item_start is None:
+            return
+        raw = self._text[self._item_start:end].strip()
+        self._item_start = None
+        if not raw:
+            return
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        self._items.append(item)
+        events.append(("item", self._key, item))
+
+    def _close_value(self, end: int, events: List) -> None:
+        """顶层字段的值完成"""
+        if self._key is None or self._value_start is None:
+            self._reset_field()
+            return
+
+        raw = self._text[self._value_start:end].strip()
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = list(self._items) if self._value_is_array else None
+
+        if value is not None:
+            self.result[self._key] = value
+            events.append(("field", self._key, value))
+
+        self._reset_field()
+
+    def _reset_field(self) -> None:
+        self._expect_key = True
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._value_is_array = False
+        self._item_start = None
+        self._items = []
+
+    def _recover_partial(self) -> Any:
+        """从截断的字段中恢复可用内容"""
+        if self._value_is_array:
+            items = list(self._items)
+            if self._item_start is not None:
+                tail = self._close_string(self._text[self._item_start:])
+                if tail is not None:
+                    try:
+                        items.append(json.loads(tail))
+                    except json.JSONDecodeError:
+                        pass
+            return items
+
+        raw = self._text[self._value_start:]
+        fixed = self._close_string(raw)
+        if fixed is None:
+            return None
+        try:
+            return json.loads(fixed)
+        except json.JSONDecodeError:
+            return None
+
+    @staticmethod
+    def _close_string(raw: str) -> Optional[str]:
+        """把截断的 JSON 字符串字面量补全，非字符串返回原文"""
+        raw = raw.strip()
+        if not raw.startswith('"'):
+            return raw or None
+        if len(raw) > 1 and raw.endswith('"') and not raw.endswith('\\"'):
+            return raw
+        # 去掉末尾不完整的转义序列
+        body = raw[1:]
+        backslashes = len(body) - len(body.rstrip('\\'))
+        if backslashes % 2 == 1:
+            body = body[:-1]
+        unicode_idx = body.rfind('\\u')
+        if unicode_idx != -1 and len(body) - unicode_idx < 6:
+            body = body[:unicode_idx]
+        return '"' + body + '"'
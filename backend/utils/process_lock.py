@@ -0,0 +1,81 @@
+"""
+进程间互斥锁
+
+多进程部署时，后台任务（增量同步、保留策略）只应在一个工作进程中运行。
+各进程启动时尝试以非阻塞方式锁定同一个文件，成功的进程负责后台任务；
+锁随进程退出自动释放，服务器补启的新工作进程会重新获得它。
+
+file_lock() 是阻塞式的短时互斥锁，用于多个进程可能同时操作同一份文件的场景（如任务归档和恢复）。
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows：只运行单进程开发服务器，无需互斥
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 持有的锁文件（进程存活期间保持打开）
+_held = {}
+
+
+def try_acquire_process_lock(path: str) -> bool:
+    """
+    尝试获取进程锁（不阻塞）
+
+    Args:
+        path: 锁文件路径
+
+    Returns:
+        bool: 本进程是否持有该锁（已持有时同样返回 True）
+    """
+    if fcntl is None or path in _held:
+        return True
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    f = open(path, "a")
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _held[path] = f
+    logger.debug(f"进程 {os.getpid()} 获得进程锁: {path}")
+    return True
+
+
+# 没有 fcntl 时退化为进程内的线程锁
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    跨进程互斥锁（阻塞，同一进程的不同线程之间同样互斥）
+
+    每次加锁都重新打开锁文件：flock 锁属于打开的文件，同一进程内的两次打开也会互相等待。
+    锁文件保留在原处，删除它会让正在等待的进程锁住一个已不存在的文件。
+
+    Args:
+        path: 锁文件路径
+    """
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(path, threading.Lock())
+        with lock:
+            yield
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
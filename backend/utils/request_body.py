@@ -0,0 +1,333 @@
+"""请求体流式解析工具
+
+用于处理携带 base64 图片的大 JSON 请求体：
+- 分块读取请求流，不把整个请求体读成一个大字符串
+- 图片字段边读边解码，单张图片读完立即压缩，原始数据随即释放
+- 单张图片和请求总量超限时立即中断，不再继续读取
+"""
+import base64
+import binascii
+import codecs
+import json
+import re
+from typing import Any, Callable, Dict, IO, Iterable, List, Optional, Tuple
+
+# 每次从请求流读取的字节数
+CHUNK_SIZE = 64 * 1024
+
+# base64 字母表以外的字符（换行、空格等）
+_NON_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+# 图片字符串中的 JSON 转义：\/ 还原为 /，换行等空白转义直接丢弃（按 MIME 折行的 base64）
+_JSON_ESCAPES = {'/': '/', '\\': '\\', '"': '"', 'n': '', 'r': '', 't': '', 'b': '', 'f': ''}
+
+
+class PayloadTooLargeError(ValueError):
+    """请求体或其中的图片超过大小限制"""
+
+
+class StreamingImageJSONParser:
+    """
+    流式 JSON 解析器：顶层对象中指定字段的 base64 图片数组会被边读边解码
+
+    其余字段按原样累积后再整体 json.loads（这部分通常只有几十 KB）。
+
+    用法：
+        parser = StreamingImageJSONParser(('user_images',), max_image_bytes, max_total_bytes)
+        for text in chunks:
+            parser.feed(text)
+        data, images = parser.close()
+    """
+
+    def __init__(
+        self,
+        image_fields: Iterable[str],
+        max_image_bytes: int,
+        max_total_bytes: int,
+        normalize: Optional[Callable[[bytes], bytes]] = None
+    ):
+        self.image_fields = tuple(image_fields)
+        self.max_image_bytes = max_image_bytes
+        self.max_total_bytes = max_total_bytes
+        self.normalize = normalize
+
+        self.images: Dict[str, List[bytes]] = {field: [] for field in self.image_fields}
+        self.total_bytes = 0
+
+        # 非图片部分（图片位置用 null 占位）
+        self._skeleton: List[str] = []
+
+        # 扫描状态
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._key_chars: Optional[List[str]] = None
+        self._in_image_array = False
+
+        # 当前图片的解码状态
+        self._in_image = False
+        self._b64_pending = ""
+        self._b64_escape = ""  # 在分块边界处被截断的转义序列
+        self._image_buf = bytearray()
+
+    def feed(self, text: str) -> None:
+        """
+        喂入一段已解码的文本
+
+        Raises:
+            PayloadTooLargeError: 图片或请求总量超过限制
+            ValueError: 图片不是合法的 base64
+        """
+        i = 0
+        n = len(text)
+
+        while i < n:
+            if self._in_image:
+                # 图片字符串内没有需要处理的结构字符，直接整段找结束引号
+                end = text.find('"', i)
+                self._feed_image(text[i:] if end == -1 else text[i:end])
+                if end == -1:
+                    return
+                self._finish_image()
+                i = end + 1
+                continue
+
+            c = text[i]
+            i += 1
+
+            if self._in_string:
+                self._append(c)
+                if self._key_chars is not None and not (c == '"' and not self._escape):
+                    self._key_chars.append(c)
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._key_chars is not None:
+                        self._key = json.loads('"' + ''.join(self._key_chars) + '"')
+                        self._key_chars = None
+                continue
+
+            if c == '"':
+                if self._depth == 2 and self._in_image_array:
+                    self._in_image = True
+                    self._append('null')
+                    continue
+                self._in_string = True
+                if self._depth == 1 and self._expect_key:
+                    self._key_chars = []
+                self._append(c)
+                continue
+
+            if c in '{[':
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+                elif (self._depth == 2 and c == '[' and not self._expect_key
+                        and self._key in self.images):
+                    self._in_image_array = True
+            elif c in '}]':
+                if self._depth == 2 and self._in_image_array:
+                    self._in_image_array = False
+                self._depth -= 1
+            elif c == ',' and self._depth == 1:
+                self._expect_key = True
+            elif c == ':' and self._depth == 1:
+                self._expect_key = False
+
+            self._append(c)
+
+    def close(self) -> Tuple[Dict[str, Any], Dict[str, List[bytes]]]:
+        """
+        结束解析
+
+        Returns:
+            (data, images): 非图片字段组成的字典，以及各图片字段解码后的图片列表
+
+        Raises:
+            ValueError: JSON 不完整或格式错误
+        """
+        if self._in_image or self._in_string or self._depth != 0:
+            raise ValueError("请求体 JSON 不完整")
+
+        skeleton = ''.join(self._skeleton).strip()
+        if not skeleton:
+            return {}, self.images
+
+        data = json.loads(skeleton)
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是 JSON 对象")
+
+        # 图片字段已单独解析，去掉占位用的 null
+        for field in self.image_fields:
+            data.pop(field, None)
+
+        return data, self.images
+
+    # ==================== 内部方法 ====================
+
+    def _append(self, piece: str) -> None:
+        """累积非图片部分，同样计入总量限制"""
+        self._skeleton.append(piece)
+        self.total_bytes += len(piece)
+        self._check_total()
+
+    def _feed_image(self, segment: str) -> None:
+        """解码一段 base64 文本"""
+        if not segment:
+            return
+
+        segment = self._unescape(segment)
+
+        # data URL 前缀（data:image/png;base64,）：丢弃逗号之前的内容
+        comma = segment.rfind(',')
+        if comma != -1:
+            segment = segment[comma + 1:]
+            self.total_bytes -= len(self._image_buf)
+            self._image_buf.clear()
+            self._b64_pending = ""
+
+        self._b64_pending += _NON_BASE64.sub('', segment)
+        usable = len(self._b64_pending) // 4 * 4
+        if usable:
+            self._decode(self._b64_pending[:usable])
+            self._b64_pending = self._b64_pending[usable:]
+
+    def _unescape(self, segment: str) -> str:
+        """还原图片字符串中的 JSON 转义，末尾不完整的转义留到下一段"""
+        segment = self._b64_escape + segment
+        self._b64_escape = ""
+        if '\\' not in segment:
+            return segment
+
+        out = []
+        i = 0
+        n = len(segment)
+        while True:
+            j = segment.find('\\', i)
+            if j == -1:
+                out.append(segment[i:])
+                break
+            out.append(segment[i:j])
+            if j + 1 >= n or (segment[j + 1] == 'u' and j + 6 > n):
+                self._b64_escape = segment[j:]
+                break
+            c = segment[j + 1]
+            if c == 'u':
+                try:
+                    out.append(chr(int(segment[j + 2:j + 6], 16)))
+                except ValueError:
+                    raise ValueError(f"图片数据包含无效的转义序列（字段 {self._key}）")
+                i = j + 6
+            elif c in _JSON_ESCAPES:
+                out.append(_JSON_ESCAPES[c])
+                i = j + 2
+            else:
+                raise ValueError(f"图片数据包含无效的转义序列（字段 {self._key}）")
+        return ''.join(out)
+
+    def _finish_image(self) -> None:
+        """单张图片读取完毕：解码剩余部分并立即压缩"""
+        if self._b64_escape:
+            raise ValueError(f"图片数据包含无效的转义序列（字段 {self._key}）")
+        if self._b64_pending:
+            pending = self._b64_pending
+            self._decode(pending + '=' * (-len(pending) % 4))
+
+        if self._image_buf:
+            image_data = bytes(self._image_buf)
+            if self.normalize:
+                image_data = self.normalize(image_data)
+            self.images[self._key].append(image_data)
+
+        self._in_image = False
+        self._b64_pending = ""
+        self._b64_escape = ""
+        self._image_buf = bytearray()
+
+    def _decode(self, b64_text: str) -> None:
+        try:
+            decoded = base64.b64decode(b64_text)
+        except (binascii.Error, ValueError):
+            raise ValueError(f"图片数据不是有效的 base64 编码（字段 {self._key}）")
+
+        self._image_buf.extend(decoded)
+        self.total_bytes += len(decoded)
+
+        if len(self._image_buf) > self.max_image_bytes:
+            raise PayloadTooLargeError(
+                f"单张图片过大：超过 {self.max_image_bytes // 1024 // 1024}MB 限制\n"
+                "解决方案：请压缩图片后重新上传"
+            )
+        self._check_total()
+
+    def _check_total(self) -> None:
+        if self.total_bytes > self.max_total_bytes:
+            raise PayloadTooLargeError(
+                f"请求数据过大：超过 {self.max_total_bytes // 1024 // 1024}MB 限制\n"
+                "解决方案：减少参考图片数量或压缩图片后重试"
+            )
+
+
+def parse_json_with_images(
+    stream: IO[bytes],
+    image_fields: Iterable[str],
+    max_image_bytes: int,
+    max_total_bytes: int,
+    normalize: Optional[Callable[[bytes], bytes]] = None
+) -> Tuple[Dict[str, Any], Dict[str, List[bytes]]]:
+    """
+    分块读取请求流并解析 JSON，图片字段边读边解码
+
+    Args:
+        stream: 请求体二进制流
+        image_fields: 存放 base64 图片数组的顶层字段名
+        max_image_bytes: 单张图片解码后的大小上限
+        max_total_bytes: 整个请求（图片解码后 + 其他字段）的大小上限
+        normalize: 单张图片读完后的处理函数（如压缩）
+
+    Returns:
+        (data, images): 非图片字段字典，以及各图片字段的图片列表
+    """
+    parser = StreamingImageJSONParser(image_fields, max_image_bytes, max_total_bytes, normalize)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        parser.feed(decoder.decode(chunk))
+
+    parser.feed(decoder.decode(b'', final=True))
+    return parser.close()
+
+
+def read_limited(stream: IO[bytes], max_bytes: int) -> bytes:
+    """
+    读取请求流，超过上限时立即中断
+
+    Args:
+        stream: 请求体二进制流
+        max_bytes: 最大字节数
+
+    Returns:
+        bytes: 请求体数据
+
+    Raises:
+        PayloadTooLargeError: 超过大小限制
+    """
+    buf = bytearray()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buf.extend(chunk)
+        if len(buf) > max_bytes:
+            raise PayloadTooLargeError(
+                f"上传数据过大：超过 {max_bytes // 1024 // 1024}MB 限制"
+            )
+    return bytes(buf)
@@ -1,10 +1,11 @@
 """Text API 客户端封装"""
+import json
 import time
 import random
 import base64
 import requests
 from functools import wraps
-from typing import List, Optional, Union
+from typing import Iterator, List, Optional, Union
 from .image_compressor import compress_image
 
 
@@ -101,6 +102,103 @@ class TextChatClient:
 
         return content
 
+    def _build_messages(
+        self,
+        prompt: str,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None
+    ) -> List[dict]:
+        """构建 chat/completions 的 messages 列表"""
+        messages = []
+
+        # 添加系统提示词
+        if system_prompt:
+            messages.append({
+                "role": "system",
+                "content": system_prompt
+            })
+
+        # 构建用户消息内容
+        content = self._build_content_with_images(prompt, images)
+        messages.append({
+            "role": "user",
+            "content": content
+        })
+
+        return messages
+
+    def _raise_for_status(self, response: requests.Response, model: str) -> None:
+        """根据 HTTP 状态码抛出带解决方案的异常"""
+        error_detail = response.text[:500]
+        status_code = response.status_code
+
+        # 根据状态码给出更详细的错误信息
+        if status_code == 401:
+            raise Exception(
+                "❌ API Key 认证失败\n\n"
+                "【可能原因】\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 格式错误（复制时可能包含空格）\n"
+                "3. API Key 被禁用或删除\n\n"
+                "【解决方案】\n"
+                "1. 在系统设置页面检查 API Key 是否正确\n"
+                "2. 重新获取 API Key\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 403:
+            raise Exception(
+                "❌ 权限被拒绝\n\n"
+                "【可能原因】\n"
+                "1. API Key 没有访问该模型的权限\n"
+                "2. 账户配额已用尽\n"
+                "3. 区域限制\n\n"
+                "【解决方案】\n"
+                "1. 检查 API 权限配置\n"
+                "2. 尝试使用其他模型\n"
+                f"\n【原始错误】{error_detail[:200]}"
+            )
+        elif status_code == 404:
+            raise Exception(
+                "❌ 模型不存在或 API 端点错误\n\n"
+                "【可能原因】\n"
+                f"1. 模型 '{model}' 不存在或已下线\n"
+                "2. Base URL 配置错误\n\n"
+                "【解决方案】\n"
+                "1. 检查模型名称是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 429:
+            raise Exception(
+                "⏳ API 配额或速率限制\n\n"
+                "【说明】\n"
+                "请求频率过高或配额已用尽。\n\n"
+                "【解决方案】\n"
+                "1. 稍后再试（等待 1-2 分钟）\n"
+                "2. 检查 API 配额使用情况\n"
+                "3. 考虑升级计划获取更多配额"
+            )
+        elif status_code >= 500:
+            raise Exception(
+                f"⚠️ API 服务器错误 ({status_code})\n\n"
+                "【说明】\n"
+                "这是服务端的临时故障，与您的配置无关。\n\n"
+                "【解决方案】\n"
+                "1. 稍等几分钟后重试\n"
+                "2. 如果持续出现，检查服务商状态页"
+            )
+        else:
+            raise Exception(
+                f"❌ API 请求失败 (状态码: {status_code})\n\n"
+                f"【原始错误】\n{error_detail}\n\n"
+                f"【请求地址】{self.chat_endpoint}\n"
+                f"【模型】{model}\n\n"
+                "【通用解决方案】\n"
+                "1. 检查 API Key 是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                "3. 检查模型名称是否正确"
+            )
+
     @retry_on_429(max_retries=3, base_delay=2)
     def generate_text(
         self,
@@ -126,21 +224,7 @@ class TextChatClient:
         Returns:
             生成的文本
         """
-        messages = []
-
-        # 添加系统提示词
-        if system_prompt:
-            messages.append({
-                "role": "system",
-                "content": system_prompt
-            })
-
-        # 构建用户消息内容
-        content = self._build_content_with_images(prompt, images)
-        messages.append({
-            "role": "user",
-            "content": content
-        })
+        messages = self._build_messages(prompt, images, system_prompt)
 
         payload = {
             "model": model,
@@ -164,75 +248,7 @@ class TextChatClient:
         )
 
         if response.status_code != 200:
-            error_detail = response.text[:500]
-            status_code = response.status_code
-
-            # 根据状态码给出更详细的错误信息
-            if status_code == 401:
-                raise Exception(
-                    "❌ API Key 认证失败\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 格式错误（复制时可能包含空格）\n"
-                    "3. API Key 被禁用或删除\n\n"
-                    "【解决方案】\n"
-                    "1. 在系统设置页面检查 API Key 是否正确\n"
-                    "2. 重新获取 API Key\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 403:
-                raise Exception(
-                    "❌ 权限被拒绝\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 没有访问该模型的权限\n"
-                    "2. 账户配额已用尽\n"
-                    "3. 区域限制\n\n"
-                    "【解决方案】\n"
-                    "1. 检查 API 权限配置\n"
-                    "2. 尝试使用其他模型\n"
-                    f"\n【原始错误】{error_detail[:200]}"
-                )
-            elif status_code == 404:
-                raise Exception(
-                    "❌ 模型不存在或 API 端点错误\n\n"
-                    "【可能原因】\n"
-                    f"1. 模型 '{model}' 不存在或已下线\n"
-                    "2. Base URL 配置错误\n\n"
-                    "【解决方案】\n"
-                    "1. 检查模型名称是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 429:
-                raise Exception(
-                    "⏳ API 配额或速率限制\n\n"
-                    "【说明】\n"
-                    "请求频率过高或配额已用尽。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍后再试（等待 1-2 分钟）\n"
-                    "2. 检查 API 配额使用情况\n"
-                    "3. 考虑升级计划获取更多配额"
-                )
-            elif status_code >= 500:
-                raise Exception(
-                    f"⚠️ API 服务器错误 ({status_code})\n\n"
-                    "【说明】\n"
-                    "这是服务端的临时故障，与您的配置无关。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍等几分钟后重试\n"
-                    "2. 如果持续出现，检查服务商状态页"
-                )
-            else:
-                raise Exception(
-                    f"❌ API 请求失败 (状态码: {status_code})\n\n"
-                    f"【原始错误】\n{error_detail}\n\n"
-                    f"【请求地址】{self.chat_endpoint}\n"
-                    f"【模型】{model}\n\n"
-                    "【通用解决方案】\n"
-                    "1. 检查 API Key 是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    "3. 检查模型名称是否正确"
-                )
+            self._raise_for_status(response, model)
 
         result = response.json()
 
@@ -251,6 +267,82 @@ class TextChatClient:
             )
 
 
+    @retry_on_429(max_retries=3, base_delay=2)
+    def _open_stream(self, payload: dict, model: str) -> requests.Response:
+        """发起流式请求（只对建立连接阶段做限流重试）"""
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        response = requests.post(
+            self.chat_endpoint,
+            json=payload,
+            headers=headers,
+            timeout=300,  # 5分钟超时
+            stream=True
+        )
+
+        if response.status_code != 200:
+            try:
+                self._raise_for_status(response, model)
+            finally:
+                response.close()
+
+        return response
+
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本（参数同 generate_text）
+
+        Yields:
+            依次到达的文本片段
+        """
+        payload = {
+            "model": model,
+            "messages": self._build_messages(prompt, images, system_prompt),
+            "temperature": temperature,
+            "max_tokens": max_output_tokens,
+            "stream": True
+        }
+
+        response = self._open_stream(payload, model)
+        try:
+            # 按字节分行后再以 UTF-8 解码：text/event-stream 响应通常不带 charset，
+            # decode_unicode 会按 ISO-8859-1 解码导致中文乱码（UTF-8 多字节字符不含换行字节，分行是安全的）
+            for raw_line in response.iter_lines():
+                line = raw_line.decode('utf-8', errors='replace')
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = choices[0].get("delta") or choices[0].get("message") or {}
+                text = delta.get("content")
+                if text:
+                    yield text
+        finally:
+            response.close()
+
+
 def get_text_chat_client(provider_config: dict):
     """
     获取 Text Chat 客户端实例（根据 type 返回对应客户端）
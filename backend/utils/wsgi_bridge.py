@@ -0,0 +1,184 @@
+"""
+在 ASGI 服务器中运行 WSGI 应用
+
+ASGI 模式下除事件流以外的请求仍由 Flask 处理：
+- 请求体先在事件循环中读完（超过 1MB 转存临时文件），Flask 在线程池中同步读取
+- 响应头和每个响应块从工作线程提交回事件循环发送，发送完成后才继续产生下一块（背压）
+- 客户端断开后停止迭代并关闭响应（触发生成器的 GeneratorExit 清理）
+"""
+
+import asyncio
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import Any, Callable, Dict, Optional
+
+from werkzeug.wsgi import FileWrapper
+
+# 请求体在内存中缓冲的上限，超过后转存临时文件
+_SPOOL_MAX_SIZE = 1024 * 1024
+# 发送文件时每块的最小字节数（每块都要在线程和事件循环之间往返一次）
+_FILE_BLOCK_SIZE = 256 * 1024
+
+
+def _file_wrapper(file, block_size: int = 8192) -> FileWrapper:
+    return FileWrapper(file, max(block_size, _FILE_BLOCK_SIZE))
+
+
+class WsgiBridge:
+    """把 WSGI 应用包装为 ASGI 应用（只处理 http 请求）"""
+
+    def __init__(self, wsgi_app: Callable, max_workers: int, max_body_size: Optional[int] = None):
+        """
+        Args:
+            wsgi_app: WSGI 应用
+            max_workers: 同时执行 WSGI 请求的线程数
+            max_body_size: 请求体上限（字节），声明的 Content-Length 超限时不读取请求体，
+                交给应用按自身规则拒绝；未声明长度且实际超限时直接返回 413
+        """
+        self.wsgi_app = wsgi_app
+        self.max_body_size = max_body_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        body = SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+        try:
+            if not await self._read_body(scope, receive, send, body):
+                return
+            body.seek(0)
+            environ = self._environ(scope, body)
+
+            loop = asyncio.get_running_loop()
+            disconnected = threading.Event()
+            watcher = loop.create_task(self._watch_disconnect(receive, disconnected))
+            try:
+                await loop.run_in_executor(
+                    self.executor, self._run, environ, send, loop, disconnected
+                )
+            finally:
+                watcher.cancel()
+        finally:
+            body.close()
+
+    async def _read_body(self, scope, receive, send, body) -> bool:
+        """读取请求体，返回是否继续处理（客户端断开或已返回 413 时为 False）"""
+        declared = None
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    pass
+        if self.max_body_size is not None and declared is not None and declared > self.max_body_size:
+            return True
+
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return False
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if self.max_body_size is not None and size > self.max_body_size:
+                await send({
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"text/plain; charset=utf-8")]
+                })
+                await send({"type": "http.response.body", "body": b"Request Entity Too Large"})
+                return False
+            body.write(chunk)
+            more_body = message.get("more_body", False)
+        return True
+
+    @staticmethod
+    async def _watch_disconnect(receive: Callable, disconnected: threading.Event) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    @staticmethod
+    def _environ(scope: Dict[str, Any], body) -> Dict[str, Any]:
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        server = scope.get("server") or ("localhost", None)
+        client = scope.get("client") or ("", 0)
+
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            # WSGI 要求路径为按 latin-1 解码的原始字节
+            "SCRIPT_NAME": root_path.encode("utf-8").decode("latin-1"),
+            "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1] or 80),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+            "wsgi.file_wrapper": _file_wrapper,
+        }
+        for raw_name, raw_value in scope["headers"]:
+            name = raw_name.decode("latin-1")
+            value = raw_value.decode("latin-1")
+            if name == "content-type":
+                key = "CONTENT_TYPE"
+            elif name == "content-length":
+                key = "CONTENT_LENGTH"
+            else:
+                key = "HTTP_" + name.upper().replace("-", "_")
+            if key in environ:
+                value = f"{environ[key]},{value}"
+            environ[key] = value
+        return environ
+
+    def _run(self, environ, send, loop, disconnected: threading.Event) -> None:
+        """在工作线程中执行 WSGI 应用"""
+        response_start = {}
+        started = False
+
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response_start["status"] = int(status.split(" ", 1)[0])
+            response_start["headers"] = [
+                (name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers
+            ]
+            return write
+
+        def write(data: bytes) -> None:
+            nonlocal started
+            if not started:
+                send_message({"type": "http.response.start", **response_start})
+                started = True
+            if data:
+                send_message({"type": "http.response.body", "body": data, "more_body": True})
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                if disconnected.is_set():
+                    return
+                write(chunk)
+            if not disconnected.is_set():
+                write(b"")
+                send_message({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,10 @@
+"""
+WSGI 入口（生产环境）
+
+由多进程服务器加载，每个工作进程各自创建应用；跨请求的状态都在共享状态中（见 services/shared_state.py）：
+    uv run gunicorn -c backend/gunicorn.conf.py backend.wsgi:app
+"""
+
+from backend.app import create_app
+
+app = create_app()
@@ -90,6 +90,8 @@ export interface ProgressEvent {
   total?: number
   image_url?: string
   message?: string
+  stage?: 'first_byte' | 'thought' | 'text' | 'image_received'  // 流式生成阶段
+  elapsed_ms?: number
 }
 
 export interface FinishEvent {
@@ -98,11 +100,38 @@ export interface FinishEvent {
   images: string[]
 }
 
+// 上传参考图片：同一张图片只存一份，返回的 ID 可在大纲/生成/重试/重绘中复用
+export async function uploadImages(
+  images: File[]
+): Promise<{ success: boolean; ids?: string[]; error?: string }> {
+  const formData = new FormData()
+  images.forEach((file) => {
+    formData.append('images', file)
+  })
+
+  const response = await axios.post(`${API_BASE_URL}/uploads`, formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data'
+    }
+  })
+  return response.data
+}
+
 // 生成大纲（支持图片上传）
 export async function generateOutline(
   topic: string,
-  images?: File[]
+  images?: File[],
+  imageIds?: string[]
 ): Promise<OutlineResponse & { has_images?: boolean }> {
+  // 已上传的图片直接传 ID
+  if (imageIds && imageIds.length > 0) {
+    const response = await axios.post<OutlineResponse & { has_images?: boolean }>(
+      `${API_BASE_URL}/outline`,
+      { topic, image_ids: imageIds }
+    )
+    return response.data
+  }
+
   // 如果有图片，使用 FormData
   if (images && images.length > 0) {
     const formData = new FormData()
@@ -132,7 +161,11 @@ export async function generateOutline(
 
 // 获取图片 URL（新格式：task_id/filename）
 // thumbnail 参数：true=缩略图（默认），false=原图
-export function getImageUrl(taskId: string, filename: string, thumbnail: boolean = true): string {
+// width 参数：按宽度获取缩放后的图片（服务端按 Accept 选择 AVIF/WebP/JPEG，忽略 thumbnail）
+export function getImageUrl(taskId: string, filename: string, thumbnail: boolean = true, width?: number): string {
+  if (width) {
+    return `${API_BASE_URL}/images/${taskId}/${filename}?w=${Math.round(width)}`
+  }
   const thumbParam = thumbnail ? '?thumbnail=true' : '?thumbnail=false'
   return `${API_BASE_URL}/images/${taskId}/${filename}${thumbParam}`
 }
@@ -145,6 +178,7 @@ export async function regenerateImage(
   context?: {
     fullOutline?: string
     userTopic?: string
+    userImageIds?: string[]
   }
 ): Promise<{ success: boolean; index: number; image_url?: string; error?: string }> {
   const response = await axios.post(`${API_BASE_URL}/regenerate`, {
@@ -152,11 +186,34 @@ export async function regenerateImage(
     page,
     use_reference: useReference,
     full_outline: context?.fullOutline,
-    user_topic: context?.userTopic
+    user_topic: context?.userTopic,
+    user_image_ids: context?.userImageIds?.length ? context.userImageIds : undefined
   })
   return response.data
 }
 
+// 提交后台生成任务并订阅其事件流（SSE）
+// 生成在服务端后台运行，连接断开不会中断生成；事件流只推送本次提交之后的事件
+async function openJobStream(path: string, body: Record<string, unknown>): Promise<Response> {
+  const job = await fetch(`${API_BASE_URL}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(body)
+  })
+  if (!job.ok) {
+    throw new Error(`HTTP error! status: ${job.status}`)
+  }
+
+  const { stream_url } = await job.json()
+  const response = await fetch(`${API_BASE_URL}${stream_url}`)
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`)
+  }
+  return response
+}
+
 // 批量重试失败的图片（SSE）
 export async function retryFailedImages(
   taskId: string,
@@ -165,24 +222,16 @@ export async function retryFailedImages(
   onComplete: (event: ProgressEvent) => void,
   onError: (event: ProgressEvent) => void,
   onFinish: (event: { success: boolean; total: number; completed: number; failed: number }) => void,
-  onStreamError: (error: Error) => void
+  onStreamError: (error: Error) => void,
+  userImageIds?: string[]
 ) {
   try {
-    const response = await fetch(`${API_BASE_URL}/retry-failed`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        task_id: taskId,
-        pages
-      })
+    const response = await openJobStream('/jobs/retry-failed', {
+      task_id: taskId,
+      pages,
+      user_image_ids: userImageIds && userImageIds.length > 0 ? userImageIds : undefined
     })
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`)
-    }
-
     const reader = response.body?.getReader()
     if (!reader) {
       throw new Error('无法读取响应流')
@@ -614,23 +663,83 @@ export async function deleteHistory(recordId: string): Promise<{
   }
 }
 
+/**
+ * 历史记录封面拼图
+ */
+export interface ContactSheet {
+  key: string
+  url: string
+  width: number
+  height: number
+  tile_width: number
+  tile_height: number
+  tiles: Record<string, { x: number; y: number }>
+}
+
+/**
+ * 获取历史记录列表及当前页的封面拼图
+ *
+ * 返回值与 getHistoryList 相同，另含 sheet：整页封面拼成的一张图及各记录的坐标，
+ * 列表卡片用 CSS 背景定位显示封面，一页只需一次图片请求
+ *
+ * @param page - 页码，从 1 开始
+ * @param pageSize - 每页数量
+ * @param status - 状态过滤（可选）
+ */
+export async function getHistoryContactSheet(
+  page: number = 1,
+  pageSize: number = 20,
+  status?: string
+): Promise<{
+  success: boolean
+  records: HistoryRecord[]
+  total?: number
+  total_pages?: number
+  sheet?: ContactSheet | null
+  error?: string
+}> {
+  try {
+    const params: any = { page, page_size: pageSize }
+    if (status) params.status = status
+
+    const response = await axios.get(`${API_BASE_URL}/history/contact-sheet`, {
+      params,
+      timeout: 30000 // 首次生成拼图需要读取缩略图，超时时间放宽
+    })
+    return response.data
+  } catch (error: any) {
+    const errorMessage = axios.isAxiosError(error)
+      ? error.response?.data?.error || error.message || '获取历史记录列表失败'
+      : '未知错误，请稍后重试'
+    return { success: false, records: [], error: errorMessage }
+  }
+}
+
 /**
  * 搜索历史记录
  *
  * 根据关键词搜索历史记录标题
  *
- * @param keyword - 搜索关键词
+ * @param keyword - 搜索关键词（匹配标题和大纲内容）
+ * @param page - 页码，从 1 开始
+ * @param pageSize - 每页数量
  *
- * @returns Promise 包含匹配的历史记录列表
+ * @returns Promise 包含按相关度排序的历史记录列表和分页信息
  */
-export async function searchHistory(keyword: string): Promise<{
+export async function searchHistory(
+  keyword: string,
+  page: number = 1,
+  pageSize: number = 20
+): Promise<{
   success: boolean
   records: HistoryRecord[]
+  total?: number
+  total_pages?: number
   error?: string
 }> {
   try {
     const response = await axios.get(`${API_BASE_URL}/history/search`, {
-      params: { keyword },
+      params: { keyword, page, page_size: pageSize },
       timeout: 10000 // 10秒超时
     })
     return response.data
@@ -659,7 +768,10 @@ export async function searchHistory(keyword: string): Promise<{
 export async function getHistoryStats(): Promise<{
   success: boolean
   total: number
+  total_images?: number
+  total_disk_bytes?: number
   by_status: Record<string, number>
+  details?: Record<string, { records: number; images: number; disk_bytes: number }>
   error?: string
 }> {
   try {
@@ -692,43 +804,20 @@ export async function generateImagesPost(
   onError: (event: ProgressEvent) => void,
   onFinish: (event: FinishEvent) => void,
   onStreamError: (error: Error) => void,
-  userImages?: File[],
-  userTopic?: string
+  userImageIds?: string[],
+  userTopic?: string,
+  recordId?: string | null
 ) {
   try {
-    // 将用户图片转换为 base64
-    let userImagesBase64: string[] = []
-    if (userImages && userImages.length > 0) {
-      userImagesBase64 = await Promise.all(
-        userImages.map(file => {
-          return new Promise<string>((resolve, reject) => {
-            const reader = new FileReader()
-            reader.onload = () => resolve(reader.result as string)
-            reader.onerror = reject
-            reader.readAsDataURL(file)
-          })
-        })
-      )
-    }
-
-    const response = await fetch(`${API_BASE_URL}/generate`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        pages,
-        task_id: taskId,
-        full_outline: fullOutline,
-        user_images: userImagesBase64.length > 0 ? userImagesBase64 : undefined,
-        user_topic: userTopic || ''
-      })
+    const response = await openJobStream('/jobs/generate', {
+      pages,
+      task_id: taskId,
+      full_outline: fullOutline,
+      user_image_ids: userImageIds && userImageIds.length > 0 ? userImageIds : undefined,
+      user_topic: userTopic || '',
+      record_id: recordId || undefined
     })
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`)
-    }
-
     const reader = response.body?.getReader()
     if (!reader) {
       throw new Error('无法读取响应流')
@@ -790,18 +879,47 @@ export async function generateImagesPost(
   }
 }
 
-// 扫描所有任务并同步图片列表
-export async function scanAllTasks(): Promise<{
+// 扫描所有任务并同步图片列表（后端分批扫描，这里按游标逐批请求并汇总结果）
+// incremental 为 true 时只扫描自上次同步后发生变化的任务
+export async function scanAllTasks(incremental = false, batchSize = 200): Promise<{
   success: boolean
   total_tasks?: number
   synced?: number
+  updated?: number
   failed?: number
   orphan_tasks?: string[]
   results?: any[]
   error?: string
 }> {
-  const response = await axios.post(`${API_BASE_URL}/history/scan-all`)
-  return response.data
+  const summary = {
+    success: true,
+    total_tasks: 0,
+    synced: 0,
+    updated: 0,
+    failed: 0,
+    orphan_tasks: [] as string[],
+    results: [] as any[]
+  }
+  let cursor: string | null = null
+
+  do {
+    const response: any = await axios.post(`${API_BASE_URL}/history/scan-all`, null, {
+      params: { limit: batchSize, cursor: cursor || undefined, incremental }
+    })
+    const data = response.data
+    if (!data.success) {
+      return data
+    }
+    summary.total_tasks += data.total_tasks || 0
+    summary.synced += data.synced || 0
+    summary.updated += data.updated || 0
+    summary.failed += data.failed || 0
+    summary.orphan_tasks.push(...(data.orphan_tasks || []))
+    summary.results.push(...(data.results || []))
+    cursor = data.has_more ? data.next_cursor : null
+  } while (cursor)
+
+  return summary
 }
 
 // ==================== 配置管理 API ====================
@@ -874,3 +992,86 @@ export async function generateContent(
   })
   return response.data
 }
+
+export interface ContentFieldEvent {
+  field: 'titles' | 'copywriting' | 'tags'
+  value: string[] | string
+}
+
+// 流式生成标题、文案、标签（SSE）：每个字段一完成就回调，无需等待全部生成
+export async function generateContentStream(
+  topic: string,
+  outline: string,
+  onTitle: (event: { index: number; title: string }) => void,
+  onField: (event: ContentFieldEvent) => void
+): Promise<ContentResponse & { partial?: boolean }> {
+  try {
+    const response = await fetch(`${API_BASE_URL}/content/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({ topic, outline })
+    })
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`)
+    }
+
+    const reader = response.body?.getReader()
+    if (!reader) {
+      throw new Error('无法读取响应流')
+    }
+
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let result: (ContentResponse & { partial?: boolean }) | null = null
+
+    try {
+      while (true) {
+        const { done, value } = await reader.read()
+
+        if (done) break
+
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n\n')
+        buffer = lines.pop() || ''
+
+        for (const line of lines) {
+          if (!line.trim()) continue
+
+          const [eventLine, dataLine] = line.split('\n')
+          if (!eventLine || !dataLine) continue
+
+          const eventType = eventLine.replace('event: ', '').trim()
+          const eventData = dataLine.replace('data: ', '').trim()
+
+          try {
+            const data = JSON.parse(eventData)
+
+            switch (eventType) {
+              case 'title':
+                onTitle(data)
+                break
+              case 'field':
+                onField(data)
+                break
+              case 'finish':
+              case 'error':
+                result = data
+                break
+            }
+          } catch (e) {
+            console.error('解析 SSE 数据失败:', e)
+          }
+        }
+      }
+    } finally {
+      reader.releaseLock()
+    }
+
+    return result || { success: false, error: '连接中断，未收到生成结果' }
+  } catch (error) {
+    return { success: false, error: (error as Error).message || '生成失败，请重试' }
+  }
+}
@@ -21,6 +21,7 @@ export interface Provider {
   endpoint_type?: string
   high_concurrency?: boolean
   short_prompt?: boolean
+  context_cache?: boolean
 }
 
 // 服务商配置类型
@@ -51,6 +52,7 @@ export interface ImageProviderForm {
   model: string
   high_concurrency: boolean
   short_prompt: boolean
+  context_cache: boolean
   endpoint_type: string
   _has_api_key: boolean
 }
@@ -127,6 +129,7 @@ export function useProviderForm() {
       model: '',
       high_concurrency: false,
       short_prompt: false,
+      context_cache: false,
       endpoint_type: '/v1/images/generations',
       _has_api_key: false
     }
@@ -363,6 +366,7 @@ export function useProviderForm() {
       model: provider.model || '',
       high_concurrency: provider.high_concurrency || false,
       short_prompt: provider.short_prompt || false,
+      context_cache: provider.context_cache || false,
       endpoint_type: provider.endpoint_type || '/v1/images/generations',
       _has_api_key: !!provider.api_key_masked
     }
@@ -405,7 +409,8 @@ export function useProviderForm() {
       type: imageForm.value.type,
       model: imageForm.value.model,
       high_concurrency: imageForm.value.high_concurrency,
-      short_prompt: imageForm.value.short_prompt
+      short_prompt: imageForm.value.short_prompt,
+      context_cache: imageForm.value.context_cache
     }
 
     // 如果是 OpenAI 兼容接口，保存 endpoint_type
@@ -25,6 +25,7 @@ export interface GeneratedImage {
   status: 'generating' | 'done' | 'error' | 'retrying'  // 生成状态
   error?: string      // 错误信息
   retryable?: boolean // 是否可以重试
+  stageMessage?: string // 流式生成阶段提示（如"模型思考中..."）
 }
 
 /**
@@ -70,6 +71,9 @@ export interface GeneratorState {
   // 用户上传的参考图片（File对象，不会被持久化）
   userImages: File[]
 
+  // 参考图片的上传 ID（服务端已存储，可持久化并在生成/重试时复用）
+  userImageIds: string[]
+
   // 生成的内容数据（标题、文案、标签）
   content: GeneratedContent
 
@@ -107,6 +111,7 @@ function saveState(state: GeneratorState) {
       images: state.images,                  // 生成的图片结果
       taskId: state.taskId,                  // 任务ID
       recordId: state.recordId,              // 历史记录ID
+      userImageIds: state.userImageIds,      // 参考图片上传ID
       content: state.content,                // 生成的内容（标题、文案、标签）
       outlineStatus: state.outlineStatus,    // 大纲生成状态
       lastSavedAt: state.lastSavedAt         // 最后保存时间
@@ -152,6 +157,9 @@ export const useGeneratorStore = defineStore('generator', {
       // 用户上传的参考图片（不从 localStorage 恢复）
       userImages: [],
 
+      // 参考图片上传 ID
+      userImageIds: saved.userImageIds || [],
+
       // 生成的内容数据
       content: saved.content || {
         titles: [],
@@ -314,6 +322,7 @@ export const useGeneratorStore = defineStore('generator', {
         image.status = status
         if (url) image.url = url
         if (error) image.error = error
+        if (status !== 'generating') delete image.stageMessage
       }
       // 成功完成时增加计数
       if (status === 'done') {
@@ -321,6 +330,18 @@ export const useGeneratorStore = defineStore('generator', {
       }
     },
 
+    /**
+     * 更新图片的流式生成阶段提示
+     * @param index 页面索引
+     * @param message 阶段提示文字
+     */
+    setImageStage(index: number, message: string) {
+      const image = this.images.find(img => img.index === index)
+      if (image && image.status === 'generating') {
+        image.stageMessage = message
+      }
+    },
+
     /**
      * 更新指定图片的URL
      * @param index 页面索引
@@ -329,9 +350,8 @@ export const useGeneratorStore = defineStore('generator', {
     updateImage(index: number, newUrl: string) {
       const image = this.images.find(img => img.index === index)
       if (image) {
-        // 添加时间戳避免缓存
-        const timestamp = Date.now()
-        image.url = `${newUrl}?t=${timestamp}`
+        // 后端返回的 URL 带内容版本号（?v=），重新生成后自动变化，不会命中旧缓存
+        image.url = newUrl
         image.status = 'done'
         delete image.error
       }
@@ -420,6 +440,7 @@ export const useGeneratorStore = defineStore('generator', {
 
       // 清空用户上传的参考图片
       this.userImages = []
+      this.userImageIds = []
 
       // 重置生成的内容数据
       this.content = {
@@ -448,6 +469,28 @@ export const useGeneratorStore = defineStore('generator', {
       this.content.error = undefined
     },
 
+    /**
+     * 流式生成中追加一个标题
+     * @param index 标题序号
+     * @param title 标题文本
+     */
+    setContentTitle(index: number, title: string) {
+      this.content.titles[index] = title
+    },
+
+    /**
+     * 流式生成中更新某个已完成的字段
+     * @param field 字段名
+     * @param value 字段值
+     */
+    setContentField(field: 'titles' | 'copywriting' | 'tags', value: string[] | string) {
+      if (field === 'copywriting') {
+        this.content.copywriting = value as string
+      } else {
+        this.content[field] = value as string[]
+      }
+    },
+
     /**
      * 设置生成的内容数据
      * @param titles 标题列表
@@ -78,3 +78,20 @@ def sample_history_record():
         "created_at": "2025-01-01T00:00:00",
         "updated_at": "2025-01-01T00:00:00"
     }
+
+
+@pytest.fixture
+def history_service(temp_history_dir, monkeypatch):
+    """使用临时目录的历史记录服务（history 目录建在 temp_history_dir 下）"""
+    from backend.services import history as history_module
+    from backend.services.shared_state import MemorySharedState
+    monkeypatch.setattr(
+        history_module, "__file__",
+        os.path.join(temp_history_dir, "backend", "services", "history.py")
+    )
+    shared = MemorySharedState()
+    monkeypatch.setattr(history_module, "get_shared_state", lambda: shared)
+    service = history_module.HistoryService()
+    yield service
+    service.flush_pending_updates()
+    service.store.close()
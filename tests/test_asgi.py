@@ -0,0 +1,235 @@
+"""
+ASGI 模式测试（事件流、事件总线、WSGI 桥接）
+
+没有依赖 pytest-asyncio，每个测试用 asyncio.run 驱动。
+"""
+import asyncio
+
+import pytest
+
+from backend.services import generation_jobs as generation_jobs_module
+from backend.services import task_state as task_state_module
+from backend.services.generation_jobs import GenerationJobs
+from backend.services.shared_state import MemorySharedState
+from backend.services.task_event_bus import TaskEventBus
+from backend.services.task_state import TaskStateStore
+from backend.utils.wsgi_bridge import WsgiBridge
+
+TASK_ID = "task_stream"
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """事件流使用内存中的任务状态"""
+    store = TaskStateStore(MemorySharedState())
+    monkeypatch.setattr(task_state_module, "_store_instance", store)
+    monkeypatch.setattr(generation_jobs_module, "_jobs_instance", GenerationJobs(store))
+    monkeypatch.setattr(TaskEventBus, "POLL_INTERVAL", 0.02)
+    return store
+
+
+@pytest.fixture
+def asgi_app(store, app):
+    from backend import asgi
+    return asgi.AsgiApp(app)
+
+
+def _progress(i):
+    return {"event": "progress", "data": {"index": i, "status": "done"}}
+
+
+FINISH = {"event": "finish", "data": {"success": True}}
+
+
+class StreamClient:
+    """连接事件流，收集发送的消息"""
+
+    def __init__(self, app, query=b"", headers=()):
+        self.app = app
+        self.scope = {
+            "type": "http",
+            "method": "GET",
+            "path": f"/api/task/{TASK_ID}/stream",
+            "query_string": query,
+            "headers": list(headers),
+        }
+        self.messages = []
+        self.disconnected = asyncio.Event()
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        self.messages.append(message)
+
+    async def run(self):
+        await self.app(self.scope, self.receive, self.send)
+
+    @property
+    def body(self):
+        return b"".join(m.get("body", b"") for m in self.messages if m["type"] == "http.response.body").decode()
+
+    @property
+    def ids(self):
+        return [int(line[4:]) for line in self.body.splitlines() if line.startswith("id: ")]
+
+    @property
+    def finished(self):
+        return any(m["type"] == "http.response.body" and not m.get("more_body") for m in self.messages)
+
+    async def wait_for(self, predicate, timeout=5):
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not predicate():
+            if asyncio.get_running_loop().time() > deadline:
+                raise AssertionError(f"等待超时，已收到: {self.body!r}")
+            await asyncio.sleep(0.01)
+
+
+class TestEventStream:
+    """GET /api/task/<task_id>/stream"""
+
+    def test_replay_after(self, asgi_app, store):
+        for i in range(3):
+            store.append_event(TASK_ID, _progress(i))
+        store.append_event(TASK_ID, FINISH)
+
+        async def main():
+            client = StreamClient(asgi_app, query=b"after=2")
+            await asyncio.wait_for(client.run(), 5)
+            return client
+
+        client = asyncio.run(main())
+        assert client.messages[0]["status"] == 200
+        assert client.ids == [3, 4]
+        assert "event: finish" in client.body
+        assert client.finished
+
+    def test_last_event_id_header(self, asgi_app, store):
+        for i in range(3):
+            store.append_event(TASK_ID, _progress(i))
+        store.append_event(TASK_ID, FINISH)
+
+        async def main():
+            # 浏览器自动重连时带 Last-Event-ID，取两者中较大的序号
+            client = StreamClient(asgi_app, query=b"after=1", headers=[(b"last-event-id", b"3")])
+            await asyncio.wait_for(client.run(), 5)
+            return client
+
+        assert asyncio.run(main()).ids == [4]
+
+    def test_duplicates_dropped_by_seq(self, asgi_app, store):
+        store.append_event(TASK_ID, _progress(0))
+        store.append_event(TASK_ID, _progress(1))
+
+        async def main():
+            first = StreamClient(asgi_app)
+            first_task = asyncio.ensure_future(first.run())
+            await first.wait_for(lambda: first.ids == [1, 2])
+
+            # 新订阅者从头补取：总线回退读取位置，已推送过的事件再次分发给第一个订阅者
+            second = StreamClient(asgi_app)
+            second_task = asyncio.ensure_future(second.run())
+            await second.wait_for(lambda: second.ids == [1, 2])
+
+            store.append_event(TASK_ID, FINISH)
+            await asyncio.wait_for(asyncio.gather(first_task, second_task), 5)
+            return first, second
+
+        first, second = asyncio.run(main())
+        assert first.ids == [1, 2, 3]
+        assert second.ids == [1, 2, 3]
+        assert asgi_app.bus.subscriber_count() == 0
+
+    def test_live_progress_without_seq(self, asgi_app, store):
+        async def main():
+            client = StreamClient(asgi_app)
+            task = asyncio.ensure_future(client.run())
+            await client.wait_for(lambda: asgi_app.bus.subscriber_count() == 1)
+            asgi_app.bus._on_job_event(TASK_ID, {"event": "progress", "data": {"index": 0, "stage": "streaming"}})
+            await client.wait_for(lambda: "streaming" in client.body)
+            store.append_event(TASK_ID, FINISH)
+            await asyncio.wait_for(task, 5)
+            return client
+
+        client = asyncio.run(main())
+        assert client.ids == [1]
+
+    def test_idle_timeout(self, asgi_app, monkeypatch):
+        from backend import asgi
+        monkeypatch.setattr(asgi, "HEARTBEAT_INTERVAL", 0.02)
+        monkeypatch.setattr(asgi, "STREAM_IDLE_TIMEOUT", 0.1)
+
+        async def main():
+            client = StreamClient(asgi_app)
+            await asyncio.wait_for(client.run(), 5)
+            return client
+
+        client = asyncio.run(main())
+        assert "event: heartbeat" in client.body
+        assert client.finished
+        assert asgi_app.bus.subscriber_count() == 0
+
+    def test_client_disconnect(self, asgi_app):
+        async def main():
+            client = StreamClient(asgi_app)
+            task = asyncio.ensure_future(client.run())
+            await client.wait_for(lambda: asgi_app.bus.subscriber_count() == 1)
+            client.disconnected.set()
+            await asyncio.wait_for(task, 5)
+
+        asyncio.run(main())
+        assert asgi_app.bus.subscriber_count() == 0
+
+
+def _echo_app(environ, start_response):
+    """返回请求体长度和声明的 Content-Length"""
+    body = environ["wsgi.input"].read()
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [f"{len(body)}:{environ.get('CONTENT_LENGTH', '')}".encode()]
+
+
+def _call_bridge(bridge, chunks, headers=()):
+    messages = []
+
+    async def main():
+        pending = [{"type": "http.request", "body": c, "more_body": i < len(chunks) - 1}
+                   for i, c in enumerate(chunks)]
+
+        async def receive():
+            if pending:
+                return pending.pop(0)
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "POST", "path": "/echo", "headers": list(headers)}
+        await asyncio.wait_for(bridge(scope, receive, send), 5)
+
+    asyncio.run(main())
+    status = messages[0]["status"]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return status, body
+
+
+class TestWsgiBridge:
+    """WsgiBridge 请求体上限"""
+
+    def test_body_within_limit(self):
+        bridge = WsgiBridge(_echo_app, max_workers=2, max_body_size=10)
+        assert _call_bridge(bridge, [b"abc", b"defg"]) == (200, b"7:")
+
+    def test_undeclared_body_over_limit(self):
+        bridge = WsgiBridge(_echo_app, max_workers=2, max_body_size=10)
+        status, body = _call_bridge(bridge, [b"x" * 6, b"y" * 6])
+        assert status == 413
+        assert body == b"Request Entity Too Large"
+
+    def test_declared_length_over_limit_left_to_app(self):
+        """声明的长度超限时不读取请求体，由应用（Flask 的 MAX_CONTENT_LENGTH）拒绝"""
+        bridge = WsgiBridge(_echo_app, max_workers=2, max_body_size=10)
+        status, body = _call_bridge(bridge, [b"x" * 20], headers=[(b"content-length", b"20")])
+        assert status == 200
+        assert body == b"0:20"
+
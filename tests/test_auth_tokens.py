@@ -0,0 +1,155 @@
+"""
+登录 token 测试
+"""
+import json
+import os
+import time
+
+import pytest
+
+from backend.services.auth_tokens import AuthTokenService, _b64decode, _b64encode, load_or_create_secret
+from backend.services.shared_state import MemorySharedState
+
+SECRET = b"test-secret"
+
+
+@pytest.fixture
+def shared():
+    return MemorySharedState()
+
+
+@pytest.fixture
+def tokens(shared):
+    return AuthTokenService(SECRET, shared, ttl_seconds=3600)
+
+
+def _signed(service, claims):
+    """用正确的密钥签名任意载荷"""
+    payload = json.dumps(claims).encode("utf-8")
+    return f"{_b64encode(payload)}.{service._sign(payload)}"
+
+
+class TestAuthTokens:
+    """AuthTokenService 测试"""
+
+    def test_issue_and_verify(self, tokens):
+        token = tokens.issue("admin")
+        claims = tokens.decode(token)
+        assert claims["sub"] == "admin"
+        assert claims["exp"] > time.time()
+        assert tokens.verify(token)
+        assert tokens.issue("admin") != token
+
+    @pytest.mark.parametrize("token", [
+        "", "abc", "a.b.c", "!!!.???", "é.é", ".", "YWJj.",
+    ])
+    def test_malformed(self, tokens, token):
+        assert tokens.decode(token) is None
+        assert not tokens.verify(token)
+
+    def test_tampered_payload(self, tokens):
+        payload_text, signature = tokens.issue("user").split(".")
+        claims = json.loads(_b64decode(payload_text))
+        claims["sub"] = "admin"
+        forged = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        assert tokens.decode(f"{forged}.{signature}") is None
+
+    def test_tampered_signature(self, tokens):
+        payload_text, signature = tokens.issue("admin").split(".")
+        flipped = ("A" if signature[0] != "A" else "B") + signature[1:]
+        assert tokens.decode(f"{payload_text}.{flipped}") is None
+
+    def test_other_secret(self, tokens, shared):
+        other = AuthTokenService(b"other-secret", shared, ttl_seconds=3600)
+        assert other.decode(tokens.issue("admin")) is None
+
+    @pytest.mark.parametrize("claims", [
+        [1, 2, 3],
+        "admin",
+        42,
+        None,
+        {"sub": "admin"},
+        {"sub": "admin", "exp": "tomorrow", "jti": "x"},
+        {"sub": "admin", "exp": time.time() + 3600, "jti": 123},
+    ])
+    def test_invalid_claims(self, tokens, claims):
+        token = _signed(tokens, claims)
+        assert tokens.decode(token) is None
+        assert not tokens.verify(token)
+
+    def test_expired(self, shared):
+        expired = AuthTokenService(SECRET, shared, ttl_seconds=-1)
+        token = expired.issue("admin")
+        assert expired.decode(token) is None
+        assert not expired.verify(token)
+        assert not expired.revoke(token)
+
+    def test_expires_after_ttl(self, tokens, monkeypatch):
+        token = tokens.issue("admin")
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 3601)
+        assert not tokens.verify(token)
+
+    def test_revoked(self, tokens):
+        token = tokens.issue("admin")
+        other = tokens.issue("admin")
+        assert tokens.revoke(token)
+        assert not tokens.verify(token)
+        # 签名和有效期仍然正确，只是已登出
+        assert tokens.decode(token) is not None
+        assert tokens.verify(other)
+
+    def test_revocation_shared_between_processes(self, tokens, shared):
+        other_process = AuthTokenService(SECRET, shared, ttl_seconds=3600)
+        token = tokens.issue("admin")
+        assert other_process.verify(token)
+
+        assert tokens.revoke(token)
+        # 其他进程在缓存过期后读取到吊销列表
+        other_process._revoked_loaded_at = 0.0
+        assert not other_process.verify(token)
+
+    def test_revocation_delay_in_other_process(self, tokens, shared, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "time", lambda: now[0])
+        other_process = AuthTokenService(SECRET, shared, ttl_seconds=3600, revocation_refresh=5)
+        token = tokens.issue("admin")
+        assert other_process.verify(token)
+
+        tokens.revoke(token)
+        # 缓存期内其他进程仍接受该 token，最多延迟 revocation_refresh 秒
+        now[0] += 4.9
+        assert other_process.verify(token)
+        now[0] += 0.1
+        assert not other_process.verify(token)
+
+    def test_revocation_without_cache(self, tokens, shared):
+        other_process = AuthTokenService(SECRET, shared, ttl_seconds=3600, revocation_refresh=0)
+        token = tokens.issue("admin")
+        assert other_process.verify(token)
+        tokens.revoke(token)
+        assert not other_process.verify(token)
+
+    def test_revocation_list_drops_expired(self, tokens, shared):
+        shared.set(AuthTokenService.REVOCATION_NAMESPACE, AuthTokenService.REVOCATION_KEY, {
+            "old": time.time() - 10
+        })
+        tokens.revoke(tokens.issue("admin"))
+        revoked = shared.get(AuthTokenService.REVOCATION_NAMESPACE, AuthTokenService.REVOCATION_KEY)
+        assert "old" not in revoked
+        assert len(revoked) == 1
+
+    def test_revoke_invalid_token(self, tokens, shared):
+        assert not tokens.revoke("not-a-token")
+        assert shared.get(AuthTokenService.REVOCATION_NAMESPACE, AuthTokenService.REVOCATION_KEY) is None
+
+
+class TestSecretFile:
+    """密钥文件测试"""
+
+    def test_created_once(self, temp_history_dir):
+        path = os.path.join(temp_history_dir, "auth_secret")
+        secret = load_or_create_secret(path)
+        assert len(secret) == 64
+        assert load_or_create_secret(path) == secret
+        assert os.stat(path).st_mode & 0o777 == 0o600
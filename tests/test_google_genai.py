@@ -0,0 +1,193 @@
+"""
+Google GenAI 图片生成器测试（流式提前结束、token 用量、上下文缓存）
+
+用假的客户端代替 genai.Client，不访问网络。
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from backend.generators.google_genai import GoogleGenAIGenerator
+
+IMAGE = b"\x89PNG final"
+
+
+def _part(text=None, data=None, thought=False):
+    inline_data = SimpleNamespace(data=data) if data else None
+    return SimpleNamespace(text=text, inline_data=inline_data, thought=thought)
+
+
+def _chunk(*parts, usage=None):
+    content = SimpleNamespace(parts=list(parts))
+    return SimpleNamespace(candidates=[SimpleNamespace(content=content)], usage_metadata=usage)
+
+
+def _usage(prompt=None, cached=None, output=None):
+    return SimpleNamespace(
+        prompt_token_count=prompt,
+        cached_content_token_count=cached,
+        candidates_token_count=output,
+    )
+
+
+class FakeStream:
+    """记录读取到第几个分片以及是否被关闭"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            self.consumed += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """只实现生成器用到的 models.generate_content_stream 和 caches.create"""
+
+    def __init__(self, chunks_factory):
+        self.chunks_factory = chunks_factory
+        self.streams = []
+        self.configs = []
+        self.cache_creates = []
+        self.models = SimpleNamespace(generate_content_stream=self._generate_content_stream)
+        self.caches = SimpleNamespace(create=self._create_cache)
+
+    def _generate_content_stream(self, model, contents, config):
+        self.configs.append(config)
+        stream = FakeStream(self.chunks_factory())
+        self.streams.append(stream)
+        return stream
+
+    def _create_cache(self, model, config):
+        self.cache_creates.append(config)
+        return SimpleNamespace(name=f"cachedContents/{len(self.cache_creates)}")
+
+
+def _generator(chunks_factory, **config):
+    generator = GoogleGenAIGenerator({"api_key": "test-key", **config})
+    generator.client = FakeClient(chunks_factory)
+    return generator
+
+
+class TestStreamImage:
+    """收到图片后提前结束"""
+
+    def test_early_exit_emits_progress(self):
+        chunks = [
+            _chunk(_part(text="构思版式", thought=True)),
+            _chunk(_part(data=b"draft", thought=True)),
+            _chunk(_part(data=IMAGE)),
+            RuntimeError("不应读取图片之后的分片"),
+        ]
+        generator = _generator(lambda: chunks)
+        stages = []
+
+        data = generator.generate_image("第一页", on_progress=lambda stage, info: stages.append((stage, info)))
+
+        assert data == IMAGE
+        stream = generator.client.streams[0]
+        assert stream.consumed == 3 and stream.closed
+        assert [stage for stage, _ in stages] == ["first_byte", "thought", "image_received"]
+        assert stages[1][1]["text"] == "构思版式"
+        assert stages[2][1]["bytes"] == len(IMAGE)
+        assert all("elapsed_ms" in info for _, info in stages)
+
+    def test_progress_callback_errors_ignored(self):
+        generator = _generator(lambda: [_chunk(_part(data=IMAGE))])
+
+        def fail(stage, info):
+            raise RuntimeError("boom")
+
+        assert generator.generate_image("第一页", on_progress=fail) == IMAGE
+
+    def test_usage_from_image_chunk(self):
+        chunks = [
+            _chunk(_part(text="思考", thought=True), usage=_usage(prompt=1200)),
+            _chunk(_part(data=IMAGE), usage=_usage(prompt=1200, cached=1000, output=1290)),
+            _chunk(usage=_usage(prompt=1200, cached=1000, output=1400)),
+        ]
+        generator = _generator(lambda: chunks)
+        generator.generate_image("第一页")
+        assert generator.pop_last_usage() == {"prompt_tokens": 1200, "cached_tokens": 1000, "output_tokens": 1290}
+        assert generator.pop_last_usage() is None
+
+    def test_usage_unknown_after_early_exit(self):
+        # 输出 token 数只在收尾分片中返回，提前退出时记为未知而不是 0
+        chunks = [
+            _chunk(_part(data=IMAGE), usage=_usage(prompt=800)),
+            _chunk(usage=_usage(prompt=800, output=1290)),
+        ]
+        generator = _generator(lambda: chunks)
+        generator.generate_image("第一页")
+        assert generator.pop_last_usage() == {"prompt_tokens": 800, "cached_tokens": 0, "output_tokens": None}
+
+        generator = _generator(lambda: [_chunk(_part(data=IMAGE))])
+        generator.generate_image("第一页")
+        assert generator.pop_last_usage() == {"prompt_tokens": None, "cached_tokens": None, "output_tokens": None}
+
+    def test_no_image_raises(self):
+        generator = _generator(lambda: [_chunk(_part(text="无法生成"))])
+        with pytest.raises(ValueError, match="API 返回为空"):
+            generator.generate_image("第一页")
+
+
+class TestContextCache:
+    """任务共享上下文的显式缓存"""
+
+    def test_cache_key_reused_across_pages(self):
+        generator = _generator(lambda: [_chunk(_part(data=IMAGE))], context_cache=True)
+        for page in ("第一页", "第二页", "第三页"):
+            generator.generate_image(page, shared_context="完整大纲")
+
+        client = generator.client
+        assert len(client.cache_creates) == 1
+        assert [config.cached_content for config in client.configs] == ["cachedContents/1"] * 3
+
+        # 上下文或模型不同则是另一份缓存
+        generator.generate_image("第一页", shared_context="另一份大纲")
+        generator.generate_image("第一页", shared_context="完整大纲", model="other-model")
+        assert len(client.cache_creates) == 3
+
+    def test_expired_cache_recreated(self, monkeypatch):
+        from backend.generators import google_genai
+        now = [1000.0]
+        monkeypatch.setattr(google_genai.time, "time", lambda: now[0])
+        generator = _generator(lambda: [_chunk(_part(data=IMAGE))], context_cache=True, context_cache_ttl=120)
+
+        generator.generate_image("第一页", shared_context="完整大纲")
+        now[0] += 59
+        generator.generate_image("第二页", shared_context="完整大纲")
+        assert len(generator.client.cache_creates) == 1
+
+        # 提前 60 秒视为过期
+        now[0] += 2
+        generator.generate_image("第三页", shared_context="完整大纲")
+        assert len(generator.client.cache_creates) == 2
+
+    def test_disabled_uses_prefix(self):
+        generator = _generator(lambda: [_chunk(_part(data=IMAGE))])
+        generator.generate_image("第一页", shared_context="完整大纲")
+        assert generator.client.cache_creates == []
+        assert generator.client.configs[0].cached_content is None
+
+    def test_server_deleted_cache_falls_back_to_prefix(self):
+        calls = []
+
+        def chunks():
+            calls.append(1)
+            if len(calls) == 1:
+                return [RuntimeError("CachedContent not found")]
+            return [_chunk(_part(data=IMAGE))]
+
+        generator = _generator(chunks, context_cache=True)
+        assert generator.generate_image("第一页", shared_context="完整大纲") == IMAGE
+        assert generator.client.configs[1].cached_content is None
+        assert generator._context_caches == {}
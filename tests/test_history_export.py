@@ -0,0 +1,197 @@
+"""
+历史记录打包下载测试
+"""
+import io
+import os
+import zipfile
+
+import pytest
+
+from backend.services.history_export import (
+    HistoryExportCache, ZipEntry, archive_signature, archive_size, iter_zip, plan_archive
+)
+from backend.services.history_layout import HistoryLayout
+
+
+@pytest.fixture
+def task_dir(temp_history_dir):
+    """包含两页图片、一张缩略图和一个非图片文件的任务文件夹"""
+    path = os.path.join(temp_history_dir, "task_export")
+    os.makedirs(path)
+    files = {
+        "1.png": os.urandom(3000),
+        "0.png": os.urandom(70000),
+        "thumb_0.png": b"thumb",
+        "notes.txt": b"ignored",
+    }
+    for name, data in files.items():
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(data)
+    return path
+
+
+def _read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _overwrite(path, data):
+    """同样大小的新内容覆盖写入，并确保修改时间变化"""
+    st = os.stat(path)
+    with open(path, "wb") as f:
+        f.write(data)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+class TestZipWriter:
+    """STORED ZIP 生成测试"""
+
+    def test_plan_archive(self, task_dir):
+        entries = plan_archive(task_dir)
+        assert [entry.name for entry in entries] == ["page_1.png", "page_2.png"]
+        assert [entry.size for entry in entries] == [70000, 3000]
+
+    def test_archive_size_matches_stream(self, task_dir):
+        entries = plan_archive(task_dir)
+        data = b"".join(iter_zip(entries))
+        assert len(data) == archive_size(entries)
+
+    def test_archive_readable_by_zipfile(self, task_dir):
+        data = b"".join(iter_zip(plan_archive(task_dir)))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.testzip() is None
+            assert zf.namelist() == ["page_1.png", "page_2.png"]
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+            # CRC 在数据之后的数据描述符中
+            assert all(info.flag_bits & 0x08 for info in zf.infolist())
+            assert zf.read("page_1.png") == _read(os.path.join(task_dir, "0.png"))
+            assert zf.read("page_2.png") == _read(os.path.join(task_dir, "1.png"))
+
+    def test_empty_archive(self):
+        data = b"".join(iter_zip([]))
+        assert len(data) == archive_size([])
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.namelist() == []
+
+    def test_reads_each_file_once(self, task_dir, monkeypatch):
+        opened = []
+        real_open = open
+
+        def tracking_open(path, *args, **kwargs):
+            opened.append(os.path.basename(path))
+            return real_open(path, *args, **kwargs)
+
+        monkeypatch.setattr("builtins.open", tracking_open)
+        stream = iter_zip(plan_archive(task_dir))
+        # 第一个文件头在读取任何图片之前发出
+        assert next(stream).endswith(b"page_1.png")
+        assert opened == []
+        b"".join(stream)
+        assert opened == ["0.png", "1.png"]
+
+    def test_modified_content_raises(self, task_dir):
+        entries = plan_archive(task_dir)
+        # 大小不变、内容变化：由修改时间发现
+        _overwrite(os.path.join(task_dir, "1.png"), b"\0" * 3000)
+        with pytest.raises(ValueError, match="打包期间图片被修改"):
+            b"".join(iter_zip(entries))
+
+    def test_replaced_file_after_open_keeps_old_content(self, task_dir):
+        path = os.path.join(task_dir, "0.png")
+        original = _read(path)
+        stream = iter_zip(plan_archive(task_dir))
+        head = [next(stream), next(stream)]
+
+        # 原子替换不影响已打开的文件，归档仍是一致的旧内容
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * 70000)
+        os.replace(tmp_path, path)
+
+        data = b"".join(head + list(stream))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            assert zf.testzip() is None
+            assert zf.read("page_1.png") == original
+
+    def test_truncated_file_raises(self, task_dir):
+        entries = plan_archive(task_dir)
+        with open(os.path.join(task_dir, "0.png"), "r+b") as f:
+            f.truncate(100)
+        with pytest.raises(ValueError, match="打包期间图片被修改"):
+            b"".join(iter_zip(entries))
+
+    def test_grown_file_raises(self, task_dir):
+        entries = plan_archive(task_dir)
+        with open(os.path.join(task_dir, "1.png"), "ab") as f:
+            f.write(b"more")
+        with pytest.raises(ValueError, match="打包期间图片被修改"):
+            b"".join(iter_zip(entries))
+
+    def test_too_large_raises(self, task_dir):
+        entries = [ZipEntry("page_1.png", os.path.join(task_dir, "0.png"), 5 * 1024 ** 3, 0)]
+        with pytest.raises(ValueError, match="4GB"):
+            next(iter_zip(entries))
+
+    def test_signature_changes_with_files(self, task_dir):
+        before = archive_signature(plan_archive(task_dir))
+        assert archive_signature(plan_archive(task_dir)) == before
+        with open(os.path.join(task_dir, "1.png"), "ab") as f:
+            f.write(b"more")
+        assert archive_signature(plan_archive(task_dir)) != before
+
+
+class TestHistoryExportCache:
+    """打包缓存测试"""
+
+    def test_stream_writes_cache(self, temp_history_dir, task_dir):
+        cache = HistoryExportCache(HistoryLayout(temp_history_dir))
+        entries = plan_archive(task_dir)
+        signature = archive_signature(entries)
+        assert cache.cached("task_export", signature) is None
+
+        data = b"".join(cache.stream("task_export", signature, entries))
+
+        path = cache.cached("task_export", signature)
+        assert path is not None
+        assert _read(path) == data
+        assert os.path.getsize(path) == archive_size(entries)
+
+    def test_new_signature_replaces_stale_cache(self, temp_history_dir, task_dir):
+        cache = HistoryExportCache(HistoryLayout(temp_history_dir))
+        entries = plan_archive(task_dir)
+        old_path = cache.build("task_export", archive_signature(entries), entries)
+
+        with open(os.path.join(task_dir, "1.png"), "ab") as f:
+            f.write(b"more")
+        entries = plan_archive(task_dir)
+        new_path = cache.build("task_export", archive_signature(entries), entries)
+
+        assert os.path.exists(new_path)
+        assert not os.path.exists(old_path)
+        cache.invalidate("task_export")
+        assert not os.path.exists(new_path)
+
+    def test_failed_stream_leaves_no_cache(self, temp_history_dir, task_dir):
+        cache = HistoryExportCache(HistoryLayout(temp_history_dir))
+        entries = plan_archive(task_dir)
+        signature = archive_signature(entries)
+        _overwrite(os.path.join(task_dir, "0.png"), b"\0" * 70000)
+
+        with pytest.raises(ValueError):
+            b"".join(cache.stream("task_export", signature, entries))
+
+        assert cache.cached("task_export", signature) is None
+        cache_dir = os.path.dirname(cache.cache_path("task_export", signature))
+        assert os.listdir(cache_dir) == []
+
+    def test_abandoned_stream_leaves_no_cache(self, temp_history_dir, task_dir):
+        cache = HistoryExportCache(HistoryLayout(temp_history_dir))
+        entries = plan_archive(task_dir)
+        signature = archive_signature(entries)
+
+        stream = cache.stream("task_export", signature, entries)
+        next(stream)
+        stream.close()
+
+        assert cache.cached("task_export", signature) is None
+        assert os.listdir(os.path.dirname(cache.cache_path("task_export", signature))) == []
@@ -0,0 +1,166 @@
+"""
+历史记录内存索引测试
+"""
+import threading
+
+from backend.services.history_index import HistoryIndex, RecordCache
+
+
+def _entry(record_id, created_at, updated_at=None, status="draft", task_id=None):
+    return {
+        "id": record_id,
+        "title": f"标题 {record_id}",
+        "created_at": created_at,
+        "updated_at": updated_at or created_at,
+        "status": status,
+        "task_id": task_id,
+    }
+
+
+def _ids(entries):
+    return [entry.id for entry in entries]
+
+
+class TestHistoryIndex:
+    """HistoryIndex 测试"""
+
+    def test_load_sorts_newest_first(self):
+        index = HistoryIndex()
+        index.load([
+            _entry("b", "2024-01-02T00:00:00"),
+            _entry("a", "2024-01-01T00:00:00"),
+            _entry("c", "2024-01-03T00:00:00"),
+        ])
+        assert len(index) == 3
+        assert _ids(index.select().page(0, 10)) == ["c", "b", "a"]
+        assert _ids(index.iter_newest()) == ["c", "b", "a"]
+
+    def test_upsert_moves_entry_between_lists(self):
+        index = HistoryIndex()
+        index.load([
+            _entry("a", "2024-01-01T00:00:00"),
+            _entry("b", "2024-01-02T00:00:00"),
+        ])
+        index.upsert(_entry("a", "2024-01-01T00:00:00", "2024-01-05T00:00:00", status="completed"))
+
+        assert _ids(index.select().page(0, 10)) == ["b", "a"]
+        assert _ids(index.select(sort="updated_at").page(0, 10)) == ["a", "b"]
+        assert _ids(index.select(status="draft").page(0, 10)) == ["b"]
+        assert _ids(index.select(status="completed").page(0, 10)) == ["a"]
+
+    def test_remove(self):
+        index = HistoryIndex()
+        index.load([
+            _entry("a", "2024-01-01T00:00:00", task_id="task_a"),
+            _entry("b", "2024-01-02T00:00:00"),
+        ])
+        assert index.remove("a").id == "a"
+        assert index.remove("a") is None
+        assert "a" not in index
+        assert index.find_by_task("task_a") is None
+        assert _ids(index.select().page(0, 10)) == ["b"]
+
+    def test_upsert_changes_task_id(self):
+        index = HistoryIndex()
+        index.load([_entry("a", "2024-01-01T00:00:00", task_id="task_old")])
+        index.upsert(_entry("a", "2024-01-01T00:00:00", task_id="task_new"))
+        assert index.find_by_task("task_old") is None
+        assert index.find_by_task("task_new") == "a"
+
+    def test_select_time_range_and_cursor(self):
+        index = HistoryIndex()
+        index.load([_entry(f"r{day}", f"2024-01-{day:02d}T00:00:00") for day in range(1, 8)])
+
+        selected = index.select(since="2024-01-03", until="2024-01-06")
+        assert _ids(selected.page(0, 10)) == ["r5", "r4", "r3"]
+
+        page, has_more = index.select().page_before(None, 3)
+        assert _ids(page) == ["r7", "r6", "r5"] and has_more
+        page, has_more = index.select().page_before(page[-1].key_for("created_at"), 3)
+        assert _ids(page) == ["r4", "r3", "r2"] and has_more
+
+    def test_slice_unaffected_by_later_writes(self):
+        index = HistoryIndex()
+        index.load([_entry(f"r{day}", f"2024-01-{day:02d}T00:00:00") for day in range(1, 6)])
+        selected = index.select()
+
+        index.remove("r5")
+        index.upsert(_entry("r9", "2024-01-09T00:00:00"))
+        index.load([])
+
+        assert len(selected) == 5
+        assert _ids(selected.page(0, 10)) == ["r5", "r4", "r3", "r2", "r1"]
+
+    def test_concurrent_readers_and_writer(self):
+        """写入（修改、删除、重建）与分页读取并发时，读取方始终看到完整一致的索引"""
+        stable = [_entry(f"s{i:03d}", f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}") for i in range(200)]
+        index = HistoryIndex()
+        index.load(stable)
+
+        stop = threading.Event()
+        errors = []
+
+        def writer():
+            try:
+                round_no = 0
+                while not stop.is_set():
+                    round_no += 1
+                    for i in range(0, 200, 7):
+                        data = dict(stable[i], updated_at=f"2024-02-01T00:00:{round_no % 60:02d}")
+                        data["status"] = "completed" if round_no % 2 else "draft"
+                        index.upsert(data)
+                    index.upsert(_entry("tmp", "2024-03-01T00:00:00"))
+                    index.remove("tmp")
+                    if round_no % 5 == 0:
+                        index.load(stable)
+            except Exception as e:  # pragma: no cover - 失败时由断言报告
+                errors.append(e)
+
+        def reader():
+            try:
+                for _ in range(300):
+                    assert len(index) >= 200
+                    assert "s000" in index and index.get("s100") is not None
+                    for sort in HistoryIndex.SORT_FIELDS:
+                        selected = index.select(sort=sort)
+                        page = selected.page(0, 50)
+                        assert len(page) == 50
+                        assert len({entry.id for entry in page}) == 50
+                        keys = [entry.key_for(sort) for entry in page]
+                        assert keys == sorted(keys, reverse=True)
+                        rest, _ = selected.page_before(keys[-1], 500)
+                        assert len(page) + len(rest) == len(selected)
+            except Exception as e:
+                errors.append(e)
+
+        writer_thread = threading.Thread(target=writer)
+        readers = [threading.Thread(target=reader) for _ in range(4)]
+        writer_thread.start()
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        stop.set()
+        writer_thread.join()
+
+        assert not errors, errors[0]
+
+
+class TestRecordCache:
+    """RecordCache 测试"""
+
+    def test_copies_and_evicts(self):
+        cache = RecordCache(max_size=2)
+        record = {"id": "a", "outline": {"pages": []}}
+        cache.put(record)
+        record["outline"]["pages"].append("x")
+        assert cache.get("a")["outline"]["pages"] == []
+
+        cache.get("a")["outline"]["pages"].append("y")
+        assert cache.get("a")["outline"]["pages"] == []
+
+        cache.put({"id": "b"})
+        cache.get("a")
+        cache.put({"id": "c"})
+        assert cache.get("b") is None
+        assert cache.get("a") is not None and cache.get("c") is not None
@@ -0,0 +1,152 @@
+"""
+历史记录目录布局测试
+"""
+import json
+import os
+
+import pytest
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_store import JsonHistoryStore
+
+
+def _write(path, data=b"png"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _write_legacy_record(layout, record_id, task_id):
+    record = {
+        "id": record_id,
+        "title": f"标题 {record_id}",
+        "created_at": "2024-01-01T00:00:00",
+        "updated_at": "2024-01-01T00:00:00",
+        "status": "completed",
+        "outline": {"pages": []},
+        "images": {"task_id": task_id, "generated": ["0.png"]},
+    }
+    with open(layout.legacy_record_path(record_id), "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False)
+    _write(os.path.join(layout.legacy_task_dir(task_id), "0.png"), record_id.encode("utf-8"))
+    return record
+
+
+class TestPaths:
+    """路径解析测试"""
+
+    def test_sharded_paths(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        task_dir = layout.sharded_task_dir("task_abc")
+        shard = HistoryLayout.task_shard("task_abc")
+        assert len(shard) == 2
+        assert task_dir == os.path.join(temp_history_dir, "tasks", shard, "task_abc")
+        assert layout.sharded_record_path("abcdef") == os.path.join(temp_history_dir, "records", "ab", "abcdef.json")
+        assert layout.archive_path("task_abc") == os.path.join(temp_history_dir, "archive", shard, "task_abc.zip")
+
+    def test_new_folders_use_sharded_location(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        assert layout.task_dir("task_new") == layout.sharded_task_dir("task_new")
+        assert layout.ensure_task_dir("task_new") == layout.sharded_task_dir("task_new")
+        assert os.path.isdir(layout.sharded_task_dir("task_new"))
+        assert layout.record_path("new") == layout.sharded_record_path("new")
+
+    def test_falls_back_to_legacy_location(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "old", "task_old")
+        assert layout.task_dir("task_old") == layout.legacy_task_dir("task_old")
+        assert layout.record_path("old") == layout.legacy_record_path("old")
+
+        # 两个位置都存在时分片位置优先
+        os.makedirs(layout.sharded_task_dir("task_old"))
+        assert layout.task_dir("task_old") == layout.sharded_task_dir("task_old")
+
+    @pytest.mark.parametrize("name", ["", ".", "..", "../etc", "a/b", "a\\b", "a\0b"])
+    def test_rejects_path_traversal(self, temp_history_dir, name):
+        layout = HistoryLayout(temp_history_dir)
+        with pytest.raises(ValueError):
+            layout.task_dir(name)
+        with pytest.raises(ValueError):
+            layout.record_path(name)
+
+    def test_iter_both_locations(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "old", "task_old")
+        layout.ensure_task_dir("task_new")
+        _write(layout.sharded_record_path("new"), b"{}")
+        os.makedirs(os.path.join(temp_history_dir, "exports"))
+
+        assert {task_id for task_id, _ in layout.iter_task_dirs()} == {"task_old", "task_new"}
+        assert set(layout.iter_record_paths()) == {
+            layout.legacy_record_path("old"), layout.sharded_record_path("new")
+        }
+
+
+class TestMigrate:
+    """旧布局迁移测试"""
+
+    def test_moves_records_and_images(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        store = JsonHistoryStore(temp_history_dir, layout)
+        records = [_write_legacy_record(layout, f"r{i}", f"task_{i}") for i in range(3)]
+
+        result = layout.migrate(grace_seconds=0)
+
+        assert result == {"moved_tasks": 3, "skipped_tasks": [], "moved_records": 3, "failed": []}
+        for record in records:
+            task_id = record["images"]["task_id"]
+            assert not os.path.exists(layout.legacy_task_dir(task_id))
+            assert not os.path.exists(layout.legacy_record_path(record["id"]))
+            assert store.get(record["id"]) == record
+            with open(os.path.join(layout.task_dir(task_id), "0.png"), "rb") as f:
+                assert f.read() == record["id"].encode("utf-8")
+            assert layout.task_dir(task_id) == layout.sharded_task_dir(task_id)
+        # index.json 留在根目录
+        assert os.path.exists(os.path.join(temp_history_dir, "index.json"))
+
+    def test_second_run_is_noop(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "r1", "task_1")
+        layout.migrate(grace_seconds=0)
+        before = sorted(os.path.relpath(os.path.join(d, f), temp_history_dir)
+                        for d, _, files in os.walk(temp_history_dir) for f in files)
+
+        result = layout.migrate(grace_seconds=0)
+
+        assert result == {"moved_tasks": 0, "skipped_tasks": [], "moved_records": 0, "failed": []}
+        after = sorted(os.path.relpath(os.path.join(d, f), temp_history_dir)
+                       for d, _, files in os.walk(temp_history_dir) for f in files)
+        assert after == before
+
+    def test_dry_run_moves_nothing(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "r1", "task_1")
+        result = layout.migrate(grace_seconds=0, dry_run=True)
+        assert result["moved_tasks"] == 1 and result["moved_records"] == 1
+        assert os.path.isdir(layout.legacy_task_dir("task_1"))
+        assert os.path.exists(layout.legacy_record_path("r1"))
+
+    def test_skips_recently_written_task(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "r1", "task_busy")
+        result = layout.migrate(grace_seconds=300)
+        assert result["skipped_tasks"] == ["task_busy"]
+        assert os.path.isdir(layout.legacy_task_dir("task_busy"))
+
+    def test_conflicting_task_folder_reported(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "r1", "task_dup")
+        os.makedirs(layout.sharded_task_dir("task_dup"))
+        result = layout.migrate(grace_seconds=0)
+        assert [item["name"] for item in result["failed"]] == ["task_dup"]
+        assert os.path.isdir(layout.legacy_task_dir("task_dup"))
+
+    def test_stale_legacy_record_removed(self, temp_history_dir):
+        """分片位置已有新版本时，旧位置的记录文件直接删除"""
+        layout = HistoryLayout(temp_history_dir)
+        _write_legacy_record(layout, "r1", "task_1")
+        _write(layout.sharded_record_path("r1"), b'{"id": "r1", "title": "new"}')
+        layout.migrate(grace_seconds=0)
+        assert not os.path.exists(layout.legacy_record_path("r1"))
+        with open(layout.sharded_record_path("r1"), encoding="utf-8") as f:
+            assert json.load(f)["title"] == "new"
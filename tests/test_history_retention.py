@@ -0,0 +1,159 @@
+"""
+历史记录保留策略测试
+"""
+import multiprocessing
+import os
+import threading
+
+import pytest
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_retention import TaskArchiver
+
+
+def _write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+
+def _restore_in_process(root, task_id, results):
+    results.put(TaskArchiver(HistoryLayout(root)).restore(task_id))
+
+
+@pytest.fixture
+def archived_task(temp_history_dir):
+    """已归档的任务（返回 layout 和任务文件内容）"""
+    layout = HistoryLayout(temp_history_dir)
+    task_dir = layout.sharded_task_dir("task_archived")
+    files = {"0.png": os.urandom(5000), "thumb_0.png": os.urandom(500)}
+    for name, data in files.items():
+        os.makedirs(task_dir, exist_ok=True)
+        with open(os.path.join(task_dir, name), "wb") as f:
+            f.write(data)
+    assert TaskArchiver(layout).archive("task_archived") > 0
+    assert not os.path.isdir(task_dir)
+    return layout, files
+
+
+def _assert_restored(layout, files):
+    task_dir = layout.task_dir("task_archived")
+    for name, data in files.items():
+        with open(os.path.join(task_dir, name), "rb") as f:
+            assert f.read() == data
+    assert not os.path.exists(layout.archive_path("task_archived"))
+    shard_dir = os.path.dirname(task_dir)
+    assert os.listdir(shard_dir) == ["task_archived"]
+
+
+class TestTaskArchiver:
+    """TaskArchiver 测试"""
+
+    def test_archive_and_restore(self, archived_task):
+        layout, files = archived_task
+        archiver = TaskArchiver(layout)
+        assert archiver.is_archived("task_archived")
+        assert archiver.restore("task_archived")
+        assert not archiver.restore("task_archived")
+        _assert_restored(layout, files)
+
+    def test_concurrent_restore_in_threads(self, archived_task):
+        layout, files = archived_task
+        results, errors = [], []
+
+        def restore():
+            try:
+                results.append(TaskArchiver(layout).restore("task_archived"))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=restore) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        assert sorted(results) == [False] * 7 + [True]
+        _assert_restored(layout, files)
+
+    @pytest.mark.skipif(os.name != "posix", reason="需要 fork")
+    def test_concurrent_restore_in_processes(self, archived_task):
+        layout, files = archived_task
+        ctx = multiprocessing.get_context("fork")
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=_restore_in_process, args=(layout.root, "task_archived", results))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=30)
+
+        assert all(process.exitcode == 0 for process in processes)
+        assert sorted(results.get(timeout=5) for _ in processes) == [False] * 3 + [True]
+        _assert_restored(layout, files)
+
+    def test_failed_restore_leaves_no_temp_folder(self, archived_task):
+        layout, _ = archived_task
+        archive_path = layout.archive_path("task_archived")
+        with open(archive_path, "wb") as f:
+            f.write(b"not a zip")
+
+        with pytest.raises(Exception):
+            TaskArchiver(layout).restore("task_archived")
+
+        shard_dir = os.path.dirname(layout.sharded_task_dir("task_archived"))
+        assert os.listdir(shard_dir) == []
+        assert os.path.exists(archive_path)
+
+
+class TestRetention:
+    """保留策略测试"""
+
+    def _idle_task(self, history_service, sample_outline, task_id):
+        """创建一个从未扫描过（记录中占用空间为 0）、且已超过活跃宽限期的任务"""
+        record_id = history_service.create_record("秋季穿搭", sample_outline, task_id)
+        task_dir = history_service.layout.task_dir(task_id)
+        _write_file(os.path.join(task_dir, "0.png"), 20000)
+        _write_file(os.path.join(task_dir, "thumb_0.png"), 5000)
+        old = os.path.getmtime(task_dir) - 3600
+        for name in os.listdir(task_dir):
+            os.utime(os.path.join(task_dir, name), (old, old))
+        os.utime(task_dir, (old, old))
+        return record_id, task_dir
+
+    def test_measures_folders_and_writes_back(self, history_service, sample_outline):
+        record_id, _ = self._idle_task(history_service, sample_outline, "task_measure")
+        updated_at = history_service.get_record(record_id)["updated_at"]
+
+        result = history_service.retention.run()
+
+        assert result["archived"] == []
+        assert result["live_bytes"] == 25000
+        record = history_service.get_record(record_id)
+        assert record["disk_bytes"] == 25000
+        assert record["updated_at"] == updated_at
+
+    def test_quota_uses_measured_size(self, history_service, sample_outline):
+        record_id, task_dir = self._idle_task(history_service, sample_outline, "task_quota")
+        history_service.retention.quota_bytes = 1
+        history_service.retention.touch("task_quota")
+
+        preview = history_service.retention.run(dry_run=True)
+        assert preview["archived"] == ["task_quota"]
+        assert 0 < preview["freed_bytes"] < 25000
+        assert preview["live_bytes"] == 0
+        # 预演不修改任何内容
+        assert os.path.isdir(task_dir)
+        assert not history_service.get_record(record_id).get("disk_bytes")
+        assert history_service.shared.get(history_service.retention.ACCESS_NAMESPACE, "task_quota")
+
+        result = history_service.retention.run()
+        assert result["archived"] == ["task_quota"]
+        assert not os.path.isdir(task_dir)
+        archive_bytes = history_service.get_record(record_id)["disk_bytes"]
+        assert result["freed_bytes"] == 25000 - archive_bytes
+        # 预演估算与实际释放的空间只差流式写入的数据描述符
+        assert abs(preview["freed_bytes"] - result["freed_bytes"]) < 100
@@ -0,0 +1,169 @@
+"""
+历史记录接口测试（字段投影、ETag、压缩）
+"""
+import gzip
+import json
+
+import pytest
+from flask import Response
+from werkzeug.datastructures import Accept
+
+from backend.routes.history_routes import LIST_FIELDS, RECORD_FIELDS
+from backend.routes.utils import parse_fields, project_fields
+from backend.utils.http_compression import compress_json_response
+
+
+@pytest.fixture
+def history_client(client, history_service, monkeypatch):
+    """接口使用临时目录中的历史记录服务"""
+    from backend.services import history as history_module
+    monkeypatch.setattr(history_module, "_service_instance", history_service)
+    return client
+
+
+@pytest.fixture
+def record_id(history_service, sample_outline):
+    return history_service.create_record("秋季穿搭", sample_outline, "task_routes")
+
+
+class TestFields:
+    """?fields= 字段投影"""
+
+    def test_parse_fields(self):
+        assert parse_fields(None, RECORD_FIELDS) is None
+        assert parse_fields("", RECORD_FIELDS) is None
+        assert parse_fields(" , ", RECORD_FIELDS) is None
+        assert parse_fields("title, status,title,images.generated", RECORD_FIELDS) == [
+            "images.generated", "status", "title"
+        ]
+
+    @pytest.mark.parametrize("raw", ["titel", "id,bogus", "images..generated", ".images", "outline."])
+    def test_parse_fields_rejects_unknown(self, raw):
+        with pytest.raises(ValueError, match="不支持的字段"):
+            parse_fields(raw, RECORD_FIELDS)
+
+    def test_list_and_record_fields_differ(self):
+        assert parse_fields("page_count", LIST_FIELDS) == ["page_count"]
+        with pytest.raises(ValueError):
+            parse_fields("outline", LIST_FIELDS)
+
+    def test_project_fields(self):
+        record = {"id": "r1", "title": "t", "images": {"task_id": "x", "generated": ["0.png"]}, "status": "draft"}
+        assert project_fields(record, None) is record
+        assert project_fields(record, ["images.generated", "title"]) == {
+            "id": "r1", "title": "t", "images": {"generated": ["0.png"]}
+        }
+        # 已请求整个父字段时忽略子字段；不存在的字段忽略
+        assert project_fields(record, ["images", "images.task_id", "thumbnail"]) == {
+            "id": "r1", "images": record["images"]
+        }
+
+    def test_list_endpoint(self, history_client, record_id):
+        response = history_client.get("/api/history?fields=title,status")
+        assert response.status_code == 200
+        assert response.get_json()["records"] == [{"id": record_id, "title": "秋季穿搭", "status": "draft"}]
+
+        response = history_client.get("/api/history?fields=title,outline")
+        assert response.status_code == 400
+        assert "outline" in response.get_json()["error"]
+
+    def test_record_endpoint(self, history_client, record_id):
+        response = history_client.get(f"/api/history/{record_id}?fields=outline.raw")
+        assert response.get_json()["record"] == {"id": record_id, "outline": {"raw": "这是原始大纲文本"}}
+
+        response = history_client.get(f"/api/history/{record_id}?fields=titel")
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
+
+
+class TestConditionalRequests:
+    """ETag / If-None-Match"""
+
+    def test_record_not_modified(self, history_client, history_service, record_id):
+        response = history_client.get(f"/api/history/{record_id}")
+        etag = response.headers["ETag"]
+        assert "no-cache" in response.headers["Cache-Control"]
+
+        response = history_client.get(f"/api/history/{record_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+        # 不同的字段投影是不同的表示
+        response = history_client.get(f"/api/history/{record_id}?fields=title", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+
+        history_service.update_record(record_id, status="completed")
+        response = history_client.get(f"/api/history/{record_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_list_not_modified(self, history_client, history_service, record_id, sample_outline):
+        etag = history_client.get("/api/history").headers["ETag"]
+        assert history_client.get("/api/history", headers={"If-None-Match": etag}).status_code == 304
+
+        history_service.create_record("冬季穿搭", sample_outline)
+        assert history_client.get("/api/history", headers={"If-None-Match": etag}).status_code == 200
+
+    def test_missing_record(self, history_client):
+        assert history_client.get("/api/history/missing").status_code == 404
+
+
+def _json_response(payload, etag="abc"):
+    response = Response(json.dumps(payload), mimetype="application/json")
+    response.set_etag(etag)
+    return response
+
+
+GZIP = Accept([("gzip", 1)])
+
+
+class TestCompression:
+    """JSON 响应压缩"""
+
+    def test_compresses_large_response(self):
+        payload = {"records": [{"title": "秋季穿搭"}] * 200}
+        response = compress_json_response(_json_response(payload), GZIP, 1024)
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert response.get_etag() == ("abc", True)
+        assert json.loads(gzip.decompress(response.get_data())) == payload
+
+    def test_below_threshold(self):
+        response = compress_json_response(_json_response({"ok": True}), GZIP, 1024)
+        assert "Content-Encoding" not in response.headers
+        # 同一 URL 在其他请求中可能被压缩，缓存仍需按 Accept-Encoding 区分
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert response.get_etag() == ("abc", False)
+
+    def test_client_without_gzip(self):
+        response = compress_json_response(_json_response({"x": "y" * 5000}), Accept([]), 1024)
+        assert "Content-Encoding" not in response.headers
+        assert "Accept-Encoding" in response.headers["Vary"]
+
+    def test_already_encoded(self):
+        response = _json_response({"x": "y" * 5000})
+        response.headers["Content-Encoding"] = "identity"
+        data = response.get_data()
+        response = compress_json_response(response, GZIP, 1024)
+        assert response.headers["Content-Encoding"] == "identity"
+        assert response.get_data() == data
+
+    def test_streamed_and_non_json(self):
+        streamed = Response((chunk for chunk in [b"{", b"}"]), mimetype="application/json")
+        assert "Content-Encoding" not in compress_json_response(streamed, GZIP, 0).headers
+
+        text = Response("y" * 5000, mimetype="text/plain")
+        assert "Content-Encoding" not in compress_json_response(text, GZIP, 1024).headers
+
+    def test_endpoint_compressed(self, history_client, history_service, sample_outline):
+        for i in range(30):
+            history_service.create_record(f"记录 {i}", sample_outline)
+        response = history_client.get("/api/history?page_size=30", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert len(json.loads(gzip.decompress(response.data))["records"]) == 30
+
+        # 压缩后的弱 ETag 照常命中
+        response = history_client.get("/api/history?page_size=30", headers={
+            "Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]
+        })
+        assert response.status_code == 304
@@ -0,0 +1,110 @@
+"""
+历史记录全文检索测试
+"""
+from backend.services.history_search import InvertedIndex, query_terms, tokenize
+
+
+def _record(record_id, title, pages=(), created_at="2024-01-01T00:00:00"):
+    return {
+        "id": record_id,
+        "title": title,
+        "created_at": created_at,
+        "outline": {"pages": [{"index": i, "content": content} for i, content in enumerate(pages)]},
+    }
+
+
+def _outline(*contents):
+    return {"raw": "", "pages": [{"index": i, "type": "content", "content": c} for i, c in enumerate(contents)]}
+
+
+class TestTokenize:
+    """切分规则测试"""
+
+    def test_cjk_bigrams_and_single_chars(self):
+        assert tokenize("穿搭指南") == ["穿搭", "搭指", "指南", "穿", "搭", "指", "南"]
+        # 查询时只用二元组，避免单字命中无关记录
+        assert tokenize("穿搭指南", for_query=True) == ["穿搭", "搭指", "指南"]
+
+    def test_single_cjk_char(self):
+        assert tokenize("秋", for_query=True) == ["秋"]
+        assert query_terms("秋") == ["秋"]
+
+    def test_mixed_script(self):
+        assert query_terms("iPhone15 拍照技巧") == ["iphone15", "拍照", "照技", "技巧"]
+        assert query_terms("Vlog入门") == ["vlog", "入门"]
+        assert query_terms("穿搭，穿搭！") == ["穿搭"]
+        assert query_terms("，。！") == []
+
+
+class TestInvertedIndex:
+    """内存倒排索引测试"""
+
+    def test_all_terms_must_match(self):
+        index = InvertedIndex()
+        index.add(_record("a", "秋季穿搭"))
+        index.add(_record("b", "秋季旅行"))
+        assert [hit[0] for hit in index.search(query_terms("秋季穿搭"))] == ["a"]
+        assert {hit[0] for hit in index.search(query_terms("秋季"))} == {"a", "b"}
+
+    def test_title_ranks_above_content(self):
+        index = InvertedIndex()
+        index.add(_record("content", "日常分享", pages=["今天聊聊咖啡"], created_at="2024-01-02T00:00:00"))
+        index.add(_record("title", "咖啡入门", created_at="2024-01-01T00:00:00"))
+        assert [hit[0] for hit in index.search(query_terms("咖啡"))] == ["title", "content"]
+
+    def test_ties_newest_first(self):
+        index = InvertedIndex()
+        index.add(_record("old", "咖啡", created_at="2024-01-01T00:00:00"))
+        index.add(_record("new", "咖啡", created_at="2024-01-02T00:00:00"))
+        assert [hit[0] for hit in index.search(query_terms("咖啡"))] == ["new", "old"]
+
+    def test_replace_and_remove(self):
+        index = InvertedIndex()
+        index.add(_record("a", "咖啡"))
+        index.add(_record("a", "奶茶"))
+        assert index.search(query_terms("咖啡")) == []
+        index.remove("a")
+        assert index.search(query_terms("奶茶")) == []
+        assert len(index) == 0
+
+
+class TestSearchRecords:
+    """HistoryService.search_records 测试"""
+
+    def test_match_in_outline_page(self, history_service):
+        record_id = history_service.create_record("日常分享", _outline("封面", "第二页讲手冲咖啡"))
+        history_service.create_record("旅行日记", _outline("海边"))
+
+        result = history_service.search_records("手冲")
+        assert result["total"] == 1
+        assert result["records"][0]["id"] == record_id
+
+    def test_cjk_and_mixed_queries(self, history_service):
+        phone = history_service.create_record("iPhone15 拍照技巧", _outline("夜景模式"))
+        vlog = history_service.create_record("Vlog入门", _outline("剪辑软件推荐"))
+
+        assert [r["id"] for r in history_service.search_records("IPHONE15 拍照")["records"]] == [phone]
+        assert [r["id"] for r in history_service.search_records("vlog 剪辑")["records"]] == [vlog]
+        assert history_service.search_records("拍照 剪辑")["total"] == 0
+
+    def test_single_character_query(self, history_service):
+        autumn = history_service.create_record("秋季穿搭", _outline("毛衣"))
+        history_service.create_record("冬季穿搭", _outline("羽绒服"))
+        assert [r["id"] for r in history_service.search_records("秋")["records"]] == [autumn]
+
+    def test_ranking_and_paging(self, history_service):
+        content_only = history_service.create_record("日常分享", _outline("今天聊聊咖啡"))
+        in_title = history_service.create_record("咖啡入门", _outline("器具"))
+        twice = history_service.create_record("咖啡豆选购", _outline("咖啡产区"))
+
+        result = history_service.search_records("咖啡", page=1, page_size=2)
+        assert result["total"] == 3 and result["total_pages"] == 2
+        assert [r["id"] for r in result["records"]] == [twice, in_title]
+        assert [r["id"] for r in history_service.search_records("咖啡", page=2, page_size=2)["records"]] == [
+            content_only
+        ]
+
+    def test_punctuation_falls_back_to_title_substring(self, history_service):
+        record_id = history_service.create_record("Q&A：常见问题", _outline("内容"))
+        result = history_service.search_records("&")
+        assert [r["id"] for r in result["records"]] == [record_id]
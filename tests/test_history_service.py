@@ -0,0 +1,196 @@
+"""
+历史记录服务测试
+"""
+import os
+
+import pytest
+
+
+def _write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+
+
+class TestHistoryStore:
+    """历史记录存储与内存索引测试"""
+
+    def test_create_update_delete(self, history_service, sample_outline):
+        record_id = history_service.create_record("秋季穿搭", sample_outline, "task_store")
+
+        record = history_service.get_record(record_id)
+        assert record["title"] == "秋季穿搭"
+        assert record["outline"] == sample_outline
+        assert history_service._index.find_by_task("task_store") == record_id
+
+        assert history_service.update_record(record_id, status="completed")
+        assert history_service.get_record(record_id)["status"] == "completed"
+        listed = history_service.list_records(status="completed")["records"]
+        assert [r["id"] for r in listed] == [record_id]
+
+        assert history_service.delete_record(record_id)
+        assert history_service.get_record(record_id) is None
+        assert not history_service.record_exists(record_id)
+
+    def test_returned_record_is_a_copy(self, history_service, sample_outline):
+        record_id = history_service.create_record("秋季穿搭", sample_outline)
+        history_service.get_record(record_id)["outline"]["pages"].clear()
+        assert history_service.get_record(record_id)["outline"] == sample_outline
+
+
+class TestWriteBehind:
+    """延迟写入（queue_update）测试"""
+
+    def test_updates_merged_into_one_write(self, history_service, sample_outline, monkeypatch):
+        monkeypatch.setattr(history_service, "WRITE_BEHIND_DELAY", 60)
+        record_id = history_service.create_record("秋季穿搭", sample_outline, "task_wb")
+        writes = []
+        original = history_service.store.update
+        monkeypatch.setattr(history_service.store, "update",
+                            lambda rid, mutate: writes.append(rid) or original(rid, mutate))
+
+        history_service.queue_update(record_id, images={"task_id": "task_wb", "generated": ["0.png"]})
+        history_service.queue_update(record_id, status="generating", thumbnail=None)
+        history_service.queue_update(record_id, images={"task_id": "task_wb", "generated": ["0.png", "1.png"]})
+        assert writes == []
+        assert history_service._index.get(record_id).status == "draft"
+
+        history_service.flush_pending_updates()
+        assert writes == [record_id]
+        record = history_service.get_record(record_id)
+        assert record["status"] == "generating"
+        assert record["images"]["generated"] == ["0.png", "1.png"]
+        assert record["thumbnail"] is None
+
+    def test_flush_drains_queue(self, history_service, sample_outline, monkeypatch):
+        monkeypatch.setattr(history_service, "WRITE_BEHIND_DELAY", 60)
+        first = history_service.create_record("秋季穿搭", sample_outline)
+        second = history_service.create_record("冬季穿搭", sample_outline)
+        history_service.queue_update(first, status="partial")
+        history_service.queue_update(second, status="completed")
+
+        history_service.flush_pending_updates(first)
+        assert history_service._pending_updates.keys() == {second}
+        assert history_service._index.get(first).status == "partial"
+
+        history_service.flush_pending_updates()
+        assert history_service._pending_updates == {}
+        assert history_service._index.get(second).status == "completed"
+        # 已清空的缓冲再次写入不会重复写入
+        history_service.flush_pending_updates()
+
+    def test_get_record_reads_queued_fields(self, history_service, sample_outline, monkeypatch):
+        monkeypatch.setattr(history_service, "WRITE_BEHIND_DELAY", 60)
+        record_id = history_service.create_record("秋季穿搭", sample_outline)
+        history_service.queue_update(record_id, status="completed")
+        assert history_service.get_record(record_id)["status"] == "completed"
+        assert history_service._pending_updates == {}
+
+    def test_timer_flushes(self, history_service, sample_outline, monkeypatch):
+        monkeypatch.setattr(history_service, "WRITE_BEHIND_DELAY", 0.05)
+        record_id = history_service.create_record("秋季穿搭", sample_outline)
+        history_service.queue_update(record_id, status="completed")
+
+        timer = history_service._flush_timer
+        assert timer is not None
+        timer.join(5)
+        assert history_service._flush_timer is None
+        assert history_service._index.get(record_id).status == "completed"
+
+    def test_task_disk_bytes(self, temp_history_dir):
+        from backend.services.history import HistoryService
+        task_dir = os.path.join(temp_history_dir, "task_size")
+        _write_file(os.path.join(task_dir, "0.png"), 100)
+        _write_file(os.path.join(task_dir, "thumb_0.png"), 20)
+        assert HistoryService.task_disk_bytes(task_dir) == 120
+        assert HistoryService.task_disk_bytes(os.path.join(temp_history_dir, "missing")) == 0
+
+
+class TestMultipleWorkers:
+    """多个工作进程（各自的 HistoryService 实例）共享同一存储"""
+
+    def test_created_record_visible_immediately(self, history_service, sample_outline):
+        from backend.services.history import HistoryService
+        other_worker = HistoryService()
+        try:
+            # 其他进程已加载内存索引，之后不足 INDEX_CHECK_INTERVAL 内即读取新记录
+            assert other_worker.list_records()["records"] == []
+            record_id = history_service.create_record("秋季穿搭", sample_outline, "task_other")
+
+            assert other_worker.record_exists(record_id)
+            assert other_worker.get_record(record_id)["title"] == "秋季穿搭"
+            assert other_worker.record_version(record_id) is not None
+        finally:
+            other_worker.store.close()
+
+
+class TestScanTaskImages:
+    """任务文件夹扫描测试"""
+
+    def test_scan_syncs_images_and_status(self, history_service, sample_outline):
+        record_id = history_service.create_record("秋季穿搭", sample_outline, "task_scan")
+        task_dir = history_service.layout.task_dir("task_scan")
+        _write_file(os.path.join(task_dir, "0.png"), 100)
+        _write_file(os.path.join(task_dir, "1.png"), 200)
+
+        result = history_service.scan_and_sync_task_images("task_scan")
+        assert result["success"] and not result["unchanged"]
+        record = history_service.get_record(record_id)
+        assert record["images"]["generated"] == ["0.png", "1.png"]
+        assert record["status"] == "partial"
+        assert record["disk_bytes"] == 300
+
+    def test_size_only_change_keeps_updated_at(self, history_service, sample_outline):
+        record_id = history_service.create_record("秋季穿搭", sample_outline, "task_size")
+        task_dir = history_service.layout.task_dir("task_size")
+        _write_file(os.path.join(task_dir, "0.png"), 100)
+        history_service.scan_and_sync_task_images("task_size")
+        before = history_service.get_record(record_id)
+        version_before = history_service.record_version(record_id)
+
+        # 只新增缩略图：图片列表和状态不变，只有占用空间变化
+        _write_file(os.path.join(task_dir, "thumb_0.png"), 50)
+        result = history_service.scan_and_sync_task_images("task_size")
+
+        assert result["unchanged"]
+        after = history_service.get_record(record_id)
+        assert after["updated_at"] == before["updated_at"]
+        assert after["disk_bytes"] == 150
+        assert history_service._index.get(record_id).disk_bytes == 150
+        assert history_service.record_version(record_id) != version_before
+
+
+
+class TestCursorPagination:
+    """游标分页测试"""
+
+    def test_walk_pages_while_inserting_and_deleting(self, history_service, sample_outline):
+        original = [history_service.create_record(f"记录 {i}", sample_outline) for i in range(25)]
+        deleted = set()
+        seen = []
+        cursor = None
+        round_no = 0
+        while True:
+            page = history_service.list_records_by_cursor(cursor=cursor, limit=4)
+            seen.extend(r["id"] for r in page["records"])
+            if not page["has_more"]:
+                break
+            cursor = page["next_cursor"]
+
+            # 翻页之间：新建记录，删除一条已读过的和一条还没读到的
+            round_no += 1
+            history_service.create_record(f"新记录 {round_no}", sample_outline)
+            history_service.delete_record(seen[round_no - 1])
+            deleted.add(seen[round_no - 1])
+            unread = [record_id for record_id in original if record_id not in seen and record_id not in deleted]
+            if len(unread) > 1:
+                history_service.delete_record(unread[-1])
+                deleted.add(unread[-1])
+
+        assert len(seen) == len(set(seen))
+        assert set(seen) == set(original) - (deleted - set(seen))
+        assert seen == sorted(seen, key=original.index, reverse=True)
+
+    def test_invalid_cursor(self, history_service):
+        with pytest.raises(ValueError, match="无效的分页游标"):
+            history_service.list_records_by_cursor(cursor="not-a-cursor")
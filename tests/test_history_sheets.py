@@ -0,0 +1,106 @@
+"""
+历史记录列表封面拼图测试
+"""
+import os
+
+import pytest
+from PIL import Image
+
+from backend.services import history_sheets
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_sheets import COLUMNS, TILE_HEIGHT, TILE_WIDTH, ContactSheetCache, sheet_key
+
+
+def _thumb(directory, name, color, size=(300, 500)):
+    path = os.path.join(directory, name)
+    Image.new("RGB", size, color).save(path, "JPEG")
+    return path
+
+
+class TestContactSheetCache:
+    """拼图生成和缓存测试"""
+
+    def test_grid_geometry(self, temp_history_dir):
+        cache = ContactSheetCache(HistoryLayout(temp_history_dir))
+        tiles = [(f"r{i}", _thumb(temp_history_dir, f"{i}.jpg", (i * 20, 0, 0))) for i in range(8)]
+
+        sheet = cache.get_or_build(sheet_key(1, 1, 20), tiles)
+
+        assert (sheet["tile_width"], sheet["tile_height"]) == (TILE_WIDTH, TILE_HEIGHT)
+        assert (sheet["width"], sheet["height"]) == (COLUMNS * TILE_WIDTH, 2 * TILE_HEIGHT)
+        assert sheet["tiles"]["r0"] == {"x": 0, "y": 0}
+        assert sheet["tiles"]["r5"] == {"x": 5 * TILE_WIDTH, "y": 0}
+        assert sheet["tiles"]["r6"] == {"x": 0, "y": TILE_HEIGHT}
+        with Image.open(cache.image_path(sheet["key"])) as img:
+            assert img.format == "JPEG"
+            assert img.size == (sheet["width"], sheet["height"])
+            # 每个封面按比例裁切填满格子：格子中心取自对应的缩略图
+            red = img.getpixel((5 * TILE_WIDTH + TILE_WIDTH // 2, TILE_HEIGHT // 2))[0]
+            assert abs(red - 100) < 10
+
+    def test_narrow_sheet_and_missing_tiles(self, temp_history_dir):
+        cache = ContactSheetCache(HistoryLayout(temp_history_dir))
+        tiles = [
+            ("r0", _thumb(temp_history_dir, "0.jpg", (0, 0, 0))),
+            ("missing", os.path.join(temp_history_dir, "missing.jpg")),
+            ("r2", _thumb(temp_history_dir, "2.jpg", (0, 0, 0))),
+        ]
+        sheet = cache.get_or_build(sheet_key(1), tiles)
+        assert (sheet["width"], sheet["height"]) == (2 * TILE_WIDTH, TILE_HEIGHT)
+        assert sheet["tiles"] == {"r0": {"x": 0, "y": 0}, "r2": {"x": TILE_WIDTH, "y": 0}}
+
+        assert cache.get_or_build(sheet_key(2), [("missing", tiles[1][1])]) is None
+
+    def test_cached_by_key(self, temp_history_dir):
+        cache = ContactSheetCache(HistoryLayout(temp_history_dir))
+        path = _thumb(temp_history_dir, "0.jpg", (0, 0, 0))
+        key = sheet_key(1, 1, 20)
+        sheet = cache.get_or_build(key, [("r0", path)])
+        os.remove(path)
+        assert cache.get_or_build(key, [("r0", path)]) == sheet
+
+    def test_prunes_oldest(self, temp_history_dir, monkeypatch):
+        monkeypatch.setattr(history_sheets, "MAX_SHEETS", 2)
+        cache = ContactSheetCache(HistoryLayout(temp_history_dir))
+        path = _thumb(temp_history_dir, "0.jpg", (0, 0, 0))
+        keys = [sheet_key(version) for version in range(3)]
+        for i, key in enumerate(keys):
+            cache.get_or_build(key, [("r0", path)])
+            os.utime(cache.image_path(key), (1000 + i, 1000 + i))
+
+        cache.get_or_build(sheet_key(99), [("r0", path)])
+        remaining = sorted(name for name in os.listdir(cache.root) if name.endswith(".jpg"))
+        assert len(remaining) == 2
+        assert not os.path.exists(cache.image_path(keys[0]))
+
+    @pytest.mark.parametrize("key", ["../etc/passwd", "ABC", "0" * 19, "g" * 20])
+    def test_rejects_invalid_key(self, temp_history_dir, key):
+        with pytest.raises(ValueError):
+            ContactSheetCache(HistoryLayout(temp_history_dir)).image_path(key)
+
+
+class TestContactSheetEndpoint:
+    """HistoryService.get_contact_sheet 测试"""
+
+    def test_page_of_covers(self, history_service, sample_outline):
+        record_ids = []
+        for i in range(3):
+            task_id = f"task_sheet_{i}"
+            record_id = history_service.create_record(f"记录 {i}", sample_outline, task_id)
+            task_dir = history_service.layout.ensure_task_dir(task_id)
+            _thumb(task_dir, "thumb_0.png", (0, 0, 0))
+            history_service.update_record(record_id, thumbnail="0.png")
+            record_ids.append(record_id)
+        history_service.create_record("没有封面", sample_outline)
+
+        result = history_service.get_contact_sheet(page=1, page_size=10)
+        assert len(result["records"]) == 4
+        sheet = result["sheet"]
+        assert set(sheet["tiles"]) == set(record_ids)
+        # 列表倒序：最新的记录在第一格
+        assert sheet["tiles"][record_ids[-1]] == {"x": 0, "y": 0}
+
+        # 记录没有变化时复用同一张拼图，修改后生成新的
+        assert history_service.get_contact_sheet(page=1, page_size=10)["sheet"]["key"] == sheet["key"]
+        history_service.update_record(record_ids[0], status="completed")
+        assert history_service.get_contact_sheet(page=1, page_size=10)["sheet"]["key"] != sheet["key"]
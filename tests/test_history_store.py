@@ -0,0 +1,219 @@
+"""
+历史记录存储后端测试
+
+同一组断言分别在 JSON 和 SQLite 后端上运行。
+"""
+import json
+import os
+import sqlite3
+
+import pytest
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.history_search import query_terms
+from backend.services.history_store import JsonHistoryStore, SqliteHistoryStore
+
+
+def _record(record_id, created_at, title="标题", status="draft", generated=None, content="正文"):
+    return {
+        "id": record_id,
+        "title": title,
+        "created_at": created_at,
+        "updated_at": created_at,
+        "status": status,
+        "outline": {"raw": content, "pages": [{"index": 0, "type": "cover", "content": content}]},
+        "images": {"task_id": f"task_{record_id}", "generated": generated or []},
+        "thumbnail": None,
+    }
+
+
+@pytest.fixture(params=[JsonHistoryStore, SqliteHistoryStore], ids=["json", "sqlite"])
+def store(request, temp_history_dir):
+    store = request.param(temp_history_dir, HistoryLayout(temp_history_dir))
+    yield store
+    store.close()
+
+
+class TestHistoryStore:
+    """两种后端共同的读写行为"""
+
+    def test_insert_get_exists(self, store):
+        record = _record("r1", "2024-01-01T00:00:00", title="秋季穿搭")
+        store.insert(record)
+
+        assert store.exists("r1")
+        assert store.get("r1") == record
+        assert not store.exists("missing")
+        assert store.get("missing") is None
+
+    def test_load_entries_newest_first(self, store):
+        store.insert(_record("r1", "2024-01-01T00:00:00"))
+        store.insert(_record("r3", "2024-01-03T00:00:00", generated=["0.png"]))
+        store.insert(_record("r2", "2024-01-02T00:00:00"))
+
+        entries = store.load_entries()
+        assert {entry["id"] for entry in entries} == {"r1", "r2", "r3"}
+        by_id = {entry["id"]: entry for entry in entries}
+        assert by_id["r3"]["image_count"] == 1
+        assert by_id["r3"]["task_id"] == "task_r3"
+        assert by_id["r1"]["page_count"] == 1
+
+    def test_update(self, store):
+        store.insert(_record("r1", "2024-01-01T00:00:00"))
+
+        updated = store.update("r1", lambda record: record.update(status="completed", title="新标题"))
+        assert updated["status"] == "completed"
+        assert store.get("r1")["title"] == "新标题"
+        assert store.load_entries()[0]["status"] == "completed"
+        assert store.update("missing", lambda record: None) is None
+
+    def test_delete(self, store):
+        store.insert(_record("r1", "2024-01-01T00:00:00"))
+        store.insert(_record("r2", "2024-01-02T00:00:00"))
+
+        assert store.delete("r1")["id"] == "r1"
+        assert store.delete("r1") is None
+        assert not store.exists("r1")
+        assert [entry["id"] for entry in store.load_entries()] == ["r2"]
+
+    def test_change_token(self, store):
+        before = store.change_token()
+        store.insert(_record("r1", "2024-01-01T00:00:00"))
+        after_insert = store.change_token()
+        assert after_insert != before
+        assert store.last_write_token == after_insert
+
+        store.update("r1", lambda record: record.update(status="completed"))
+        assert store.change_token() != after_insert
+        assert store.last_write_token == store.change_token()
+
+    def test_stats(self, store):
+        store.insert(_record("r1", "2024-01-01T00:00:00", generated=["0.png", "1.png"]))
+        store.insert(_record("r2", "2024-01-02T00:00:00", status="completed", generated=["0.png"]))
+        store.update("r1", lambda record: record.update(disk_bytes=300))
+
+        expected = {
+            "draft": {"records": 1, "images": 2, "disk_bytes": 300},
+            "completed": {"records": 1, "images": 1, "disk_bytes": 0},
+        }
+        assert store.get_stats() == expected
+
+        store.delete("r2")
+        assert store.get_stats() == {"draft": expected["draft"]}
+        assert store.rebuild_stats() == {"draft": expected["draft"]}
+
+    def test_search(self, store):
+        store.insert(_record("r1", "2024-01-01T00:00:00", title="秋季穿搭", content="基础款搭配"))
+        store.insert(_record("r2", "2024-01-02T00:00:00", title="夏日饮品", content="冰咖啡"))
+        store.insert(_record("r3", "2024-01-03T00:00:00", title="冬季穿搭", content="羽绒服"))
+
+        ids, total = store.search(query_terms("穿搭"), limit=10)
+        assert total == 2 and set(ids) == {"r1", "r3"}
+
+        ids, total = store.search(query_terms("穿搭"), limit=1, offset=1)
+        assert total == 2 and len(ids) == 1
+
+        assert store.search(query_terms("咖啡"), limit=10) == (["r2"], 1)
+        assert store.search(query_terms("不存在"), limit=10) == ([], 0)
+
+        store.delete("r2")
+        assert store.search(query_terms("咖啡"), limit=10) == ([], 0)
+        store.update("r1", lambda record: record.update(title="秋季咖啡"))
+        assert store.search(query_terms("咖啡"), limit=10) == (["r1"], 1)
+
+    def test_other_instance_sees_writes(self, store, temp_history_dir):
+        """另一个实例（模拟其他进程）通过变更标记发现修改"""
+        other = type(store)(temp_history_dir, HistoryLayout(temp_history_dir))
+        try:
+            token = other.change_token()
+            store.insert(_record("r1", "2024-01-01T00:00:00", title="秋季穿搭"))
+            assert other.change_token() != token
+            assert other.get("r1")["title"] == "秋季穿搭"
+            assert other.search(query_terms("穿搭"), limit=10) == (["r1"], 1)
+        finally:
+            other.close()
+
+
+class TestSqliteHistoryStore:
+    """SQLite 后端特有行为"""
+
+    def test_wal_mode(self, temp_history_dir):
+        store = SqliteHistoryStore(temp_history_dir)
+        try:
+            mode = store._conn().execute("PRAGMA journal_mode").fetchone()[0]
+            assert mode == "wal"
+        finally:
+            store.close()
+
+    def test_search_terms_maintained_in_table(self, temp_history_dir):
+        store = SqliteHistoryStore(temp_history_dir)
+        try:
+            store.insert(_record("r1", "2024-01-01T00:00:00", title="秋季穿搭"))
+            count = lambda: store._conn().execute(
+                "SELECT COUNT(*) FROM search_terms WHERE record_id = 'r1'"
+            ).fetchone()[0]
+            assert count() > 0
+            store.delete("r1")
+            assert count() == 0
+        finally:
+            store.close()
+
+    def test_migrates_json_records(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        json_store = JsonHistoryStore(temp_history_dir, layout)
+        json_store.insert(_record("r1", "2024-01-01T00:00:00", title="秋季穿搭"))
+        json_store.insert(_record("r2", "2024-01-02T00:00:00", status="completed", generated=["0.png"]))
+        # 不在 index.json 中的记录文件同样导入
+        orphan = _record("r3", "2024-01-03T00:00:00")
+        path = layout.sharded_record_path("r3")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(orphan, f, ensure_ascii=False)
+
+        store = SqliteHistoryStore(temp_history_dir, layout)
+        try:
+            assert {entry["id"] for entry in store.load_entries()} == {"r1", "r2", "r3"}
+            assert store.get("r2")["images"]["generated"] == ["0.png"]
+            assert store.get_stats()["completed"] == {"records": 1, "images": 1, "disk_bytes": 0}
+            assert store.search(query_terms("穿搭"), limit=10) == (["r1"], 1)
+        finally:
+            store.close()
+
+        # 只导入一次：之后对 JSON 文件的修改不再导入，原文件保留不动
+        json_store.insert(_record("r4", "2024-01-04T00:00:00"))
+        store = SqliteHistoryStore(temp_history_dir, layout)
+        try:
+            assert not store.exists("r4")
+            assert os.path.exists(layout.record_path("r1"))
+        finally:
+            store.close()
+
+    def test_upgrades_old_schema(self, temp_history_dir):
+        """旧版本数据库没有 image_count / disk_bytes 列和倒排表，打开时补齐"""
+        db_path = os.path.join(temp_history_dir, SqliteHistoryStore.DB_FILENAME)
+        record = _record("r1", "2024-01-01T00:00:00", title="秋季穿搭", generated=["0.png", "1.png"])
+        conn = sqlite3.connect(db_path)
+        conn.executescript("""
+            CREATE TABLE records (
+                id TEXT PRIMARY KEY, title TEXT NOT NULL DEFAULT '', created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL, status TEXT NOT NULL, thumbnail TEXT,
+                page_count INTEGER NOT NULL DEFAULT 0, task_id TEXT, data TEXT NOT NULL
+            );
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            INSERT INTO meta (key, value) VALUES ('generation', '3'), ('json_migrated', 'yes');
+        """)
+        conn.execute(
+            "INSERT INTO records VALUES (?, ?, ?, ?, ?, NULL, 1, ?, ?)",
+            ("r1", record["title"], record["created_at"], record["updated_at"], "draft",
+             "task_r1", json.dumps(record, ensure_ascii=False))
+        )
+        conn.commit()
+        conn.close()
+
+        store = SqliteHistoryStore(temp_history_dir)
+        try:
+            assert store.load_entries()[0]["image_count"] == 2
+            assert store.get_stats() == {"draft": {"records": 1, "images": 2, "disk_bytes": 0}}
+            assert store.search(query_terms("穿搭"), limit=10) == (["r1"], 1)
+        finally:
+            store.close()
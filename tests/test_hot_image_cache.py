@@ -0,0 +1,127 @@
+"""
+热点图片内存缓存测试
+"""
+import os
+
+import pytest
+
+from backend.services.hot_image_cache import MAX_ITEM_FRACTION, HotImageCache
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+class TestHotImageCache:
+    """HotImageCache 测试"""
+
+    def test_load_hits_after_miss(self, temp_history_dir):
+        cache = HotImageCache(1024 * 1024)
+        path = os.path.join(temp_history_dir, "0.png")
+        _write(path, b"a" * 100)
+
+        assert cache.load(path) == b"a" * 100
+        assert cache.load(path) == b"a" * 100
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 100)
+
+    def test_overwrite_invalidates(self, temp_history_dir):
+        cache = HotImageCache(1024 * 1024)
+        path = os.path.join(temp_history_dir, "0.png")
+        _write(path, b"old" * 10)
+        cache.put(path, b"old" * 10)
+
+        # 其他进程重新生成（大小、修改时间变化）
+        _write(path, b"new" * 20)
+        assert cache.load(path) == b"new" * 20
+        assert cache.stats()["invalidations"] == 1
+
+    def test_put_replaces_data(self, temp_history_dir):
+        cache = HotImageCache(1024 * 1024)
+        path = os.path.join(temp_history_dir, "0.png")
+        _write(path, b"old")
+        cache.put(path, b"old")
+        _write(path, b"newer")
+        cache.put(path, b"newer")
+        assert cache.load(path) == b"newer"
+        assert cache.stats()["bytes"] == 5
+
+    def test_deleted_file(self, temp_history_dir):
+        cache = HotImageCache(1024 * 1024)
+        path = os.path.join(temp_history_dir, "0.png")
+        _write(path, b"data")
+        cache.load(path)
+        os.remove(path)
+        with pytest.raises(FileNotFoundError):
+            cache.load(path)
+
+    def test_invalidate_dir(self, temp_history_dir):
+        cache = HotImageCache(1024 * 1024)
+        task_dir = os.path.join(temp_history_dir, "task_a")
+        other_dir = os.path.join(temp_history_dir, "task_ab")
+        os.makedirs(task_dir)
+        os.makedirs(other_dir)
+        for directory in (task_dir, other_dir):
+            path = os.path.join(directory, "0.png")
+            _write(path, b"data")
+            cache.load(path)
+
+        cache.invalidate_dir(task_dir)
+        stats = cache.stats()
+        assert stats["entries"] == 1 and stats["bytes"] == 4
+        # 前缀相同的其他任务不受影响
+        assert cache.load(os.path.join(other_dir, "0.png")) == b"data"
+        assert cache.stats()["hits"] == 1
+
+    def test_lru_eviction_and_item_limit(self, temp_history_dir):
+        # 预算 240 字节，单个文件最多 240 // MAX_ITEM_FRACTION = 30 字节
+        cache = HotImageCache(30 * MAX_ITEM_FRACTION)
+        big = os.path.join(temp_history_dir, "big.png")
+        _write(big, b"x" * 31)
+        # 超过单个文件上限：返回 None，由调用方直接发送文件
+        assert cache.load(big) is None
+        assert cache.stats()["entries"] == 0
+
+        paths = []
+        for i in range(MAX_ITEM_FRACTION + 1):
+            path = os.path.join(temp_history_dir, f"{i}.png")
+            _write(path, bytes([i]) * 30)
+            paths.append(path)
+        for path in paths[:-1]:
+            cache.load(path)
+        cache.load(paths[0])  # 最旧的条目变为最近使用
+        cache.load(paths[-1])
+
+        stats = cache.stats()
+        assert stats["evictions"] == 1
+        assert stats["bytes"] == 30 * MAX_ITEM_FRACTION
+        hits = stats["hits"]
+        cache.load(paths[0])
+        assert cache.stats()["hits"] == hits + 1
+        cache.load(paths[1])
+        assert cache.stats()["hits"] == hits + 1
+
+    def test_disabled(self, temp_history_dir):
+        cache = HotImageCache(0)
+        path = os.path.join(temp_history_dir, "0.png")
+        _write(path, b"data")
+        assert cache.load(path) is None
+        assert not cache.stats()["enabled"]
+
+
+class TestHistoryInvalidation:
+    """删除记录时清除任务文件夹的缓存"""
+
+    def test_delete_record_invalidates(self, history_service, sample_outline, monkeypatch):
+        from backend.services import history as history_module
+        cache = HotImageCache(1024 * 1024)
+        monkeypatch.setattr(history_module, "get_hot_image_cache", lambda: cache)
+        record_id = history_service.create_record("秋季穿搭", sample_outline, "task_hot")
+        path = os.path.join(history_service.layout.ensure_task_dir("task_hot"), "0.png")
+        _write(path, b"data")
+        cache.load(path)
+
+        history_service.delete_record(record_id)
+        assert cache.stats()["entries"] == 0
+        assert cache.stats()["invalidations"] == 1
@@ -0,0 +1,160 @@
+"""
+图片获取接口测试（ETag、版本号、前置代理发送）
+"""
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from backend.config import Config
+from backend.utils.http_cache import file_version
+
+
+def _png(width=64, height=48, color=(200, 40, 40)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def image_client(client, history_service, monkeypatch):
+    """图片接口使用临时目录中的历史记录服务，任务 task_img 下有一张原图"""
+    from backend.services import history as history_module
+    monkeypatch.setattr(history_module, "_service_instance", history_service)
+    task_dir = history_service.layout.ensure_task_dir("task_img")
+    with open(os.path.join(task_dir, "0.png"), "wb") as f:
+        f.write(_png())
+    return client
+
+
+class TestImageCaching:
+    """内容哈希 ETag 与 ?v= 版本号"""
+
+    def test_etag_and_not_modified(self, image_client, history_service):
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false")
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        etag = response.headers["ETag"]
+        version = file_version(os.path.join(history_service.layout.task_dir("task_img"), "0.png"))
+        assert etag == f'"{version}"'
+        assert "no-cache" in response.headers["Cache-Control"]
+
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false",
+                                    headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+
+    def test_current_version_is_immutable(self, image_client, history_service):
+        version = file_version(os.path.join(history_service.layout.task_dir("task_img"), "0.png"))
+        response = image_client.get(f"/api/images/task_img/0.png?thumbnail=false&v={version}")
+        cache_control = response.headers["Cache-Control"]
+        assert "immutable" in cache_control and "max-age=31536000" in cache_control
+
+        # 过期的版本号（图片已重新生成）：仍返回当前内容，但要求重新验证
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false&v=0000000000000000")
+        assert response.status_code == 200
+        assert "no-cache" in response.headers["Cache-Control"]
+
+    def test_etag_changes_when_image_regenerated(self, image_client, history_service):
+        etag = image_client.get("/api/images/task_img/0.png?thumbnail=false").headers["ETag"]
+        with open(os.path.join(history_service.layout.task_dir("task_img"), "0.png"), "wb") as f:
+            f.write(_png(color=(10, 200, 10)))
+
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false",
+                                    headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_thumbnail_mimetype_sniffed(self, image_client, history_service):
+        """缩略图是 JPEG 数据但文件名是 .png"""
+        buffer = io.BytesIO()
+        Image.new("RGB", (16, 12)).save(buffer, "JPEG")
+        with open(os.path.join(history_service.layout.task_dir("task_img"), "thumb_0.png"), "wb") as f:
+            f.write(buffer.getvalue())
+
+        response = image_client.get("/api/images/task_img/0.png")
+        assert response.status_code == 200
+        assert response.mimetype == "image/jpeg"
+
+    def test_missing_image(self, image_client):
+        assert image_client.get("/api/images/task_img/9.png").status_code == 404
+        assert image_client.get("/api/images/task_none/0.png").status_code == 404
+
+
+class TestFileOffload:
+    """FILE_OFFLOAD：文件内容交给前置代理发送"""
+
+    def test_disabled_sends_file(self, image_client, monkeypatch):
+        monkeypatch.setattr(Config, "FILE_OFFLOAD", "")
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false")
+        assert response.status_code == 200
+        assert response.data.startswith(b"\x89PNG")
+        assert "X-Accel-Redirect" not in response.headers
+        assert "X-Sendfile" not in response.headers
+
+    def test_nginx(self, image_client, history_service, monkeypatch):
+        monkeypatch.setattr(Config, "FILE_OFFLOAD", "nginx")
+        monkeypatch.setattr(Config, "FILE_OFFLOAD_PREFIX", "/_history/")
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false")
+
+        assert response.status_code == 200
+        assert response.data == b""
+        rel_path = os.path.relpath(
+            os.path.join(history_service.layout.task_dir("task_img"), "0.png"), history_service.history_dir
+        )
+        assert response.headers["X-Accel-Redirect"] == "/_history/" + rel_path.replace(os.sep, "/")
+        assert response.mimetype == "image/png"
+        assert response.headers["ETag"]
+
+        # If-None-Match 命中时由 Flask 直接返回 304，不交给代理
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false",
+                                    headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 304
+        assert "X-Accel-Redirect" not in response.headers
+
+    def test_sendfile(self, image_client, history_service, monkeypatch):
+        monkeypatch.setattr(Config, "FILE_OFFLOAD", "sendfile")
+        response = image_client.get("/api/images/task_img/0.png?thumbnail=false")
+        assert response.status_code == 200
+        assert response.data == b""
+        assert response.headers["X-Sendfile"] == os.path.abspath(
+            os.path.join(history_service.layout.task_dir("task_img"), "0.png")
+        )
+
+    def test_zip_download(self, image_client, history_service, monkeypatch):
+        monkeypatch.setattr(Config, "FILE_OFFLOAD", "nginx")
+        record_id = history_service.create_record("秋季穿搭", {"pages": []}, "task_img")
+        history_service.scan_and_sync_task_images("task_img")
+
+        response = image_client.get(f"/api/history/{record_id}/download")
+        assert response.status_code == 200
+        assert response.headers["X-Accel-Redirect"].startswith("/_history/exports/")
+        assert response.headers["Content-Disposition"].startswith("attachment;")
+
+
+class TestImageVariants:
+    """?w= / ?format= 响应式变体"""
+
+    def test_width_snapped_and_clamped(self, image_client):
+        response = image_client.get("/api/images/task_img/0.png?w=30&format=png")
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        with Image.open(io.BytesIO(response.data)) as img:
+            # 30 取整到 240 档，原图只有 64 像素宽，不放大
+            assert img.size == (64, 48)
+        assert response.headers["ETag"].endswith('-240-png"')
+
+        response = image_client.get("/api/images/task_img/0.png?w=99999&format=png")
+        assert response.headers["ETag"].endswith('-2160-png"')
+
+    def test_format_negotiated_by_accept(self, image_client):
+        response = image_client.get("/api/images/task_img/0.png?w=240", headers={"Accept": "image/*"})
+        assert response.status_code == 200
+        assert response.mimetype == "image/jpeg"
+        assert "Accept" in response.headers["Vary"]
+
+    def test_unsupported_format(self, image_client):
+        response = image_client.get("/api/images/task_img/0.png?format=bmp")
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
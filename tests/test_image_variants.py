@@ -0,0 +1,106 @@
+"""
+图片响应式变体测试
+"""
+import os
+import time
+
+from PIL import Image
+from werkzeug.datastructures import MIMEAccept
+
+from backend.services.history_layout import HistoryLayout
+from backend.services.image_variants import (
+    VARIANT_WIDTHS, ImageVariantCache, negotiate_format, snap_width, supported_formats
+)
+
+
+def _source(directory, name="0.png", size=(1000, 800)):
+    path = os.path.join(directory, name)
+    Image.new("RGB", size, (120, 80, 40)).save(path, "PNG")
+    return path
+
+
+class TestSizing:
+    """宽度档位和格式协商"""
+
+    def test_snap_width(self):
+        assert snap_width(1) == VARIANT_WIDTHS[0]
+        assert snap_width(240) == 240
+        assert snap_width(241) == 480
+        assert snap_width(700) == 720
+        # 超过最大档位时限制为最大档位
+        assert snap_width(100000) == VARIANT_WIDTHS[-1]
+
+    def test_negotiate_format(self):
+        assert negotiate_format(MIMEAccept([("image/*", 1)])) == "jpeg"
+        assert negotiate_format(MIMEAccept([])) == "jpeg"
+        if "webp" in supported_formats():
+            assert negotiate_format(MIMEAccept([("image/webp", 1), ("image/*", 0.8)])) == "webp"
+        assert "jpeg" in supported_formats() and "png" in supported_formats()
+
+
+class TestImageVariantCache:
+    """变体磁盘缓存测试"""
+
+    def test_renders_and_reuses(self, temp_history_dir):
+        cache = ImageVariantCache(HistoryLayout(temp_history_dir), 10 * 1024 * 1024)
+        source = _source(temp_history_dir)
+
+        path = cache.get("task_v", "0.png", source, "v1", 480, "jpeg")
+        with Image.open(path) as img:
+            assert img.format == "JPEG"
+            assert img.size == (480, 384)
+        mtime = os.stat(path).st_mtime_ns
+        assert cache.get("task_v", "0.png", source, "v1", 480, "jpeg") == path
+        assert os.stat(path).st_mtime_ns == mtime
+
+        # 新版本号对应新文件
+        assert cache.get("task_v", "0.png", source, "v2", 480, "jpeg") != path
+
+    def test_never_upscales(self, temp_history_dir):
+        cache = ImageVariantCache(HistoryLayout(temp_history_dir), 10 * 1024 * 1024)
+        source = _source(temp_history_dir, size=(300, 200))
+        with Image.open(cache.get("task_v", "0.png", source, "v1", 2160, "png")) as img:
+            assert img.size == (300, 200)
+        with Image.open(cache.get("task_v", "0.png", source, "v1", None, "png")) as img:
+            assert img.size == (300, 200)
+
+    def test_lru_eviction(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        source = _source(temp_history_dir)
+        probe = ImageVariantCache(layout, 10 * 1024 * 1024)
+        size = os.path.getsize(probe.get("task_probe", "0.png", source, "v1", 240, "png"))
+        probe.invalidate("task_probe")
+
+        # 上限容纳约两个变体
+        cache = ImageVariantCache(layout, size * 2 + size // 2)
+        first = cache.get("task_a", "0.png", source, "v1", 240, "png")
+        second = cache.get("task_b", "0.png", source, "v1", 240, "png")
+        cache.get("task_a", "0.png", source, "v1", 240, "png")  # first 变为最近使用
+        third = cache.get("task_c", "0.png", source, "v1", 240, "png")
+
+        assert os.path.exists(first) and os.path.exists(third)
+        assert not os.path.exists(second)
+        assert cache._total <= cache.max_bytes
+
+    def test_restores_order_from_disk(self, temp_history_dir):
+        layout = HistoryLayout(temp_history_dir)
+        source = _source(temp_history_dir)
+        cache = ImageVariantCache(layout, 10 * 1024 * 1024)
+        old = cache.get("task_a", "0.png", source, "v1", 240, "png")
+        new = cache.get("task_b", "0.png", source, "v1", 240, "png")
+        past = time.time() - 100
+        os.utime(old, (past, past))
+
+        # 新进程：首次使用时扫描磁盘，按修改时间确定淘汰顺序
+        restarted = ImageVariantCache(layout, os.path.getsize(new) + os.path.getsize(old) // 2)
+        restarted.get("task_b", "0.png", source, "v1", 240, "png")
+        restarted.get("task_b", "0.png", source, "v1", 480, "png")
+        assert not os.path.exists(old)
+
+    def test_invalidate(self, temp_history_dir):
+        cache = ImageVariantCache(HistoryLayout(temp_history_dir), 10 * 1024 * 1024)
+        source = _source(temp_history_dir)
+        path = cache.get("task_v", "0.png", source, "v1", 240, "png")
+        cache.invalidate("task_v")
+        assert not os.path.exists(path)
+        assert cache._total == 0
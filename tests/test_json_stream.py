@@ -0,0 +1,127 @@
+"""
+增量 JSON 解析和流式文本生成测试
+"""
+import io
+import json
+
+import requests
+
+from backend.utils.json_stream import IncrementalJSONParser
+from backend.utils.text_client import TextChatClient
+
+
+def _feed_all(text, chunk_size):
+    parser = IncrementalJSONParser()
+    events = []
+    for i in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[i:i + chunk_size]))
+    return parser, events
+
+
+OUTLINE = {
+    "outline": "封面：秋季穿搭指南\n内容：基础款搭配",
+    "pages": [
+        {"index": 0, "type": "cover", "content": "秋季穿搭"},
+        {"index": 1, "type": "content", "content": "基础款 \"引号\" 与 \\ 反斜杠"}
+    ]
+}
+
+
+class TestIncrementalJSONParser:
+    """IncrementalJSONParser 测试"""
+
+    def test_every_chunk_size_gives_same_result(self):
+        text = json.dumps(OUTLINE, ensure_ascii=False)
+        for size in range(1, len(text) + 1):
+            parser, events = _feed_all(text, size)
+            assert parser.done
+            assert parser.finish() == OUTLINE
+            items = [value for kind, key, value in events if kind == "item"]
+            assert items == OUTLINE["pages"]
+
+    def test_skips_code_fence_and_surrounding_text(self):
+        text = "好的，下面是大纲：\n```json\n" + json.dumps(OUTLINE, ensure_ascii=False) + "\n```\n希望有帮助"
+        parser, _ = _feed_all(text, 7)
+        assert parser.done
+        assert parser.finish() == OUTLINE
+
+    def test_field_reported_as_soon_as_complete(self):
+        parser = IncrementalJSONParser()
+        events = parser.feed('{"outline": "封面", "pa')
+        assert ("field", "outline", "封面") in events
+        assert not parser.done
+
+    def test_truncated_string_recovered(self):
+        parser, _ = _feed_all('{"outline": "封面：秋季\\n穿搭指', 5)
+        assert parser.truncated
+        assert parser.finish() == {"outline": "封面：秋季\n穿搭指"}
+
+    def test_truncated_escape_dropped(self):
+        for tail in ('\\', '\\u4e'):
+            parser, _ = _feed_all('{"outline": "秋季' + tail, 3)
+            assert parser.finish() == {"outline": "秋季"}
+
+    def test_truncated_array_keeps_complete_items(self):
+        text = json.dumps(OUTLINE, ensure_ascii=False)
+        cut = text.index('{"index": 1')
+        parser, _ = _feed_all(text[:cut + 20], 4)
+        result = parser.finish()
+        assert result["outline"] == OUTLINE["outline"]
+        assert result["pages"] == OUTLINE["pages"][:1]
+
+    def test_no_json_raises(self):
+        parser, _ = _feed_all("抱歉，无法生成", 3)
+        try:
+            parser.finish()
+        except ValueError:
+            return
+        raise AssertionError("应当抛出 ValueError")
+
+
+class _FakeStreamClient(TextChatClient):
+    """返回预设 SSE 字节流的客户端（不发起网络请求）"""
+
+    def __init__(self, body: bytes):
+        super().__init__(api_key="test-key", base_url="http://localhost")
+        self.body = body
+
+    def _open_stream(self, payload, model):
+        response = requests.Response()
+        response.status_code = 200
+        # 与多数服务商一致：不带 charset
+        response.headers["Content-Type"] = "text/event-stream"
+        response.raw = io.BytesIO(self.body)
+        return response
+
+
+def _sse_body(pieces):
+    lines = []
+    for piece in pieces:
+        chunk = {"choices": [{"delta": {"content": piece}}]}
+        lines.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode("utf-8")
+
+
+class TestTextStream:
+    """TextChatClient.generate_text_stream 测试"""
+
+    def test_utf8_without_charset(self):
+        pieces = ["秋季", "穿搭", "指南"]
+        client = _FakeStreamClient(_sse_body(pieces))
+        assert list(client.generate_text_stream("prompt")) == pieces
+
+    def test_multibyte_split_across_network_chunks(self):
+        # 足够长的内容使 iter_lines 的读取块边界落在多字节字符中间
+        pieces = ["穿搭" * 300, "指南😀" * 100]
+        client = _FakeStreamClient(_sse_body(pieces))
+        assert "".join(client.generate_text_stream("prompt")) == "".join(pieces)
+
+    def test_stream_feeds_parser(self):
+        text = json.dumps(OUTLINE, ensure_ascii=False)
+        pieces = [text[i:i + 5] for i in range(0, len(text), 5)]
+        client = _FakeStreamClient(_sse_body(pieces))
+        parser = IncrementalJSONParser()
+        for piece in client.generate_text_stream("prompt"):
+            parser.feed(piece)
+        assert parser.finish() == OUTLINE
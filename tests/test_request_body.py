@@ -0,0 +1,88 @@
+"""
+请求体流式解析测试（base64 图片边读边解码）
+"""
+import base64
+import io
+import json
+import os
+
+import pytest
+
+from backend.utils import request_body
+from backend.utils.request_body import PayloadTooLargeError, StreamingImageJSONParser, parse_json_with_images
+
+IMAGE = os.urandom(700)
+LIMIT = 10 * 1024 * 1024
+
+
+def _parse_split(text, offset):
+    parser = StreamingImageJSONParser(('user_images',), LIMIT, LIMIT)
+    parser.feed(text[:offset])
+    parser.feed(text[offset:])
+    return parser.close()
+
+
+def _body(encoded, **extra):
+    """拼出请求体 JSON（encoded 为 JSON 字符串字面量内部的原始文本）"""
+    head = json.dumps({"topic": "秋季穿搭", **extra}, ensure_ascii=False)[:-1]
+    return head + ', "user_images": ["' + encoded + '"], "pages": [1, 2]}'
+
+
+def _assert_every_offset(text, expected_images):
+    for offset in range(len(text) + 1):
+        data, images = _parse_split(text, offset)
+        assert images["user_images"] == expected_images, f"offset={offset}"
+        assert data == {"topic": "秋季穿搭", "pages": [1, 2]}
+
+
+class TestStreamingImageJSONParser:
+    """StreamingImageJSONParser 测试"""
+
+    def test_plain_base64(self):
+        _assert_every_offset(_body(base64.b64encode(IMAGE).decode()), [IMAGE])
+
+    def test_mime_wrapped_lf(self):
+        wrapped = base64.encodebytes(IMAGE).decode()
+        assert "\n" in wrapped
+        _assert_every_offset(_body(json.dumps(wrapped)[1:-1]), [IMAGE])
+
+    def test_mime_wrapped_crlf(self):
+        wrapped = base64.encodebytes(IMAGE).decode().replace("\n", "\r\n")
+        _assert_every_offset(_body(json.dumps(wrapped)[1:-1]), [IMAGE])
+
+    def test_escaped_slash(self):
+        encoded = base64.b64encode(IMAGE).decode()
+        assert "/" in encoded
+        _assert_every_offset(_body(encoded.replace("/", "\\/")), [IMAGE])
+
+    def test_unicode_escape(self):
+        encoded = base64.b64encode(IMAGE).decode()
+        escaped = "".join(f"\\u{ord(c):04x}" if i % 7 == 0 else c for i, c in enumerate(encoded))
+        _assert_every_offset(_body(escaped), [IMAGE])
+
+    def test_data_url_prefix(self):
+        encoded = "data:image\\/png;base64," + base64.b64encode(IMAGE).decode()
+        _assert_every_offset(_body(encoded), [IMAGE])
+
+    def test_invalid_escape_rejected(self):
+        with pytest.raises(ValueError):
+            _parse_split(_body("QUJD\\xRA=="), 10)
+
+    def test_truncated_escape_at_end_rejected(self):
+        with pytest.raises(ValueError):
+            _parse_split(_body("QUJDRA==\\u00"), 10)
+
+    def test_image_size_limit(self):
+        parser = StreamingImageJSONParser(('user_images',), 100, LIMIT)
+        with pytest.raises(PayloadTooLargeError):
+            parser.feed(_body(base64.b64encode(IMAGE).decode()))
+
+
+def test_parse_stream_with_tiny_chunks(monkeypatch):
+    """按字节分块读取时，多字节字符和转义序列都可能被切开"""
+    monkeypatch.setattr(request_body, "CHUNK_SIZE", 1)
+    wrapped = base64.encodebytes(IMAGE).decode().replace("/", "\\/")
+    text = _body(json.dumps(wrapped)[1:-1].replace("\\\\/", "\\/"))
+    data, images = parse_json_with_images(io.BytesIO(text.encode("utf-8")), ('user_images',), LIMIT, LIMIT)
+    assert images["user_images"] == [IMAGE]
+    assert data["topic"] == "秋季穿搭"
@@ -0,0 +1,212 @@
+"""
+跨请求共享状态和任务状态测试
+"""
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from backend.services import shared_state as shared_state_module
+from backend.services.shared_state import MemorySharedState, SqliteSharedState, create_shared_state
+from backend.services.task_state import TaskStateStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def shared(request, temp_history_dir):
+    return create_shared_state(request.param, os.path.join(temp_history_dir, "state.db"))
+
+
+def _increment_in_process(db_path, count):
+    """子进程：独立打开数据库并递增计数"""
+    state = SqliteSharedState(db_path)
+    for _ in range(count):
+        state.update("counter", "n", lambda value: (value or 0) + 1)
+
+
+class TestSharedState:
+    """两种内置后端共同的行为"""
+
+    def test_get_set_delete(self, shared):
+        assert shared.get("ns", "k") is None
+        assert shared.get("ns", "k", "default") == "default"
+        shared.set("ns", "k", {"a": [1, 2], "中文": "值"})
+        assert shared.get("ns", "k") == {"a": [1, 2], "中文": "值"}
+        assert shared.get("other", "k") is None
+        shared.delete("ns", "k")
+        assert shared.get("ns", "k") is None
+
+    def test_returns_copies(self, shared):
+        shared.set("ns", "k", {"items": []})
+        shared.get("ns", "k")["items"].append(1)
+        assert shared.get("ns", "k") == {"items": []}
+
+    def test_bytes_round_trip(self, shared):
+        value = {"cover": b"\x89PNG\x00\xff", "images": [b"", bytes(range(256))], "name": "x"}
+        shared.set("ns", "k", value)
+        assert shared.get("ns", "k") == value
+        assert shared.update("ns", "k", lambda v: v["images"]) == [b"", bytes(range(256))]
+        assert shared.get("ns", "k") == [b"", bytes(range(256))]
+
+    def test_ttl_expiry(self, shared, monkeypatch):
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now)
+        shared.set("ns", "short", 1, ttl=10)
+        shared.set("ns", "forever", 2)
+        assert sorted(shared.keys("ns")) == ["forever", "short"]
+
+        monkeypatch.setattr(time, "time", lambda: now + 11)
+        assert shared.get("ns", "short") is None
+        assert shared.get("ns", "forever") == 2
+        assert shared.keys("ns") == ["forever"]
+        # 过期的值在 update 中视为不存在
+        assert shared.update("ns", "short", lambda value: value) is None
+
+    def test_update(self, shared):
+        assert shared.update("ns", "k", lambda value: (value or 0) + 1) == 1
+        assert shared.update("ns", "k", lambda value: value + 1) == 2
+        assert shared.get("ns", "k") == 2
+        # 返回 None 表示删除
+        assert shared.update("ns", "k", lambda value: None) is None
+        assert shared.keys("ns") == []
+
+    def test_concurrent_update_from_threads(self, shared):
+        def worker():
+            for _ in range(50):
+                shared.update("counter", "n", lambda value: (value or 0) + 1)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert shared.get("counter", "n") == 400
+
+
+class TestSqliteSharedState:
+    """SQLite 后端特有行为"""
+
+    def test_update_atomic_across_processes(self, temp_history_dir):
+        db_path = os.path.join(temp_history_dir, "state.db")
+        state = SqliteSharedState(db_path)
+        ctx = multiprocessing.get_context("fork")
+        processes = [ctx.Process(target=_increment_in_process, args=(db_path, 50)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(60)
+            assert process.exitcode == 0
+        assert state.get("counter", "n") == 200
+
+    def test_visible_to_other_connection(self, temp_history_dir):
+        db_path = os.path.join(temp_history_dir, "state.db")
+        writer, reader = SqliteSharedState(db_path), SqliteSharedState(db_path)
+        writer.set("ns", "k", b"data", ttl=60)
+        assert reader.get("ns", "k") == b"data"
+
+    def test_failed_update_rolls_back(self, temp_history_dir):
+        state = SqliteSharedState(os.path.join(temp_history_dir, "state.db"))
+        state.set("ns", "k", 1)
+
+        def fail(value):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            state.update("ns", "k", fail)
+        assert state.update("ns", "k", lambda value: value + 1) == 2
+
+    def test_purges_expired_rows(self, temp_history_dir, monkeypatch):
+        monkeypatch.setattr(SqliteSharedState, "PURGE_EVERY", 2)
+        state = SqliteSharedState(os.path.join(temp_history_dir, "state.db"))
+        state.set("ns", "old", 1, ttl=0.001)
+        time.sleep(0.01)
+        state.set("ns", "new", 2)
+        rows = state._conn().execute("SELECT key FROM state").fetchall()
+        assert [row[0] for row in rows] == ["new"]
+
+
+class TestCreateSharedState:
+    """后端选择"""
+
+    def test_custom_backend(self, temp_history_dir):
+        state = create_shared_state("backend.services.shared_state:MemorySharedState", "")
+        assert isinstance(state, MemorySharedState)
+
+    @pytest.mark.parametrize("backend", ["redis", "backend.config:Config"])
+    def test_invalid_backend(self, backend):
+        with pytest.raises(ValueError):
+            create_shared_state(backend, "")
+
+    def test_singleton_uses_config(self, temp_history_dir, monkeypatch):
+        monkeypatch.setattr(shared_state_module, "_state_instance", None)
+        monkeypatch.setattr(shared_state_module.Config, "SHARED_STATE_BACKEND", "sqlite")
+        monkeypatch.setattr(shared_state_module.Config, "SHARED_STATE_PATH",
+                            os.path.join(temp_history_dir, "custom", "state.db"))
+        state = shared_state_module.get_shared_state()
+        assert isinstance(state, SqliteSharedState)
+        assert shared_state_module.get_shared_state() is state
+        assert os.path.exists(os.path.join(temp_history_dir, "custom", "state.db"))
+
+
+class TestTaskStateStore:
+    """任务状态测试"""
+
+    def _create(self, store, task_id="task_a"):
+        store.create(task_id, [{"index": 0}, {"index": 1}], "大纲", "主题", "record_1", [b"ref"])
+
+    def test_page_state(self, shared):
+        store = TaskStateStore(shared)
+        self._create(store)
+        store.mark_failed("task_a", 1, "超时")
+        state = store.mark_generated("task_a", 0, "0.png")
+        assert state["generated"] == {0: "0.png"}
+        assert state["failed"] == {1: "超时"}
+
+        store.mark_generated("task_a", 1, "1.png")
+        state = store.get("task_a")
+        assert state["generated"] == {0: "0.png", 1: "1.png"} and state["failed"] == {}
+        assert store.user_images("task_a") == [b"ref"]
+
+        store.set_cover("task_a", b"cover")
+        assert store.cover_image("task_a") == b"cover" and store.get("task_a")["has_cover"]
+        # 不存在的任务不会被创建
+        assert store.mark_generated("task_none", 0, "0.png") is None
+        assert store.get("task_none") is None
+
+    def test_event_sequence_continues_on_regenerate(self, shared):
+        store = TaskStateStore(shared)
+        self._create(store)
+        for i in range(3):
+            assert store.append_event("task_a", {"event": "progress", "data": {"i": i}}) == i + 1
+        store.record_metrics("task_a", 0, {"elapsed_ms": 10})
+        store.set_cover("task_a", b"cover")
+        subscribed_after = store.last_seq("task_a")
+
+        # 重新生成：清空事件、用量和封面，但序号继续递增
+        self._create(store)
+        assert store.events("task_a") == []
+        assert store.metrics("task_a") == {}
+        assert store.cover_image("task_a") is None
+        assert store.last_seq("task_a") == 3
+
+        assert store.append_event("task_a", {"event": "complete", "data": {}}) == 4
+        events = store.events("task_a", after=subscribed_after)
+        assert [(e["seq"], e["event"]) for e in events] == [(4, "complete")]
+
+    def test_event_log_bounded(self, shared, monkeypatch):
+        monkeypatch.setattr(TaskStateStore, "MAX_EVENTS", 5)
+        store = TaskStateStore(shared)
+        for i in range(8):
+            store.append_event("task_a", {"event": "progress", "data": {"i": i}})
+        assert [e["seq"] for e in store.events("task_a")] == [4, 5, 6, 7, 8]
+        assert [e["seq"] for e in store.events("task_a", after=6)] == [7, 8]
+
+    def test_discard(self, shared):
+        store = TaskStateStore(shared)
+        self._create(store)
+        store.append_event("task_a", {"event": "progress", "data": {}})
+        store.discard("task_a")
+        assert store.get("task_a") is None
+        assert store.user_images("task_a") is None
+        assert store.events("task_a") == [] and store.last_seq("task_a") == 0
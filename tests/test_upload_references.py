@@ -0,0 +1,27 @@
+"""
+引用不存在的上传图片时返回 400 测试
+"""
+import pytest
+
+MISSING_ID = "0" * 32
+
+ENDPOINTS = [
+    ("/api/generate", {"pages": [{"index": 0, "type": "cover", "content": "封面"}]}),
+    ("/api/jobs/generate", {"pages": [{"index": 0, "type": "cover", "content": "封面"}]}),
+    ("/api/retry", {"task_id": "task_test", "page": {"index": 0, "type": "cover", "content": "封面"}}),
+    ("/api/regenerate", {"task_id": "task_test", "page": {"index": 0, "type": "cover", "content": "封面"}}),
+    ("/api/retry-failed", {"task_id": "task_test", "pages": [{"index": 0, "type": "cover", "content": "封面"}]}),
+    ("/api/jobs/retry-failed", {"task_id": "task_test", "pages": [{"index": 0, "type": "cover", "content": "封面"}]}),
+    ("/api/outline", {"topic": "秋季穿搭"}),
+]
+
+
+@pytest.mark.parametrize("endpoint,body", ENDPOINTS)
+@pytest.mark.parametrize("upload_id", [MISSING_ID, "not-an-id"])
+def test_unknown_upload_id_is_client_error(client, endpoint, body, upload_id):
+    key = "image_ids" if endpoint == "/api/outline" else "user_image_ids"
+    response = client.post(endpoint, json={**body, key: [upload_id]})
+    assert response.status_code == 400
+    payload = response.get_json()
+    assert payload["success"] is False
+    assert "参考图片不存在" in payload["error"]